@@ -1 +1,13 @@
-from .api import API
+from .trace import tracer
+from .client import AsyncClient, Client, CommandError, FileEntry, LoginError
+from .transfer import export_tree, import_tree
+
+def __getattr__(name):
+    # API 与 APIPool 依赖 Qt，按需导入，这样 headless client 在没有 PySide6 的环境中也能使用
+    if name == "API":
+        from .api import API
+        return API
+    if name == "APIPool":
+        from .pool import APIPool
+        return APIPool
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,58 +1,100 @@
-import os
-import sys
+import codecs
 
-from PySide6.QtCore import QObject, Signal, QProcess, Qt
+from PySide6.QtCore import QObject, Signal, QProcess, QTimer, Qt
+from PySide6.QtNetwork import QLocalSocket
 
-DEBUG = True
+from .daemon import FRAME_INPUT, FRAME_OUTPUT, FrameDecoder, encode_frame
+from .executable import find_executable, output_encoding
+from .recorder import recorder
+from .trace import tracer
+
+TERMINATE_TIMEOUT_MS = 1000 # terminate 之后这么久还没有退出就 kill
+_terminating = set() # 正在退出的 QProcess，API 可能已经被删除，在这里保持引用直到进程结束
 
 class API(QObject):
     standardOutputReady = Signal(str, str)
     standardErrorReady = Signal(str, str)
     processFinished = Signal(str, int, QProcess.ExitStatus)
     processErrorOccurred = Signal(str, str)
+    inputWritten = Signal(str) # 又有一部分输入交给了后端，大量写入的调用方据此继续发送
 
-    def __init__(self, terminal_object_name: str, executable_filename: str, parent=None):
+    def __init__(self, terminal_object_name: str, executable_filename: str, parent=None, daemon_socket: str = None):
         super().__init__(parent)
         self.parent_gui = parent
         self.terminal_object_name = terminal_object_name
         self.executable_filename = executable_filename # 存储要启动的 app 的文件名
-        self.process = QProcess(self) # QProcess 的父对象是 API 自身，方便管理
-
-        if sys.platform == 'win32':
-            self.process_output_encoding = 'gbk'
-        else:
-            self.process_output_encoding = 'utf-8'
-
-        self.process.readyReadStandardOutput.connect(self._on_ready_read_standard_output)
-        self.process.readyReadStandardError.connect(self._on_ready_read_standard_error)
-        self.process.finished.connect(self._on_process_finished)
-        self.process.errorOccurred.connect(self._on_qprocess_error_occurred)
+        self.daemon_socket = daemon_socket # app --daemon 的套接字路径，设置时连接守护进程而不是启动新进程
+        self.socket = None # 连接守护进程时的 QLocalSocket
+        self._frames = FrameDecoder()
+        self.process = self._new_process()
+        self._holding_output = False # 进程在池中预热时先缓存输出，交给终端后再补发
+        self._held_output = [] # [(is_error, text)]
+
+        self.process_output_encoding = output_encoding()
+
+    def _new_process(self) -> QProcess:
+        process = QProcess(self) # QProcess 的父对象是 API 自身，方便管理
+        process.readyReadStandardOutput.connect(self._on_ready_read_standard_output)
+        process.readyReadStandardError.connect(self._on_ready_read_standard_error)
+        process.finished.connect(self._on_process_finished)
+        process.errorOccurred.connect(self._on_qprocess_error_occurred)
+        process.bytesWritten.connect(self._on_bytes_written)
+        return process
 
     def _get_executable_path(self, executable_name):
         """在目录下查找可执行文件的完整路径。"""
-        root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        executable_dir = os.path.join(root_dir, "build") if DEBUG else os.path.join(root_dir, "bin")
-
-        if sys.platform == 'win32' and not executable_name.lower().endswith(('.py', '.bat', '.cmd', '.exe')):
-            executable_name += ".exe"
-
-        full_path = os.path.join(executable_dir, executable_name)
-
-        if not os.path.exists(full_path): # 不在这里直接显示 warning，而是返回 None，让调用者处理
-            self.parent_gui.warning("Executable not found", f"[API._get_executable_path] Error: Executable not found at '{full_path}'")
+        full_path = find_executable(executable_name)
+        if full_path is None: # 不在这里直接显示 warning，而是返回 None，让调用者处理
+            if hasattr(self.parent_gui, "warning"): # 预热池中的 API 没有可以提示的界面
+                self.parent_gui.warning("Executable not found", f"[API._get_executable_path] Error: Executable '{executable_name}' not found")
             return None
         return full_path
 
     def _on_ready_read_standard_output(self):
         """读取 QProcess 的标准输出并发出自定义信号。"""
         output = self.process.readAllStandardOutput().data().decode(self.process_output_encoding, errors='replace')
+        self._emit_standard_output(output)
+
+    def _emit_standard_output(self, output: str):
+        if self._holding_output:
+            self._held_output.append((False, output))
+            return
+        self._record(False, output)
         self.standardOutputReady.emit(self.terminal_object_name, output)
 
+    def _on_socket_ready_read(self):
+        """守护进程的输出帧与进程的标准输出一样处理，FRAME_READY 不需要处理：终端按提示符判断命令结束。"""
+        for frame_type, payload in self._frames.feed(self.socket.readAll().data()):
+            if frame_type == FRAME_OUTPUT:
+                output = self._socket_decoder.decode(payload)
+                if output:
+                    self._emit_standard_output(output)
+
+    def _on_socket_disconnected(self):
+        """守护进程结束了这个会话（exit）或者守护进程退出，与进程结束一样通知终端。"""
+        self.processFinished.emit(self.terminal_object_name, 0, QProcess.NormalExit)
+
+    def _on_socket_error_occurred(self, error: QLocalSocket.LocalSocketError):
+        if error != QLocalSocket.PeerClosedError: # 正常断开由 disconnected 处理
+            self.processErrorOccurred.emit(self.terminal_object_name, f"Daemon connection error: {self.socket.errorString()}")
+
+    def _on_bytes_written(self, _bytes: int):
+        self.inputWritten.emit(self.terminal_object_name)
+
     def _on_ready_read_standard_error(self):
         """读取 QProcess 的标准错误输出并发出自定义信号。"""
         error_output = self.process.readAllStandardError().data().decode(self.process_output_encoding, errors='replace')
+        if self._holding_output:
+            self._held_output.append((True, error_output))
+            return
+        self._record(True, error_output)
         self.standardErrorReady.emit(self.terminal_object_name, error_output)
 
+    def _record(self, is_error: bool, text: str):
+        tracer.record_output(self.terminal_object_name, text)
+        if recorder is not None: # 设置了 OSFM_RECORD 时录制原始输出，供 bench/replay.py 回放
+            recorder.record(self.terminal_object_name, "stderr" if is_error else "stdout", text)
+
     def _on_process_finished(self, exitCode: int, exitStatus: QProcess.ExitStatus):
         """处理 QProcess 进程结束事件并发出自定义信号。"""
         self.processFinished.emit(self.terminal_object_name, exitCode, exitStatus)
@@ -71,7 +113,9 @@ class API(QObject):
         self.processErrorOccurred.emit(self.terminal_object_name, error_msg)
 
     def start_app_process(self):
-        """启动关联的外部应用程序进程。"""
+        """启动关联的外部应用程序进程，设置了 daemon_socket 时改为连接守护进程，开始一个新会话。"""
+        if self.daemon_socket:
+            return self._connect_daemon()
         if self.process.state() != QProcess.NotRunning: # 如果进程已经在运行，先尝试终止它，避免重复启动
             self.terminate_app_process()
 
@@ -80,26 +124,100 @@ class API(QObject):
             self.processErrorOccurred.emit(self.terminal_object_name, f"Error: Executable '{self.executable_filename}' not found.")
             return False
 
-        self.process.start(executable_path)
-        if not self.process.waitForStarted(1500): # 等待1.5秒
-            error_msg = f"Failed to start process '{executable_path}': {self.process.errorString()}"
-            self.processErrorOccurred.emit(self.terminal_object_name, error_msg)
-            return False
+        self.process.start(executable_path) # 异步启动，启动失败会通过 errorOccurred 报告，不阻塞事件循环
         return True
 
-    def send_input_to_app(self, data: str):
-        """向关联的应用程序进程的标准输入发送数据。"""
-        if self.process.state() == QProcess.Running: # 将数据写入 QProcess 的标准输入 必须添加换行符，因为你的 app 预期通过换行符来结束一行输入
-            self.process.write((data + '\n').encode('utf-8'))
+    def _connect_daemon(self):
+        if self.socket is None:
+            self.socket = QLocalSocket(self)
+            self.socket.readyRead.connect(self._on_socket_ready_read)
+            self.socket.disconnected.connect(self._on_socket_disconnected)
+            self.socket.errorOccurred.connect(self._on_socket_error_occurred)
+            self.socket.bytesWritten.connect(self._on_bytes_written)
         else:
+            self._abort_socket()
+        self._frames = FrameDecoder()
+        self._socket_decoder = codecs.getincrementaldecoder('utf-8')(errors='replace') # 守护进程输出 UTF-8，多字节字符可能跨帧
+        self.socket.connectToServer(self.daemon_socket) # 异步连接，失败会通过 errorOccurred 报告
+        return True
+
+    def _abort_socket(self):
+        """主动断开，不把它当作会话结束报告给终端。"""
+        self.socket.blockSignals(True)
+        self.socket.abort()
+        self.socket.blockSignals(False)
+
+    def hold_output(self):
+        """缓存之后的输出，直到 release_output 被调用。"""
+        self._holding_output = True
+
+    def release_output(self):
+        """停止缓存，并按原顺序补发缓存期间收到的输出。"""
+        self._holding_output = False
+        held_output, self._held_output = self._held_output, []
+        for is_error, text in held_output:
+            self._record(is_error, text)
+            if is_error:
+                self.standardErrorReady.emit(self.terminal_object_name, text)
+            else:
+                self.standardOutputReady.emit(self.terminal_object_name, text)
+
+    def attach(self, terminal_object_name: str, parent):
+        """把预热好的 API 交给新的终端标签页。"""
+        self.terminal_object_name = terminal_object_name
+        self.parent_gui = parent
+        self.setParent(parent)
+
+    def send_input_to_app(self, data: str, trace: bool = True):
+        """向关联的应用程序进程的标准输入发送数据。trace 为 False 时由调用方自己计时（例如流水线脚本）。"""
+        if self.state() == QProcess.Running: # 将数据写入 QProcess 的标准输入 必须添加换行符，因为你的 app 预期通过换行符来结束一行输入
+            if trace:
+                tracer.begin(self.terminal_object_name, data)
+            if self.socket is not None:
+                self.socket.write(encode_frame(FRAME_INPUT, (data + '\n').encode('utf-8')))
+            else:
+                self.process.write((data + '\n').encode('utf-8'))
+        else:
+            self.processErrorOccurred.emit(self.terminal_object_name, "Error: Application process is not running. Cannot send input.")
+
+    def send_bytes_to_app(self, data: bytes):
+        """原样写入后端的标准输入，不补换行，用于 write 命令的分段内容。"""
+        if self.state() != QProcess.Running:
             self.processErrorOccurred.emit(self.terminal_object_name, "Error: Application process is not running. Cannot send input.")
+        elif self.socket is not None:
+            self.socket.write(encode_frame(FRAME_INPUT, data))
+        else:
+            self.process.write(data)
+
+    def pending_input_bytes(self) -> int:
+        """已经写入但后端还没有读走的字节数。"""
+        return self.socket.bytesToWrite() if self.socket is not None else self.process.bytesToWrite()
 
     def terminate_app_process(self):
-        """终止关联的应用程序进程并清理资源。"""
-        if self.process.state() != QProcess.NotRunning:
-            self.process.terminate() # 尝试正常终止进程
-            if not self.process.waitForFinished(1000): # 等待1秒让进程退出
-                self.process.kill() # 如果未退出，则强制杀死
+        """
+        终止关联的应用程序进程并清理资源，不阻塞界面：进程脱离 API 后异步退出，TERMINATE_TIMEOUT_MS 内没有退出就 kill，
+        API 换上一个新的 QProcess。连接守护进程时只断开连接，守护进程把它当作这个会话的 exit。
+        """
+        if self.socket is not None:
+            self._abort_socket()
+            return
+        if self.process.state() == QProcess.NotRunning:
+            return
+        process = self.process
+        for signal in (process.readyReadStandardOutput, process.readyReadStandardError, process.finished,
+                       process.errorOccurred, process.bytesWritten):
+            signal.disconnect() # 旧进程的输出和结束不再报告给终端
+        process.setParent(None) # API 随后可能被 deleteLater
+        _terminating.add(process)
+        process.finished.connect(lambda *_: (_terminating.discard(process), process.deleteLater()))
+        QTimer.singleShot(TERMINATE_TIMEOUT_MS, process, process.kill) # 进程先结束时定时器随它一起取消
+        process.terminate() # 尝试正常终止进程
+        self.process = self._new_process()
 
     def state(self):
+        if self.socket is not None: # 按 QProcess 的状态报告，终端和 Explorer 不必区分两种后端
+            return {
+                QLocalSocket.ConnectedState: QProcess.Running,
+                QLocalSocket.ConnectingState: QProcess.Starting,
+            }.get(self.socket.state(), QProcess.NotRunning)
         return self.process.state()
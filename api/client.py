@@ -0,0 +1,449 @@
+import asyncio
+import codecs
+import re
+
+from .daemon import DaemonConnection
+from .executable import find_executable, output_encoding
+
+SHELL_PROMPT = re.compile(r"OSFileSystem@(?P<user>[^:\n]*):~(?P<path>[^\n]*?)\$ $")
+USERNAME_PROMPT = re.compile(r"host@login:Username\$ $")
+PASSWORD_PROMPT = re.compile(r"host@login:Password\$ $")
+SUDO_PROMPT = re.compile(r"\[sudo\] password for [^\n]*: $")
+SECRET_PROMPT = re.compile(r"(?:current |retype )?password: $") # mkuser / passwd 询问密码
+DISK_SIZE_PROMPT = re.compile(r"please input disk size\(MB\): $")
+SHELL_PROMPT_BYTES = re.compile(rb"OSFileSystem@[^:\n]*:~[^\n]*?\$ $") # download 不解码输出，直接在字节中找提示符
+CAT_ERROR = re.compile(r"cat: .*: (No such file|Not a file|Permission denied|No such file or directory|No such directory|Not a directory)$")
+
+PROMPT_SCAN_LENGTH = 256 # 提示符只会出现在缓冲区末尾，只在这段范围内匹配
+WRITE_CHUNK_BYTES = 256 * 1024 # write 命令每段的长度，后端上限是 1MB
+WRITE_ABORT = b"abort\n" # 不是数字的长度行：后端丢弃已写入的块，保留文件原来的内容
+DOWNLOAD_HOLD_BYTES = 4096 # download 的输出在这么长以内时可能只是一行错误信息，先不交给 sink
+
+class CommandError(Exception):
+    """ The backend rejected a command, message is the line it printed """
+    def __init__(self, command: str, message: str):
+        super().__init__(message)
+        self.command = command
+        self.message = message
+
+class LoginError(Exception):
+    """ Login or sudo verification failed """
+
+
+class FileEntry:
+    """ One row of `ls -l` """
+    def __init__(self, name: str, uid: int, owner: str, access: str, creation_time: str, modified_time: str):
+        self.name = name
+        self.uid = uid
+        self.owner = owner
+        self.access = access # 例如 'drwxrwxrwx' 或 'frwxrw-r--'
+        self.creation_time = creation_time
+        self.modified_time = modified_time
+
+    @property
+    def is_dir(self) -> bool:
+        return self.access.startswith("d")
+
+    def __repr__(self):
+        return f"FileEntry({self.name!r}, {self.access!r}, owner={self.owner!r})"
+
+
+class UserEntry:
+    """ One row of `lsuser` """
+    def __init__(self, uid: int, name: str, trusted: list):
+        self.uid = uid
+        self.name = name
+        self.trusted = trusted
+
+    def __repr__(self):
+        return f"UserEntry({self.uid}, {self.name!r}, trusted={self.trusted!r})"
+
+
+def parse_ls_long(output: str) -> list:
+    entries = []
+    for line in output.splitlines():
+        parts = [part.strip() for part in line.split("|")]
+        if len(parts) != 6 or parts[0] == "fileName":
+            continue
+        name, uid, owner, access, creation_time, modified_time = parts
+        entries.append(FileEntry(name, int(uid), owner, access, creation_time, modified_time))
+    return entries
+
+def parse_lsuser(output: str) -> list:
+    users = []
+    for line in output.splitlines():
+        parts = [part.strip() for part in line.split("|")]
+        if len(parts) != 3 or parts[0] == "uid":
+            continue
+        trusted = [name.strip() for name in parts[2].split(",") if name.strip()]
+        users.append(UserEntry(int(parts[0]), parts[1], trusted))
+    return users
+
+def _quote(argument: str) -> str:
+    """ The shell has quotes but no escapes, so an argument can never contain a double quote """
+    if '"' in argument or "\n" in argument:
+        raise ValueError(f"argument cannot contain double quotes or newlines: {argument!r}")
+    return f'"{argument}"'
+
+
+def write_frames(path: str, source):
+    """
+    The `write` command for path followed by source in length-framed chunks and the final empty chunk,
+    as (bytes to send, content bytes in them). source is bytes or a binary file object.
+    Sending WRITE_ABORT after the command line instead of the remaining frames cancels the write.
+    """
+    command = f"write {_quote(path)}\n".encode('utf-8') # 在生成器外检查路径，出错时还什么都没有发送
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        data = memoryview(source)
+        chunks = (bytes(data[i:i + WRITE_CHUNK_BYTES]) for i in range(0, len(data), WRITE_CHUNK_BYTES))
+    else:
+        chunks = iter(lambda: source.read(WRITE_CHUNK_BYTES), b"")
+    def frames():
+        yield command, 0
+        for chunk in chunks:
+            yield b"%d\n" % len(chunk) + chunk, len(chunk) # 长度行和内容一起发出，守护进程中是同一个输入帧
+        yield b"0\n", 0
+    return frames()
+
+
+class AsyncClient:
+    """
+    Qt-free session with one backend process, reading prompt-framed responses from asyncio.subprocess streams.
+    Several clients can run concurrently in one event loop; each one is a separate `app` process on the same disk image.
+    With socket_path the session is opened on a running `app --daemon <socket>` instead, sharing its mounted disk and cache.
+    """
+    def __init__(
+        self,
+        username: str = "root",
+        password: str = "123456",
+        executable: str = None,
+        cwd: str = None,
+        disk_size_mb: int = None,
+        timeout: float = 30.0,
+        socket_path: str = None
+    ):
+        self.username = username
+        self.password = password
+        self.executable = executable
+        self.cwd = cwd # 后端在工作目录下打开 OSFileSystem.dsk
+        self.disk_size_mb = disk_size_mb # 没有磁盘时用这个大小创建，为 None 时报错
+        self.timeout = timeout
+        self.socket_path = socket_path # 守护进程的套接字，设置时不启动新进程
+        self.process = None
+        self.user = None # 当前提示符里的用户名
+        self.path = None # 当前目录，根目录为 "/"
+        self._buffer = ""
+        self._decoder = codecs.getincrementaldecoder(output_encoding())(errors='replace')
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def start(self):
+        """启动后端进程并登录。"""
+        if self.socket_path:
+            self.process = await DaemonConnection.open(self.socket_path) # 与子进程有相同的 stdin / stdout 接口
+        else:
+            executable = self.executable or find_executable("app")
+            if executable is None:
+                raise FileNotFoundError("backend executable 'app' not found")
+            self.process = await asyncio.create_subprocess_exec(
+                executable,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL, # 后端所有有用的输出都在 stdout
+                cwd=self.cwd
+            )
+        prompt, _ = await self._read_until(DISK_SIZE_PROMPT, USERNAME_PROMPT)
+        if prompt is DISK_SIZE_PROMPT:
+            if self.disk_size_mb is None:
+                await self.close()
+                raise FileNotFoundError("no disk image in the working directory and disk_size_mb is not set")
+            await self._send(str(self.disk_size_mb))
+            await self._read_until(USERNAME_PROMPT)
+        await self._send(self.username)
+        await self._read_until(PASSWORD_PROMPT)
+        await self._send(self.password)
+        prompt, output = await self._read_until(SHELL_PROMPT, USERNAME_PROMPT)
+        if prompt is USERNAME_PROMPT:
+            await self.close()
+            raise LoginError(output.strip() or "Access denied")
+        return self
+
+    async def close(self):
+        """退出 Shell 并等待进程结束，超时则强制结束。"""
+        if self.process is None:
+            return
+        process, self.process = self.process, None
+        if process.returncode is None:
+            try:
+                process.stdin.write(b"exit\n")
+                await process.stdin.drain()
+                await asyncio.wait_for(process.wait(), 5)
+            except (ConnectionError, asyncio.TimeoutError):
+                process.kill()
+                await process.wait()
+
+    async def _send(self, line: str):
+        self.process.stdin.write((line + "\n").encode('utf-8'))
+        await self.process.stdin.drain()
+
+    async def _read_until(self, *prompts):
+        """读取输出直到缓冲区以某个提示符结尾，返回 (提示符, 提示符之前的输出)。"""
+        while True:
+            offset = max(0, len(self._buffer) - PROMPT_SCAN_LENGTH)
+            for prompt in prompts:
+                match = prompt.search(self._buffer, offset)
+                if match:
+                    output = self._buffer[:match.start()]
+                    self._buffer = ""
+                    if prompt is SHELL_PROMPT:
+                        self.user = match.group("user")
+                        self.path = match.group("path") or "/"
+                    return prompt, output
+            chunk = await asyncio.wait_for(self.process.stdout.read(65536), self.timeout)
+            if not chunk:
+                raise ConnectionError(f"backend exited, last output: {self._buffer[-200:]!r}")
+            self._buffer += self._decoder.decode(chunk).replace("\x0c", "") # Windows 下 cls 输出到管道时是换页符
+
+    async def run(self, command: str, sudo: bool = False, answers=()) -> str:
+        """
+        Sends one command line and returns everything printed before the next shell prompt.
+        answers are typed in order at password prompts (mkuser, passwd); sudo answers its own prompt.
+        """
+        if "\n" in command:
+            raise ValueError("command must be a single line")
+        answers = list(answers)
+        async with self._lock:
+            await self._send(f"sudo {command}" if sudo else command)
+            if sudo:
+                await self._read_until(SUDO_PROMPT)
+                await self._send(self.password)
+            outputs = []
+            while True:
+                prompt, output = await self._read_until(SHELL_PROMPT, SECRET_PROMPT)
+                outputs.append(output)
+                if prompt is SHELL_PROMPT:
+                    break
+                await self._send(answers.pop(0) if answers else "")
+        output = "".join(outputs)
+        if sudo:
+            status, _, output = output.partition("\n")
+            if status != "Verification successful":
+                raise LoginError(status)
+        return output
+
+    async def _run_silent(self, command: str, sudo: bool = False, answers=()):
+        """成功时不输出任何内容的命令，有输出就是错误信息。"""
+        output = await self.run(command, sudo, answers)
+        if output.strip():
+            raise CommandError(command, output.strip().splitlines()[-1])
+
+    async def run_batch(self, commands: list, stop_on_error: bool = True) -> str:
+        """
+        Sends the commands as one `batch` block: they run back to back and only one prompt comes back.
+        With stop_on_error the backend skips the rest of the block after the first failing command.
+        Commands that read more input (sudo, passwd, mkuser, vim) are refused inside a batch.
+        """
+        for command in commands:
+            if "\n" in command:
+                raise ValueError("command must be a single line")
+        block = ["batch -e" if stop_on_error else "batch", *commands, "end"]
+        async with self._lock:
+            self.process.stdin.write(("\n".join(block) + "\n").encode('utf-8'))
+            await self.process.stdin.drain()
+            _, output = await self._read_until(SHELL_PROMPT)
+        return output
+
+    async def _run_listing(self, command: str) -> str:
+        output = await self.run(command)
+        name = command.split(maxsplit=1)[0]
+        lines = output.strip().splitlines()
+        if len(lines) == 1 and lines[0].startswith(f"{name}: "): # 出错时只有一行 "<命令>: ..." 的信息
+            raise CommandError(command, lines[0])
+        return output
+
+    async def ls(self, path: str = None) -> list:
+        output = await self._run_listing(f"ls -l {_quote(path)}" if path else "ls -l")
+        return parse_ls_long(output)
+
+    async def listdir(self, path: str = None) -> list:
+        output = await self._run_listing(f"ls {_quote(path)}" if path else "ls")
+        return [name for name in output.strip("\n").split("\t") if name]
+
+    async def cat(self, path: str, offset: int = None, length: int = None) -> str:
+        """ Whole file, or up to length bytes starting at byte offset (to the end when length is None) """
+        command = f"cat {_quote(path)}"
+        if offset is not None or length is not None:
+            command += f" {offset or 0}" + (f" {length}" if length is not None else "")
+        output = await self.run(command)
+        if output.endswith("\n"):
+            output = output[:-1] # cat 在内容后面多输出一个换行
+        lines = output.splitlines()
+        if len(lines) == 1 and CAT_ERROR.match(lines[0]):
+            raise CommandError(f"cat {path}", lines[0])
+        return output
+
+    async def download(self, path: str, sink) -> int:
+        """
+        Streams `cat path` into sink.write as raw bytes and returns how many were written.
+        The output is neither decoded nor joined: only its last PROMPT_SCAN_LENGTH bytes are held back to find the prompt.
+        If sink.write raises, the rest of the output is read and dropped so the session stays usable, then the error is raised.
+        """
+        written = 0
+        failure = None
+        pending = b""
+        async with self._lock:
+            await self._send(f"cat {_quote(path)}")
+            holding = True # 输出还可能是一行错误信息
+            while True:
+                chunk = await asyncio.wait_for(self.process.stdout.read(65536), self.timeout)
+                if not chunk:
+                    raise ConnectionError(f"backend exited while reading {path!r}")
+                pending += chunk
+                match = SHELL_PROMPT_BYTES.search(pending, max(0, len(pending) - PROMPT_SCAN_LENGTH))
+                if match:
+                    pending = pending[:match.start()]
+                    break
+                holding = holding and len(pending) <= DOWNLOAD_HOLD_BYTES
+                flush_length = len(pending) - PROMPT_SCAN_LENGTH
+                if holding or flush_length <= 0:
+                    continue
+                if failure is None:
+                    try:
+                        sink.write(pending[:flush_length])
+                        written += flush_length
+                    except BaseException as e:
+                        failure = e
+                pending = pending[flush_length:]
+        if failure is not None:
+            raise failure
+        if pending.endswith(b"\n"):
+            pending = pending[:-1] # cat 在内容后面多输出一个换行
+        if holding:
+            message = pending.decode(output_encoding(), errors='replace')
+            if "\n" not in message and CAT_ERROR.match(message):
+                raise CommandError(f"cat {path}", message)
+        sink.write(pending)
+        return written + len(pending)
+
+    async def write(self, path: str, content: str, append: bool = False):
+        """
+        Writes content line by line with echo, the same way the editor saves, in one batch round trip.
+        The backend ends every written line with a newline, so a trailing newline in content is not doubled.
+        """
+        lines = content.split("\n")
+        if len(lines) > 1 and lines[-1] == "":
+            lines.pop()
+        commands = [
+            f"echo {_quote(line)} {'>>' if append or index > 0 else '>'} {_quote(path)}"
+            for index, line in enumerate(lines)
+        ]
+        output = await self.run_batch(commands)
+        if output.strip():
+            raise CommandError(f"write {path}", output.strip().splitlines()[-1])
+
+    async def upload(self, path: str, source, progress=None) -> int:
+        """
+        Creates or overwrites path with raw bytes through the backend's `write` command, returns the bytes sent.
+        source is bytes or a binary file object read WRITE_CHUNK_BYTES at a time, so large files are never held in memory.
+        progress(n) is called after every chunk; if it (or anything else) raises, the write is aborted,
+        the file keeps its old content and the session stays usable. The backend cannot store NUL bytes.
+        """
+        frames = write_frames(path, source)
+        sent = 0
+        async with self._lock:
+            stdin = self.process.stdin
+            try:
+                for frame, length in frames:
+                    stdin.write(frame)
+                    await stdin.drain()
+                    if length:
+                        sent += length
+                        if progress is not None:
+                            progress(length)
+            except BaseException:
+                try:
+                    stdin.write(WRITE_ABORT)
+                    await stdin.drain()
+                    await self._read_until(SHELL_PROMPT)
+                except (ConnectionError, asyncio.TimeoutError):
+                    pass
+                raise
+            _, output = await self._read_until(SHELL_PROMPT)
+        if output.strip():
+            raise CommandError(f"write {path}", output.strip().splitlines()[-1])
+        return sent
+
+    async def touch(self, path: str):
+        await self._run_silent(f"touch {_quote(path)}")
+
+    async def mkdir(self, path: str):
+        await self._run_silent(f"mkdir {_quote(path)}")
+
+    async def rmdir(self, path: str):
+        await self._run_silent(f"rmdir {_quote(path)}")
+
+    async def rm(self, path: str):
+        await self._run_silent(f"rm {_quote(path)}")
+
+    async def cp(self, source: str, destination: str):
+        await self._run_silent(f"cp {_quote(source)} {_quote(destination)}")
+
+    async def mv(self, source: str, destination: str):
+        await self._run_silent(f"mv {_quote(source)} {_quote(destination)}")
+
+    async def cd(self, path: str):
+        await self._run_silent(f"cd {_quote(path)}")
+
+    async def chmod(self, path: str, who: str, access: str = ""):
+        """ who is one of -a (all), -t (trusted), -o (others); access is a subset of "rwx" """
+        await self._run_silent(f"chmod {_quote(path)} {who} {access}".rstrip())
+
+    async def lsuser(self) -> list:
+        return parse_lsuser(await self.run("lsuser"))
+
+    async def mkuser(self, name: str, password: str):
+        await self._run_silent(f"mkuser {_quote(name)}", sudo=True, answers=(password, password))
+
+    async def rmuser(self, name: str):
+        await self._run_silent(f"rmuser {_quote(name)}", sudo=True)
+
+    async def trust(self, name: str):
+        await self._run_silent(f"trust {_quote(name)}")
+
+    async def distrust(self, name: str):
+        await self._run_silent(f"distrust {_quote(name)}")
+
+
+class Client:
+    """ Blocking wrapper around AsyncClient for scripts that do not use asyncio, e.g. `with Client() as fs: fs.ls()` """
+    def __init__(self, *args, **kwargs):
+        self._loop = asyncio.new_event_loop()
+        self._client = AsyncClient(*args, **kwargs)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start(self):
+        self._loop.run_until_complete(self._client.start())
+        return self
+
+    def close(self):
+        try:
+            self._loop.run_until_complete(self._client.close())
+        finally:
+            self._loop.close()
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if asyncio.iscoroutinefunction(attribute):
+            return lambda *args, **kwargs: self._loop.run_until_complete(attribute(*args, **kwargs))
+        return attribute
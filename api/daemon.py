@@ -0,0 +1,94 @@
+"""
+Framing for the backend's daemon mode, `app --daemon <socket>`.
+
+Every frame is a 4-byte big-endian payload length, one type byte, then the payload.
+The client sends FRAME_INPUT with one or more input lines. The daemon answers each input frame with
+FRAME_OUTPUT chunks followed by exactly one FRAME_READY, and closes the connection when the session exits.
+"""
+import asyncio
+import struct
+
+FRAME_HEADER = struct.Struct(">IB")
+FRAME_INPUT = ord("I")
+FRAME_OUTPUT = ord("O")
+FRAME_READY = ord("R")
+
+def encode_frame(frame_type: int, payload: bytes = b"") -> bytes:
+    return FRAME_HEADER.pack(len(payload), frame_type) + payload
+
+
+class FrameDecoder:
+    """ Splits a byte stream into (type, payload) frames, keeping an incomplete frame for the next feed """
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> list:
+        self._buffer += data
+        frames = []
+        position = 0
+        while len(self._buffer) - position >= FRAME_HEADER.size:
+            length, frame_type = FRAME_HEADER.unpack_from(self._buffer, position)
+            end = position + FRAME_HEADER.size + length
+            if end > len(self._buffer):
+                break
+            frames.append((frame_type, bytes(self._buffer[position + FRAME_HEADER.size:end])))
+            position = end
+        del self._buffer[:position]
+        return frames
+
+
+class _InputStream:
+    def __init__(self, writer: asyncio.StreamWriter):
+        self._writer = writer
+
+    def write(self, data: bytes):
+        self._writer.write(encode_frame(FRAME_INPUT, data))
+
+    async def drain(self):
+        await self._writer.drain()
+
+
+class _OutputStream:
+    def __init__(self, reader: asyncio.StreamReader):
+        self._reader = reader
+        self.closed = False
+
+    async def read(self, n: int = -1) -> bytes:
+        """ Payload of the next output frame, b"" once the daemon has closed the session """
+        while not self.closed:
+            try:
+                length, frame_type = FRAME_HEADER.unpack(await self._reader.readexactly(FRAME_HEADER.size))
+                payload = await self._reader.readexactly(length)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                self.closed = True
+                break
+            if frame_type == FRAME_OUTPUT and payload:
+                return payload
+        return b""
+
+
+class DaemonConnection:
+    """ One daemon session with the stdin / stdout / wait / kill surface of the subprocess AsyncClient would start """
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writer = writer
+        self.stdin = _InputStream(writer)
+        self.stdout = _OutputStream(reader)
+
+    @classmethod
+    async def open(cls, socket_path: str):
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        return cls(reader, writer)
+
+    @property
+    def returncode(self):
+        return 0 if self.stdout.closed else None
+
+    async def wait(self) -> int:
+        while await self.stdout.read():
+            pass
+        self.kill()
+        return 0
+
+    def kill(self):
+        self.stdout.closed = True
+        self._writer.close()
@@ -0,0 +1,283 @@
+"""
+Offline defragmenter and compactor for OSFileSystem.dsk.
+
+    python -m api.defrag                            # rewrite OSFileSystem.dsk in place
+    python -m api.defrag --image a.dsk --output b.dsk --truncate
+    python -m api.defrag --bench --json             # also measure sequential reads before and after
+
+The tree is copied into a new image, depth first from the root, in the order a walk reads it:
+
+    directory INode     (the root stays at rootLocation)
+    directory blocks    packed, DIRECTORY_BLOCK_ITEMS items per block
+    child INodes        every entry of the directory, side by side
+    for each file       its FileIndex chain, then its data blocks, both contiguous
+    subdirectories      each laid out the same way
+
+Everything after the last used block is free: the free block stack or bitmap and the superblock counters are rebuilt
+with api.fsck.write_free_list. With --truncate the image file ends at the last used block (the backend reads zeros past
+the end and extends the file when it writes there), otherwise it keeps its length and the tail is left sparse.
+The image is checked with api.fsck first and refused when blocks are shared, dangling or unreadable; leaked blocks and
+wrong counters are fine, the rebuild drops them. Only defragment an image no backend has open.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+
+from .fsck import BROKEN_ENTRY, DANGLING, DOUBLY_ALLOCATED, Checker, directory_blocks, read_free_list, write_free_list
+from .image import DISK_NAME, FILE_TYPE, DiskImage, ImageError
+
+COPY_RUN_BLOCKS = 4096 # 连续的数据块一次最多复制这么多，16MB
+BLOCKING_PROBLEMS = (DOUBLY_ALLOCATED, DANGLING, BROKEN_ENTRY)
+PARTIAL_SUFFIX = ".defrag"
+
+def _runs(blocks: np.ndarray) -> list:
+    """ [(第一块, 块数)] of consecutive block numbers """
+    if not len(blocks):
+        return []
+    breaks = np.flatnonzero(np.diff(blocks.astype(np.int64)) != 1) + 1
+    starts = np.concatenate(([0], breaks))
+    lengths = np.diff(np.concatenate((starts, [len(blocks)])))
+    return list(zip(blocks[starts].tolist(), lengths.tolist()))
+
+
+def fragmentation(image: DiskImage) -> dict:
+    """
+    How scattered the tree is: a file is fragmented when its data blocks or its FileIndex chain are not one run,
+    a directory when its blocks are not. Free extents are runs of free blocks in the data area.
+    """
+    files = fragmented_files = extents = data_blocks = 0
+    directories = fragmented_directories = 0
+    used_end = image.root_location + 1
+    for _, node, _, children in image.walk("/"):
+        directories += 1
+        _, chain = image.directory(node.bno)
+        fragmented_directories += len(_runs(np.array(chain))) > 1
+        used_end = max(used_end, max(chain) + 1)
+        for _, child in children:
+            files += 1
+            index_blocks, data = [], []
+            for index_bno, blocks in image.file_chain(child.bno):
+                index_blocks.append(index_bno)
+                data.extend(blocks)
+            data = np.array(data, dtype=np.int64)
+            data_extents = len(_runs(data))
+            extents += data_extents
+            data_blocks += len(data)
+            fragmented_files += data_extents > 1 or len(_runs(np.array(index_blocks))) > 1
+            used_end = max(used_end, max(index_blocks, default=0) + 1, int(data.max(initial=0)) + 1)
+    free = np.zeros(image.total_blocks, dtype=bool)
+    try:
+        free[read_free_list(image)] = True
+    except (ImageError, IndexError):
+        pass
+    free[:image.root_location] = False
+    free_runs = _runs(np.flatnonzero(free))
+    return {
+        "files": files,
+        "fragmented_files": fragmented_files,
+        "data_blocks": data_blocks,
+        "extents": extents,
+        "extents_per_file": round(extents / files, 2) if files else 0.0,
+        "directories": directories,
+        "fragmented_directories": fragmented_directories,
+        "used_blocks": image.total_blocks - image.root_location - int(free.sum()),
+        "free_blocks": int(free.sum()),
+        "free_extents": len(free_runs),
+        "largest_free_extent": max((length for _, length in free_runs), default=0),
+        "used_end": used_end,
+        "image_bytes": image.length,
+    }
+
+
+class Defragmenter:
+    """ Plans the new layout of a checked image, then writes it into another image with the same header """
+    def __init__(self, source: DiskImage):
+        self.source = source
+        self.next_block = source.root_location
+        self.directories = [] # [(新 INode 块号, INode, 新目录块号, [(名字, 新 INode 块号)])]
+        self.files = [] # [(新 INode 块号, INode, 新索引表块号, [[旧数据块号]], 新数据块号)]
+
+    def _place(self, count: int) -> int:
+        start = self.next_block
+        self.next_block += count
+        return start
+
+    def plan(self) -> int:
+        """ Assigns every block its new number, returns the first block after the used area """
+        source = self.source
+        root = source.root_location
+        stack = [(root, self._place(1), root)] # (旧 INode 块号, 新 INode 块号, 新父目录 INode 块号)
+        while stack:
+            old_bno, new_bno, parent_bno = stack.pop()
+            node = source.inode(old_bno)
+            items, _ = source.directory(node.bno)
+            entries = items[2:] # 检查过的目录前两项一定是 "." 和 ".."
+            directory_start = self._place(directory_blocks(len(items)))
+            child_start = self._place(len(entries))
+            listing = [(".", new_bno), ("..", parent_bno)]
+            subdirectories = []
+            for position, (name, child_old) in enumerate(entries):
+                child_new = child_start + position
+                listing.append((name, child_new))
+                child = source.inode(child_old)
+                if child.kind == FILE_TYPE:
+                    chain = [data for _, data in source.file_chain(child.bno)]
+                    index_start = self._place(len(chain)) if chain else 0
+                    data_start = self._place(sum(len(data) for data in chain))
+                    self.files.append((child_new, child, index_start, chain, data_start))
+                else:
+                    subdirectories.append((child_old, child_new, new_bno))
+            self.directories.append((new_bno, node, directory_start, listing))
+            stack.extend(reversed(subdirectories))
+        return self.next_block
+
+    def write(self, target: DiskImage):
+        """ Writes the planned tree into target, which must be writable and at least as long as the used area """
+        source = self.source
+        for new_bno, node, directory_start, listing in self.directories:
+            chain = list(range(directory_start, directory_start + directory_blocks(len(listing))))
+            target.write_inode(new_bno, node._replace(bno=directory_start))
+            target.write_directory(chain, listing)
+        for new_bno, node, index_start, chain, data_start in self.files:
+            target.write_inode(new_bno, node._replace(bno=index_start))
+            next_data = data_start
+            for i, data in enumerate(chain):
+                index = np.zeros(source.block_size // 4, dtype='<u4') # 每个索引表保持原来的项数
+                index[:len(data)] = np.arange(next_data, next_data + len(data))
+                if i + 1 < len(chain):
+                    index[-1] = index_start + i + 1
+                target.write(index_start + i, index.tobytes())
+                for start, length in _runs(np.array(data, dtype=np.int64)):
+                    for offset in range(0, length, COPY_RUN_BLOCKS):
+                        count = min(COPY_RUN_BLOCKS, length - offset)
+                        target.write(next_data + offset, source.blocks(start + offset, count))
+                    next_data += length
+
+
+class DefragReport:
+    """ Fragmentation before and after, and the sequential read benchmark when it ran """
+    def __init__(self, source: str, output: str):
+        self.source = source
+        self.output = output
+        self.before = None
+        self.after = None
+        self.bench_before = None
+        self.bench_after = None
+        self.elapsed = 0.0
+
+    @property
+    def speedup(self):
+        if not self.bench_before or not self.bench_after or not self.bench_after["seconds"]:
+            return None
+        return round(self.bench_before["seconds"] / self.bench_after["seconds"], 2)
+
+    def to_dict(self) -> dict:
+        return {
+            "source": self.source,
+            "output": self.output,
+            "seconds": round(self.elapsed, 3),
+            "before": self.before,
+            "after": self.after,
+            "bench_before": self.bench_before,
+            "bench_after": self.bench_after,
+            "speedup": self.speedup,
+        }
+
+
+def _read_benchmark(path: str, repeat: int) -> dict:
+    try:
+        from bench.seqread import read_image
+    except ImportError as e:
+        raise ImageError("--bench needs the bench package, run from the repository root") from e
+    return read_image(path, repeat=repeat)
+
+
+def defragment(path: str = DISK_NAME, output: str = None, truncate: bool = False, bench: bool = False,
+               repeat: int = 1) -> DefragReport:
+    """
+    Rewrites the image at path into output (in place when output is None, through a temporary file next to it).
+    Raises ImageError when the image cannot be read or api.fsck finds shared, dangling or broken entries.
+    """
+    started = time.perf_counter()
+    destination = output or path
+    partial = destination + PARTIAL_SUFFIX
+    report = DefragReport(path, destination)
+    with DiskImage(path) as source:
+        problems = [problem for problem in Checker(source).run().problems if problem[0] in BLOCKING_PROBLEMS]
+        if problems:
+            kind, where, message = problems[0]
+            more = f" and {len(problems) - 1} more problems" if len(problems) > 1 else ""
+            raise ImageError(f"{kind}: {where}: {message}{more}; run python -m api.fsck --repair first")
+        report.before = fragmentation(source)
+        if bench:
+            report.bench_before = _read_benchmark(path, repeat)
+        defragmenter = Defragmenter(source)
+        used_end = defragmenter.plan()
+        length = used_end * source.block_size if truncate else max(source.length, used_end * source.block_size)
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(source.block_size) # 块 0：头部、超级块和用户表
+            with open(partial, 'wb') as f:
+                f.write(header)
+                f.truncate(length)
+            with DiskImage(partial, writable=True) as target:
+                defragmenter.write(target)
+                free = np.zeros(target.total_blocks, dtype=bool)
+                free[used_end:] = True
+                write_free_list(target, free)
+                report.after = fragmentation(target)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+    shutil.copymode(path, partial)
+    os.replace(partial, destination)
+    if bench:
+        report.bench_after = _read_benchmark(destination, repeat)
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def _describe(numbers: dict) -> str:
+    return (f"{numbers['fragmented_files']}/{numbers['files']} files fragmented, {numbers['extents_per_file']} extents per file, "
+            f"{numbers['fragmented_directories']}/{numbers['directories']} directories fragmented, "
+            f"{numbers['free_extents']} free extents, used area ends at block {numbers['used_end']}, "
+            f"{numbers['image_bytes'] / 1048576:.1f} MB file")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Defragment and compact the OS-FileManager disk image")
+    parser.add_argument("--image", default=DISK_NAME, help="disk image, OSFileSystem.dsk by default")
+    parser.add_argument("--output", help="write the result here instead of replacing the image")
+    parser.add_argument("--truncate", action="store_true", help="cut the image file off after the last used block")
+    parser.add_argument("--bench", action="store_true", help="measure sequential reads through the backend before and after")
+    parser.add_argument("--repeat", type=int, default=1, help="benchmark rounds, the fastest one counts")
+    parser.add_argument("--json", action="store_true", help="print the whole report as JSON")
+    options = parser.parse_args(argv)
+    try:
+        report = defragment(options.image, options.output, options.truncate, options.bench, options.repeat)
+    except ImageError as e:
+        print(f"defrag: {e}", file=sys.stderr)
+        return 2
+    except OSError as e:
+        print(f"defrag: {e.filename or options.image}: {e.strerror}", file=sys.stderr)
+        return 1
+    if options.json:
+        print(json.dumps(report.to_dict(), ensure_ascii=False, indent=2))
+        return 0
+    print(f"before: {_describe(report.before)}")
+    print(f"after:  {_describe(report.after)}")
+    if report.bench_before and report.bench_after:
+        print(f"sequential read: {report.bench_before['mb_per_second']} MB/s -> {report.bench_after['mb_per_second']} MB/s "
+              f"({report.bench_before['seconds']} s -> {report.bench_after['seconds']} s, {report.speedup}x)")
+    print(f"{report.output}: {report.after['used_blocks']} blocks in use, {report.elapsed:.2f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
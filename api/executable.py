@@ -0,0 +1,18 @@
+import os
+import sys
+
+DEBUG = True
+
+def find_executable(executable_name: str):
+    """在目录下查找可执行文件的完整路径，找不到时返回 None。"""
+    root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    executable_dir = os.path.join(root_dir, "build") if DEBUG else os.path.join(root_dir, "bin")
+
+    if sys.platform == 'win32' and not executable_name.lower().endswith(('.py', '.bat', '.cmd', '.exe')):
+        executable_name += ".exe"
+
+    full_path = os.path.join(executable_dir, executable_name)
+    return full_path if os.path.exists(full_path) else None
+
+def output_encoding() -> str:
+    return 'gbk' if sys.platform == 'win32' else 'utf-8'
@@ -0,0 +1,402 @@
+"""
+Offline consistency check of OSFileSystem.dsk.
+
+    python -m api.fsck                  # exit status 1 when anything is wrong
+    python -m api.fsck --repair
+    python -m api.fsck --image other.dsk --json
+
+The image is read through api.image. Every block gets an owner in a NumPy array while the tree is walked from the root:
+the INode, directory chain, FileIndex chain and data blocks of each file or directory. The owner array is then compared
+with the free block stack or bitmap:
+
+    leaked              neither used nor free, the space is lost until the next repair
+    doubly-allocated    used twice, used while on the free list, or on the free list twice
+    dangling            a pointer to a block outside the image or inside the superblock / free block area
+    broken-entry        a directory entry that is unusable: bad INode, bad name, wrong "." / "..", duplicate name
+    superblock          freeBlockNumber, avaliableCapacity or the free block stack top disagree with the free list
+
+Repair keeps the first owner of a block and truncates everything else at the bad pointer, drops entries that cannot be
+read, renames entries with bad or duplicate names to "#<INode 块号>", then rebuilds the free block stack or bitmap from
+the blocks nothing owns and rewrites the superblock counters. Only repair an image no backend has open.
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from .image import (ALLOCATOR_EXTENT, DIRECTORY_BLOCK_ITEMS, DIRECTORY_ITEM, DIRECTORY_LINK_NAME, DIRECTORY_TYPE,
+                    DISK_NAME, FILE_INDEX_SIZE, FILE_TYPE, DiskImage, ImageError)
+from .transfer import FILE_NAME_LENGTH
+
+LEAKED = "leaked"
+DOUBLY_ALLOCATED = "doubly-allocated"
+DANGLING = "dangling"
+BROKEN_ENTRY = "broken-entry"
+SUPERBLOCK = "superblock"
+PROBLEM_KINDS = (LEAKED, DOUBLY_ALLOCATED, DANGLING, BROKEN_ENTRY, SUPERBLOCK)
+
+NO_OWNER = -1
+SYSTEM_OWNER = -2 # 引导块、超级块和空闲块栈（位图）区域
+BITMAP_PAGE_BLOCKS = 32768 # 每个位图块记录的块数
+SAMPLE_BLOCKS = 8 # 块级问题只列出这么多块号
+
+def directory_blocks(items: int) -> int:
+    """ Blocks the backend uses for a directory with this many items, "." and ".." included """
+    return max(1, -(-items // DIRECTORY_BLOCK_ITEMS))
+
+
+def read_free_list(image: DiskImage) -> np.ndarray:
+    """
+    Block numbers on the free list, in allocation order for the free block stack and ascending for the bitmap.
+    Raises ImageError when the stack top recorded in the superblock is outside the stack area.
+    """
+    if image.allocator == ALLOCATOR_EXTENT:
+        pages = -(-image.total_blocks // BITMAP_PAGE_BLOCKS)
+        bits = np.unpackbits(np.frombuffer(image.blocks(1, pages), dtype=np.uint8), bitorder='little')
+        return np.flatnonzero(bits[:image.total_blocks]).astype(np.uint32)
+    stack_size = image.block_size // 4
+    top, offset = image.free_block_stack_top, image.free_block_stack_offset
+    if not 1 <= top < image.root_location or offset > stack_size:
+        raise ImageError(f"free block stack top {top}:{offset} is outside the stack area (blocks 1 ~ {image.root_location - 1})")
+    return np.frombuffer(image.blocks(top, image.root_location - top), dtype='<u4')[offset:].astype(np.uint32)
+
+
+def write_free_list(image: DiskImage, free: np.ndarray):
+    """
+    Makes exactly the blocks where free is True free: rewrites the stack (ascending, so the lowest block is handed out
+    first, as after format) or the bitmap, then the superblock counters.
+    """
+    blocks = np.flatnonzero(free).astype('<u4')
+    if image.allocator == ALLOCATOR_EXTENT:
+        pages = -(-image.total_blocks // BITMAP_PAGE_BLOCKS)
+        bits = np.zeros(pages * image.block_size * 8, dtype=np.uint8)
+        bits[blocks] = 1
+        image.write(1, np.packbits(bits, bitorder='little').tobytes())
+        image.free_block_stack_top, image.free_block_stack_offset = 0, 0
+    else:
+        stack_size = image.block_size // 4
+        slots = (image.root_location - 1) * stack_size
+        first_slot = slots - len(blocks)
+        area = np.zeros(slots, dtype='<u4')
+        area[first_slot:] = blocks
+        image.write(1, area.tobytes())
+        image.free_block_stack_top = 1 + first_slot // stack_size
+        image.free_block_stack_offset = first_slot % stack_size
+    image.free_block_number = len(blocks)
+    image.available_capacity = len(blocks) * image.block_size
+    image.write_superblock()
+
+
+class FsckReport:
+    """ What a check found, and what a repair changed """
+    def __init__(self):
+        self.problems = [] # [(种类, 位置, 说明)]
+        self.directories = 0
+        self.files = 0
+        self.used_blocks = 0
+        self.free_blocks = 0
+        self.total_blocks = 0
+        self.repaired = False
+        self.elapsed = 0.0
+
+    def add(self, kind: str, where, message: str):
+        self.problems.append((kind, where, message))
+
+    def count(self, kind: str) -> int:
+        return sum(1 for problem in self.problems if problem[0] == kind)
+
+    @property
+    def clean(self) -> bool:
+        return not self.problems
+
+    def to_dict(self) -> dict:
+        return {
+            "clean": self.clean,
+            "repaired": self.repaired,
+            "directories": self.directories,
+            "files": self.files,
+            "total_blocks": self.total_blocks,
+            "used_blocks": self.used_blocks,
+            "free_blocks": self.free_blocks,
+            "seconds": round(self.elapsed, 3),
+            "counts": {kind: self.count(kind) for kind in PROBLEM_KINDS},
+            "problems": [{"kind": kind, "where": where, "message": message} for kind, where, message in self.problems],
+        }
+
+
+class Checker:
+    """ One pass over an image, see the module docstring; with repair the image must be opened writable """
+    def __init__(self, image: DiskImage, repair: bool = False):
+        self.image = image
+        self.repair = repair
+        self.report = FsckReport()
+        self.first_block = image.root_location # 根目录 INode 之前都是系统区
+        self.owner = np.full(image.total_blocks, NO_OWNER, dtype=np.int32)
+        self.owner[:self.first_block] = SYSTEM_OWNER
+        self.paths = [] # 所有者编号 -> 路径
+
+    def _owner_name(self, owner: int) -> str:
+        return "the superblock and free block area" if owner == SYSTEM_OWNER else self.paths[owner]
+
+    def _new_owner(self, path: str) -> int:
+        self.paths.append(path)
+        return len(self.paths) - 1
+
+    def _claim_one(self, bno: int, owner: int, what: str) -> bool:
+        """ Claims one INode, directory or FileIndex block, False (and a problem) when it cannot be """
+        path = self.paths[owner]
+        if not self.first_block <= bno < self.image.total_blocks:
+            self.report.add(DANGLING, path, f"{what} points to block {bno}, outside the data area")
+            return False
+        previous = int(self.owner[bno])
+        if previous == owner:
+            self.report.add(BROKEN_ENTRY, path, f"{what} loops back to block {bno}")
+            return False
+        if previous != NO_OWNER:
+            self.report.add(DOUBLY_ALLOCATED, path, f"{what} block {bno} is also used by {self._owner_name(previous)}")
+            return False
+        self.owner[bno] = owner
+        return True
+
+    def _claim(self, blocks: np.ndarray, owner: int, what: str) -> int:
+        """ Claims every usable block of one FileIndex, returns the position of the first unusable one (len when none) """
+        path = self.paths[owner]
+        bad = (blocks < self.first_block) | (blocks >= self.image.total_blocks)
+        usable = ~bad
+        clash = np.zeros(len(blocks), dtype=bool)
+        clash[usable] = self.owner[blocks[usable]] != NO_OWNER
+        if len(blocks) > 1:
+            _, first = np.unique(blocks, return_index=True)
+            repeated = np.ones(len(blocks), dtype=bool)
+            repeated[first] = False
+            clash |= repeated & usable
+        for i in np.flatnonzero(bad)[:SAMPLE_BLOCKS].tolist():
+            self.report.add(DANGLING, path, f"{what} entry {i} points to block {blocks[i]}, outside the data area")
+        for i in np.flatnonzero(clash)[:SAMPLE_BLOCKS].tolist():
+            previous = int(self.owner[blocks[i]])
+            other = "this file" if previous in (owner, NO_OWNER) else self._owner_name(previous)
+            self.report.add(DOUBLY_ALLOCATED, path, f"{what} entry {i}: block {blocks[i]} is also used by {other}")
+        good = usable & ~clash
+        self.owner[blocks[good]] = owner
+        problems = bad | clash
+        return int(np.argmax(problems)) if problems.any() else len(blocks)
+
+    def _release(self, blocks, owner: int):
+        """ Gives up blocks a repair cut off, so the free list rebuild frees them """
+        blocks = np.asarray(blocks, dtype=np.int64)
+        blocks = blocks[(blocks >= self.first_block) & (blocks < self.image.total_blocks)]
+        blocks = blocks[self.owner[blocks] == owner]
+        self.owner[blocks] = NO_OWNER
+
+    def _read_directory(self, first_bno: int, owner: int) -> tuple:
+        """ ([(名字, INode 块号)], [目录块号], 是否需要重写) along the chain, stopping at the first block that cannot be claimed """
+        items, chain = [], []
+        bno = first_bno
+        broken = False
+        while bno:
+            if not self._claim_one(bno, owner, "directory chain"):
+                broken = True
+                break
+            chain.append(bno)
+            block = self.image.blocks(bno)
+            bno = 0
+            for i, (inode_bno, name) in enumerate(DIRECTORY_ITEM.iter_unpack(block)):
+                if not inode_bno:
+                    break
+                if i == DIRECTORY_BLOCK_ITEMS and name.rstrip(b"\0") == DIRECTORY_LINK_NAME:
+                    bno = inode_bno
+                    break
+                items.append((name.split(b"\0", 1)[0], inode_bno))
+        return items, chain, broken
+
+    def _check_file(self, node, owner: int) -> bool:
+        """ Claims the FileIndex chain and data blocks of a file, False when the entry has to go """
+        index_bno, previous = node.bno, None
+        while index_bno:
+            if not self._claim_one(index_bno, owner, "file index" if previous is None else f"file index after block {previous}"):
+                if previous is None:
+                    return False
+                if self.repair:
+                    self.image.write(previous, (0).to_bytes(4, 'little'), FILE_INDEX_SIZE * 4) # 截断在上一个索引表
+                break
+            index = np.frombuffer(self.image.blocks(index_bno), dtype='<u4')
+            entries = index[:FILE_INDEX_SIZE]
+            zero = np.flatnonzero(entries == 0)
+            length = int(zero[0]) if len(zero) else FILE_INDEX_SIZE
+            stop = self._claim(entries[:length], owner, f"file index {index_bno}")
+            if stop < length and self.repair: # 只检查时继续往下走，后面的块不会被误报为泄漏
+                self._release(entries[stop:length], owner)
+                cut = index.copy()
+                cut[stop:] = 0
+                self.image.write(index_bno, cut.tobytes())
+                break
+            previous, index_bno = index_bno, int(index[FILE_INDEX_SIZE])
+        return True
+
+    def _valid_name(self, raw: bytes) -> bool:
+        if not raw or len(raw) >= FILE_NAME_LENGTH or b"/" in raw or raw in (b".", b".."):
+            return False
+        try:
+            raw.decode('utf-8')
+        except UnicodeDecodeError:
+            return False
+        return True
+
+    def run(self) -> FsckReport:
+        started = time.perf_counter()
+        image = self.image
+        report = self.report
+        report.total_blocks = image.total_blocks
+        expected_root = -(-image.total_blocks * 4 // image.block_size) + 1
+        if image.root_location != expected_root:
+            raise ImageError(f"rootLocation is {image.root_location}, a {image.capacity} byte image keeps it at {expected_root}")
+        root_owner = self._new_owner("/")
+        if not self._claim_one(image.root_location, root_owner, "root INode"):
+            raise ImageError("the root INode block cannot be used")
+        root = image.inode(image.root_location)
+        if root.kind != DIRECTORY_TYPE:
+            raise ImageError("the root INode is not a directory")
+        items, chain, broken = self._read_directory(root.bno, root_owner)
+        if not chain:
+            raise ImageError("the root directory block cannot be used")
+        stack = [("/", image.root_location, image.root_location, root_owner, items, chain, broken)]
+        while stack:
+            path, inode_bno, parent_bno, owner, items, chain, rewrite = stack.pop()
+            report.directories += 1
+            kept = [(".", inode_bno), ("..", parent_bno)]
+            for position, (name, expected) in enumerate(kept):
+                if position >= len(items) or items[position][0] != name.encode() or items[position][1] != expected:
+                    found = f"'{items[position][0].decode('utf-8', 'replace')}' -> {items[position][1]}" if position < len(items) else "nothing"
+                    report.add(BROKEN_ENTRY, path, f"item {position} should be '{name}' -> {expected}, found {found}")
+                    rewrite = True
+            entries = items[2:] if len(items) >= 2 and [n for n, _ in items[:2]] == [b".", b".."] else \
+                [item for item in items if item[0] not in (b".", b"..")]
+            names = set()
+            children = []
+            for raw, child_bno in entries:
+                shown = raw.decode('utf-8', 'replace')
+                child_path = f"{path.rstrip('/')}/{shown}"
+                child = self._new_owner(child_path)
+                if not self._claim_one(child_bno, child, "entry"):
+                    rewrite = True
+                    continue
+                node = image.inode(child_bno)
+                if node.kind not in (FILE_TYPE, DIRECTORY_TYPE):
+                    report.add(BROKEN_ENTRY, child_path, f"INode {child_bno} has unknown type {node.kind}")
+                    self._release([child_bno], child)
+                    rewrite = True
+                    continue
+                name = shown
+                if not self._valid_name(raw) or raw in names:
+                    name = f"#{child_bno}"[:FILE_NAME_LENGTH - 1]
+                    reason = "a duplicate name" if raw in names else "an invalid name"
+                    report.add(BROKEN_ENTRY, child_path, f"entry has {reason}" + (f", renamed to '{name}'" if self.repair else ""))
+                    self.paths[child] = child_path = f"{path.rstrip('/')}/{name}"
+                    rewrite = True
+                names.add(name.encode('utf-8'))
+                if node.kind == DIRECTORY_TYPE:
+                    child_items, child_chain, child_broken = self._read_directory(node.bno, child)
+                    if not child_chain:
+                        self._release([child_bno], child)
+                        rewrite = True
+                        continue
+                    children.append((child_path, child_bno, inode_bno, child, child_items, child_chain, child_broken))
+                else:
+                    report.files += 1
+                    if not self._check_file(node, child):
+                        self._release([child_bno], child)
+                        rewrite = True
+                        continue
+                kept.append((name, child_bno))
+            if rewrite and self.repair:
+                needed = directory_blocks(len(kept))
+                if needed > len(chain): # 只在链断开时才会发生：从没人用的块里补足
+                    chain += self._spare_blocks(needed - len(chain), owner)
+                self._release(chain[needed:], owner)
+                image.write_directory(chain[:needed], kept)
+            stack.extend(reversed(children))
+
+        self._check_free_list()
+        report.used_blocks = int((self.owner != NO_OWNER).sum())
+        if self.repair and not report.clean:
+            write_free_list(image, self.owner == NO_OWNER)
+            report.repaired = True
+        report.free_blocks = int(image.free_block_number)
+        report.elapsed = time.perf_counter() - started
+        return report
+
+    def _spare_blocks(self, count: int, owner: int) -> list:
+        spare = np.flatnonzero(self.owner == NO_OWNER)[:count]
+        if len(spare) < count:
+            raise ImageError("no free block left to rebuild a directory")
+        self.owner[spare] = owner
+        for bno in spare.tolist():
+            self.image.write(bno, bytes(self.image.block_size))
+        return spare.tolist()
+
+    def _check_free_list(self):
+        image = self.image
+        report = self.report
+        try:
+            free = read_free_list(image)
+        except ImageError as e:
+            report.add(SUPERBLOCK, None, str(e))
+            free = np.zeros(0, dtype=np.uint32)
+        inside = (free >= self.first_block) & (free < image.total_blocks)
+        if not inside.all():
+            outside = free[~inside]
+            report.add(DANGLING, "free list", f"{len(outside)} free entries outside the data area, e.g. {outside[:SAMPLE_BLOCKS].tolist()}")
+        free = free[inside]
+        counts = np.bincount(free, minlength=image.total_blocks)
+        twice = np.flatnonzero(counts > 1)
+        if len(twice):
+            report.add(DOUBLY_ALLOCATED, "free list", f"{len(twice)} blocks are on the free list more than once, e.g. {twice[:SAMPLE_BLOCKS].tolist()}")
+        on_list = counts > 0
+        used = self.owner >= 0
+        in_use = np.flatnonzero(used & on_list)
+        if len(in_use):
+            examples = ", ".join(f"{bno} ({self.paths[self.owner[bno]]})" for bno in in_use[:SAMPLE_BLOCKS].tolist())
+            report.add(DOUBLY_ALLOCATED, "free list", f"{len(in_use)} blocks in use are also free, e.g. {examples}")
+        leaked = np.flatnonzero((self.owner == NO_OWNER) & ~on_list)
+        if len(leaked):
+            report.add(LEAKED, "free list", f"{len(leaked)} blocks are neither used nor free, e.g. {leaked[:SAMPLE_BLOCKS].tolist()}")
+        listed = len(free) + int((~inside).sum())
+        if image.free_block_number != listed:
+            report.add(SUPERBLOCK, None, f"freeBlockNumber is {image.free_block_number}, the free list holds {listed}")
+        if image.available_capacity != image.free_block_number * image.block_size:
+            report.add(SUPERBLOCK, None,
+                       f"avaliableCapacity is {image.available_capacity}, {image.free_block_number} free blocks make {image.free_block_number * image.block_size}")
+
+
+def check_image(path: str = DISK_NAME, repair: bool = False) -> FsckReport:
+    """ Checks (and with repair, fixes) the image at path; ImageError when it cannot be checked at all """
+    with DiskImage(path, writable=repair) as image:
+        return Checker(image, repair).run()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the OS-FileManager disk image for lost, shared and dangling blocks")
+    parser.add_argument("--image", default=DISK_NAME, help="disk image, OSFileSystem.dsk by default")
+    parser.add_argument("--repair", action="store_true", help="fix what was found; no backend may have the image open")
+    parser.add_argument("--json", action="store_true", help="print the whole report as JSON")
+    options = parser.parse_args(argv)
+    try:
+        report = check_image(options.image, options.repair)
+    except ImageError as e:
+        print(f"fsck: {e}", file=sys.stderr)
+        return 2
+    if options.json:
+        print(json.dumps(report.to_dict(), ensure_ascii=False, indent=2))
+    else:
+        for kind, where, message in report.problems:
+            print(f"{kind}: {where}: {message}" if where else f"{kind}: {message}")
+        state = "clean" if report.clean else ("repaired" if report.repaired else f"{len(report.problems)} problems")
+        print(f"{options.image}: {state}, {report.directories} directories, {report.files} files, "
+              f"{report.used_blocks}/{report.total_blocks} blocks used, {report.elapsed:.2f} s")
+    return 0 if report.clean else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
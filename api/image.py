@@ -0,0 +1,300 @@
+"""
+Access to OSFileSystem.dsk through mmap, without starting the backend. Images are opened read-only unless the offline
+tools (api.fsck, api.defrag) ask for a writable mapping.
+
+The layout mirrors src/include/Data.h as the backend writes it (x86-64, natural alignment):
+
+    0       capacity(4) isUnformatted(1) blockSize(2)
+    7       FileSystemCoreInfo: rootLocation, freeBlockNumber, freeBlockStackTop, freeBlockStackOffset, avaliableCapacity, ...
+    block 1 ~ rootLocation-1        free block stack (ALLOCATOR_STACK) or free block bitmap (ALLOCATOR_EXTENT)
+    block rootLocation              root directory INode, every INode takes a whole block
+    block rootLocation+1            first root directory block
+
+The backend writes its cache back after every command, so the image is consistent whenever no command is running.
+Never write to an image a backend has open: it keeps the superblock and the free block stack top in memory.
+"""
+import io
+import mmap
+import os
+import struct
+import time
+
+from collections import namedtuple
+
+DISK_NAME = "OSFileSystem.dsk"
+BLOCK_BYTE = 4096
+HEADER = struct.Struct("<IbH") # capacity, isUnformatted, blockSize
+SUPERBLOCK_OFFSET = HEADER.size
+SUPERBLOCK = struct.Struct("<IIIH2xI") # rootLocation, freeBlockNumber, freeBlockStackTop, freeBlockStackOffset, avaliableCapacity
+ALLOCATOR_OFFSET = SUPERBLOCK_OFFSET + 608 # 用户表、信赖矩阵和修改标记之后的 allocator
+ALLOCATOR_STACK = 0
+ALLOCATOR_EXTENT = 1
+INODE = struct.Struct("<BB2xI25s25s") # uid, flag, bno, creationTime, modifiedTime
+DIRECTORY_ITEM = struct.Struct("<I12s") # inodeIndex, name
+DIRECTORY_NUMS = BLOCK_BYTE // DIRECTORY_ITEM.size
+DIRECTORY_BLOCK_ITEMS = DIRECTORY_NUMS - 1 # 最后一项留作指向下一块的链接
+DIRECTORY_LINK_NAME = b"/"
+FILE_INDEX_SIZE = BLOCK_BYTE // 4 - 1 # 最后一项是下一个索引表的块号
+READ_RUN_BLOCKS = 256 # 连续的数据块一次最多读这么多，与后端的 READAHEAD_BLOCK_NUMS 相同
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+FILE_TYPE = 0
+DIRECTORY_TYPE = 1
+LINK_TYPE = 2
+
+class ImageError(Exception):
+    """ The image is missing, unformatted or does not hold what a path or block number says it should """
+
+
+class INode(namedtuple("INode", "uid flag bno creation_time modified_time")):
+    @property
+    def kind(self) -> int:
+        return self.flag >> 6
+
+    @property
+    def is_dir(self) -> bool:
+        return self.kind == DIRECTORY_TYPE
+
+    @property
+    def mtime(self) -> float:
+        """ modifiedTime as a Unix timestamp, the backend writes it in local time """
+        try:
+            return time.mktime(time.strptime(self.modified_time, TIME_FORMAT))
+        except (ValueError, OverflowError):
+            return 0.0
+
+
+def _c_string(raw: bytes) -> str:
+    return raw.split(b"\0", 1)[0].decode('utf-8', errors='replace')
+
+
+class DiskImage:
+    """ A mapped disk image; paths are absolute virtual paths, "/" is the root directory """
+    def __init__(self, path: str = DISK_NAME, writable: bool = False):
+        self.path = path
+        self.writable = writable
+        try:
+            self._file = open(path, 'r+b' if writable else 'rb')
+        except OSError as e:
+            raise ImageError(f"cannot open '{path}': {e.strerror}") from e
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        except ValueError as e: # 空文件不能映射
+            self._file.close()
+            raise ImageError(f"'{path}' is empty") from e
+        if len(self._map) < ALLOCATOR_OFFSET + 4:
+            self.close()
+            raise ImageError(f"'{path}' is too short to be a disk image")
+        self.capacity, unformatted, self.block_size = HEADER.unpack_from(self._map, 0)
+        if unformatted or self.block_size != BLOCK_BYTE:
+            self.close()
+            raise ImageError(f"'{path}' is not formatted")
+        (self.root_location, self.free_block_number, self.free_block_stack_top,
+         self.free_block_stack_offset, self.available_capacity) = SUPERBLOCK.unpack_from(self._map, SUPERBLOCK_OFFSET)
+        self.allocator, = struct.unpack_from("<I", self._map, ALLOCATOR_OFFSET)
+        self.total_blocks = self.capacity // self.block_size # 截短过的映像读到文件尾之后都是 0，与后端相同
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if getattr(self, "_map", None) is not None and not self._map.closed:
+            if self.writable:
+                self._map.flush()
+            self._map.close()
+        self._file.close()
+
+    @property
+    def length(self) -> int:
+        """ Bytes in the image file, which may be less than capacity once it has been truncated """
+        return len(self._map)
+
+    def _check(self, bno: int, what: str):
+        if not 0 < bno < self.total_blocks:
+            raise ImageError(f"{what} points to block {bno}, outside the image")
+
+    def blocks(self, bno: int, count: int = 1) -> bytes:
+        """ count whole blocks starting at bno """
+        self._check(bno, "read")
+        self._check(bno + count - 1, "read")
+        data = self._map[bno * self.block_size:(bno + count) * self.block_size]
+        if len(data) < count * self.block_size:
+            data += bytes(count * self.block_size - len(data))
+        return data
+
+    def write(self, bno: int, data: bytes, offset: int = 0):
+        """ Writes data at offset inside block bno, the image must have been opened writable """
+        self._check(bno, "write")
+        start = bno * self.block_size + offset
+        if start + len(data) > len(self._map):
+            raise ImageError(f"block {bno} lies past the end of the truncated image")
+        self._map[start:start + len(data)] = data
+
+    def write_superblock(self):
+        """ Writes root_location, the free block counters and available_capacity back into the superblock """
+        SUPERBLOCK.pack_into(self._map, SUPERBLOCK_OFFSET, self.root_location, self.free_block_number, self.free_block_stack_top,
+                             self.free_block_stack_offset, self.available_capacity)
+
+    def write_inode(self, bno: int, node: INode):
+        self.write(bno, INODE.pack(node.uid, node.flag, node.bno, node.creation_time.encode('utf-8'), node.modified_time.encode('utf-8')))
+
+    def write_directory(self, chain: list, items: list):
+        """
+        Writes [(name, INode 块号)] over the directory blocks in chain as the backend lays them out: DIRECTORY_BLOCK_ITEMS
+        items per block, the last item of every block but the last links to the next one. chain must be long enough.
+        """
+        for i, bno in enumerate(chain):
+            block = bytearray(self.block_size)
+            for j, (name, inode_bno) in enumerate(items[i * DIRECTORY_BLOCK_ITEMS:(i + 1) * DIRECTORY_BLOCK_ITEMS]):
+                DIRECTORY_ITEM.pack_into(block, j * DIRECTORY_ITEM.size, inode_bno, name.encode('utf-8'))
+            if i + 1 < len(chain):
+                DIRECTORY_ITEM.pack_into(block, DIRECTORY_BLOCK_ITEMS * DIRECTORY_ITEM.size, chain[i + 1], DIRECTORY_LINK_NAME)
+            self.write(bno, bytes(block))
+
+    def inode(self, bno: int) -> INode:
+        self._check(bno, "directory entry")
+        uid, flag, data_bno, creation_time, modified_time = INODE.unpack_from(self.blocks(bno))
+        return INode(uid, flag, data_bno, _c_string(creation_time), _c_string(modified_time))
+
+    def directory(self, bno: int) -> tuple:
+        """ ([(name, INode 块号)] including "." and "..", [目录块号]) of the directory whose first block is bno """
+        items = []
+        chain = []
+        next_bno = bno
+        while next_bno:
+            self._check(next_bno, "directory")
+            if next_bno in chain:
+                raise ImageError(f"directory block {bno} links back to block {next_bno}")
+            chain.append(next_bno)
+            block = self.blocks(next_bno)
+            next_bno = 0
+            for i, (inode_bno, name) in enumerate(DIRECTORY_ITEM.iter_unpack(block)):
+                if not inode_bno:
+                    break
+                if i == DIRECTORY_BLOCK_ITEMS and name.rstrip(b"\0") == DIRECTORY_LINK_NAME:
+                    next_bno = inode_bno
+                    break
+                items.append((_c_string(name), inode_bno))
+        return items, chain
+
+    def file_index(self, bno: int) -> tuple:
+        """ ([数据块号], 下一个索引表的块号) of one FileIndex block """
+        self._check(bno, "file index")
+        index = struct.unpack_from(f"<{FILE_INDEX_SIZE + 1}I", self.blocks(bno))
+        data = []
+        for block in index[:FILE_INDEX_SIZE]:
+            if not block:
+                break
+            data.append(block)
+        return data, index[FILE_INDEX_SIZE]
+
+    def file_chain(self, bno: int):
+        """ Yields (索引表块号, [数据块号]) along the FileIndex chain starting at bno """
+        seen = set()
+        while bno:
+            if bno in seen:
+                raise ImageError(f"file index chain loops back to block {bno}")
+            seen.add(bno)
+            data, next_bno = self.file_index(bno)
+            yield bno, data
+            bno = next_bno
+
+    def _runs(self, bno: int):
+        """ Runs of consecutive data blocks as (第一块, 块数), at most READ_RUN_BLOCKS each """
+        for _, data in self.file_chain(bno):
+            i = 0
+            while i < len(data):
+                run = 1
+                while run < READ_RUN_BLOCKS and i + run < len(data) and data[i + run] == data[i] + run:
+                    run += 1
+                yield data[i], run
+                i += run
+
+    def read_file(self, bno: int):
+        """
+        Yields the content of the file whose FileIndex starts at bno, one run of blocks at a time.
+        Like the backend's cat, NUL padding is dropped, so every chunk is at most READ_RUN_BLOCKS blocks.
+        """
+        for start, run in self._runs(bno):
+            yield self.blocks(start, run).replace(b"\0", b"")
+
+    def file_size(self, bno: int) -> int:
+        """ Bytes read_file would yield, counted without keeping them """
+        size = 0
+        for start, run in self._runs(bno):
+            data = self.blocks(start, run)
+            size += len(data) - data.count(0)
+        return size
+
+    def open_file(self, bno: int) -> io.BufferedReader:
+        """ read_file as a binary file object """
+        return io.BufferedReader(ChunkStream(self.read_file(bno)), READ_RUN_BLOCKS * BLOCK_BYTE)
+
+    def lookup(self, path: str) -> int:
+        """ Block of the INode at an absolute virtual path """
+        inode_bno = self.root_location
+        for part in path.split("/"):
+            if part in ("", "."):
+                continue
+            node = self.inode(inode_bno)
+            if not node.is_dir:
+                raise ImageError(f"'{path}': Not a directory")
+            items, _ = self.directory(node.bno)
+            for name, item_bno in items:
+                if name == part:
+                    inode_bno = item_bno
+                    break
+            else:
+                raise ImageError(f"'{path}': No such file or directory")
+        return inode_bno
+
+    def walk(self, path: str = "/"):
+        """
+        Yields (目录路径, 目录的 INode, [(名字, INode)] 子目录, [(名字, INode)] 文件) for path and every directory below it,
+        parents first. Like os.walk, removing names from the subdirectory list skips them.
+        """
+        stack = [(path.rstrip("/") or "/", self.inode(self.lookup(path)))]
+        if not stack[0][1].is_dir:
+            raise ImageError(f"'{path}': Not a directory")
+        while stack:
+            directory_path, node = stack.pop()
+            directories, files = [], []
+            items, _ = self.directory(node.bno)
+            for name, inode_bno in items:
+                if name in (".", ".."):
+                    continue
+                child = self.inode(inode_bno)
+                (directories if child.is_dir else files).append((name, child))
+            yield directory_path, node, directories, files
+            prefix = directory_path.rstrip("/")
+            stack.extend((f"{prefix}/{name}", child) for name, child in reversed(directories))
+
+
+class ChunkStream(io.RawIOBase):
+    """ Reads an iterator of bytes chunks as a stream, without joining them """
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk)
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+
+def find_image(directory: str = None):
+    """ Path of the disk image the backend would open in directory (the current one by default), None if there is none """
+    path = os.path.join(directory or os.getcwd(), DISK_NAME)
+    return path if os.path.isfile(path) else None
@@ -0,0 +1,81 @@
+from PySide6.QtCore import QObject, QProcess, QTimer, QCoreApplication
+
+from .api import API
+
+class APIPool(QObject):
+    """
+    Keeps spare backend processes started ahead of time, so new terminal tabs do not wait for a spawn.
+    A spare mounts the disk when it starts; the backend re-reads the superblock and drops stale cached blocks when
+    the login is entered, so a spare that waited while other tabs wrote the disk still sees their changes.
+    """
+    MAX_FAILURES = 3 # 连续失败这么多次后不再补充，避免可执行文件缺失时反复启动
+
+    def __init__(self, executable_filename: str, size: int = 1, parent=None, daemon_socket: str = None):
+        super().__init__(parent)
+        self.executable_filename = executable_filename
+        self.daemon_socket = daemon_socket # 设置时备用的是守护进程中已经打开的会话
+        self.size = max(0, size)
+        self.spares = [] # 已启动、正在等待登录的 API
+        self.failures = 0
+        self.next_spare_id = 0
+        self._refill_scheduled = False
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.shutdown)
+
+    def fill(self):
+        """启动备用进程直到池满，每个进程都是异步启动的。"""
+        self._refill_scheduled = False
+        while len(self.spares) < self.size and self.failures < self.MAX_FAILURES:
+            self.next_spare_id += 1
+            api = API(f"Spare-{self.next_spare_id}", self.executable_filename, self, self.daemon_socket)
+            api.hold_output()
+            api.processFinished.connect(self._on_spare_lost)
+            api.processErrorOccurred.connect(self._on_spare_lost)
+            if not api.start_app_process():
+                self.failures = self.MAX_FAILURES # 可执行文件不存在，补充也没有意义
+                api.deleteLater()
+                return
+            self.spares.append(api)
+
+    def take(self, terminal_object_name: str, parent):
+        """取出一个已预热的 API 并交给 parent，池空时返回 None。调用者连接信号后需要调用 release_output。"""
+        self._schedule_refill()
+        while self.spares:
+            api = self.spares.pop(0)
+            api.processFinished.disconnect(self._on_spare_lost)
+            api.processErrorOccurred.disconnect(self._on_spare_lost)
+            if api.state() == QProcess.NotRunning: # 理论上已经被 _on_spare_lost 移除，保险起见
+                api.deleteLater()
+                continue
+            self.failures = 0 # 备用进程正常运行到被取出，之前的失败不再算作连续失败
+            api.attach(terminal_object_name, parent)
+            return api
+        return None
+
+    def shutdown(self):
+        """退出时直接结束所有备用进程，它们还没有登录，没有需要保存的状态。"""
+        self.size = 0
+        for api in self.spares:
+            api.processFinished.disconnect(self._on_spare_lost)
+            api.processErrorOccurred.disconnect(self._on_spare_lost)
+            if api.socket is not None:
+                api.terminate_app_process() # 只是断开连接
+            else:
+                api.process.kill() # 不等待，QProcess 销毁时回收
+        self.spares.clear()
+
+    def _on_spare_lost(self, terminal_object_name: str, *args):
+        for api in self.spares:
+            if api.terminal_object_name == terminal_object_name:
+                self.spares.remove(api)
+                api.terminate_app_process()
+                api.deleteLater()
+                self.failures += 1
+                self._schedule_refill()
+                break
+
+    def _schedule_refill(self):
+        if not self._refill_scheduled:
+            self._refill_scheduled = True
+            QTimer.singleShot(0, self.fill)
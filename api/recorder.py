@@ -0,0 +1,48 @@
+import json
+import os
+import threading
+import time
+
+class SessionRecorder:
+    """ Appends every output chunk a backend emits to a JSON Lines trace file, for bench/replay.py """
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._file = open(file_path, 'a', encoding='utf-8')
+        self._write({"version": 1, "started": time.strftime("%Y-%m-%dT%H:%M:%S")})
+
+    @classmethod
+    def from_env(cls):
+        """ Recording is on only when OSFM_RECORD names the trace file """
+        file_path = os.environ.get("OSFM_RECORD")
+        return cls(file_path) if file_path else None
+
+    def record(self, terminal_object_name: str, stream: str, data: str):
+        self._write({
+            "t": round(time.perf_counter() - self.start, 6), # 相对开始录制的秒数，用于按原节奏回放
+            "terminal": terminal_object_name,
+            "stream": stream,
+            "data": data,
+        })
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def _write(self, record: dict):
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+def load_trace(file_path: str) -> list:
+    """ Output records of a trace file in order, the header line is skipped """
+    records = []
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            if "stream" in record:
+                records.append(record)
+    return records
+
+recorder = SessionRecorder.from_env()
@@ -0,0 +1,333 @@
+"""
+Incremental block-level snapshots of OSFileSystem.dsk.
+
+    python -m api.snapshot create --note "before cleanup"
+    python -m api.snapshot list
+    python -m api.snapshot restore 3 restored.dsk
+
+Every snapshot keeps a manifest with one SHA-256 digest (truncated to 16 bytes) per block. Blocks are stored once per distinct content in an
+append-only, zlib-compressed pack shared by all snapshots, so a new snapshot only adds the blocks that changed; all-zero
+blocks are never stored and come back as holes. The store lives next to the image in OSFileSystem.snapshots by default:
+
+    blocks.pack                 compressed block contents
+    blocks.idx                  (digest, offset in blocks.pack, length, compressed) for every stored block
+    snapshots/<id>.manifest     digests of every block of the image, in block order
+    snapshots/<id>.json         what was snapshotted and when
+
+The image is hashed in chunks of the mapped file on a thread pool (hashlib and NumPy release the GIL), so a snapshot is
+bounded by disk bandwidth. Like api.image, take snapshots while no command is running.
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .image import BLOCK_BYTE, DISK_NAME, READ_RUN_BLOCKS, TIME_FORMAT
+
+STORE_SUFFIX = ".snapshots"
+DIGEST_SIZE = 16
+INDEX_RECORD = struct.Struct("<16sQI?3x") # digest, offset, length, compressed
+HASH_CHUNK_BLOCKS = 16384 # 每个线程一次哈希 64 MB
+COMPRESS_BATCH_BLOCKS = 4096
+COMPRESS_LEVEL = 1
+COMPRESSIBLE_ZERO_BYTES = BLOCK_BYTE // 8 # 有这么多 0 字节（文件末尾、索引表、INode）或者几乎全是 ASCII 的块才压缩
+COMPRESSIBLE_ASCII_BYTES = BLOCK_BYTE * 15 // 16
+
+def block_digest(block) -> bytes:
+    return hashlib.sha256(block).digest()[:DIGEST_SIZE] # SHA-256 大多有硬件加速，比 BLAKE2b 快
+
+ZERO_DIGEST = block_digest(bytes(BLOCK_BYTE))
+
+class SnapshotError(Exception):
+    """ The store, a snapshot or the image cannot be used as asked """
+
+
+def default_store(image_path: str) -> str:
+    return os.path.splitext(image_path)[0] + STORE_SUFFIX
+
+
+def _hash_chunk(view: memoryview, first: int, count: int) -> bytearray:
+    """ Digests of blocks first ~ first+count-1, all-zero blocks are found with NumPy and not hashed """
+    words = np.frombuffer(view, dtype=np.uint64, count=count * BLOCK_BYTE // 8, offset=first * BLOCK_BYTE)
+    used = np.flatnonzero(words.reshape(count, -1).any(axis=1))
+    del words
+    digests = bytearray(ZERO_DIGEST * count)
+    for i in used.tolist():
+        start = (first + i) * BLOCK_BYTE
+        digests[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE] = block_digest(view[start:start + BLOCK_BYTE])
+    return digests
+
+
+def hash_blocks(view: memoryview, length: int, workers: int = None, progress=None) -> np.ndarray:
+    """ (块数, DIGEST_SIZE) uint8 digests of a mapped image; a partial last block is hashed as if padded with zeros """
+    whole = length // BLOCK_BYTE
+    tail = length % BLOCK_BYTE
+    digests = bytearray()
+    with ThreadPoolExecutor(workers or os.cpu_count()) as executor:
+        chunks = [(first, min(HASH_CHUNK_BLOCKS, whole - first)) for first in range(0, whole, HASH_CHUNK_BLOCKS)]
+        for (first, count), chunk in zip(chunks, executor.map(lambda c: _hash_chunk(view, *c), chunks)):
+            digests += chunk
+            if progress:
+                progress(first + count, whole + bool(tail))
+    if tail:
+        digests += block_digest(bytes(view[whole * BLOCK_BYTE:]).ljust(BLOCK_BYTE, b"\0"))
+    return np.frombuffer(bytes(digests), dtype=np.uint8).reshape(-1, DIGEST_SIZE)
+
+
+def _compress(blocks: bytes) -> list:
+    """
+    [(数据, 是否压缩)] for consecutive whole blocks. Which blocks are worth compressing is decided for the whole batch
+    with NumPy; already compressed or random data would cost a zlib stream per block and come out no smaller.
+    """
+    data = np.frombuffer(blocks, dtype=np.uint8).reshape(-1, BLOCK_BYTE)
+    compressible = ((data == 0).sum(axis=1) >= COMPRESSIBLE_ZERO_BYTES) | ((data < 0x80).sum(axis=1) >= COMPRESSIBLE_ASCII_BYTES)
+    records = []
+    for i, worth in enumerate(compressible.tolist()):
+        block = blocks[i * BLOCK_BYTE:(i + 1) * BLOCK_BYTE]
+        packed = zlib.compress(block, COMPRESS_LEVEL) if worth else block
+        records.append((packed, True) if len(packed) < len(block) else (block, False))
+    return records
+
+
+class SnapshotStore:
+    """ A directory of snapshots sharing one block store, created on the first snapshot """
+    def __init__(self, path: str):
+        self.path = path
+        self._index = None
+
+    def _file(self, *parts) -> str:
+        return os.path.join(self.path, *parts)
+
+    def index(self) -> dict:
+        """ {digest: (offset, length, compressed)} of every stored block """
+        if self._index is None:
+            self._index = {}
+            try:
+                with open(self._file("blocks.idx"), 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                data = b""
+            usable = len(data) - len(data) % INDEX_RECORD.size # 写到一半中断的记录不算
+            for digest, offset, length, compressed in INDEX_RECORD.iter_unpack(data[:usable]):
+                self._index[digest] = (offset, length, compressed)
+        return self._index
+
+    def snapshots(self) -> list:
+        """ Metadata of every snapshot, oldest first """
+        try:
+            names = os.listdir(self._file("snapshots"))
+        except FileNotFoundError:
+            return []
+        result = []
+        for name in names:
+            if name.endswith(".json"):
+                with open(self._file("snapshots", name), encoding='utf-8') as f:
+                    result.append(json.load(f))
+        return sorted(result, key=lambda meta: meta["id"])
+
+    def snapshot(self, snapshot_id: int) -> dict:
+        try:
+            with open(self._file("snapshots", f"{snapshot_id}.json"), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise SnapshotError(f"no snapshot {snapshot_id} in '{self.path}'") from None
+
+    def manifest(self, snapshot_id: int) -> np.ndarray:
+        return np.fromfile(self._file("snapshots", f"{snapshot_id}.manifest"), dtype=np.uint8).reshape(-1, DIGEST_SIZE)
+
+    def create(self, image_path: str = DISK_NAME, note: str = "", workers: int = None, progress=None) -> dict:
+        """
+        Snapshots image_path and returns its metadata. Only blocks whose digest differs from the latest snapshot are
+        looked up in the store, and only contents the store does not hold yet are compressed and appended to it.
+        """
+        started = time.perf_counter()
+        try:
+            image = open(image_path, 'rb')
+        except OSError as e:
+            raise SnapshotError(f"cannot open '{image_path}': {e.strerror}") from e
+        with image:
+            length = os.fstat(image.fileno()).st_size
+            if not length:
+                raise SnapshotError(f"'{image_path}' is empty")
+            with mmap.mmap(image.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    meta = self._create(view, length, image_path, note, workers, progress)
+                finally:
+                    view.release()
+        meta["seconds"] = round(time.perf_counter() - started, 3)
+        self._write_meta(meta)
+        return meta
+
+    def _create(self, view: memoryview, length: int, image_path: str, note: str, workers: int, progress) -> dict:
+        digests = hash_blocks(view, length, workers, progress)
+        history = self.snapshots()
+        parent = history[-1] if history else None
+        candidates = np.arange(len(digests))
+        if parent is not None:
+            previous = self.manifest(parent["id"])
+            if len(previous) == len(digests):
+                candidates = np.flatnonzero((digests != previous).any(axis=1))
+            del previous
+        changed = len(candidates)
+
+        index = self.index()
+        new = {}
+        for block in candidates.tolist():
+            digest = digests[block].tobytes()
+            if digest != ZERO_DIGEST and digest not in index and digest not in new:
+                new[digest] = block
+
+        os.makedirs(self._file("snapshots"), exist_ok=True)
+        stored_bytes = 0
+        with open(self._file("blocks.pack"), 'ab') as pack, open(self._file("blocks.idx"), 'ab') as idx:
+            offset = pack.seek(0, os.SEEK_END)
+            records = list(new.items())
+            batches = [records[i:i + COMPRESS_BATCH_BLOCKS] for i in range(0, len(records), COMPRESS_BATCH_BLOCKS)]
+            def read(batch):
+                return _compress(b"".join(bytes(view[b * BLOCK_BYTE:(b + 1) * BLOCK_BYTE]).ljust(BLOCK_BYTE, b"\0") for _, b in batch))
+            with ThreadPoolExecutor(workers or os.cpu_count()) as executor:
+                for batch, packed in zip(batches, executor.map(read, batches)):
+                    entries = []
+                    for (digest, _), (data, compressed) in zip(batch, packed):
+                        entries.append(INDEX_RECORD.pack(digest, offset, len(data), compressed))
+                        index[digest] = (offset, len(data), compressed)
+                        offset += len(data)
+                        stored_bytes += len(data)
+                    pack.write(b"".join(data for data, _ in packed))
+                    idx.write(b"".join(entries))
+            pack.flush()
+            os.fsync(pack.fileno()) # 索引只能指向已经落盘的块
+            idx.flush()
+            os.fsync(idx.fileno())
+
+        snapshot_id = parent["id"] + 1 if parent else 1
+        with open(self._file("snapshots", f"{snapshot_id}.manifest.tmp"), 'wb') as f:
+            f.write(digests.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self._file("snapshots", f"{snapshot_id}.manifest.tmp"), self._file("snapshots", f"{snapshot_id}.manifest"))
+        return {
+            "id": snapshot_id,
+            "parent": parent["id"] if parent else None,
+            "created": time.strftime(TIME_FORMAT),
+            "image": os.path.abspath(image_path),
+            "length": length,
+            "blocks": len(digests),
+            "used_blocks": int(len(digests) - (digests == np.frombuffer(ZERO_DIGEST, dtype=np.uint8)).all(axis=1).sum()),
+            "changed_blocks": changed,
+            "stored_blocks": len(new),
+            "stored_bytes": stored_bytes,
+            "note": note,
+        }
+
+    def _write_meta(self, meta: dict):
+        path = self._file("snapshots", f"{meta['id']}.json")
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(path + ".tmp", path) # 元数据最后写，它存在时快照就是完整的
+
+    def restore(self, snapshot_id: int, destination: str, progress=None) -> dict:
+        """
+        Writes snapshot snapshot_id to a new image at destination, checking every block against its digest.
+        Zero blocks are left as holes. Nothing is left at destination when it fails.
+        """
+        meta = self.snapshot(snapshot_id)
+        if os.path.exists(destination):
+            raise SnapshotError(f"'{destination}' already exists")
+        digests = self.manifest(snapshot_id)
+        if len(digests) != meta["blocks"]:
+            raise SnapshotError(f"manifest of snapshot {snapshot_id} is truncated")
+        index = self.index()
+        used = np.flatnonzero((digests != np.frombuffer(ZERO_DIGEST, dtype=np.uint8)).any(axis=1))
+        partial = destination + ".partial"
+        try:
+            with open(self._file("blocks.pack"), 'rb') as pack_file, open(partial, 'wb') as out:
+                with mmap.mmap(pack_file.fileno(), 0, access=mmap.ACCESS_READ) as pack:
+                    out.truncate(meta["blocks"] * BLOCK_BYTE)
+                    run_start, run = 0, bytearray()
+                    for done, block in enumerate(used.tolist()):
+                        digest = digests[block].tobytes()
+                        if digest not in index:
+                            raise SnapshotError(f"block {block} of snapshot {snapshot_id} is missing from the store")
+                        offset, length, compressed = index[digest]
+                        data = pack[offset:offset + length]
+                        if compressed:
+                            data = zlib.decompress(data)
+                        if block_digest(data) != digest:
+                            raise SnapshotError(f"block {block} of snapshot {snapshot_id} is corrupt in the store")
+                        if run and (block != run_start + len(run) // BLOCK_BYTE or len(run) >= READ_RUN_BLOCKS * BLOCK_BYTE):
+                            os.pwrite(out.fileno(), run, run_start * BLOCK_BYTE)
+                            run = bytearray()
+                        if not run:
+                            run_start = block
+                        run += data
+                        if progress and done % HASH_CHUNK_BLOCKS == 0:
+                            progress(done, len(used))
+                    if run:
+                        os.pwrite(out.fileno(), run, run_start * BLOCK_BYTE)
+                    if progress:
+                        progress(len(used), len(used))
+                    out.truncate(meta["length"])
+            os.replace(partial, destination)
+        except (OSError, ValueError, zlib.error) as e:
+            if os.path.exists(partial):
+                os.remove(partial)
+            if isinstance(e, OSError):
+                raise SnapshotError(f"cannot restore to '{destination}': {e.strerror or e}") from e
+            raise SnapshotError(f"block store in '{self.path}' is unreadable: {e}") from e
+        except SnapshotError:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        return meta
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incremental block-level snapshots of the OS-FileManager disk image")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    create_parser = subparsers.add_parser("create", help="snapshot the image, storing only changed blocks")
+    create_parser.add_argument("--note", default="", help="free text kept with the snapshot")
+    create_parser.add_argument("--workers", type=int, help="hashing threads, one per CPU by default")
+    subparsers.add_parser("list", help="list the snapshots in the store")
+    restore_parser = subparsers.add_parser("restore", help="write a snapshot to a new image")
+    restore_parser.add_argument("id", type=int)
+    restore_parser.add_argument("destination", help="path of the image to create")
+    for subparser in subparsers.choices.values():
+        subparser.add_argument("--image", default=DISK_NAME, help="disk image, OSFileSystem.dsk by default")
+        subparser.add_argument("--store", help="snapshot directory, <image>.snapshots by default")
+    options = parser.parse_args(argv)
+    store = SnapshotStore(options.store or default_store(options.image))
+
+    def report(done: int, total: int):
+        print(f"\r{done}/{total} blocks", end="", file=sys.stderr)
+
+    try:
+        if options.action == "create":
+            meta = store.create(options.image, options.note, options.workers, report)
+            print(file=sys.stderr)
+            print(json.dumps(meta, ensure_ascii=False, indent=2))
+        elif options.action == "list":
+            for meta in store.snapshots():
+                print(f"{meta['id']:>4}  {meta['created']}  {meta['changed_blocks']:>9} changed  "
+                      f"{meta['stored_bytes'] / 1024 / 1024:>9.1f} MB stored  {meta['note']}")
+        else:
+            store.restore(options.id, options.destination, report)
+            print(file=sys.stderr)
+    except SnapshotError as e:
+        print(f"snapshot: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
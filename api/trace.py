@@ -0,0 +1,241 @@
+import csv
+import json
+import re
+import time
+
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+PROMPT_TAIL_LENGTH = 256 # 提示符可能被拆成多段输出，只保留末尾这么多字符用于匹配
+
+PROMPT_KINDS = (
+    ("shell", re.compile(r"OSFileSystem@[\w\.-]+:.*?\$\s$")),
+    ("username", re.compile(r"host@login:Username\$ $")),
+    ("password", re.compile(r"host@login:Password\$ $")),
+    ("sudo", re.compile(r"\[sudo\] password for .*?:\s$")),
+    ("secret", re.compile(r"(?:current |retype )?password: $")), # mkuser / passwd 询问密码，与 client.SECRET_PROMPT 相同
+)
+
+def _prompt_kind(tail: str):
+    for kind, regex in PROMPT_KINDS:
+        if regex.search(tail):
+            return kind
+    return None
+
+def _command_type(command: str, awaiting: str) -> str:
+    """ Classifies a command line, never keeps credentials typed at a login, sudo, mkuser or passwd prompt """
+    if awaiting == "username":
+        return "login"
+    if awaiting in ("password", "sudo", "secret"):
+        return "password"
+    parts = command.split(maxsplit=1)
+    return parts[0] if parts else "empty"
+
+
+class Histogram:
+    """ Fixed-bucket latency histogram plus a bounded sample window for percentiles """
+    BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+    MAX_SAMPLES = 2048
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1) # 最后一个桶收集超过 5 秒的样本
+        self.samples = deque(maxlen=self.MAX_SAMPLES)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        milliseconds = seconds * 1000
+        self.counts[bisect_left(self.BUCKETS_MS, milliseconds)] += 1
+        self.samples.append(milliseconds)
+        self.count += 1
+        self.total += milliseconds
+        self.max = max(self.max, milliseconds)
+
+    def merge(self, other: "Histogram"):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.samples.extend(other.samples)
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.mean(), 3),
+            "p50_ms": round(self.percentile(50), 3),
+            "p95_ms": round(self.percentile(95), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "max_ms": round(self.max, 3),
+            "buckets_ms": {f"<={bound}": n for bound, n in zip(self.BUCKETS_MS, self.counts)} | {"inf": self.counts[-1]},
+        }
+
+
+class CommandTrace:
+    """ Timing of one command written to the backend, from send to the next prompt """
+    def __init__(self, terminal_object_name: str, command_type: str):
+        self.terminal_object_name = terminal_object_name
+        self.command_type = command_type
+        self.wall_time = time.time()
+        self.sent_at = time.perf_counter()
+        self.first_byte_at = None
+        self.prompt_at = None
+        self.bytes_received = 0
+        self.stages = {} # {stage 名称: 秒}
+
+    def first_byte_latency(self):
+        return None if self.first_byte_at is None else self.first_byte_at - self.sent_at
+
+    def latency(self):
+        return None if self.prompt_at is None else self.prompt_at - self.sent_at
+
+    def to_dict(self) -> dict:
+        def ms(seconds):
+            return None if seconds is None else round(seconds * 1000, 3)
+        return {
+            "terminal": self.terminal_object_name,
+            "command_type": self.command_type,
+            "time": self.wall_time,
+            "first_byte_ms": ms(self.first_byte_latency()),
+            "prompt_ms": ms(self.latency()),
+            "bytes_received": self.bytes_received,
+            "stages_ms": {name: ms(seconds) for name, seconds in self.stages.items()},
+        }
+
+
+class Tracer:
+    """ Collects a CommandTrace for every command sent to a backend and aggregates them per command type """
+    def __init__(self, max_traces: int = 1000):
+        self.traces = deque(maxlen=max_traces) # 已完成的最近若干条
+        self.histograms = {} # {命令类型 或 stage 名称: Histogram}
+        self.first_byte_histograms = {}
+        self.bytes_received = {} # {命令类型: 累计字节数}
+        self._open = {} # {terminal_object_name: 尚未看到提示符的 CommandTrace}
+        self._tails = {}
+        self._awaiting = {} # {terminal_object_name: 最近一次提示符的类型}
+        self._closed = {} # {terminal_object_name: 最近一条已经等到提示符的 CommandTrace}
+        self.last_trace = None
+
+    def begin(self, terminal_object_name: str, command: str) -> CommandTrace:
+        previous = self._open.pop(terminal_object_name, None)
+        if previous is not None: # 上一条命令还没等到提示符就又发送了输入，按未完成记录
+            self._finish(previous)
+        trace = CommandTrace(terminal_object_name, _command_type(command, self._awaiting.get(terminal_object_name)))
+        self._open[terminal_object_name] = trace
+        self._tails[terminal_object_name] = ""
+        self.last_trace = trace
+        return trace
+
+    def record_output(self, terminal_object_name: str, text: str):
+        tail = (self._tails.get(terminal_object_name, "") + text)[-PROMPT_TAIL_LENGTH:]
+        self._tails[terminal_object_name] = tail
+        kind = _prompt_kind(tail)
+        if kind is not None:
+            self._awaiting[terminal_object_name] = kind
+        trace = self._open.get(terminal_object_name)
+        if trace is None:
+            return
+        now = time.perf_counter()
+        if trace.first_byte_at is None:
+            trace.first_byte_at = now
+        trace.bytes_received += len(text.encode('utf-8'))
+        if kind is not None:
+            trace.prompt_at = now
+            del self._open[terminal_object_name]
+            self._finish(trace)
+
+    def add_stage(self, stage_name: str, seconds: float, terminal_object_name: str = None):
+        """
+        把解析、渲染等阶段耗时记到对应命令上：指定终端时记到这个终端尚未结束或最近结束的命令，不会记到其他标签页的命令；
+        没有指定终端时记到最近一条命令。
+        """
+        if terminal_object_name:
+            trace = self._open.get(terminal_object_name) or self._closed.get(terminal_object_name)
+        else:
+            trace = self.last_trace
+        if trace is not None:
+            trace.stages[stage_name] = trace.stages.get(stage_name, 0.0) + seconds
+        self.add_sample(f"stage:{stage_name}", seconds)
+
+    def add_sample(self, name: str, seconds: float):
+        """只进直方图、不属于任何命令的样本，例如事件循环延迟。"""
+        self.histograms.setdefault(name, Histogram()).add(seconds)
+
+    @contextmanager
+    def stage(self, stage_name: str, terminal_object_name: str = None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(stage_name, time.perf_counter() - start, terminal_object_name)
+
+    def clear(self):
+        self.traces.clear()
+        self.histograms.clear()
+        self.first_byte_histograms.clear()
+        self.bytes_received.clear()
+        self._open.clear()
+        self._tails.clear()
+        self._awaiting.clear()
+        self._closed.clear()
+        self.last_trace = None
+
+    def _finish(self, trace: CommandTrace):
+        self.traces.append(trace)
+        self._closed[trace.terminal_object_name] = trace
+        if trace.latency() is not None:
+            self.histograms.setdefault(trace.command_type, Histogram()).add(trace.latency())
+        if trace.first_byte_latency() is not None:
+            self.first_byte_histograms.setdefault(trace.command_type, Histogram()).add(trace.first_byte_latency())
+        self.bytes_received[trace.command_type] = self.bytes_received.get(trace.command_type, 0) + trace.bytes_received
+
+    def summary(self) -> list:
+        """每个命令类型 / stage 一行，按名称排序。"""
+        rows = []
+        for name in sorted(self.histograms):
+            histogram = self.histograms[name]
+            first_byte = self.first_byte_histograms.get(name)
+            rows.append({
+                "name": name,
+                "count": histogram.count,
+                "mean_ms": histogram.mean(),
+                "p50_ms": histogram.percentile(50),
+                "p95_ms": histogram.percentile(95),
+                "p99_ms": histogram.percentile(99),
+                "max_ms": histogram.max,
+                "first_byte_ms": first_byte.mean() if first_byte else None,
+                "bytes_received": self.bytes_received.get(name),
+            })
+        return rows
+
+    def export_json(self, file_path: str):
+        data = {
+            "histograms": {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+            "first_byte_histograms": {name: histogram.to_dict() for name, histogram in self.first_byte_histograms.items()},
+            "traces": [trace.to_dict() for trace in self.traces],
+        }
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+
+    def export_csv(self, file_path: str):
+        with open(file_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["terminal", "command_type", "time", "first_byte_ms", "prompt_ms", "bytes_received", "stages_ms"])
+            for trace in self.traces:
+                row = trace.to_dict()
+                writer.writerow([
+                    row["terminal"], row["command_type"], row["time"], row["first_byte_ms"], row["prompt_ms"],
+                    row["bytes_received"], ";".join(f"{name}={ms}" for name, ms in row["stages_ms"].items())
+                ])
+
+tracer = Tracer() # GUI 内所有 API 共用的追踪器
@@ -0,0 +1,522 @@
+"""
+Bulk copies between host directories and the virtual disk.
+
+    python -m api.transfer import ./dataset /data --jobs 4 --socket /tmp/osfm.sock
+    python -m api.transfer export /data ./dataset
+    python -m api.transfer export /data data.tar.gz
+
+File contents go through the backend's `write` command in length-framed chunks, so nothing is held in memory whole.
+Parallel sessions only make sense on a daemon (`app --daemon <socket>`): separate `app` processes each keep their own
+copy of the free block bitmap and would hand out the same blocks, so without a socket everything runs in one session.
+
+Exports by root read OSFileSystem.dsk directly through api.image when it can be found (no backend is started, permissions
+are not checked); other users, and images that cannot be found, walk the tree with `ls -l` and stream every file out of
+`cat`, so the backend applies the session user's access bits.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import tarfile
+import tempfile
+import time
+
+from .client import AsyncClient, CommandError
+from .image import TIME_FORMAT, ChunkStream, DiskImage, ImageError, find_image
+
+FILE_NAME_LENGTH = 12 # 与后端相同，文件名按 UTF-8 编码后必须短于这么多字节
+SCAN_CHUNK_BYTES = 1024 * 1024
+SPOOL_BYTES = 1024 * 1024 # 经 shell 导出到 tar 时文件大小事先未知，超过这么多就暂存到临时文件
+IMAGE_EXPORT_USER = "root" # 直接读映像不检查权限，只替这个用户这样导出
+TAR_COMPRESSION = {".tar": "", ".tar.gz": "gz", ".tgz": "gz", ".tar.bz2": "bz2", ".tar.xz": "xz"}
+
+class TransferCancelled(Exception):
+    """ The cancel event was set while a transfer was running """
+
+
+class TransferStats:
+    """ Progress of one transfer, updated as chunks are sent """
+    def __init__(self):
+        self.files_total = 0
+        self.files_done = 0
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self.directories = 0
+        self.skipped = [] # [(主机路径, 原因)]
+        self.errors = [] # [(虚拟路径, 错误信息)]
+        self.cancelled = False
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def throughput(self) -> float:
+        """ Bytes per second so far """
+        return self.bytes_done / self.elapsed if self.elapsed > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "files": self.files_done,
+            "directories": self.directories,
+            "bytes": self.bytes_done,
+            "seconds": round(self.elapsed, 4),
+            "mb_per_sec": round(self.throughput / 1024 / 1024, 2),
+            "skipped": len(self.skipped),
+            "errors": len(self.errors),
+            "error_samples": self.errors[:20],
+            "cancelled": self.cancelled,
+        }
+
+
+def invalid_name(name: str):
+    """ Why the backend cannot hold this name, None when it can """
+    if len(name.encode('utf-8')) >= FILE_NAME_LENGTH:
+        return "name too long"
+    if '"' in name or any(ord(ch) < 32 for ch in name):
+        return "quote or control character in name"
+    return None
+
+def contains_nul(host_path: str) -> bool:
+    """ The backend pads blocks with NUL and strips it on read, so such files cannot round-trip """
+    with open(host_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(SCAN_CHUNK_BYTES), b""):
+            if b"\0" in chunk:
+                return True
+    return False
+
+def plan_import(host_dir: str, destination: str, stats: TransferStats) -> list:
+    """
+    Walks host_dir and groups it into independent subtrees, largest first.
+    Every group is (directories, files): directories parents first, files as (host path, virtual path, size).
+    """
+    groups = {} # {顶层名字: (目录, 文件)}，顶层的文件各自成组
+    for root, dirnames, filenames in os.walk(host_dir):
+        relative = os.path.relpath(root, host_dir)
+        parts = [] if relative == "." else relative.split(os.sep)
+        for dirname in list(dirnames):
+            reason = invalid_name(dirname)
+            if reason:
+                stats.skipped.append((os.path.join(root, dirname), reason))
+                dirnames.remove(dirname) # 整个子树都跳过
+        dirnames.sort()
+        virtual_root = "/".join([destination.rstrip("/")] + parts)
+        if parts:
+            groups.setdefault(parts[0], ([], []))[0].append(virtual_root)
+        for filename in sorted(filenames):
+            host_path = os.path.join(root, filename)
+            reason = invalid_name(filename) or (None if os.path.isfile(host_path) else "not a regular file")
+            if reason:
+                stats.skipped.append((host_path, reason))
+                continue
+            size = os.path.getsize(host_path)
+            key = parts[0] if parts else f"/{filename}"
+            groups.setdefault(key, ([], []))[1].append((host_path, f"{virtual_root}/{filename}", size))
+            stats.files_total += 1
+            stats.bytes_total += size
+    return sorted(groups.values(), key=lambda group: -sum(size for _, _, size in group[1]))
+
+async def _make_directory(client: AsyncClient, path: str, stats: TransferStats) -> bool:
+    try:
+        await client.mkdir(path)
+        stats.directories += 1
+    except CommandError as e:
+        if not e.message.endswith("File exists"):
+            stats.errors.append((path, e.message))
+            return False
+    return True
+
+async def _make_directories(client: AsyncClient, path: str, stats: TransferStats) -> bool:
+    """ mkdir -p: creates every missing directory of the absolute path, from the root down """
+    parts = [part for part in path.split("/") if part]
+    for depth in range(1, len(parts) + 1):
+        if not await _make_directory(client, "/" + "/".join(parts[:depth]), stats):
+            return False
+    return True
+
+async def _import_worker(client: AsyncClient, queue: asyncio.Queue, stats: TransferStats, cancel, progress):
+    def sent(n: int):
+        stats.bytes_done += n
+        if progress is not None:
+            progress(stats)
+        if cancel is not None and cancel.is_set():
+            raise TransferCancelled()
+
+    while not queue.empty():
+        directories, files = queue.get_nowait()
+        failed = set() # 没能创建的目录，里面的文件不再尝试
+        for directory in directories:
+            if directory.rsplit("/", 1)[0] in failed or not await _make_directory(client, directory, stats):
+                failed.add(directory)
+        for host_path, virtual_path, size in files:
+            if cancel is not None and cancel.is_set():
+                raise TransferCancelled()
+            reason = "directory not created" if virtual_path.rsplit("/", 1)[0] in failed else None
+            if reason is None and contains_nul(host_path):
+                reason = "contains NUL bytes"
+            if reason:
+                stats.skipped.append((host_path, reason))
+                stats.files_total -= 1
+                stats.bytes_total -= size
+                continue
+            try:
+                with open(host_path, 'rb') as f:
+                    await client.upload(virtual_path, f, sent)
+            except CommandError as e:
+                stats.errors.append((virtual_path, e.message))
+            stats.files_done += 1
+            if progress is not None:
+                progress(stats)
+
+async def import_tree(host_dir: str, destination: str, jobs: int = 4, progress=None, cancel=None, **client_options) -> TransferStats:
+    """
+    Recreates the host directory tree under the virtual directory destination (an absolute path, created with its missing parents).
+    Independent subtrees are spread over up to jobs sessions when client_options has a socket_path, otherwise one session is used.
+    progress(stats) is called after every chunk and file; setting cancel (a threading.Event) stops after the current chunk,
+    and the partly written file keeps its old content. Files the backend cannot hold are skipped and listed in stats.skipped.
+    """
+    stats = TransferStats()
+    groups = plan_import(host_dir, destination, stats)
+    if not client_options.get("socket_path"):
+        jobs = 1
+    jobs = max(1, min(jobs, len(groups)))
+    clients = [AsyncClient(**client_options) for _ in range(jobs)]
+    try:
+        await asyncio.gather(*(client.start() for client in clients))
+        if await _make_directories(clients[0], destination, stats):
+            queue = asyncio.Queue()
+            for group in groups:
+                queue.put_nowait(group)
+            results = await asyncio.gather( # 每个会话都会在下一段检查到取消，等它们都停下再关闭
+                *(_import_worker(client, queue, stats, cancel, progress) for client in clients), return_exceptions=True
+            )
+            for result in results:
+                if isinstance(result, TransferCancelled):
+                    stats.cancelled = True
+                elif isinstance(result, BaseException):
+                    raise result
+    finally:
+        await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
+        stats.finished = time.perf_counter()
+    return stats
+
+def tar_compression(destination: str):
+    """ Compression of the tar archive destination names ("" for plain tar, "-" is stdout), None for a host directory """
+    if destination == "-":
+        return ""
+    lower = destination.lower()
+    for suffix in sorted(TAR_COMPRESSION, key=len, reverse=True):
+        if lower.endswith(suffix):
+            return TAR_COMPRESSION[suffix]
+    return None
+
+def parse_time(text: str) -> float:
+    """ A creation / modified time as ls -l prints it, as a Unix timestamp (0 when it cannot be parsed) """
+    try:
+        return time.mktime(time.strptime(text, TIME_FORMAT))
+    except (ValueError, OverflowError):
+        return 0.0
+
+
+class _HostFile:
+    def __init__(self, path: str, mtime: float):
+        self.path = path
+        self.mtime = mtime
+        self._file = open(path, 'wb')
+
+    def write(self, data: bytes):
+        self._file.write(data)
+
+    def close(self):
+        self._file.close()
+        if self.mtime:
+            os.utime(self.path, (self.mtime, self.mtime))
+
+    def discard(self):
+        self._file.close()
+        os.remove(self.path)
+
+
+class DirectorySink:
+    """ Recreates an exported tree below a host directory, keeping modification times """
+    def __init__(self, root: str):
+        self.root = root
+        self._directory_times = [] # 目录的时间要在里面的文件都写完之后再设置
+
+    def _host_path(self, relative: str) -> str:
+        return os.path.join(self.root, *relative.split("/")) if relative else self.root
+
+    def add_directory(self, relative: str, mtime: float):
+        path = self._host_path(relative)
+        os.makedirs(path, exist_ok=True)
+        if mtime:
+            self._directory_times.append((path, mtime))
+
+    def open_file(self, relative: str, mtime: float) -> _HostFile:
+        return _HostFile(self._host_path(relative), mtime)
+
+    def add_file(self, relative: str, mtime: float, chunks, size: int = None):
+        host_file = self.open_file(relative, mtime)
+        try:
+            for chunk in chunks:
+                host_file.write(chunk)
+        except BaseException:
+            host_file.discard()
+            raise
+        host_file.close()
+
+    def close(self):
+        for path, mtime in reversed(self._directory_times):
+            os.utime(path, (mtime, mtime))
+
+
+class _TarMember:
+    """ A file of unknown size, spooled until it is complete and can be added with its size """
+    def __init__(self, archive: tarfile.TarFile, info: tarfile.TarInfo):
+        self._archive = archive
+        self._info = info
+        self._spool = tempfile.SpooledTemporaryFile(SPOOL_BYTES)
+
+    def write(self, data: bytes):
+        self._spool.write(data)
+
+    def close(self):
+        self._info.size = self._spool.tell()
+        self._spool.seek(0)
+        self._archive.addfile(self._info, self._spool)
+        self._spool.close()
+
+    def discard(self):
+        self._spool.close()
+
+
+class TarSink:
+    """
+    Writes an exported tree as a streamed tar archive (a path, or "-" for stdout) whose members are below prefix.
+    Files of known size go straight into the stream; a cancelled export leaves the archive cut after the last member.
+    """
+    def __init__(self, destination: str, prefix: str = "", compression: str = ""):
+        self.prefix = prefix
+        if destination == "-":
+            self._archive = tarfile.open(fileobj=sys.stdout.buffer, mode=f"w|{compression}")
+        else:
+            self._archive = tarfile.open(destination, mode=f"w|{compression}")
+
+    def _info(self, relative: str, mtime: float, directory: bool = False) -> tarfile.TarInfo:
+        info = tarfile.TarInfo("/".join(part for part in (self.prefix, relative) if part))
+        info.mtime = int(mtime)
+        info.mode = 0o755 if directory else 0o644
+        if directory:
+            info.type = tarfile.DIRTYPE
+        return info
+
+    def add_directory(self, relative: str, mtime: float):
+        if relative or self.prefix:
+            self._archive.addfile(self._info(relative, mtime, True))
+
+    def open_file(self, relative: str, mtime: float) -> _TarMember:
+        return _TarMember(self._archive, self._info(relative, mtime))
+
+    def add_file(self, relative: str, mtime: float, chunks, size: int = None):
+        if size is None:
+            member = self.open_file(relative, mtime)
+            try:
+                for chunk in chunks:
+                    member.write(chunk)
+            except BaseException:
+                member.discard()
+                raise
+            member.close()
+            return
+        info = self._info(relative, mtime)
+        info.size = size
+        self._archive.addfile(info, io.BufferedReader(ChunkStream(chunks))) # tarfile 把读不满当作数据提前结束
+
+    def close(self):
+        self._archive.close()
+
+
+class _CountingWriter:
+    """ Passes chunks on to a sink file, counting them and checking for cancellation """
+    def __init__(self, target, stats: TransferStats, cancel, progress):
+        self.target = target
+        self.stats = stats
+        self.cancel = cancel
+        self.progress = progress
+
+    def write(self, data: bytes):
+        if self.cancel is not None and self.cancel.is_set():
+            raise TransferCancelled()
+        self.target.write(data)
+        self.stats.bytes_done += len(data)
+        if self.progress is not None:
+            self.progress(self.stats)
+
+
+def _counted(chunks, stats: TransferStats, cancel, progress):
+    for chunk in chunks:
+        if cancel is not None and cancel.is_set():
+            raise TransferCancelled()
+        yield chunk
+        stats.bytes_done += len(chunk)
+        if progress is not None:
+            progress(stats)
+
+def relative_path(source: str, path: str) -> str:
+    """ path below the virtual directory source, "" for source itself """
+    return path[len(source.rstrip("/")):].strip("/")
+
+def export_image(image: DiskImage, source: str, sink, stats: TransferStats, cancel=None, progress=None):
+    """
+    Copies the virtual directory source and everything below it from a mapped image into sink.
+    Every file is read twice from the mapping, once to count its size for the tar header and once to copy it.
+    """
+    tree = list(image.walk(source)) # 只有目录结构，先走一遍得到文件总数
+    stats.files_total = sum(len(files) for _, _, _, files in tree)
+    for path, node, _, files in tree:
+        sink.add_directory(relative_path(source, path), node.mtime)
+        stats.directories += 1
+        for name, child in files:
+            relative = relative_path(source, f"{path.rstrip('/')}/{name}")
+            if cancel is not None and cancel.is_set():
+                raise TransferCancelled()
+            try:
+                sink.add_file(relative, child.mtime, _counted(image.read_file(child.bno), stats, cancel, progress), image.file_size(child.bno))
+            except (OSError, ImageError) as e:
+                stats.errors.append((f"{path.rstrip('/')}/{name}", str(e)))
+            stats.files_done += 1
+            if progress is not None:
+                progress(stats)
+
+async def export_shell(client: AsyncClient, source: str, sink, stats: TransferStats, cancel=None, progress=None):
+    """ Copies the virtual directory source into sink through a logged-in session, with the session user's permissions """
+    stack = [source.rstrip("/") or "/"]
+    while stack:
+        path = stack.pop()
+        entries = await client.ls(path)
+        mtime = next((parse_time(entry.modified_time) for entry in entries if entry.name == "."), 0.0)
+        sink.add_directory(relative_path(source, path), mtime)
+        stats.directories += 1
+        directories = []
+        for entry in entries:
+            if entry.name in (".", ".."):
+                continue
+            child = f"{path.rstrip('/')}/{entry.name}"
+            if entry.is_dir:
+                directories.append(child)
+                continue
+            stats.files_total += 1
+            if cancel is not None and cancel.is_set():
+                raise TransferCancelled()
+            try:
+                target = sink.open_file(relative_path(source, child), parse_time(entry.modified_time))
+            except OSError as e:
+                stats.errors.append((child, str(e)))
+                continue
+            try:
+                await client.download(child, _CountingWriter(target, stats, cancel, progress))
+            except CommandError as e:
+                target.discard()
+                stats.errors.append((child, e.message))
+            except BaseException:
+                target.discard()
+                raise
+            else:
+                target.close()
+            stats.files_done += 1
+            if progress is not None:
+                progress(stats)
+        stack.extend(reversed(directories))
+
+def open_sink(source: str, destination: str):
+    """ TarSink when destination names a tar archive (or is "-"), DirectorySink otherwise """
+    compression = tar_compression(destination)
+    if compression is None:
+        return DirectorySink(destination)
+    return TarSink(destination, source.rstrip("/").rsplit("/", 1)[-1], compression)
+
+async def export_tree(
+    source: str, destination: str, progress=None, cancel=None, image_path: str = None, prefer_image: bool = True, **client_options
+) -> TransferStats:
+    """
+    Copies the virtual directory source (an absolute path) into the host directory destination, or into a tar archive
+    when destination ends in .tar / .tar.gz / .tgz / .tar.bz2 / .tar.xz or is "-" for stdout.
+    The image is read directly when image_path is given, or when prefer_image is set, the user is root, no daemon socket
+    is given and the disk image is in client_options' cwd; otherwise a backend session is started, which checks the
+    user's permissions. progress and cancel work as for import_tree.
+    """
+    if (image_path is None and prefer_image and not client_options.get("socket_path")
+            and client_options.get("username", IMAGE_EXPORT_USER) == IMAGE_EXPORT_USER):
+        image_path = find_image(client_options.get("cwd"))
+    stats = TransferStats()
+    sink = open_sink(source, destination)
+    try:
+        if image_path is not None:
+            with DiskImage(image_path) as image:
+                await asyncio.to_thread(export_image, image, source, sink, stats, cancel, progress)
+        else:
+            async with AsyncClient(**client_options) as client:
+                await export_shell(client, source, sink, stats, cancel, progress)
+    except TransferCancelled:
+        stats.cancelled = True
+    finally:
+        sink.close()
+        stats.finished = time.perf_counter()
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Copy directory trees between the host and the OS-FileManager disk")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    import_parser = subparsers.add_parser("import", help="recreate a host directory under a virtual directory")
+    import_parser.add_argument("source", help="host directory")
+    import_parser.add_argument("destination", help="absolute virtual path of the directory to create")
+    import_parser.add_argument("--jobs", type=int, default=4, help="parallel sessions, needs --socket")
+    export_parser = subparsers.add_parser("export", help="copy a virtual directory to a host directory or a tar archive")
+    export_parser.add_argument("source", help="absolute virtual path of the directory to export")
+    export_parser.add_argument("destination", help="host directory, or .tar / .tar.gz / .tgz / .tar.bz2 / .tar.xz archive, - for stdout")
+    export_group = export_parser.add_mutually_exclusive_group()
+    export_group.add_argument("--image", help="read this disk image directly, even with --socket")
+    export_group.add_argument("--shell", action="store_true", help="go through a backend session even when the image is found")
+    for subparser in subparsers.choices.values():
+        subparser.add_argument("--socket", help="daemon socket, the disk in --cwd is opened directly otherwise")
+        subparser.add_argument("--cwd", help="directory holding OSFileSystem.dsk")
+        subparser.add_argument("--executable", help="backend binary, defaults to the one api.API starts")
+        subparser.add_argument("--username", default="root")
+        subparser.add_argument("--password", default="123456")
+    options = parser.parse_args(argv)
+
+    client_options = {
+        "username": options.username,
+        "password": options.password,
+        "executable": options.executable,
+        "cwd": options.cwd,
+        "socket_path": options.socket,
+    }
+    def report(stats: TransferStats):
+        print(f"\r{stats.files_done}/{stats.files_total} files  {stats.throughput / 1024 / 1024:.1f} MB/s", end="", file=sys.stderr)
+
+    if options.action == "import":
+        stats = asyncio.run(import_tree(options.source, options.destination, options.jobs, report, **client_options))
+    else:
+        try:
+            stats = asyncio.run(export_tree(
+                options.source, options.destination, report, image_path=options.image, prefer_image=not options.shell, **client_options
+            ))
+        except (ImageError, CommandError) as e:
+            print(f"export: {e}", file=sys.stderr)
+            return 1
+    print(file=sys.stderr)
+    for host_path, reason in stats.skipped:
+        print(f"skipped {host_path}: {reason}", file=sys.stderr)
+    for path, message in stats.errors:
+        print(f"error {path}: {message}", file=sys.stderr)
+    print(json.dumps(stats.to_dict(), indent=4), file=sys.stderr if options.action == "export" and options.destination == "-" else sys.stdout)
+    return 1 if stats.errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
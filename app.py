@@ -1,5 +1,6 @@
+from gui import GUI, startup_timer
 from PySide6.QtWidgets import QApplication
-from gui import GUI
+startup_timer.mark("import modules")
 
 class MainWindow(GUI):
 
@@ -9,5 +10,6 @@ class MainWindow(GUI):
 
 if __name__ == '__main__':
     app = QApplication([])
+    startup_timer.mark("create QApplication")
     MainWindow().show()
     app.exec()
@@ -0,0 +1,187 @@
+"""
+Concurrent load generator for backend sessions.
+
+    python -m bench.load --sessions 8 --depth 2 --fanout 3 --files 4 --file-size 2048 --output load.json
+
+Every session is an api.client.AsyncClient, i.e. the same stdin / prompt protocol api.API speaks.
+By default each session gets its own disk image, because separate `app` processes keep their own
+copy of the free block stack; --shared-image puts all sessions on one image (each in its own subtree).
+"""
+import argparse
+import asyncio
+import json
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from api.client import AsyncClient, CommandError
+from api.trace import Histogram
+
+DISK_NAME = "OSFileSystem.dsk"
+SUPERBLOCK_OFFSET = 7 # capacity(4) + isUnformatted(1) + blockSize(2)
+
+def read_image_usage(image_path: Path) -> dict:
+    """ Capacity and used blocks straight from the image header and superblock """
+    with open(image_path, 'rb') as f:
+        header = f.read(SUPERBLOCK_OFFSET + 24)
+    capacity, _, block_size = struct.unpack_from("<IbH", header, 0)
+    _, free_blocks = struct.unpack_from("<II", header, SUPERBLOCK_OFFSET)
+    total_blocks = capacity // block_size
+    return {
+        "image_bytes": image_path.stat().st_size,
+        "total_blocks": total_blocks,
+        "free_blocks": free_blocks,
+        "used_blocks": total_blocks - free_blocks,
+    }
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=Path(__file__).resolve().parent.parent
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+def make_content(size: int, line_length: int = 63) -> str:
+    """ size bytes of text in lines of line_length characters plus newline """
+    line = ("0123456789abcdefghijklmnopqrstuvwxyz" * (line_length // 36 + 1))[:line_length]
+    lines = [line] * (size // (line_length + 1))
+    remainder = size - len(lines) * (line_length + 1)
+    if remainder > 1:
+        lines.append(line[:remainder - 1])
+    return "\n".join(lines) + "\n"
+
+def tree_directories(root: str, depth: int, fanout: int) -> list:
+    """ All directories of a tree, parents before children """
+    directories = [root]
+    level = [root]
+    for _ in range(depth):
+        level = [f"{parent}/d{index}" for parent in level for index in range(fanout)]
+        directories.extend(level)
+    return directories
+
+
+class LoadRun:
+    """ Runs the scripted workload on many sessions and aggregates per-command latency """
+    def __init__(self, options):
+        self.options = options
+        self.histograms = {} # {命令: Histogram}
+        self.errors = []
+        self.content = make_content(options.file_size)
+
+    async def timed(self, command: str, coroutine):
+        start = time.perf_counter()
+        try:
+            result = await coroutine
+        except CommandError as e:
+            self.errors.append(str(e))
+            result = None
+        self.histograms.setdefault(command, Histogram()).add(time.perf_counter() - start)
+        return result
+
+    async def session(self, index: int, workdir: Path):
+        options = self.options
+        root = f"s{index}"
+        directories = tree_directories(root, options.depth, options.fanout)
+        files = [f"{directory}/f{number}" for directory in directories for number in range(options.files)]
+        async with AsyncClient(
+            executable=options.executable, cwd=str(workdir), disk_size_mb=options.disk_mb, timeout=options.timeout
+        ) as client:
+            for _ in range(options.iterations):
+                for directory in directories:
+                    await self.timed("mkdir", client.mkdir(directory))
+                for file_path in files:
+                    await self.timed("write", client.write(file_path, self.content))
+                for file_path in files:
+                    await self.timed("cat", client.cat(file_path))
+                for directory in directories:
+                    await self.timed("ls", client.ls(directory))
+                if not options.keep:
+                    for file_path in files:
+                        await self.timed("rm", client.rm(file_path))
+                    for directory in reversed(directories):
+                        await self.timed("rmdir", client.rmdir(directory))
+
+    async def prepare(self, workdirs: list):
+        """ Creates and formats the images that do not exist yet, so neither the timing nor the block growth includes it """
+        missing = sorted({workdir for workdir in workdirs if not (workdir / DISK_NAME).exists()})
+        for workdir in missing: # 共享的磁盘只创建一次，其余会话之后再并发启动
+            async with AsyncClient(executable=self.options.executable, cwd=str(workdir), disk_size_mb=self.options.disk_mb):
+                pass
+
+    async def run(self, workdirs: list) -> float:
+        start = time.perf_counter()
+        await asyncio.gather(*(self.session(index, workdir) for index, workdir in enumerate(workdirs)))
+        return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent load generator for OS-FileManager backend sessions")
+    parser.add_argument("--sessions", type=int, default=4, help="concurrent backend sessions")
+    parser.add_argument("--iterations", type=int, default=1, help="times each session runs the workload")
+    parser.add_argument("--depth", type=int, default=1, help="directory tree depth below the session root")
+    parser.add_argument("--fanout", type=int, default=2, help="subdirectories per directory")
+    parser.add_argument("--files", type=int, default=2, help="files per directory")
+    parser.add_argument("--file-size", type=int, default=1024, help="bytes per file")
+    parser.add_argument("--disk-mb", type=int, default=64, help="size of newly created disk images")
+    parser.add_argument("--shared-image", action="store_true", help="run every session against one disk image")
+    parser.add_argument("--keep", action="store_true", help="do not delete the tree after each iteration")
+    parser.add_argument("--executable", help="backend binary, defaults to the one api.API starts")
+    parser.add_argument("--workdir", help="directory for the disk images, a temporary one by default")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for one response")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    options = parser.parse_args(argv)
+
+    base_dir = Path(options.workdir) if options.workdir else Path(tempfile.mkdtemp(prefix="osfm-load-"))
+    base_dir.mkdir(parents=True, exist_ok=True)
+    if options.shared_image:
+        workdirs = [base_dir] * options.sessions
+    else:
+        workdirs = [base_dir / f"session-{index}" for index in range(options.sessions)]
+        for workdir in workdirs:
+            workdir.mkdir(exist_ok=True)
+    images = sorted({workdir / DISK_NAME for workdir in workdirs})
+    load_run = LoadRun(options)
+    asyncio.run(load_run.prepare(workdirs))
+    before = {str(image): read_image_usage(image) for image in images if image.exists()} # 格式化之后，只比较负载写入的块
+
+    wall_seconds = asyncio.run(load_run.run(workdirs))
+
+    after = {str(image): read_image_usage(image) for image in images if image.exists()}
+    operations = sum(histogram.count for histogram in load_run.histograms.values())
+    report = {
+        "revision": git_revision(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {key: value for key, value in vars(options).items() if key not in ("output", "workdir")},
+        "wall_seconds": round(wall_seconds, 4),
+        "operations": operations,
+        "ops_per_sec": round(operations / wall_seconds, 2) if wall_seconds else None,
+        "errors": len(load_run.errors),
+        "error_samples": load_run.errors[:20],
+        "commands": {command: histogram.to_dict() for command, histogram in sorted(load_run.histograms.items())},
+        "image": {
+            "before": before,
+            "after": after,
+            "used_blocks_growth": sum(usage["used_blocks"] for usage in after.values())
+                                  - sum(usage["used_blocks"] for usage in before.values()),
+        },
+    }
+    text = json.dumps(report, indent=4)
+    if options.output:
+        Path(options.output).write_text(text, encoding='utf-8')
+    else:
+        print(text)
+    if not options.workdir:
+        shutil.rmtree(base_dir, ignore_errors=True)
+    return 1 if load_run.errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
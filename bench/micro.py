@@ -0,0 +1,240 @@
+"""
+Micro-benchmarks for the Python hot paths, compared against the checked-in bench/baseline.json.
+
+    python -m bench.micro                      # run everything, compare with the baseline
+    python -m bench.micro --filter trie --max-size 100000
+    python -m bench.micro --update-baseline    # record this machine's numbers as the new baseline
+
+Runs headless (offscreen Qt platform). Exit status is 1 when any benchmark is slower than
+baseline * (1 + tolerance).
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import string
+import sys
+import time
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+TRIE_SIZES = (1000, 10000, 100000, 1000000)
+
+def random_names(count: int, seed: int = 0) -> list:
+    generator = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits + "._-"
+    return [
+        "".join(generator.choice(alphabet) for _ in range(generator.randint(3, 11)))
+        for _ in range(count)
+    ]
+
+def ls_output(entries: int) -> str:
+    """ Synthetic `ls -l` output in the backend's column layout, ending with a prompt """
+    lines = ["  fileName   | uid |              owner               |   access   |    creation time    |    modified time"]
+    lines.append(f"{'.':<11} |  0  | {'SYSTEM DEFAULT DIRECTORIES':<32} | drwxrwxrwx | 2024-01-01 00:00:00 | 2024-01-01 00:00:00")
+    lines.append(f"{'..':<11} |  0  | {'SYSTEM DEFAULT DIRECTORIES':<32} | drwxrwxrwx | 2024-01-01 00:00:00 | 2024-01-01 00:00:00")
+    for index, name in enumerate(random_names(entries, seed=entries)):
+        access = "drwxrw-r--" if index % 4 == 0 else "frwxrw-r--"
+        lines.append(f"{name:<11} |  1  | {'root':<32} | {access} | 2024-01-01 00:00:00 | 2024-01-01 00:00:00")
+    return "\n".join(lines) + "\nOSFileSystem@root:~$ "
+
+def terminal_buffer(length: int) -> str:
+    """ A long terminal transcript of commands and output, ending at a shell prompt """
+    chunk = "OSFileSystem@root:~/docs$ ls\n.\t..\tnotes.txt\treport.md\tsrc\t\nOSFileSystem@root:~/docs$ cat notes.txt\n" + "lorem ipsum dolor sit amet " * 4 + "\n"
+    return (chunk * (length // len(chunk) + 1))[:length] + "\nOSFileSystem@root:~/docs$ "
+
+
+class Benchmarks:
+    """ Each bench_* method takes a size and returns a zero-argument callable, one call is one timed run """
+    def __init__(self):
+        from PySide6.QtWidgets import QApplication
+        self.app = QApplication.instance() or QApplication([])
+        self._terminal = None
+
+    def terminal(self):
+        if self._terminal is None:
+            from gui.terminal import Terminal
+            from bench.replay import ReplayPool
+            pool = ReplayPool([{"t": 0, "terminal": "bench", "stream": "stdout", "data": ""}]) # 不启动真实后端
+            self._terminal = Terminal("Terminal Interface", None, pool)
+            self._terminal.onTabAddRequested()
+        return self._terminal
+
+    def cases(self, max_size: int):
+        for size in TRIE_SIZES:
+            if size <= max_size:
+                yield f"trie.insert[{size}]", self.bench_trie_insert, size
+                yield f"trie.items[{size}]", self.bench_trie_items, size
+        for size in (100, 1000, 20000):
+            yield f"explorer.parse_ls[{size}]", self.bench_explorer_parse, size
+        for size in (10000, 100000, 1000000):
+            if size <= max_size:
+                yield f"terminal.determine_state[{size}]", self.bench_determine_state, size
+        yield "explorer.logical_path[10000]", self.bench_logical_path, 10000
+        for size in (200, 2000, 20000):
+            yield f"highlighter.highlightBlock[{size}]", self.bench_highlight_block, size
+
+    def bench_trie_insert(self, size: int):
+        from gui.trie import Trie
+        names = random_names(size)
+        def run():
+            trie = Trie()
+            for index, name in enumerate(names):
+                trie.insert(name, index)
+        return run
+
+    def bench_trie_items(self, size: int):
+        from gui.trie import Trie
+        trie = Trie()
+        for index, name in enumerate(random_names(size)):
+            trie.insert(name, index)
+        return lambda: trie.items("")
+
+    def bench_explorer_parse(self, size: int):
+        from gui.explorer import Explorer
+        explorer = Explorer("Explorer Interface", self.terminal())
+        explorer.resize(1280, 720)
+        explorer.show()
+        output = ls_output(size)
+        def run(): # 包括视图排版：只有排版完成，用户才能看到并滚动整个目录
+            explorer._parse_ls_output_and_populate_cards(output)
+            explorer.fileView.doItemsLayout()
+        run.setup = explorer.clear_file_display # 不计时：清空上一轮的条目
+        return run
+
+    def bench_determine_state(self, size: int):
+        terminal = self.terminal()
+        text = terminal_buffer(size)
+        return lambda: terminal._determine_terminal_state(text)
+
+    def bench_logical_path(self, size: int):
+        from gui.explorer import Explorer
+        generator = random.Random(1)
+        paths = ["~", "~/", "~/docs", "~/docs/src/", "~/a/b/c/d"]
+        names = [".", "..", "notes.txt", "src"]
+        calls = [(generator.choice(paths), generator.choice(names)) for _ in range(size)]
+        def run():
+            for current_path, item_name in calls:
+                Explorer._get_item_logical_path(current_path, item_name)
+        return run
+
+    def bench_highlight_block(self, size: int):
+        from PySide6.QtGui import QTextDocument
+        from gui.highlighter import Highlighter
+        line = "OSFileSystem@root:~/docs$ " + ('echo "text" >> notes.txt ; ls -l $HOME 42 # note ' * (size // 48 + 1))[:size]
+        document = QTextDocument()
+        document.setPlainText(line)
+        highlighter = Highlighter(document)
+        block = document.firstBlock()
+        def run():
+            highlighter.rehighlightBlock(block)
+        run.keep_alive = (document, highlighter) # 防止文档和高亮器被回收
+        return run
+
+
+def measure(run, repeat: int, min_time: float) -> float:
+    """
+    Best seconds per run over repeat rounds; fast runs are looped until a round lasts min_time.
+    A run may carry a setup callable, which is called untimed before every call.
+    """
+    setup = getattr(run, "setup", None)
+    def timed_round(loops: int) -> float:
+        if setup is None:
+            start = time.perf_counter()
+            for _ in range(loops):
+                run()
+            return time.perf_counter() - start
+        elapsed = 0.0
+        for _ in range(loops):
+            setup()
+            start = time.perf_counter()
+            run()
+            elapsed += time.perf_counter() - start
+        return elapsed
+
+    if setup is not None:
+        setup()
+    run() # 预热，排除首次导入和缓存填充的开销
+    gc_was_enabled = gc.isenabled()
+    gc.disable() # 与 timeit 相同，计时期间关闭垃圾回收以减少抖动
+    try:
+        loops = 1
+        while True:
+            elapsed = timed_round(loops)
+            if elapsed >= min_time or loops >= 1 << 20:
+                break
+            loops *= 10 if elapsed < min_time / 10 else 2
+        best = elapsed / loops
+        for _ in range(repeat - 1):
+            best = min(best, timed_round(loops) / loops)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+        gc.collect()
+    return best
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    rows = []
+    for name, seconds in results.items():
+        reference = baseline.get(name)
+        ratio = seconds / reference if reference else None
+        status = "new" if ratio is None else ("SLOWER" if ratio > 1 + tolerance else "ok")
+        rows.append((name, seconds, reference, ratio, status))
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for OS-FileManager Python hot paths")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this text")
+    parser.add_argument("--max-size", type=int, default=max(TRIE_SIZES), help="skip sizes above this")
+    parser.add_argument("--repeat", type=int, default=5, help="rounds per benchmark, the best one counts")
+    parser.add_argument("--min-time", type=float, default=0.05, help="minimum seconds per round")
+    parser.add_argument("--tolerance", type=float, default=0.30, help="allowed slowdown against the baseline")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH), help="baseline file")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--output", help="also write the results and comparison as JSON")
+    options = parser.parse_args(argv)
+
+    benchmarks = Benchmarks()
+    results = {}
+    for name, factory, size in benchmarks.cases(options.max_size):
+        if options.filter not in name:
+            continue
+        run = factory(size)
+        results[name] = measure(run, options.repeat, options.min_time)
+        print(f"{name:<40}{results[name] * 1000:12.4f} ms", flush=True)
+
+    baseline_path = Path(options.baseline)
+    if options.update_baseline:
+        baseline = json.loads(baseline_path.read_text(encoding='utf-8')) if baseline_path.exists() else {}
+        baseline.setdefault("results", {}).update({name: round(seconds, 9) for name, seconds in results.items()})
+        baseline["machine"] = f"{platform.system()} {platform.machine()}, Python {platform.python_version()}"
+        baseline_path.write_text(json.dumps(baseline, indent=4, sort_keys=True) + "\n", encoding='utf-8')
+        print(f"baseline written to {baseline_path}")
+        return 0
+
+    baseline = json.loads(baseline_path.read_text(encoding='utf-8')).get("results", {}) if baseline_path.exists() else {}
+    rows = compare(results, baseline, options.tolerance)
+    print()
+    print(f"{'benchmark':<40}{'ms':>12}{'baseline':>12}{'ratio':>8}  status")
+    for name, seconds, reference, ratio, status in rows:
+        reference_text = f"{reference * 1000:12.4f}" if reference else f"{'-':>12}"
+        ratio_text = f"{ratio:8.2f}" if ratio else f"{'-':>8}"
+        print(f"{name:<40}{seconds * 1000:12.4f}{reference_text}{ratio_text}  {status}")
+    if options.output:
+        Path(options.output).write_text(json.dumps({
+            "tolerance": options.tolerance,
+            "results": [
+                {"name": name, "seconds": seconds, "baseline": reference, "ratio": ratio, "status": status}
+                for name, seconds, reference, ratio, status in rows
+            ],
+        }, indent=4), encoding='utf-8')
+    return 1 if any(status == "SLOWER" for *_, status in rows) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
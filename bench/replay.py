@@ -0,0 +1,201 @@
+"""
+Replays a recorded backend trace through the real GUI output pipeline, without the C++ binary.
+
+Record a trace by running the GUI with OSFM_RECORD=session.jsonl, then:
+
+    QT_QPA_PLATFORM=offscreen python -m bench.replay session.jsonl --output replay.json
+    python -m bench.replay session.jsonl --pace original --speed 2
+
+Each recorded terminal becomes a Terminal tab fed by a ReplayAPI, handed out through the same
+process-pool hook the GUI uses for pre-warmed backends.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtCore import QObject, QProcess, QTimer, Signal
+from PySide6.QtWidgets import QApplication
+
+from api.recorder import load_trace
+from api.trace import Histogram, tracer
+
+SHELL_PROMPT = re.compile(r"OSFileSystem@[\w\.-]+:.*?\$\s")
+LS_HEADER = re.compile(r"^\s*fileName\s*\|\s*uid\s*\|", re.MULTILINE)
+
+class ReplayAPI(QObject):
+    """ Stand-in for api.API: same signals, output comes from a trace instead of a process """
+    standardOutputReady = Signal(str, str)
+    standardErrorReady = Signal(str, str)
+    processFinished = Signal(str, int, QProcess.ExitStatus)
+    processErrorOccurred = Signal(str, str)
+
+    def __init__(self, terminal_object_name: str, parent=None):
+        super().__init__(parent)
+        self.terminal_object_name = terminal_object_name
+        self.sent_inputs = []
+        self.chunk_costs = Histogram() # 每个输出块在 Terminal 槽函数中花费的时间
+
+    def state(self):
+        return QProcess.Running
+
+    def start_app_process(self):
+        return True
+
+    def send_input_to_app(self, data: str, trace: bool = True):
+        self.sent_inputs.append(data)
+
+    def terminate_app_process(self):
+        pass
+
+    def attach(self, terminal_object_name: str, parent):
+        self.terminal_object_name = terminal_object_name
+        self.setParent(parent)
+
+    def release_output(self):
+        pass # 回放由 ReplayPool.start 统一驱动
+
+    def emit_chunk(self, stream: str, data: str):
+        signal = self.standardErrorReady if stream == "stderr" else self.standardOutputReady
+        start = time.perf_counter()
+        signal.emit(self.terminal_object_name, data) # 直连信号，槽函数在 emit 内同步执行
+        self.chunk_costs.add(time.perf_counter() - start)
+
+
+class ReplayPool(QObject):
+    """ Hands a ReplayAPI per recorded terminal to Terminal.addTerminalTab, then drives the replay """
+    finished = Signal()
+
+    def __init__(self, records: list, pace: str = "full", speed: float = 1.0, parent=None):
+        super().__init__(parent)
+        self.records = records
+        self.pace = pace
+        self.speed = speed
+        self.recorded_terminals = list(dict.fromkeys(record["terminal"] for record in records))
+        self.apis = {} # {录制时的终端名: ReplayAPI}
+        self.position = 0
+        self.wall_seconds = 0.0
+
+    def take(self, terminal_object_name: str, parent):
+        if len(self.apis) >= len(self.recorded_terminals):
+            return None
+        api = ReplayAPI(terminal_object_name, parent)
+        self.apis[self.recorded_terminals[len(self.apis)]] = api
+        return api
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._emit_next()
+
+    def _emit_next(self):
+        if self.position >= len(self.records):
+            self.wall_seconds = time.perf_counter() - self.started_at
+            self.finished.emit()
+            return
+        record = self.records[self.position]
+        self.position += 1
+        api = self.apis.get(record["terminal"])
+        if api is not None:
+            api.emit_chunk(record["stream"], record["data"])
+        delay_ms = 0
+        if self.pace == "original" and self.position < len(self.records):
+            delay_ms = max(0, int((self.records[self.position]["t"] - record["t"]) * 1000 / self.speed))
+        QTimer.singleShot(delay_ms, self._emit_next) # 每块之间都回到事件循环，与真实会话一致
+
+
+def listing_segments(records: list) -> list:
+    """ ls -l responses in the trace, one string per listing """
+    streams = {}
+    for record in records:
+        if record["stream"] == "stdout":
+            streams.setdefault(record["terminal"], []).append(record["data"])
+    segments = []
+    for chunks in streams.values():
+        for segment in SHELL_PROMPT.split("".join(chunks)):
+            if LS_HEADER.search(segment):
+                segments.append(segment)
+    return segments
+
+
+def run_benchmark(records: list, pace: str, speed: float, repeat: int) -> dict:
+    from gui.terminal import Terminal
+    from gui.explorer import Explorer
+    from gui.highlighter import Highlighter
+
+    app = QApplication.instance() or QApplication([])
+    pool = ReplayPool(records * repeat if pace == "full" else records, pace, speed)
+    terminal = Terminal("Terminal Interface", None, pool)
+    terminal.resize(1000, 700)
+    terminal.show()
+    for _ in range(len(pool.recorded_terminals) - 1): # 第一个标签页由 Terminal 自己在事件循环开始后创建
+        terminal.onTabAddRequested()
+    QTimer.singleShot(10, pool.start)
+    pool.finished.connect(app.quit)
+    app.exec()
+
+    chunk_costs = Histogram()
+    for api in pool.apis.values():
+        chunk_costs.merge(api.chunk_costs)
+
+    explorer = Explorer("Explorer Interface", terminal)
+    parse_costs = Histogram()
+    for segment in listing_segments(records):
+        start = time.perf_counter()
+        explorer._parse_ls_output_and_populate_cards(segment)
+        parse_costs.add(time.perf_counter() - start)
+
+    highlight_costs = Histogram()
+    blocks = 0
+    for api in pool.apis.values():
+        text_edit = terminal._get_terminal_widget_by_object_name(api.terminal_object_name)
+        for highlighter in text_edit.document().findChildren(Highlighter):
+            start = time.perf_counter()
+            highlighter.rehighlight()
+            highlight_costs.add(time.perf_counter() - start)
+            blocks += text_edit.document().blockCount()
+
+    total_bytes = sum(len(record["data"].encode('utf-8')) for record in pool.records)
+    render = tracer.histograms.get("stage:terminal.render")
+    return {
+        "pace": pace,
+        "speed": speed,
+        "repeat": repeat if pace == "full" else 1,
+        "terminals": len(pool.recorded_terminals),
+        "chunks": len(pool.records),
+        "bytes": total_bytes,
+        "wall_seconds": round(pool.wall_seconds, 4),
+        "chunks_per_sec": round(len(pool.records) / pool.wall_seconds, 2) if pool.wall_seconds else None,
+        "mb_per_sec": round(total_bytes / pool.wall_seconds / 1e6, 3) if pool.wall_seconds else None,
+        "terminal_output_per_chunk": chunk_costs.to_dict(),
+        "terminal_render_per_chunk": render.to_dict() if render else None,
+        "explorer_parse_per_listing": parse_costs.to_dict(),
+        "highlight_rehighlight_per_document": highlight_costs.to_dict(),
+        "highlighted_blocks": blocks,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded backend trace through the GUI output pipeline")
+    parser.add_argument("trace", help="JSON Lines trace recorded with OSFM_RECORD")
+    parser.add_argument("--pace", choices=("full", "original"), default="full", help="full speed or the recorded timing")
+    parser.add_argument("--speed", type=float, default=1.0, help="time scale for --pace original")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the trace this many times at full speed")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    options = parser.parse_args(argv)
+
+    report = run_benchmark(load_trace(options.trace), options.pace, options.speed, options.repeat)
+    text = json.dumps(report, indent=4)
+    if options.output:
+        Path(options.output).write_text(text, encoding='utf-8')
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Sequential read throughput of a disk image through the backend.
+
+    python -m bench.seqread --image OSFileSystem.dsk --repeat 3
+    python -m bench.seqread --image copy.dsk --path /src --warm
+
+Every file under --path is streamed with `cat` (api.client.AsyncClient.download) in tree order and thrown away, so the
+number reflects how the backend walks FileIndex chains and reads runs of consecutive data blocks. Each round starts a
+fresh session, so the backend's block cache is empty; unless --warm is given the image is also dropped from the page
+cache first. api.defrag uses read_image to report the speedup of a rewritten image.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from api.client import AsyncClient
+from api.image import DISK_NAME, DiskImage
+
+class NullSink:
+    """ Counts what download writes and drops it """
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, data: bytes):
+        self.bytes += len(data)
+
+
+def image_files(image_path: str, path: str = "/") -> list:
+    """ Virtual paths of every file below path, in tree order """
+    with DiskImage(image_path) as image:
+        return [
+            f"{directory.rstrip('/')}/{name}"
+            for directory, _, _, files in image.walk(path)
+            for name, _ in files
+        ]
+
+def drop_page_cache(image_path: str):
+    """ Asks the kernel to forget the cached pages of the image, best effort """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    fd = os.open(image_path, os.O_RDONLY)
+    try:
+        os.fsync(fd) # 只有干净的页才会被丢弃
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+async def read_round(workdir: str, files: list, executable: str, timeout: float) -> tuple:
+    """ (字节数, 秒数) for streaming every file once in a new session, login excluded """
+    sink = NullSink()
+    async with AsyncClient(executable=executable, cwd=workdir, timeout=timeout) as client:
+        started = time.perf_counter()
+        for path in files:
+            await client.download(path, sink)
+        return sink.bytes, time.perf_counter() - started
+
+def read_image(image_path: str, path: str = "/", repeat: int = 1, warm: bool = False, executable: str = None,
+               timeout: float = 60.0) -> dict:
+    """
+    Best of repeat rounds of reading every file below path. The backend only opens OSFileSystem.dsk in its working
+    directory, so it runs in a temporary directory holding a link to the image.
+    """
+    image_path = os.path.abspath(image_path)
+    files = image_files(image_path, path)
+    rounds = []
+    with tempfile.TemporaryDirectory(prefix="seqread-") as workdir:
+        os.symlink(image_path, os.path.join(workdir, DISK_NAME))
+        for _ in range(repeat):
+            if not warm:
+                drop_page_cache(image_path)
+            rounds.append(asyncio.run(read_round(workdir, files, executable, timeout)))
+    total, seconds = min(rounds, key=lambda item: item[1])
+    return {
+        "image": image_path,
+        "files": len(files),
+        "bytes": total,
+        "seconds": round(seconds, 3),
+        "mb_per_second": round(total / seconds / 1048576, 2) if seconds else None,
+        "rounds": [round(item[1], 3) for item in rounds],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sequential read throughput of an OS-FileManager disk image")
+    parser.add_argument("--image", default=DISK_NAME, help="disk image, OSFileSystem.dsk by default")
+    parser.add_argument("--path", default="/", help="only read the files below this virtual directory")
+    parser.add_argument("--repeat", type=int, default=1, help="rounds, the fastest one counts")
+    parser.add_argument("--warm", action="store_true", help="keep the image in the page cache between rounds")
+    parser.add_argument("--executable", help="backend binary, defaults to the one api.API starts")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for one response")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    options = parser.parse_args(argv)
+    result = read_image(options.image, options.path, options.repeat, options.warm, options.executable, options.timeout)
+    text = json.dumps(result, indent=2)
+    if options.output:
+        Path(options.output).write_text(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
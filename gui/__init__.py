@@ -1 +1,2 @@
+from .startup import startup_timer
 from .gui import GUI
@@ -0,0 +1,12 @@
+import json
+
+from functools import lru_cache
+from pathlib import Path
+
+CONFIG_FILE_PATH = Path(__file__).resolve().parent.parent / "config" / "config.json"
+
+@lru_cache(maxsize=None)
+def load_config() -> dict:
+    """ Parses config/config.json once, every interface shares the cached result """
+    with open(CONFIG_FILE_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
@@ -1,5 +1,3 @@
-import json
-
 from pathlib import Path
 
 from PySide6.QtCore import QSize, QEventLoop, QTimer, Qt, Signal
@@ -12,6 +10,11 @@ from qfluentwidgets import (
 )
 from qfluentwidgets import FluentIcon as FIF
 
+from .config import load_config
+from .highlighter import EditorHighlighter
+from .tokenizer import tokenizer_for_path
+from .watchdog import hot_path
+
 class Editor(QFrame):
     saveFileRequested = Signal(str, str)
 
@@ -19,6 +22,7 @@ class Editor(QFrame):
         super().__init__(parent=parent)
         self.setupUi()
         self.editor_space = PlainTextEdit(self)
+        self.highlighter = EditorHighlighter(self.editor_space.document())
         self.saveShortcut = QShortcut(QKeySequence("Ctrl+S"), self)
         self.current_file_path = None
         self.__initWidget()
@@ -27,9 +31,7 @@ class Editor(QFrame):
     def __initWidget(self):
         self.__initLayout()
         self.__initShortcut()
-        config_file_path = Path(__file__).resolve().parent.parent / "config" / "config.json"
-        with open(config_file_path, 'r', encoding='utf-8') as f:
-            config_data = json.load(f)
+        config_data = load_config()
 
         self.editor_space.setFont(QFont(config_data.get("fontFamily", "Monospace"), config_data.get("fontSize", 20)))
         self.editor_space.setPlaceholderText("Editor Space...")
@@ -68,8 +70,10 @@ class Editor(QFrame):
         #     parent=self
         # )
 
+    @hot_path("editor.load")
     def load_content(self, file_path: str, content: str):
         self.current_file_path = file_path
+        self.highlighter.set_tokenizer(tokenizer_for_path(file_path)) # 按扩展名选择高亮方式
         self.editor_space.setPlainText(content)
         self.editor_space.setPlaceholderText(f"Editing: {file_path}")
         InfoBar.success(
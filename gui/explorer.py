@@ -1,54 +1,86 @@
+from bisect import bisect_left
 from typing import List
 import re
 import os
 
-from PySide6.QtCore import Qt, Signal, QUrl, QEvent, QProcess, QTimer
+from PySide6.QtCore import Qt, Signal, QUrl, QEvent, QProcess, QTimer, QAbstractListModel, QModelIndex, QRect, QSize
 from PySide6.QtGui import QDesktopServices, QPainter, QPen, QColor
-from PySide6.QtWidgets import QApplication, QWidget, QLabel, QVBoxLayout, QHBoxLayout, QFrame
+from PySide6.QtWidgets import (QApplication, QWidget, QLabel, QVBoxLayout, QHBoxLayout, QFrame, QFileDialog,
+                               QListView, QStyle, QStyledItemDelegate)
 
-from qfluentwidgets import (ScrollArea, PushButton, FlowLayout, ToolButton, FluentIcon,
+from qfluentwidgets import (ScrollArea, PushButton, ToolButton, FluentIcon,
                             isDarkTheme, IconWidget, Theme, ToolTipFilter, TitleLabel, CaptionLabel,
-                            SmoothScrollArea, SearchLineEdit, StrongBodyLabel, BodyLabel, toggleTheme,
-                            InfoBar, InfoBarPosition)
+                            SmoothScrollDelegate, SearchLineEdit, StrongBodyLabel, BodyLabel, toggleTheme,
+                            InfoBar, InfoBarPosition, ProgressBar, RoundMenu, Action)
+
+from api import tracer
+from api.transfer import invalid_name, tar_compression
 
 from .filedata import FileData
 from .trie import Trie
+from .watchdog import hot_path
 from .terminal import Terminal, TerminalInputMode
 
-class FileIcon(QFrame):
-    clicked = Signal(FileData)
-    doubleClicked = Signal(FileData)
-
-    def __init__(self, file_data: FileData, parent=None):
-        super().__init__(parent=parent)
-        self.file_data = file_data
-        self.isSelected = False
+class FileListModel(QAbstractListModel):
+    """ Explorer 的文件列表，搜索时只暴露匹配的行；视图只为可见的行绘制，不再为每个条目创建控件 """
 
-        # Determine icon and if it's a directory based on access string
-        self.fluent_icon, self.is_directory_ui = FileIcon._determine_icon_and_type(
-            file_data.name, file_data.access)
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.files = []  # 排好序的 FileData
+        self.rows = None  # 匹配搜索的 files 下标（升序），None 表示显示全部
 
-        try:
-            self.iconWidget = IconWidget(self.fluent_icon, self)
-        except Exception as e:
-            print(
-                f"Error creating IconWidget for {file_data.name} (icon: {self.fluent_icon}): {e}. Using default error icon.")
-            self.iconWidget = IconWidget(FluentIcon.CANCEL, self)
+    def setFiles(self, files: List[FileData]):
+        self.beginResetModel()
+        self.files = files
+        self.rows = None
+        self.endResetModel()
 
-        self.nameLabel = QLabel(self)
-        self.vBoxLayout = QVBoxLayout(self)
-        self.setFixedSize(96, 96)
-        self.vBoxLayout.setSpacing(0)
-        self.vBoxLayout.setContentsMargins(8, 28, 8, 0)
-        self.vBoxLayout.setAlignment(Qt.AlignTop)
-        self.iconWidget.setFixedSize(28, 28)
-        self.vBoxLayout.addWidget(self.iconWidget, 0, Qt.AlignHCenter)
-        self.vBoxLayout.addSpacing(14)
-        self.vBoxLayout.addWidget(self.nameLabel, 0, Qt.AlignHCenter)
-        text = self.nameLabel.fontMetrics().elidedText(file_data.name, Qt.ElideRight, 90)
-        self.nameLabel.setText(text)
-        # Set object name for styling if needed
-        self.setObjectName('FileIconCard')
+    def appendFile(self, file_data: FileData):
+        if self.rows is not None:  # 搜索结果不变，清除搜索后才显示
+            self.files.append(file_data)
+            return
+        self.beginInsertRows(QModelIndex(), len(self.files), len(self.files))
+        self.files.append(file_data)
+        self.endInsertRows()
+
+    def setFilter(self, rows):
+        self.beginResetModel()
+        self.rows = rows
+        self.endResetModel()
+
+    def fileIndex(self, row: int) -> int:
+        """ 视图中的行对应的 files 下标 """
+        return row if self.rows is None else self.rows[row]
+
+    def rowOf(self, file_index: int) -> int:
+        """ files 下标在视图中的行，被搜索过滤掉时为 -1 """
+        if self.rows is None:
+            return file_index
+        row = bisect_left(self.rows, file_index)
+        return row if row < len(self.rows) and self.rows[row] == file_index else -1
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.files) if self.rows is None else len(self.rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        file_data = self.files[self.fileIndex(index.row())]
+        if role == Qt.DisplayRole or role == Qt.ToolTipRole:
+            return file_data.name
+        if role == Qt.UserRole:
+            return file_data
+        return None
+
+
+class FileIconDelegate(QStyledItemDelegate):
+    """ 把每一行画成 96x96 的图标卡片：图标在上，名称在下，选中时图标用强调色 """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._icons = {}  # (FluentIcon, 是否选中, 是否暗色主题) -> QIcon
 
     @staticmethod
     def _determine_icon_and_type(name: str, access_string: str):
@@ -72,30 +104,33 @@ class FileIcon(QFrame):
         else:
             return FluentIcon.DOCUMENT, False  # Treat as a generic file for now
 
-    def mouseReleaseEvent(self, e):
-        self.clicked.emit(self.file_data)
-        super().mouseReleaseEvent(e)
-
-    def mouseDoubleClickEvent(self, e):
-        if self.rect().contains(e.pos()):
-            self.doubleClicked.emit(self.file_data)
-        super().mouseDoubleClickEvent(e)
-
-    def setSelected(self, isSelected: bool, force=False):
-        if isSelected == self.isSelected and not force:
-            return
-        self.isSelected = isSelected
-        if not isSelected:
-            self.iconWidget.setIcon(self.fluent_icon)  # Use the base icon
-        else:
-            accent_color = QColor(0, 120, 212)  # Fluent blue accent
-            if isDarkTheme():  # For dark theme, use a lighter accent if needed
-                # Example: lighter blue for dark theme
-                accent_color = QColor(100, 180, 255)
-            self.iconWidget.setIcon(self.fluent_icon.icon(color=accent_color))
-        self.setProperty('isSelected', isSelected)
-        # Apply stylesheet to update visual state
-        self.setStyle(QApplication.style())
+    def _icon(self, fluent_icon: FluentIcon, selected: bool):
+        key = (fluent_icon, selected, isDarkTheme())
+        if key not in self._icons:
+            if not selected:
+                self._icons[key] = fluent_icon.icon()
+            else:
+                accent_color = QColor(0, 120, 212)  # Fluent blue accent
+                if isDarkTheme():  # 暗色主题用浅一些的强调色
+                    accent_color = QColor(100, 180, 255)
+                self._icons[key] = fluent_icon.icon(color=accent_color)
+        return self._icons[key]
+
+    def sizeHint(self, option, index):
+        return QSize(96, 96)
+
+    def paint(self, painter: QPainter, option, index):
+        file_data = index.data(Qt.UserRole)
+        fluent_icon, _ = FileIconDelegate._determine_icon_and_type(file_data.name, file_data.access)
+        rect = option.rect
+        painter.save()
+        painter.setRenderHints(QPainter.Antialiasing | QPainter.SmoothPixmapTransform)
+        selected = bool(option.state & QStyle.State_Selected)
+        self._icon(fluent_icon, selected).paint(painter, QRect(rect.x() + (rect.width() - 28) // 2, rect.y() + 28, 28, 28))
+        painter.setPen(Qt.white if isDarkTheme() else Qt.black)
+        text = option.fontMetrics.elidedText(file_data.name, Qt.ElideRight, 90)
+        painter.drawText(QRect(rect.x(), rect.y() + 70, rect.width(), rect.height() - 70), Qt.AlignHCenter | Qt.AlignTop, text)
+        painter.restore()
 
 
 class FileInfoPanel(QFrame):
@@ -174,7 +209,7 @@ class FileInfoPanel(QFrame):
 
     def setFileInfo(self, file_data: FileData, current_explorer_path: str):
         # Determine icon and type for display
-        fluent_icon, is_directory = FileIcon._determine_icon_and_type(
+        fluent_icon, is_directory = FileIconDelegate._determine_icon_and_type(
             file_data.name, file_data.access)
         self.iconWidget.setIcon(fluent_icon)
         self.nameLabel.setText(file_data.name)
@@ -208,6 +243,7 @@ class Explorer(QWidget):
         self.terminal_manager = terminal_manager
         self.terminal_manager.requestExplorerRefresh.connect(self.load_current_terminal_directory)
         self.terminal_manager.explorerCommandOutputReady.connect(self._handle_explorer_command_response)
+        self.terminal_manager.explorerListingChunk.connect(self._handle_listing_chunk)
 
         self.trie = Trie()
         # Initial path in Explorer view, matches Shell's initial login path
@@ -217,21 +253,31 @@ class Explorer(QWidget):
             r"^\s*(?P<fileName>.*?)\s*\|\s*(?P<uid>\d+)\s*\|\s*(?P<owner>.*?)\s*\|\s*(?P<access>[fdrwx\-]+)\s*\|\s*(?P<creation_time>[\d\-\s:]+)\s*\|\s*(?P<modified_time>[\d\-\s:]+)$"
         )
         self._prompt_regex = re.compile(r"OSFileSystem@[\w\.-]+:.*?\$\s")
+        self._ls_header_regex = re.compile(r"^\s*fileName\s*\|\s*uid\s*\|")
+        self._listing_files = None # 正在接收的 ls -l 输出已解析出的 FileData，None 表示没有在接收
+        self._listing_state = "header" # header: 等待表头, data: 解析数据行, done: 已遇到提示符
 
         self.backButton = ToolButton(FluentIcon.RETURN, self)
+        self.importButton = ToolButton(FluentIcon.FOLDER_ADD, self)
+        self.exportButton = ToolButton(FluentIcon.SHARE, self)
+        self.exportMenu = RoundMenu(parent=self)
+        self.transferLabel = CaptionLabel(self)
+        self.transferProgressBar = ProgressBar(self)
+        self.transferCancelButton = ToolButton(FluentIcon.CLOSE, self)
+        self.transfer_runner = None # 正在进行的导入或导出
+        self._transfer_action = ""
         self.pathLabel = StrongBodyLabel(
             f"Current Path: {self.current_path}", self)
         self.navLayout = QHBoxLayout()
         self.searchLineEdit = SearchLineEdit(self)
         self.view = QFrame(self)
-        self.scrollArea = SmoothScrollArea(self.view)
-        # This widget will contain the FlowLayout
-        self.scrollWidget = QWidget(self.scrollArea)
+        # 只绘制可见的条目，几万个条目的目录也不会创建几万个控件
+        self.fileView = QListView(self.view)
+        self.fileModel = FileListModel(self.fileView)
+        self.fileDelegate = FileIconDelegate(self.fileView)
+        self.scrollDelegate = SmoothScrollDelegate(self.fileView)
         self.infoPanel = FileInfoPanel(parent=self)
         self.hBoxLayout = QHBoxLayout(self.view)
-        # FlowLayout's parent is scrollWidget
-        self.flowLayout = FlowLayout(self.scrollWidget, isTight=True)
-        self.cards = []  # Store FileIcon instances here
         self.files_data = []  # Store FileData instances here
         self.currentIndex = -1
 
@@ -248,10 +294,21 @@ class Explorer(QWidget):
         self.__initButton()
         self.pathLabel.setContentsMargins(5, 0, 0, 0)
 
-        self.scrollArea.setWidget(self.scrollWidget)
-        self.scrollArea.setViewportMargins(0, 5, 0, 5)
-        self.scrollArea.setWidgetResizable(True)
-        self.scrollArea.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.fileView.setModel(self.fileModel)
+        self.fileView.setItemDelegate(self.fileDelegate)
+        self.fileView.setViewMode(QListView.IconMode)
+        self.fileView.setMovement(QListView.Static)
+        self.fileView.setResizeMode(QListView.Adjust)
+        self.fileView.setLayoutMode(QListView.Batched)  # 大目录分批排版，界面不会卡住
+        self.fileView.setUniformItemSizes(True)
+        self.fileView.setSpacing(4)
+        self.fileView.setSelectionMode(QListView.SingleSelection)
+        self.fileView.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.fileView.setFrameShape(QFrame.NoFrame)
+        self.fileView.setStyleSheet("QListView { background: transparent; }")
+        self.fileView.selectionModel().currentChanged.connect(self._on_current_changed)
+        self.fileView.doubleClicked.connect(
+            lambda index: self.handleDoubleClick(self.files_data[self.fileModel.fileIndex(index.row())]))
 
         self.layout.setContentsMargins(0, 0, 0, 0)
         self.layout.setSpacing(12)
@@ -259,16 +316,20 @@ class Explorer(QWidget):
         self.hBoxLayout.setSpacing(0)
         self.hBoxLayout.setContentsMargins(0, 0, 0, 0)
 
-        self.flowLayout.setVerticalSpacing(8)
-        self.flowLayout.setHorizontalSpacing(8)
-        self.flowLayout.setContentsMargins(8, 3, 8, 8)
-
         self.searchLineEdit.clearSignal.connect(self.showAllFiles)
         self.searchLineEdit.searchSignal.connect(self.search)
 
         self.navLayout.setContentsMargins(0, 0, 0, 0)
         self.navLayout.setSpacing(5)
         self.navLayout.addStretch(1)
+        self.navLayout.addWidget(self.transferLabel)
+        self.navLayout.addWidget(self.transferProgressBar)
+        self.navLayout.addWidget(self.transferCancelButton)
+        self.navLayout.addWidget(self.importButton)
+        self.navLayout.addWidget(self.exportButton)
+        self.transferProgressBar.setFixedWidth(200)
+        self.transferProgressBar.setRange(0, 1000)
+        self._set_transfer_widgets_visible(False)
 
         self.searchLineEdit.setPlaceholderText('Search files')
         self.searchLineEdit.setFixedWidth(1096)
@@ -277,7 +338,7 @@ class Explorer(QWidget):
         self.layout.addLayout(self.navLayout)
         self.layout.addWidget(self.searchLineEdit)
         self.layout.addWidget(self.view)
-        self.hBoxLayout.addWidget(self.scrollArea)
+        self.hBoxLayout.addWidget(self.fileView)
         self.hBoxLayout.addWidget(self.infoPanel, 0, Qt.AlignRight)
         self.navLayout.addWidget(self.backButton)
         self.navLayout.addWidget(self.pathLabel)
@@ -286,6 +347,17 @@ class Explorer(QWidget):
         self.backButton.setToolTip("Go to parent folder")
         self.backButton.setFixedSize(32, 32)
         self.backButton.clicked.connect(self.go_up_directory)
+        self.importButton.setToolTip("Import a folder from this computer")
+        self.importButton.setFixedSize(32, 32)
+        self.importButton.clicked.connect(self.import_directory)
+        self.exportButton.setToolTip("Export the selected folder (or this folder) to this computer")
+        self.exportButton.setFixedSize(32, 32)
+        self.exportButton.clicked.connect(self.show_export_menu)
+        self.exportMenu.addAction(Action(FluentIcon.FOLDER, "导出到文件夹...", triggered=lambda: self.export_directory(False)))
+        self.exportMenu.addAction(Action(FluentIcon.ZIP_FOLDER, "导出为 tar 归档...", triggered=lambda: self.export_directory(True)))
+        self.transferCancelButton.setToolTip("Cancel import / export")
+        self.transferCancelButton.setFixedSize(32, 32)
+        self.transferCancelButton.clicked.connect(self.cancel_transfer)
 
     def _show_infobar(self, title, content, type_info: InfoBarPosition):
         InfoBar.info(
@@ -299,24 +371,21 @@ class Explorer(QWidget):
         )
 
     def clear_file_display(self):
-        """ Clears the file display area, including cards, data, and info panel """
+        """ Clears the file display area, including the file view, data, and info panel """
         # Deselect any currently selected item and clear info panel
-        if self.currentIndex >= 0 and self.currentIndex < len(self.cards):
-            self.cards[self.currentIndex].setSelected(False)
-        self.currentIndex = -1
-        self.infoPanel.clearFileInfo()
-        # 隐藏所有卡片，但并不立即删除它们，以便后续的搜索和显示操作可以重用
-        for card in self.cards:
-            card.setVisible(False)
-        self.flowLayout.removeAllWidgets()  # 从布局中移除所有
-        self.cards.clear()
-        self.files_data.clear()
+        self._clear_selection()
+        self.files_data = []
+        self.fileModel.setFiles(self.files_data)
         self.trie = Trie()  # Reinitialize trie as all file data is gone
         self.pathLabel.setText("Current Path: (Empty)")
-        self.flowLayout.update()
-        self.scrollWidget.update()
-        self.view.update()
-        self.update()
+
+    def load_if_logged_in(self):
+        """ Lists the current terminal's directory when it is already logged in, without the warnings of an explicit refresh """
+        current_api = self.terminal_manager.get_current_api()
+        if not current_api or current_api.state() != QProcess.Running:
+            return
+        if self.terminal_manager.get_terminal_mode(current_api.terminal_object_name) == TerminalInputMode.NORMAL:
+            self.load_current_terminal_directory()
 
     def load_current_terminal_directory(self):
         """此方法现在只负责发起 'ls -l' 命令，不负责改变当前路径。"""
@@ -343,9 +412,16 @@ class Explorer(QWidget):
         self.pathLabel.setText(f"Loading: {self.current_path}...")
         self.terminal_manager.execute_command_for_explorer("ls -l")
 
+    def _handle_listing_chunk(self, terminal_obj_name: str, text: str):
+        """ ls 输出的若干整行，边接收边解析，大目录不必等整个输出拼成一个字符串 """
+        if self._listing_files is None:
+            self._begin_listing()
+        self._feed_listing(text)
+
     def _handle_explorer_command_response(self, terminal_obj_name: str, raw_output: str, success: bool, error_msg: str, command_type: str):
         """处理来自 Terminal 的命令执行结果。"""
         if not success:
+            self._listing_files = None
             self._show_infobar(
                 "命令失败", f"执行命令失败：{error_msg}", InfoBarPosition.TOP)
             self.pathLabel.setText(f"Error: {error_msg}")
@@ -358,7 +434,11 @@ class Explorer(QWidget):
         if command_type.startswith("cd"):  # 'cd' 命令成功完成
             self._show_infobar("目录切换成功", f"当前路径：{self.current_path}", InfoBarPosition.TOP)
         elif command_type.startswith("ls"):  # 'ls' 命令成功完成，现在解析输出并填充 UI
-            self._parse_ls_output_and_populate_cards(raw_output)
+            with tracer.stage("explorer.parse", terminal_obj_name):
+                if self._listing_files is None: # 输出没有分块到达
+                    self._begin_listing()
+                self._feed_listing(raw_output)
+                self._finish_listing()
             # self._show_infobar("目录加载成功", f"当前路径：{self.current_path}", InfoBarPosition.TOP)
         else:  # 处理其他命令的完成，如果需要的话
             pass  # 对于 "other" 类型命令，我们目前不进行特殊处理
@@ -397,39 +477,49 @@ class Explorer(QWidget):
 
     def _parse_ls_output_and_populate_cards(self, raw_output: str):
         """Parses raw ls -l output, creates FileData objects, and populates the UI."""
+        self._begin_listing()
+        self._feed_listing(raw_output)
+        self._finish_listing()
+
+    def _begin_listing(self):
         self.clear_file_display()  # 确保完全清空现有显示，包括重新初始化 Trie
-        lines = raw_output.strip().split('\n')
-        data_lines = []
-        is_data_section = False
+        self._listing_files = []
+        self._listing_state = "header"
 
-        for line_num, line in enumerate(lines):
+    def _feed_listing(self, text: str):
+        """ Parses complete ls -l lines into FileData, the header and the prompt delimit the data section """
+        for line in text.split('\n'):
             stripped_line = line.strip()
-            if re.search(r"^\s*fileName\s*\|\s*uid\s*\|", stripped_line) and not is_data_section:
-                is_data_section = True
-                continue
-            if is_data_section and self._prompt_regex.search(stripped_line):
-                is_data_section = False
-                break
-            if is_data_section and stripped_line:
-                data_lines.append(stripped_line)
-        parsed_data = []
-        for line_num, line in enumerate(data_lines):
-            match = self._ls_output_regex.match(line)
-            if match:
-                data = match.groupdict()
-                file_data = FileData(
-                    name=data['fileName'].strip(),
-                    uid=data['uid'].strip(),
-                    owner=data['owner'].strip(),
-                    access=data['access'].strip(),
-                    creation_time=data['creation_time'].strip(),
-                    modified_time=data['modified_time'].strip()
-                )
-                parsed_data.append(file_data)
+            if self._listing_state == "header":
+                if self._ls_header_regex.search(stripped_line):
+                    self._listing_state = "data"
+            elif self._listing_state == "data":
+                if self._prompt_regex.search(stripped_line):
+                    self._listing_state = "done"
+                    return
+                if not stripped_line:
+                    continue
+                match = self._ls_output_regex.match(stripped_line)
+                if match:
+                    data = match.groupdict()
+                    self._listing_files.append(FileData(
+                        name=data['fileName'].strip(),
+                        uid=data['uid'].strip(),
+                        owner=data['owner'].strip(),
+                        access=data['access'].strip(),
+                        creation_time=data['creation_time'].strip(),
+                        modified_time=data['modified_time'].strip()
+                    ))
+
+    @hot_path("explorer.parse")
+    def _finish_listing(self):
+        """ Sorts the parsed entries and populates the UI """
+        parsed_data = self._listing_files or []
+        self._listing_files = None
 
         # Sort directories before files, then alphabetically
         def sort_key(file_data: FileData):
-            _, is_dir = FileIcon._determine_icon_and_type(
+            _, is_dir = FileIconDelegate._determine_icon_and_type(
                 file_data.name, file_data.access)
             if file_data.name == "..":
                 return (0, file_data.name.lower())
@@ -441,9 +531,10 @@ class Explorer(QWidget):
 
         parsed_data.sort(key=sort_key)
 
-        for file_data in parsed_data:
-            self.addFile(file_data)
-        self.showAllFiles()  # 初始加载时，只添加所有文件到布局，然后 setSelectedFile 来更新信息面板
+        for i, file_data in enumerate(parsed_data):
+            self.trie.insert(file_data.name, i)
+        self.files_data = parsed_data
+        self.fileModel.setFiles(self.files_data)  # 整个列表一次交给视图，然后 setSelectedFile 来更新信息面板
         if self.files_data:
             initial_selection_index = 0  # Try to select the first non-special file/folder
             if len(self.files_data) > 2 and self.files_data[0].name == ".." and self.files_data[1].name == ".":
@@ -494,50 +585,35 @@ class Explorer(QWidget):
 
     def addFile(self, file_data: FileData):
         """ Adds a FileData object to the display. """
-        try:
-            card = FileIcon(file_data, self.scrollWidget)
-            card.clicked.connect(self.setSelectedFile)
-            card.doubleClicked.connect(self.handleDoubleClick)
-
-            self.trie.insert(file_data.name, len(self.cards))
-            self.cards.append(card)
-            self.files_data.append(file_data)  # Store original FileData object
-            # 初始时不立即添加到布局，由 _parse_ls_output_and_populate_cards 统一调用 showAllFiles 处理
-            # card.show() # Ensure the newly added card is visible
-        except Exception as e:
-            print(f"Error adding file card for {file_data.name}: {e}")
+        self.trie.insert(file_data.name, len(self.files_data))
+        self.fileModel.appendFile(file_data)  # 模型和 Explorer 共用 files_data
 
     def setSelectedFile(self, file_data: FileData):
-        """ Selects a file card and updates the info panel. """
-        try:
-            index = -1
-            for i, fd in enumerate(self.files_data):
-                if fd is file_data:
-                    index = i
-                    break
-            if index == -1:
-                if self.currentIndex >= 0 and self.currentIndex < len(self.cards):
-                    self.cards[self.currentIndex].setSelected(False)
-                self.currentIndex = -1
-                self.infoPanel.clearFileInfo()
-                return
-
-            if self.currentIndex >= 0 and self.currentIndex < len(self.cards):
-                if self.currentIndex != index:
-                    self.cards[self.currentIndex].setSelected(False)
-
-            self.currentIndex = index
-            self.cards[index].setSelected(True)
-            # Pass current_path to infoPanel for dynamic path display
-            self.infoPanel.setFileInfo(file_data, self.current_path)
-        except Exception as e:
-            print(f"Error in setSelectedFile for {file_data.name}: {e}")
-            self.currentIndex = -1
-            self.infoPanel.clearFileInfo()
+        """ Selects a file and updates the info panel. """
+        index = next((i for i, fd in enumerate(self.files_data) if fd is file_data), -1)
+        if index == -1:
+            self._clear_selection()
+            return
+        self.currentIndex = index
+        row = self.fileModel.rowOf(index)
+        if row >= 0:
+            self.fileView.setCurrentIndex(self.fileModel.index(row))
+        # Pass current_path to infoPanel for dynamic path display
+        self.infoPanel.setFileInfo(file_data, self.current_path)
+
+    def _on_current_changed(self, current, previous):
+        """ 点击或键盘移动了视图中的当前项 """
+        if current.isValid() and self.fileModel.fileIndex(current.row()) != self.currentIndex:
+            self.setSelectedFile(self.files_data[self.fileModel.fileIndex(current.row())])
+
+    def _clear_selection(self):
+        self.currentIndex = -1
+        self.fileView.selectionModel().clear()
+        self.infoPanel.clearFileInfo()
 
     def handleDoubleClick(self, file_data: FileData):
         """ Handles double-click event on a file/directory icon. """
-        _, is_directory_for_action = FileIcon._determine_icon_and_type(file_data.name, file_data.access)
+        _, is_directory_for_action = FileIconDelegate._determine_icon_and_type(file_data.name, file_data.access)
 
         if is_directory_for_action:
             self.searchLineEdit.clear()  # 清空搜索框
@@ -553,48 +629,18 @@ class Explorer(QWidget):
 
     def search(self, keyWord: str):
         # 清除当前选中项和信息面板
-        if self.currentIndex >= 0 and self.currentIndex < len(self.cards):
-            self.cards[self.currentIndex].setSelected(False)
-            self.currentIndex = -1
-            self.infoPanel.clearFileInfo()
-        # 清空布局中的所有小部件
-        self.flowLayout.removeAllWidgets()
-
+        self._clear_selection()
         if not keyWord:  # 如果搜索关键词为空，则显示所有文件
             self.showAllFiles()
             return
         # 使用修改后的 Trie 进行搜索，关键词转小写由 Trie 内部处理
         items_indices = self.trie.items(keyWord)
-        indexes_to_show = {i[1] for i in items_indices}
-        # 遍历所有卡片，只添加匹配的卡片到布局中
-        for i, card in enumerate(self.cards):
-            if i in indexes_to_show:
-                card.setVisible(True)
-                self.flowLayout.addWidget(card)
-            else:
-                card.setVisible(False)  # 确保不匹配的卡片被隐藏
-        # 强制更新布局
-        self.flowLayout.update()
-        self.scrollWidget.update()
-        self.view.update()
-        self.update()
+        self.fileModel.setFilter(sorted({i[1] for i in items_indices}))  # 只显示匹配的条目，保持原来的顺序
 
     def showAllFiles(self):
         # 清除当前选中项和信息面板
-        if self.currentIndex >= 0 and self.currentIndex < len(self.cards):
-            self.cards[self.currentIndex].setSelected(False)
-            self.currentIndex = -1
-            self.infoPanel.clearFileInfo()
-
-        self.flowLayout.removeAllWidgets()  # 清空布局中的所有小部件
-        for card in self.cards:  # 重新添加所有卡片到布局中，并确保它们可见
-            card.setVisible(True)
-            self.flowLayout.addWidget(card)
-
-        self.flowLayout.update()  # 强制更新布局
-        self.scrollWidget.update()
-        self.view.update()
-        self.update()
+        self._clear_selection()
+        self.fileModel.setFilter(None)
 
     def go_up_directory(self):
         if self.current_path == "~" or self.current_path == "/":
@@ -603,3 +649,94 @@ class Explorer(QWidget):
 
         new_path = Explorer._get_item_logical_path(self.current_path, "..")
         self.load_files(new_path)
+
+    def import_directory(self):
+        """把选中的主机文件夹导入到当前目录下的同名目录。"""
+        host_dir = QFileDialog.getExistingDirectory(self, "导入文件夹")
+        if not host_dir:
+            return
+        name = os.path.basename(os.path.normpath(host_dir))
+        reason = invalid_name(name)
+        if reason:
+            self._show_infobar("无法导入", f"'{name}' 不能用作目录名：{reason}", InfoBarPosition.TOP)
+            return
+        destination = f"{self.current_path.lstrip('~').rstrip('/')}/{name}" # Explorer 的路径以 ~ 表示根目录
+        self._start_transfer(self.terminal_manager.run_import(host_dir, destination), "导入", name)
+
+    def show_export_menu(self):
+        self.exportMenu.exec(self.exportButton.mapToGlobal(self.exportButton.rect().bottomLeft()))
+
+    def _export_source(self) -> str:
+        """选中的目录，没有选中目录时是当前目录。"""
+        path = self.current_path
+        if 0 <= self.currentIndex < len(self.files_data):
+            file_data = self.files_data[self.currentIndex]
+            _, is_directory = FileIconDelegate._determine_icon_and_type(file_data.name, file_data.access)
+            if is_directory and file_data.name not in (".", ".."):
+                path = Explorer._get_item_logical_path(self.current_path, file_data.name)
+        return path.lstrip('~') or "/"
+
+    def export_directory(self, archive: bool):
+        """把选中的目录（或当前目录）导出到主机上的文件夹或 tar 归档。"""
+        source = self._export_source()
+        name = os.path.basename(source.rstrip('/')) or "OSFileSystem"
+        if archive:
+            destination, _ = QFileDialog.getSaveFileName(self, "导出为 tar 归档", f"{name}.tar.gz",
+                                                         "Tar 归档 (*.tar *.tar.gz *.tgz *.tar.bz2 *.tar.xz)")
+            if not destination:
+                return
+            if tar_compression(destination) is None:
+                destination += ".tar"
+        else:
+            host_dir = QFileDialog.getExistingDirectory(self, "导出到文件夹")
+            if not host_dir:
+                return
+            destination = os.path.join(host_dir, name)
+            if os.path.exists(destination):
+                self._show_infobar("无法导出", f"'{destination}' 已存在", InfoBarPosition.TOP)
+                return
+        self._start_transfer(self.terminal_manager.run_export(source, destination), "导出", name)
+
+    def _start_transfer(self, runner, action: str, name: str):
+        if runner is None:
+            return
+        self.transfer_runner = runner
+        self._transfer_action = action
+        runner.progress.connect(self._on_transfer_progress)
+        runner.finished.connect(self._on_transfer_finished)
+        self.transferProgressBar.setValue(0)
+        self.transferLabel.setText(f"正在{action} {name}...")
+        self._set_transfer_widgets_visible(True)
+
+    def cancel_transfer(self):
+        if self.transfer_runner is not None:
+            self.transfer_runner.cancel()
+
+    def _set_transfer_widgets_visible(self, visible: bool):
+        self.transferLabel.setVisible(visible)
+        self.transferProgressBar.setVisible(visible)
+        self.transferCancelButton.setVisible(visible)
+        self.importButton.setEnabled(not visible)
+        self.exportButton.setEnabled(not visible)
+
+    def _on_transfer_progress(self, stats):
+        if stats.bytes_total:
+            self.transferProgressBar.setValue(int(1000 * stats.bytes_done / stats.bytes_total))
+        elif stats.files_total:
+            self.transferProgressBar.setValue(int(1000 * stats.files_done / stats.files_total))
+        self.transferLabel.setText(f"{stats.files_done}/{stats.files_total} 个文件  {stats.throughput / 1024 / 1024:.1f} MB/s")
+
+    def _on_transfer_finished(self, success: bool):
+        stats = self.transfer_runner.stats
+        action = self._transfer_action
+        self.transfer_runner = None
+        self._set_transfer_widgets_visible(False)
+        summary = f"{stats.files_done} 个文件，{stats.directories} 个目录，{stats.bytes_done / 1024 / 1024:.1f} MB，用时 {stats.elapsed:.2f} 秒"
+        if stats.skipped:
+            summary += f"，跳过 {len(stats.skipped)} 项（例如 {os.path.basename(stats.skipped[0][0])}：{stats.skipped[0][1]}）"
+        if stats.cancelled:
+            self._show_infobar(f"{action}已取消", summary, InfoBarPosition.TOP)
+        elif stats.errors:
+            self._show_infobar(f"{action}出错", f"{stats.errors[0][0]}：{stats.errors[0][1]}（共 {len(stats.errors)} 个错误）。{summary}", InfoBarPosition.TOP)
+        else:
+            self._show_infobar(f"{action}完成", summary, InfoBarPosition.TOP)
@@ -1,6 +1,6 @@
 import os
 
-from PySide6.QtCore import QSize, QEventLoop, QTimer
+from PySide6.QtCore import QSize, QTimer
 from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import QFrame, QVBoxLayout, QWidget
 
@@ -10,19 +10,33 @@ from qfluentwidgets import setTheme, SplashScreen
 from qfluentwidgets import Theme
 from qfluentwidgets import FluentIcon as FIF
 
+from api import APIPool, tracer
+
+from .config import load_config
 from .home import Home
-from .terminal import Terminal
-from .explorer import Explorer
-from .editor import Editor
-from .about import About
-from .setting import Setting
+from .startup import startup_timer
+from .watchdog import start_watchdog
 
 class Widget(QFrame):
-    def __init__(self, text: str, parent=None):
+    """ Navigation placeholder, the real interface is built by factory on first show """
+    def __init__(self, text: str, factory, parent=None):
         super().__init__(parent=parent)
-        ...
+        self.factory = factory
+        self.interface = None
+        self.vBoxLayout = QVBoxLayout(self)
+        self.vBoxLayout.setContentsMargins(0, 0, 0, 0)
         self.setObjectName(text.replace(' ', '-'))
 
+    def ensureInterface(self) -> QWidget:
+        if self.interface is None:
+            self.interface = self.factory(self)
+            self.vBoxLayout.addWidget(self.interface)
+        return self.interface
+
+    def showEvent(self, e):
+        self.ensureInterface()
+        super().showEvent(e)
+
 class GUI(FluentWindow):
     def __init__(self):
         super().__init__()
@@ -30,32 +44,80 @@ class GUI(FluentWindow):
         self.splashScreen = SplashScreen(self.windowIcon(), self)
         self.splashScreen.setIconSize(QSize(210, 210))
         self.show()
-        self.createSubInterface()
+        startup_timer.mark("init window")
 
         self.compiler = None
+        config_data = load_config()
+        self.processPool = APIPool("app", config_data.get("backendPoolSize", 1), self, config_data.get("backendDaemon") or None)
 
         self.homeInterface     = Home("Home Interface", self)
-        self.terminalInterface = Terminal('Terminal Interface', self)
-        self.explorerInterface = Explorer('Explorer Interface', self.terminalInterface, self)
-        self.editor            = Editor('Editor Interface', self)
-        self.aboutInterface    = About('About Interface', self)
-        self.settingInterface  = Setting('Setting Interface', self)
-
-        self.terminalInterface.editorContentReady.connect(self._handle_editor_content_ready)
-        self.editor.saveFileRequested.connect(self.terminalInterface.save_file_content_from_editor)
-        self.terminalInterface.editorSaveComplete.connect(self.editor._handle_save_complete)
+        startup_timer.mark("home interface")
+        # 其余界面在第一次切换到时才创建，Terminal 的后端进程也随之延后启动
+        self.terminalHost      = Widget('Terminal Interface', self._create_terminal, self)
+        self.explorerHost      = Widget('Explorer Interface', self._create_explorer, self)
+        self.editorHost        = Widget('Editor Interface', self._create_editor, self)
+        self.aboutHost         = Widget('About Interface', self._create_about, self)
+        self.settingHost       = Widget('Setting Interface', self._create_setting, self)
 
         self.initNavigation()
-        self.splashScreen.finish()
+        startup_timer.mark("navigation")
+        self.createSubInterface()
+
+    @property
+    def terminalInterface(self):
+        return self.terminalHost.ensureInterface()
+
+    @property
+    def explorerInterface(self):
+        return self.explorerHost.ensureInterface()
+
+    @property
+    def editor(self):
+        return self.editorHost.ensureInterface()
+
+    @property
+    def aboutInterface(self):
+        return self.aboutHost.ensureInterface()
+
+    @property
+    def settingInterface(self):
+        return self.settingHost.ensureInterface()
+
+    def _create_terminal(self, host: QWidget):
+        from .terminal import Terminal
+        terminal = Terminal('Terminal Interface', host, self.processPool)
+        terminal.editorContentReady.connect(self._handle_editor_content_ready)
+        terminal.editorSaveComplete.connect(self._handle_editor_save_complete)
+        return terminal
+
+    def _create_explorer(self, host: QWidget):
+        from .explorer import Explorer
+        explorer = Explorer('Explorer Interface', self.terminalInterface, host)
+        explorer.load_if_logged_in() # 登录时的 requestExplorerRefresh 早于 Explorer 创建，没有接收者
+        return explorer
+
+    def _create_editor(self, host: QWidget):
+        from .editor import Editor
+        editor = Editor('Editor Interface', host)
+        editor.saveFileRequested.connect(self._handle_save_file_requested)
+        return editor
+
+    def _create_about(self, host: QWidget):
+        from .about import About
+        return About('About Interface', host)
+
+    def _create_setting(self, host: QWidget):
+        from .setting import Setting
+        return Setting('Setting Interface', host)
 
     def initNavigation(self):
         self.addSubInterface(self.homeInterface, FIF.HOME, '主页 Home')
-        self.addSubInterface(self.terminalInterface, FIF.CONNECT, '终端管理器 Teriminal Manager')
-        self.addSubInterface(self.explorerInterface, FIF.CALENDAR, '资源管理器 File Explorer')
-        self.addSubInterface(self.editor, FIF.EDIT, '文本编辑器 Editor')
+        self.addSubInterface(self.terminalHost, FIF.CONNECT, '终端管理器 Teriminal Manager')
+        self.addSubInterface(self.explorerHost, FIF.CALENDAR, '资源管理器 File Explorer')
+        self.addSubInterface(self.editorHost, FIF.EDIT, '文本编辑器 Editor')
 
-        self.addSubInterface(self.aboutInterface, FIF.PEOPLE, '关于 About', NavigationItemPosition.BOTTOM)
-        self.addSubInterface(self.settingInterface, FIF.SETTING, '设置 Settings', NavigationItemPosition.BOTTOM)
+        self.addSubInterface(self.aboutHost, FIF.PEOPLE, '关于 About', NavigationItemPosition.BOTTOM)
+        self.addSubInterface(self.settingHost, FIF.SETTING, '设置 Settings', NavigationItemPosition.BOTTOM)
 
     def initWindow(self):
         setTheme(Theme.DARK)
@@ -65,9 +127,14 @@ class GUI(FluentWindow):
         self.showMaximized()
 
     def createSubInterface(self):
-        loop = QEventLoop(self)
-        QTimer.singleShot(618, loop.quit)
-        loop.exec()
+        QTimer.singleShot(0, self._finish_startup) # 事件循环绘制完第一帧后立即结束启动画面
+
+    def _finish_startup(self):
+        self.splashScreen.finish()
+        startup_timer.mark("first frame")
+        startup_timer.print_report()
+        self.processPool.fill() # 第一帧之后再预热后端进程，打开终端时直接取用
+        self.watchdog = start_watchdog(self) # 仅在 OSFM_WATCHDOG 或设置开启时运行
 
     def setupUI(self):
         self.setMinimumWidth(800)
@@ -75,6 +142,13 @@ class GUI(FluentWindow):
 
     def _handle_editor_content_ready(self, file_path: str, content: str, success: bool, error_message: str):
         if success:
-            self.editor.load_content(file_path, content)
+            with tracer.stage("editor.load"):
+                self.editor.load_content(file_path, content)
         else:
             self.terminalInterface.warning(f"加载文件失败", error_message)
+
+    def _handle_editor_save_complete(self, file_path: str, success: bool, error_message: str):
+        self.editor._handle_save_complete(file_path, success, error_message)
+
+    def _handle_save_file_requested(self, file_path: str, content: str):
+        self.terminalInterface.save_file_content_from_editor(file_path, content)
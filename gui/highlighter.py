@@ -1,4 +1,7 @@
+import queue
 import re
+
+from PySide6.QtCore import QCoreApplication, QThread, Signal
 from PySide6.QtGui import QSyntaxHighlighter, QTextCharFormat, QColor, QFont
 
 SHELL_COMMANDS = [
@@ -13,12 +16,13 @@ SHELL_COMMANDS = [
     'help', 'rmdir', 'touch'
 ]
 
+PROMPT_SCAN_LIMIT = 256 # 提示符只会出现在行首，匹配时最多检查这么多字符
+MAX_HIGHLIGHT_LENGTH = 2000 # 单个块的高亮长度上限，超出部分不再扫描
+
 class Highlighter(QSyntaxHighlighter):
     def __init__(self, parent=None):
         super().__init__(parent)
 
-        self.highlighting_rules = []
-
         # 提示符 (Prompt)
         self.prompt_user_host_color = QColor("#50fa7b")  # 亮绿色 (Dracula theme-like)
         self.prompt_path_color = QColor("#8be9fd")       # 青蓝色 (Dracula theme-like)
@@ -41,57 +45,272 @@ class Highlighter(QSyntaxHighlighter):
         comment_format = QTextCharFormat()
         comment_format.setForeground(QColor("#6272a4")) # 紫灰色 (Dracula theme-like)
         comment_format.setFontItalic(True)
-        self.highlighting_rules.append((re.compile(r"#.*$"), comment_format))
 
         # 字符串 (Strings)
         string_format = QTextCharFormat()
         string_format.setForeground(QColor("#f1fa8c")) # 黄色 (Dracula theme-like)
-        self.highlighting_rules.append((re.compile(r"'[^']*'"), string_format))
-        self.highlighting_rules.append((re.compile(r'"[^"]*"'), string_format))
 
         # 命令 (Keywords)
         command_format = QTextCharFormat()
         command_format.setForeground(QColor("#8be9fd")) # 青色 (Dracula theme-like)
         command_format.setFontWeight(QFont.Bold)
-        command_pattern = r"\b(" + "|".join(SHELL_COMMANDS) + r")\b"
-        self.highlighting_rules.append((re.compile(command_pattern), command_format))
 
         # 选项/标志 (Options/Flags)
         option_format = QTextCharFormat()
         option_format.setForeground(QColor("#ff79c6")) # 粉色 (Dracula theme-like)
-        self.highlighting_rules.append((re.compile(r"(?<!\w)(-{1,2}[\w-]+)"), option_format))
 
         # 数字 (Numbers)
         number_format = QTextCharFormat()
         number_format.setForeground(QColor("#bd93f9")) # 紫色 (Dracula theme-like)
-        self.highlighting_rules.append((re.compile(r"\b\d+(\.\d+)?\b"), number_format))
 
         # 操作符 (Operators)
         operator_format = QTextCharFormat()
         operator_format.setForeground(QColor("#ffb86c")) # 橙色 (Dracula theme-like)
         operator_format.setFontWeight(QFont.Bold)
-        self.highlighting_rules.append((re.compile(r"(\|\||&&|\||&|;|>|<)"), operator_format))
 
         # Shell Variables (e.g., $VAR, ${VAR_NAME})
         variable_format = QTextCharFormat()
         variable_format.setForeground(QColor("#50fa7b"))
         variable_format.setFontItalic(True)
-        self.highlighting_rules.append((re.compile(r"\$[a-zA-Z_]\w*|\$\{[^}]+\}"), variable_format))
+
+        # 所有规则合并成一个带命名分组的正则，每个块只扫描一遍；同一位置按这里的顺序优先匹配
+        command_pattern = r"\b(?:" + "|".join(sorted(SHELL_COMMANDS, key=len, reverse=True)) + r")\b"
+        self.token_regex = re.compile(
+            r"(?P<string>'[^']*'|\"[^\"]*\")"
+            r"|(?P<comment>#.*$)"
+            r"|(?P<variable>\$[a-zA-Z_]\w*|\$\{[^}]+\})"
+            r"|(?P<command>" + command_pattern + r")"
+            r"|(?P<option>(?<!\w)-{1,2}[\w-]+)"
+            r"|(?P<number>\b\d+(?:\.\d+)?\b)"
+            r"|(?P<operator>\|\||&&|\||&|;|>|<)"
+        )
+        self.token_formats = {
+            "string": string_format,
+            "comment": comment_format,
+            "variable": variable_format,
+            "command": command_format,
+            "option": option_format,
+            "number": number_format,
+            "operator": operator_format,
+        }
+
+    def highlightBlock(self, text: str):
+        # 只有 "提示符 + 命令" 的行才需要高亮；后端输出（如 cat 的大段内容）直接跳过，代价与输出长度无关
+        prompt_match = self.prompt_regex.match(text, 0, PROMPT_SCAN_LIMIT)
+        if not prompt_match:
+            return
+        start = prompt_match.start('user_host') # 应用绿色到 user@host 部分
+        end = prompt_match.end('user_host')
+        self.setFormat(start, end - start, self.prompt_user_host_format)
+        start = prompt_match.start('path') # 应用蓝色到路径部分
+        end = prompt_match.end('path')
+        self.setFormat(start, end - start, self.prompt_path_format)
+        prompt_end_offset = prompt_match.end() # 整个提示符的结束位置，用于后续规则的起始点
+
+        scan_end = min(len(text), MAX_HIGHLIGHT_LENGTH) # 超长的命令行只高亮开头部分
+        for match in self.token_regex.finditer(text, prompt_end_offset, scan_end):
+            start, end = match.span()
+            self.setFormat(start, end - start, self.token_formats[match.lastgroup])
+
+
+def _char_format(color: str, bold: bool = False, italic: bool = False) -> QTextCharFormat:
+    char_format = QTextCharFormat()
+    char_format.setForeground(QColor(color))
+    if bold:
+        char_format.setFontWeight(QFont.Bold)
+    if italic:
+        char_format.setFontItalic(True)
+    return char_format
+
+
+class TokenizeWorker(QThread):
+    """ Background thread that tokenizes snapshots of document lines for EditorHighlighter """
+    tokensReady = Signal() # 有新的分词结果可以通过 take_results 取出
+
+    BATCH_LINES = 2000 # 每批回传的行数，批与批之间检查是否有更新的任务
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._jobs = queue.Queue()
+        self._results = queue.Queue() # (generation, 起始块号, spans 列表, 块末状态列表, 是否已完成)
+        app = QCoreApplication.instance()
+        if app:
+            app.aboutToQuit.connect(self.stop)
+
+    def submit(self, generation: int, tokenizer, first: int, lines: tuple, old_states: tuple, entry_state: int, min_end: int):
+        """ lines/old_states 为从 first 开始的快照；min_end 之前的块一定重新分词，之后在状态不变处提前结束 """
+        self._jobs.put((generation, tokenizer, first, lines, old_states, entry_state, min_end))
+
+    def take_results(self) -> list:
+        results = []
+        while not self._results.empty():
+            results.append(self._results.get_nowait())
+        return results
+
+    def _emit(self, *result):
+        self._results.put(result)
+        self.tokensReady.emit()
+
+    def stop(self):
+        if self.isRunning():
+            self._jobs.put(None)
+            self.wait()
+
+    def run(self):
+        while True:
+            job = self._jobs.get()
+            while job is not None and not self._jobs.empty(): # 只处理最新的任务，旧任务已过期
+                job = self._jobs.get_nowait()
+            if job is None:
+                return
+            self._tokenize(*job)
+
+    def _tokenize(self, generation, tokenizer, first, lines, old_states, state, min_end):
+        spans_batch, states_batch = [], []
+        batch_first = first
+        for offset, text in enumerate(lines):
+            spans, state = tokenizer.tokenize_line(text[:MAX_HIGHLIGHT_LENGTH], state)
+            spans_batch.append(spans)
+            states_batch.append(state)
+            if first + offset >= min_end and old_states[offset] == state: # 后续块的状态不受影响，无需继续
+                break
+            if len(spans_batch) >= self.BATCH_LINES:
+                self._emit(generation, batch_first, spans_batch, states_batch, False)
+                batch_first += len(spans_batch)
+                spans_batch, states_batch = [], []
+                if not self._jobs.empty(): # 有新的编辑，放弃当前任务，由新任务接着处理
+                    return
+        self._emit(generation, batch_first, spans_batch, states_batch, True)
+
+
+class EditorHighlighter(QSyntaxHighlighter):
+    """ Applies per-block spans produced by a pluggable tokenizer on a TokenizeWorker thread """
+    SYNC_LINES = 32 # 小范围编辑直接在 GUI 线程分词，避免闪烁
+
+    def __init__(self, document):
+        super().__init__(None)
+        self.tokenizer = None # None 表示纯文本
+        self.generation = 0
+        self._lines = [] # 文档各块文本的镜像，worker 只读取它的快照
+        self._spans = [] # 每块的 (start, length, kind) 缓存，None 表示尚未分词
+        self._states = [] # 每块结束时的分词状态
+        self._pending_from = None # 仍在 worker 中处理的第一个块号
+
+        self.token_formats = {
+            "keyword": _char_format("#8be9fd", bold=True),
+            "string": _char_format("#f1fa8c"),
+            "comment": _char_format("#6272a4", italic=True),
+            "number": _char_format("#bd93f9"),
+            "decorator": _char_format("#50fa7b", italic=True),
+            "constant": _char_format("#ff79c6"),
+            "preprocessor": _char_format("#ffb86c", bold=True),
+        }
+
+        self.worker = TokenizeWorker(self)
+        self.worker.tokensReady.connect(self._apply_tokens)
+        self.worker.start()
+        # 先于 QSyntaxHighlighter 自身连接 contentsChange，保证它重新高亮时镜像已是最新
+        document.contentsChange.connect(self._on_contents_change)
+        self.setDocument(document)
+        self._reset_cache()
+
+    def set_tokenizer(self, tokenizer):
+        had_formats = self.tokenizer is not None
+        self.tokenizer = tokenizer
+        self._reset_cache()
+        if tokenizer is None and had_formats:
+            self.rehighlight()
+
+    def _reset_cache(self):
+        block = self.document().firstBlock()
+        self._lines = []
+        while block.isValid():
+            self._lines.append(block.text())
+            block = block.next()
+        self._pending_from = None
+        self.generation += 1
+        if self.tokenizer is None: # 纯文本：所有块都没有格式
+            self._spans = [[] for _ in self._lines]
+            self._states = [0] * len(self._lines)
+            return
+        self._spans = [None] * len(self._lines)
+        self._states = [None] * len(self._lines)
+        self._submit(0, 0, len(self._lines))
+
+    def _submit(self, start: int, entry_state: int, min_end: int):
+        self.generation += 1
+        self._pending_from = start
+        self.worker.submit(self.generation, self.tokenizer, start, tuple(self._lines[start:]),
+                           tuple(self._states[start:]), entry_state, min_end)
+
+    def _on_contents_change(self, position: int, removed: int, added: int):
+        document = self.document()
+        first_block = document.findBlock(position)
+        first = first_block.blockNumber()
+        end_position = min(position + added, document.characterCount() - 1)
+        new_last = document.findBlock(end_position).blockNumber()
+        delta = document.blockCount() - len(self._lines)
+        old_last = new_last - delta
+        if first < 0 or new_last < first or old_last < first - 1:
+            self._reset_cache()
+            return
+
+        old_end_state = self._states[old_last] if first <= old_last < len(self._states) else None
+        texts = []
+        block = first_block
+        for _ in range(first, new_last + 1):
+            texts.append(block.text())
+            block = block.next()
+        self._lines[first:old_last + 1] = texts
+        if self.tokenizer is None:
+            self._spans[first:old_last + 1] = [[] for _ in texts]
+            self._states[first:old_last + 1] = [0] * len(texts)
+            return
+        self._spans[first:old_last + 1] = [None] * len(texts)
+        self._states[first:old_last + 1] = [None] * len(texts)
+
+        if self._pending_from is not None:
+            if self._pending_from > old_last:
+                self._pending_from += delta
+            else:
+                self._pending_from = min(self._pending_from, first)
+
+        entry_state = self._states[first - 1] if first > 0 else 0
+        if self._pending_from is not None or entry_state is None:
+            start = first if self._pending_from is None else self._pending_from
+            self._submit(start, (self._states[start - 1] if start > 0 else 0) or 0, new_last + 1)
+            return
+        if len(texts) > self.SYNC_LINES:
+            self._submit(first, entry_state, new_last + 1)
+            return
+
+        state = entry_state # 小范围编辑：同步分词，状态链延续时再交给 worker
+        for offset, text in enumerate(texts):
+            self._spans[first + offset], state = self.tokenizer.tokenize_line(text[:MAX_HIGHLIGHT_LENGTH], state)
+            self._states[first + offset] = state
+        if state != old_end_state and new_last + 1 < len(self._lines):
+            self._submit(new_last + 1, state, new_last + 2)
+
+    def _apply_tokens(self):
+        for result in self.worker.take_results():
+            self._apply_result(*result)
+
+    def _apply_result(self, generation: int, first: int, spans_list: list, states_list: list, finished: bool):
+        if generation != self.generation: # 结果对应的文档已被编辑过
+            return
+        block = self.document().findBlockByNumber(first)
+        for offset, spans in enumerate(spans_list):
+            index = first + offset
+            self._states[index] = states_list[offset]
+            if self._spans[index] != spans:
+                self._spans[index] = spans
+                self.rehighlightBlock(block)
+            block = block.next()
+        self._pending_from = None if finished else first + len(spans_list)
 
     def highlightBlock(self, text: str):
-        prompt_match = self.prompt_regex.match(text)
-        prompt_end_offset = 0 # 默认没有提示符
-        if prompt_match:
-            start = prompt_match.start('user_host') # 应用绿色到 user@host 部分
-            end = prompt_match.end('user_host')
-            self.setFormat(start, end - start, self.prompt_user_host_format)
-            start = prompt_match.start('path') # 应用蓝色到路径部分
-            end = prompt_match.end('path')
-            self.setFormat(start, end - start, self.prompt_path_format)
-            prompt_end_offset = prompt_match.end() # 整个提示符的结束位置，用于后续规则的起始点
-        for pattern, char_format in self.highlighting_rules:
-            for match in pattern.finditer(text):
-                start, end = match.span()
-                # 确保匹配项在提示符的结束位置之后才应用高亮
-                if start >= prompt_end_offset:
-                    self.setFormat(start, end - start, char_format)
\ No newline at end of file
+        index = self.currentBlock().blockNumber()
+        if index >= len(self._spans) or self._lines[index] != text:
+            return
+        for start, length, kind in self._spans[index] or ():
+            self.setFormat(start, length, self.token_formats[kind])
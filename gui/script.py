@@ -0,0 +1,205 @@
+import re
+import time
+
+from PySide6.QtCore import QObject, Signal
+
+from api.trace import tracer
+
+SHELL_PROMPT = re.compile(r"OSFileSystem@[\w\.-]+:.*?\$\s")
+LEADING_PROMPT = re.compile(r"^OSFileSystem@[\w\.-]+:.*?\$\s?") # 从终端历史里选中的行会带着提示符
+PROMPT_TAIL_LENGTH = 256 # 提示符可能被拆成多段输出，缓冲区末尾这么多字符暂不显示
+ERROR_HEAD_LENGTH = 200
+
+# 会再次读取输入（密码、确认、write 的分段内容）或离开 Shell 的命令，后面已经写入的命令会被它们读走，不能流水线发送；
+# batch 会读走直到 end 的所有行却只返回一个提示符，同样不能按行对应
+INTERACTIVE_COMMANDS = {"sudo", "passwd", "mkuser", "format", "logout", "exit", "vim", "batch", "write"}
+LIST_SEPARATOR = re.compile(r';|&&')
+
+class ScriptCommand:
+    """ One line of a script and what happened to it """
+    def __init__(self, line_number: int, text: str):
+        self.line_number = line_number
+        self.text = text
+        self.name = text.split(maxsplit=1)[0]
+        self.names = {part.split()[0] for part in LIST_SEPARATOR.split(text) if part.split()} # 一行中用 ; 或 && 连接的所有命令
+        self.sent_at = None
+        self.started_at = None # 后端开始处理的时刻：发送时刻与上一条命令完成时刻中较晚的一个
+        self.finished_at = None
+        self.output_head = "" # 输出的开头，用来判断是否出错
+        self.output_bytes = 0
+        self.error = None
+        self.after_stop = False # 出错停止时已经写入后端、仍然被执行的命令
+
+    @property
+    def seconds(self):
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    def to_dict(self) -> dict:
+        return {
+            "line": self.line_number,
+            "command": self.text,
+            "ms": None if self.seconds is None else round(self.seconds * 1000, 3),
+            "output_bytes": self.output_bytes,
+            "error": self.error,
+            "after_stop": self.after_stop,
+        }
+
+
+def parse_script(text: str) -> list:
+    """ Script lines to ScriptCommand, skipping blank lines and # comments """
+    commands = []
+    for line_number, line in enumerate(text.splitlines(), 1):
+        line = LEADING_PROMPT.sub("", line.strip()).strip()
+        if line and not line.startswith("#"):
+            commands.append(ScriptCommand(line_number, line))
+    return commands
+
+def interactive_commands(commands: list) -> list:
+    return [command for command in commands if command.names & INTERACTIVE_COMMANDS]
+
+def command_error(command: ScriptCommand) -> str:
+    """ The backend reports a failed command as a `<command>: ...` line """
+    prefixes = tuple(f"{name}: " for name in command.names) + ("syntax error: ",)
+    for line in command.output_head.split("\n"):
+        if line.startswith(prefixes):
+            return line
+    return None
+
+
+class ScriptRunner(QObject):
+    """
+    Runs a list of commands on one backend with up to `depth` commands written ahead.
+    Responses are split at shell prompts: every prompt completes the oldest command in flight.
+    With stop_on_error, nothing more is sent after a failed command; commands already in flight
+    still run and are marked after_stop.
+    """
+    progress = Signal(int, int) # 已完成, 总数
+    finished = Signal(bool) # 全部成功为 True
+
+    def __init__(self, api, commands: list, depth: int = 16, stop_on_error: bool = True, parent=None):
+        super().__init__(parent)
+        self.api = api
+        self.commands = commands
+        self.depth = max(1, depth)
+        self.stop_on_error = stop_on_error
+        self.next_index = 0
+        self.in_flight = []
+        self.completed = 0
+        self.failed = []
+        self.stopped = False
+        self.done = False
+        self.started_at = None
+        self.finished_at = None
+        self._buffer = ""
+
+    def start(self) -> str:
+        """ Writes the first batch and returns the echo of the first command for the terminal """
+        self.started_at = time.perf_counter()
+        self._fill()
+        return self.in_flight[0].text + "\n" if self.in_flight else ""
+
+    def _fill(self):
+        while not self.stopped and self.next_index < len(self.commands) and len(self.in_flight) < self.depth:
+            command = self.commands[self.next_index]
+            self.next_index += 1
+            command.sent_at = time.perf_counter()
+            if not self.in_flight:
+                command.started_at = command.sent_at
+            self.in_flight.append(command)
+            self.api.send_input_to_app(command.text, trace=False) # 流水线中的命令由这里计时，不走逐条的 tracer.begin
+
+    def feed(self, output: str) -> str:
+        """ Takes backend stdout, returns the text to show: output with each command echoed after its prompt """
+        if self.done:
+            return output
+        self._buffer += output
+        display = []
+        position = 0
+        for match in SHELL_PROMPT.finditer(self._buffer):
+            self._add_output(self._buffer[position:match.start()])
+            display.append(self._buffer[position:match.end()])
+            position = match.end()
+            self._complete_current()
+            if self.in_flight:
+                display.append(self.in_flight[0].text + "\n")
+        self._buffer = self._buffer[position:]
+        flush_length = len(self._buffer) - PROMPT_TAIL_LENGTH
+        if flush_length > 0: # 长输出不必等到提示符出现才显示，只留下末尾可能是半个提示符的部分
+            self._add_output(self._buffer[:flush_length])
+            display.append(self._buffer[:flush_length])
+            self._buffer = self._buffer[flush_length:]
+        if self.done:
+            display.append(self._buffer)
+            self._buffer = ""
+        return "".join(display)
+
+    def _add_output(self, text: str):
+        if not text or not self.in_flight:
+            return
+        command = self.in_flight[0]
+        command.output_bytes += len(text.encode('utf-8'))
+        if len(command.output_head) < ERROR_HEAD_LENGTH:
+            command.output_head = (command.output_head + text)[:ERROR_HEAD_LENGTH]
+
+    def _complete_current(self):
+        if not self.in_flight:
+            return
+        command = self.in_flight.pop(0)
+        command.finished_at = time.perf_counter()
+        tracer.add_sample(f"script:{command.name}", command.seconds)
+        if self.in_flight:
+            self.in_flight[0].started_at = max(self.in_flight[0].sent_at, command.finished_at)
+        self.completed += 1
+        command.error = command_error(command)
+        if command.error is not None:
+            self.failed.append(command)
+            if self.stop_on_error and not self.stopped:
+                self.stopped = True
+                for pending in self.in_flight:
+                    pending.after_stop = True
+        else:
+            self._fill()
+        self.progress.emit(self.completed, len(self.commands))
+        if not self.in_flight and (self.stopped or self.next_index >= len(self.commands)):
+            self._finish()
+
+    def cancel(self):
+        """ Sends nothing more; finishes once the commands already in flight have completed """
+        self.stopped = True
+        if not self.in_flight:
+            self._finish()
+
+    def abort(self):
+        """ The backend is gone, finish now """
+        self.stopped = True
+        self.in_flight.clear()
+        self._finish()
+
+    def _finish(self):
+        if self.done:
+            return
+        self.done = True
+        self.finished_at = time.perf_counter()
+        self.finished.emit(not self.failed and self.completed == len(self.commands))
+
+    @property
+    def wall_seconds(self) -> float:
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return 0.0 if self.started_at is None else end - self.started_at
+
+    def slowest(self):
+        timed = [command for command in self.commands if command.seconds is not None]
+        return max(timed, key=lambda command: command.seconds) if timed else None
+
+    def report(self) -> dict:
+        return {
+            "commands": len(self.commands),
+            "completed": self.completed,
+            "failed": len(self.failed),
+            "depth": self.depth,
+            "stop_on_error": self.stop_on_error,
+            "wall_seconds": round(self.wall_seconds, 4),
+            "results": [command.to_dict() for command in self.commands],
+        }
@@ -1,10 +1,114 @@
-from PySide6.QtWidgets import QApplication, QFrame
+from PySide6.QtCore import Qt, QTimer
+from PySide6.QtWidgets import QApplication, QFrame, QVBoxLayout, QHBoxLayout, QFileDialog, QTableWidgetItem
+
+from qfluentwidgets import SubtitleLabel, BodyLabel, PushButton, TableWidget, InfoBar, InfoBarPosition
+from qfluentwidgets import FluentIcon as FIF
+
+from api import tracer
 
 class Setting(QFrame):
+    METRIC_COLUMNS = [
+        ("name", "类型 Type"), ("count", "次数 Count"), ("mean_ms", "Mean ms"), ("p50_ms", "p50 ms"),
+        ("p95_ms", "p95 ms"), ("p99_ms", "p99 ms"), ("max_ms", "Max ms"),
+        ("first_byte_ms", "首字节 First byte ms"), ("bytes_received", "字节 Bytes")
+    ]
+
     def __init__(self, text: str, parent=None):
         super().__init__(parent=parent)
+        self.refreshTimer = QTimer(self)
+        self.refreshTimer.setInterval(1000) # 界面可见时每秒刷新一次
+        self.refreshTimer.timeout.connect(self.refreshMetrics)
         self.setupUi()
         self.setObjectName(text.replace(' ', '-'))
 
     def setupUi(self):
-        ...
+        self.vBoxLayout = QVBoxLayout(self)
+        self.vBoxLayout.setContentsMargins(30, 30, 30, 30)
+        self.metricsTitle = SubtitleLabel("命令延迟 Command Latency", self)
+        self.metricsHint = BodyLabel("每条发送到后端的命令从发送到下一个提示符的耗时，stage: 开头的行是界面解析与渲染阶段。", self)
+        self.metricsTable = TableWidget(self)
+        self.metricsTable.setColumnCount(len(self.METRIC_COLUMNS))
+        self.metricsTable.setHorizontalHeaderLabels([title for _, title in self.METRIC_COLUMNS])
+        self.metricsTable.verticalHeader().hide()
+        self.metricsTable.setEditTriggers(TableWidget.NoEditTriggers)
+
+        self.buttonLayout = QHBoxLayout()
+        self.refreshButton = PushButton(FIF.SYNC, "刷新 Refresh", self)
+        self.exportJsonButton = PushButton(FIF.SAVE, "导出 JSON", self)
+        self.exportCsvButton = PushButton(FIF.SAVE, "导出 CSV", self)
+        self.clearButton = PushButton(FIF.DELETE, "清空 Clear", self)
+        self.refreshButton.clicked.connect(self.refreshMetrics)
+        self.exportJsonButton.clicked.connect(lambda: self.exportMetrics("json"))
+        self.exportCsvButton.clicked.connect(lambda: self.exportMetrics("csv"))
+        self.clearButton.clicked.connect(self.clearMetrics)
+        for button in (self.refreshButton, self.exportJsonButton, self.exportCsvButton, self.clearButton):
+            self.buttonLayout.addWidget(button)
+        self.buttonLayout.addStretch(1)
+
+        self.vBoxLayout.addWidget(self.metricsTitle)
+        self.vBoxLayout.addWidget(self.metricsHint)
+        self.vBoxLayout.addLayout(self.buttonLayout)
+        self.vBoxLayout.addWidget(self.metricsTable, 1)
+
+    def showEvent(self, e):
+        self.refreshMetrics()
+        self.refreshTimer.start()
+        super().showEvent(e)
+
+    def hideEvent(self, e):
+        self.refreshTimer.stop()
+        super().hideEvent(e)
+
+    def refreshMetrics(self):
+        rows = tracer.summary()
+        self.metricsTable.setRowCount(len(rows))
+        for row_index, row in enumerate(rows):
+            for column_index, (key, _) in enumerate(self.METRIC_COLUMNS):
+                value = row[key]
+                if value is None:
+                    text = "-"
+                elif isinstance(value, float):
+                    text = f"{value:.1f}"
+                else:
+                    text = str(value)
+                item = QTableWidgetItem(text)
+                if key != "name":
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.metricsTable.setItem(row_index, column_index, item)
+        self.metricsTable.resizeColumnsToContents()
+
+    def exportMetrics(self, file_format: str):
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "导出 Export", f"metrics.{file_format}", f"{file_format.upper()} (*.{file_format})"
+        )
+        if not file_path:
+            return
+        try:
+            if file_format == "json":
+                tracer.export_json(file_path)
+            else:
+                tracer.export_csv(file_path)
+        except OSError as e:
+            InfoBar.error(
+                title="导出失败",
+                content=str(e),
+                orient=Qt.Horizontal,
+                isClosable=True,
+                position=InfoBarPosition.TOP,
+                duration=3000,
+                parent=self
+            )
+            return
+        InfoBar.success(
+            title="导出成功",
+            content=file_path,
+            orient=Qt.Horizontal,
+            isClosable=True,
+            position=InfoBarPosition.TOP,
+            duration=2000,
+            parent=self
+        )
+
+    def clearMetrics(self):
+        tracer.clear()
+        self.refreshMetrics()
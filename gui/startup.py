@@ -0,0 +1,30 @@
+import os
+import time
+
+class StartupTimer:
+    """ Records how long each startup phase takes, printed when OSFM_STARTUP_REPORT is set """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.phases = [] # [(phase name, seconds)]
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def total(self) -> float:
+        return self.last - self.start
+
+    def report(self) -> str:
+        lines = ["Startup timing:"]
+        for phase, seconds in self.phases:
+            lines.append(f"  {phase:<28}{seconds * 1000:8.1f} ms")
+        lines.append(f"  {'time to interactive':<28}{self.total() * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+    def print_report(self):
+        if os.environ.get("OSFM_STARTUP_REPORT"):
+            print(self.report())
+
+startup_timer = StartupTimer()
@@ -1,4 +1,3 @@
-import json
 import re
 
 from pathlib import Path
@@ -6,7 +5,7 @@ from pathlib import Path
 from PySide6.QtCore import Qt, QSize, QProcess, QEvent, QTimer, Signal
 from PySide6.QtGui import QFont, QTextCursor, QColor, QKeySequence, QShortcut, QTextCharFormat
 from PySide6.QtWidgets import (
-    QApplication, QLabel, QFrame, QMessageBox,
+    QApplication, QLabel, QFrame, QMessageBox, QFileDialog,
     QWidget, QVBoxLayout,  QHBoxLayout,
     QStackedWidget
     )
@@ -19,8 +18,18 @@ from qfluentwidgets import (
 from qfluentwidgets import FluentIcon as FIF
 
 from api.api import API
+from api.fsck import check_image
+from api.image import ImageError, find_image
+from api.trace import tracer
 
+from .config import load_config
 from .highlighter import Highlighter
+from .script import INTERACTIVE_COMMANDS, ScriptRunner, interactive_commands, parse_script
+from .transfer import ExportRunner, ImportRunner
+from .watchdog import hot_path
+
+SPECIAL_OUTPUT_TAIL_LENGTH = 4096 # 判断后台命令是否完成时只看输出末尾这么多字符，足够容纳很长路径的提示符
+CRASH_CHECK_PROBLEMS = 5 # 崩溃后的磁盘检查最多在终端里列出这么多问题
 
 class TerminalInputMode:
     NORMAL = "NORMAL" # 普通命令输入模式
@@ -31,13 +40,15 @@ class TerminalInputMode:
 
 class Terminal(QWidget):
     explorerCommandOutputReady = Signal(str, str, bool, str, str) # 用于 Explorer
+    explorerListingChunk = Signal(str, str) # ls 输出中已经完整的若干行，Explorer 边收边解析
     requestExplorerRefresh = Signal()
     editorContentReady = Signal(str, str, bool, str)
     editorSaveComplete = Signal(str, bool, str)
 
-    def __init__(self, text: str, parent=None):
+    def __init__(self, text: str, parent=None, process_pool=None):
         super().__init__(parent=parent)
         self.setConfig()
+        self.process_pool = process_pool # 预热的后端进程池，为 None 时每个标签页自己启动进程
 
         self.vBoxLayout = QVBoxLayout(self)
         self.tabBoxLayout = QHBoxLayout()
@@ -52,6 +63,7 @@ class Terminal(QWidget):
         self.terminal_modes = {}
         self.password_buffers = {}
         self.current_paths_by_terminal = {}
+        self.script_runners = {} # {terminal_object_name: 正在运行的 ScriptRunner、ImportRunner 或 ExportRunner}
 
         # 状态追踪：用于Explorer的命令执行
         self._explorer_pending_requests = {} # {terminal_object_name: {"output_buffer": []}}
@@ -73,7 +85,7 @@ class Terminal(QWidget):
         self.tabBar.currentChanged.connect(self.onTabChanged)
         self.tabBar.tabAddRequested.connect(self.onTabAddRequested)
         self.tabBar.tabCloseRequested.connect(self.onTabCloseRequested)
-        self.onTabAddRequested()
+        QTimer.singleShot(0, self.onTabAddRequested) # 先让界面显示出来，再启动第一个后端进程
 
     def __initLayout(self):
         self.tabBar.setTabMaximumWidth(200)
@@ -143,17 +155,22 @@ class Terminal(QWidget):
                 new_mode = TerminalInputMode.NORMAL
         return new_mode, new_input_start_index
 
+    @hot_path("terminal.output")
     def _process_special_command_output_output(self, terminal_object_name: str, output: str, is_error: bool = False):
         """处理来自 API 的标准输出信号。"""
         text_edit = self._get_terminal_widget_by_object_name(terminal_object_name)
         if not text_edit:
             return
-        self._append_to_terminal(text_edit, output, is_error)
-        full_text = text_edit.document().toPlainText()
+        script_runner = self.script_runners.get(terminal_object_name)
+        if script_runner is not None and not is_error:
+            output = script_runner.feed(output) # 脚本运行中：在每个提示符后面补上对应的命令
+        with tracer.stage("terminal.render", terminal_object_name):
+            self._append_to_terminal(text_edit, output, is_error)
+            full_text = text_edit.document().toPlainText()
 
-        self.terminal_modes[terminal_object_name],\
-        self.input_start_indices[terminal_object_name]\
-            = self._determine_terminal_state(full_text)
+            self.terminal_modes[terminal_object_name],\
+            self.input_start_indices[terminal_object_name]\
+                = self._determine_terminal_state(full_text)
 
         extracted_path = "~"
         prompt_matches = list(self.main_shell_prompt_regex.finditer(full_text)) # 重新从 full_text 中匹配最新的主 shell 提示符，提取路径
@@ -179,24 +196,43 @@ class Terminal(QWidget):
             return
 
         request_info = self._explorer_pending_requests[terminal_obj_name]
+        if request_info.get("command_type") == "ls" and self.terminal_modes.get(terminal_obj_name) == TerminalInputMode.NORMAL:
+            self._stream_listing_output(terminal_obj_name, request_info, output, is_error)
+            return
         request_info["output_buffer"].append(output) # 累积所有输出
-        full_buffered_output = "".join(request_info["output_buffer"])
+        # 大文件的 cat 会分成很多块到达，只在末尾一段里找提示符，完成时才拼接整个缓冲区
+        output_tail = (request_info.get("output_tail", "") + output)[-SPECIAL_OUTPUT_TAIL_LENGTH:]
+        request_info["output_tail"] = output_tail
         current_mode = self.terminal_modes.get(terminal_obj_name)
 
         command_is_complete = False
         if current_mode == TerminalInputMode.NORMAL:
-            prompt_matches = list(self.main_shell_prompt_regex.finditer(full_buffered_output))
+            prompt_matches = list(self.main_shell_prompt_regex.finditer(output_tail))
             if prompt_matches:
                 last_prompt_match = prompt_matches[-1] # 确保最后一个提示符在缓冲输出的末尾附近，才认为是命令完成
-                if full_buffered_output.strip().endswith(last_prompt_match.group(0).strip()):
+                if output_tail.strip().endswith(last_prompt_match.group(0).strip()):
                     command_is_complete = True
 
-        if is_error and command_is_complete: # 如果收到了错误输出且命令似乎已完成
-            self._handle_special_command_completion(terminal_obj_name, full_buffered_output, True) # 标记为失败并完成
+        if not command_is_complete:
             return
-
-        if command_is_complete:
-            self._handle_special_command_completion(terminal_obj_name, full_buffered_output, False)
+        request_info["output_tail"] = ""
+        full_buffered_output = "".join(request_info["output_buffer"])
+        # 如果收到了错误输出且命令已完成，标记为失败
+        self._handle_special_command_completion(terminal_obj_name, full_buffered_output, bool(is_error))
+
+    def _stream_listing_output(self, terminal_obj_name: str, request_info: dict, output: str, is_error):
+        """ 大目录的 ls 输出不再整体缓冲：完整的行立即交给 Explorer，只保留最后不完整的一行 """
+        pending = request_info.get("line_tail", "") + output
+        line_end = pending.rfind("\n")
+        lines, tail = pending[:line_end + 1], pending[line_end + 1:]
+        if lines:
+            self.explorerListingChunk.emit(terminal_obj_name, lines)
+        prompt_match = self.main_shell_prompt_regex.search(tail)
+        if prompt_match and tail.strip().endswith(prompt_match.group(0).strip()):
+            request_info["line_tail"] = ""
+            self._handle_special_command_completion(terminal_obj_name, tail, bool(is_error))
+        else:
+            request_info["line_tail"] = tail
 
     def _handle_special_command_completion(self, terminal_obj_name: str, full_buffered_output: str, force_error: bool = False):
         """
@@ -241,7 +277,9 @@ class Terminal(QWidget):
                     self.editorSaveComplete.emit(file_path_for_editor, False, "API实例丢失，无法继续保存操作。")
             else: # 命令队列为空，所有保存命令已发送完毕
                 self._reset_special_command_state(terminal_obj_name)
-                self.editorSaveComplete.emit(file_path_for_editor, not force_error, "" if not force_error else "保存操作失败。")
+                save_error = output_to_process.splitlines()[-1] if output_to_process else "" # 成功的 echo 重定向不输出任何内容
+                failed = force_error or bool(save_error)
+                self.editorSaveComplete.emit(file_path_for_editor, not failed, "" if not failed else (save_error or "保存操作失败。"))
         else: # 处理 Explorer 命令完成
             self._reset_special_command_state(terminal_obj_name) # Reset Explorer state (important!)
             if issued_command_type == "cat_file_content":
@@ -299,11 +337,16 @@ class Terminal(QWidget):
 
     def _process_special_command_output_finished(self, terminal_object_name: str, exitCode: int, exitStatus: QProcess.ExitStatus):
         """处理来自 API 的进程结束信号。"""
+        script_runner = self.script_runners.get(terminal_object_name)
+        if script_runner is not None:
+            script_runner.abort()
         text_edit = self._get_terminal_widget_by_object_name(terminal_object_name)
         if text_edit:
             status_str = "正常退出" if exitStatus == QProcess.NormalExit else "崩溃"
             self._append_to_terminal(text_edit, f"\n进程已结束，退出码: {exitCode} ({status_str})\n", is_error=True)
             terminal_api = self.terminal_apis.get(terminal_object_name) # 进程结束后重新启动Shell。新的提示符会在 API 重新启动成功后打印
+            if terminal_api and exitStatus == QProcess.CrashExit and terminal_api.socket is None:
+                self._check_disk_after_crash(text_edit)
             if terminal_api:
                 self._append_to_terminal(text_edit, "尝试重新启动 Shell...\n")
                 if not terminal_api.start_app_process(): # 重新启动应用程序
@@ -311,6 +354,24 @@ class Terminal(QWidget):
                     if terminal_object_name == self._explorer_current_api_obj_name:
                         self._send_special_command_error(terminal_object_name, f"Shell process crashed or failed to restart: {status_str}")
 
+    def _check_disk_after_crash(self, text_edit: PlainTextEdit):
+        """后端可能在写到一半时崩溃，重新启动前只读检查一遍工作目录中的磁盘映像。守护进程的映像位置未知，不检查。"""
+        image_path = find_image()
+        if image_path is None:
+            return
+        try:
+            report = check_image(image_path)
+        except ImageError as e:
+            self._append_to_terminal(text_edit, f"磁盘检查失败: {e}\n", is_error=True)
+            return
+        if report.clean:
+            self._append_to_terminal(text_edit, f"磁盘检查未发现问题（{report.elapsed:.2f} 秒）。\n")
+            return
+        lines = [f"磁盘检查发现 {len(report.problems)} 个问题，关闭所有终端后运行 python -m api.fsck --repair 修复:"]
+        for kind, where, message in report.problems[:CRASH_CHECK_PROBLEMS]:
+            lines.append(f"  {kind}: {where}: {message}" if where else f"  {kind}: {message}")
+        self._append_to_terminal(text_edit, "\n".join(lines) + "\n", is_error=True)
+
     def _process_special_command_output_error_occurred(self, terminal_object_name: str, error_message: str):
         """处理来自 API 的 QProcess 错误信号。"""
         text_edit = self._get_terminal_widget_by_object_name(terminal_object_name)
@@ -345,6 +406,10 @@ class Terminal(QWidget):
         else:
             input_data = full_text[input_start_index:].strip() # 普通命令模式下，从 PlainTextEdit 获取数据
 
+        if object_name in self.script_runners: # 脚本的命令已经提前写入后端，此时再输入会打乱输出与命令的对应关系
+            self.warning("警告", "脚本正在运行，请等待结束或再次点击运行按钮停止。")
+            return
+
         terminal_api = self.terminal_apis.get(object_name)
         if not terminal_api:
             self._append_to_terminal(text_edit, "错误：未找到终端 API 实例。\n", is_error=True)
@@ -399,7 +464,7 @@ class Terminal(QWidget):
             self.warning("警告", f"未找到终端UI组件 '{terminal_obj_name}'。")
             self.explorerCommandOutputReady.emit(terminal_obj_name, "", False, f"No UI widget for '{terminal_obj_name}'.", "")
             return False
-        if self._explorer_current_api_obj_name is not None:
+        if self._explorer_current_api_obj_name is not None or terminal_obj_name in self.script_runners:
             self.warning("警告", "Explorer命令正在进行中，请稍后。")
             self.explorerCommandOutputReady.emit(terminal_obj_name, "", False, "Another Explorer command is already in progress.", "")
             return False
@@ -422,9 +487,7 @@ class Terminal(QWidget):
         return True
 
     def setConfig(self):
-        config_file_path = Path(__file__).resolve().parent.parent / "config" / "config.json"
-        with open(config_file_path, 'r', encoding='utf-8') as f:
-            config_data = json.load(f)
+        config_data = load_config()
         self.font_size = config_data.get("fontSize", 20)
         self.font_family = config_data.get("fontFamily", "Monospace")
 
@@ -508,15 +571,21 @@ class Terminal(QWidget):
             icon=icon
         )
         # self.tabBar.setCurrentTab(objectName) # 有bug暂时别用
-        terminal_api = API(objectName, "app", self)
+        terminal_api = self.process_pool.take(objectName, self) if self.process_pool else None
+        prewarmed = terminal_api is not None
+        if not prewarmed:
+            terminal_api = API(objectName, "app", self, load_config().get("backendDaemon") or None)
         self.terminal_apis[objectName] = terminal_api # 存储起来
         terminal_api.standardOutputReady.connect(self._process_special_command_output_output)
         terminal_api.standardErrorReady.connect(lambda obj_name, error_output: self._process_special_command_output_output(obj_name, error_output, True))
         terminal_api.processFinished.connect(self._process_special_command_output_finished)
         terminal_api.processErrorOccurred.connect(self._process_special_command_output_error_occurred)
-        if not terminal_api.start_app_process():
+        if prewarmed:
+            terminal_api.release_output() # 补发进程在池中等待时输出的登录提示
+        elif not terminal_api.start_app_process():
             self.warning("启动失败", f"无法启动终端进程 {objectName}。")
 
+    @hot_path("terminal.close")
     def onTabCloseRequested(self, index: int):
         tab_item = self.tabBar.tabItem(index)
         route_key = tab_item.routeKey()
@@ -524,6 +593,10 @@ class Terminal(QWidget):
             self._explorer_current_api_obj_name = None
             self._explorer_command_sent_at_index = -1
             self._explorer_pending_requests.pop(route_key, None)
+        script_runner = self.script_runners.pop(route_key, None)
+        if script_runner is not None:
+            script_runner.abort()
+            script_runner.deleteLater()
 
         terminal_api = self.terminal_apis.get(route_key)
         if terminal_api:
@@ -566,6 +639,7 @@ class Terminal(QWidget):
         # self.tabBar.setCurrentTab(new_tab_name) # 有bug，先不用
 
     def run(self):
+        """运行选中的多行命令、输入区中的多行命令或一个脚本文件；脚本运行中再次触发则停止。"""
         current_widget = self.stackedWidget.currentWidget()
         if not isinstance(current_widget, PlainTextEdit):
             self.warning('警告', '当前没有激活的终端。')
@@ -575,12 +649,158 @@ class Terminal(QWidget):
             self.warning("警告", "终端进程未运行。请稍后或尝试重新启动。")
             return
         terminal_obj_name = api.terminal_object_name
+        script_runner = self.script_runners.get(terminal_obj_name)
+        if script_runner is not None:
+            script_runner.cancel()
+            self.inform("提示", "脚本将在已发送的命令完成后停止。")
+            return
         current_mode = self.get_terminal_mode(terminal_obj_name)
         if current_mode != TerminalInputMode.NORMAL:
             self.warning("警告", "终端未就绪（请先登录）。")
             return
-        self.requestExplorerRefresh.emit() # 如果终端就绪，发出信号请求 Explorer 刷新
-        self.inform("提示", "已请求资源管理器刷新目录。")
+        script_text = self._selected_script_text(current_widget)
+        if script_text is None:
+            file_path, _ = QFileDialog.getOpenFileName(self, "运行脚本", "", "Scripts (*.sh *.txt);;All Files (*)")
+            if not file_path: # 没有选择脚本时保持原来的行为：刷新资源管理器
+                self.requestExplorerRefresh.emit()
+                self.inform("提示", "已请求资源管理器刷新目录。")
+                return
+            try:
+                script_text = Path(file_path).read_text(encoding='utf-8')
+            except (OSError, UnicodeDecodeError) as e:
+                self.warning("无法读取脚本", str(e))
+                return
+        self.run_script(terminal_obj_name, script_text)
+
+    def _selected_script_text(self, text_edit: PlainTextEdit) -> str | None:
+        """选中的文本，或者输入区中用 Shift+Enter 输入的多行命令；都没有时返回 None。"""
+        cursor = text_edit.textCursor()
+        if cursor.hasSelection():
+            return cursor.selectedText().replace("\u2029", "\n") # QTextCursor 用段落分隔符表示换行
+        input_start_index = self.input_start_indices.get(text_edit.objectName(), 0)
+        pending_input = text_edit.toPlainText()[input_start_index:]
+        if "\n" in pending_input.strip():
+            return pending_input
+        return None
+
+    def run_script(self, terminal_obj_name: str, script_text: str) -> bool:
+        """把脚本按行流水线发送给指定终端的后端，结束时通过 InfoBar 汇报。返回 True 表示已开始运行。"""
+        api = self.terminal_apis.get(terminal_obj_name)
+        text_edit = self._get_terminal_widget_by_object_name(terminal_obj_name)
+        if not api or not text_edit:
+            self.warning("警告", f"未找到终端 '{terminal_obj_name}'。")
+            return False
+        if self._explorer_current_api_obj_name is not None or terminal_obj_name in self.script_runners:
+            self.warning("警告", "已有命令正在进行中，请稍后。")
+            return False
+        commands = parse_script(script_text)
+        if not commands:
+            self.warning("警告", "脚本中没有命令。")
+            return False
+        blocked = interactive_commands(commands)
+        if blocked:
+            self.warning("无法运行脚本", f"第 {blocked[0].line_number} 行的 {', '.join(sorted(blocked[0].names & INTERACTIVE_COMMANDS))} 需要交互输入，不能在脚本中运行。")
+            return False
+
+        config_data = load_config()
+        script_runner = ScriptRunner(
+            api,
+            commands,
+            config_data.get("scriptPipelineDepth", 16),
+            config_data.get("scriptStopOnError", True),
+            self
+        )
+        script_runner.finished.connect(lambda success, name=terminal_obj_name: self._on_script_finished(name, success))
+        self.script_runners[terminal_obj_name] = script_runner
+
+        input_start_index = self.input_start_indices.get(terminal_obj_name, len(text_edit.toPlainText()))
+        cursor = text_edit.textCursor() # 清掉输入区中已经输入的内容，命令会在各自的提示符后面显示
+        cursor.setPosition(input_start_index)
+        cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+        self._append_to_terminal(text_edit, script_runner.start())
+        return True
+
+    def _on_script_finished(self, terminal_obj_name: str, success: bool):
+        script_runner = self.script_runners.pop(terminal_obj_name, None)
+        if script_runner is None:
+            return
+        script_runner.deleteLater()
+        slowest = script_runner.slowest()
+        timing = f"用时 {script_runner.wall_seconds:.2f} 秒"
+        if slowest is not None:
+            timing += f"，最慢：第 {slowest.line_number} 行 {slowest.name}（{slowest.seconds * 1000:.1f} ms）"
+        if success:
+            self.inform("脚本完成", f"{script_runner.completed} 条命令，{timing}")
+        elif script_runner.failed:
+            failed = script_runner.failed[0]
+            self.warning("脚本出错", f"第 {failed.line_number} 行：{failed.error}（完成 {script_runner.completed}/{len(script_runner.commands)}，{timing}）")
+        else:
+            self.warning("脚本已停止", f"完成 {script_runner.completed}/{len(script_runner.commands)} 条命令，{timing}")
+        self.requestExplorerRefresh.emit()
+
+    def _idle_session(self):
+        """当前终端的 (api, 终端名, 终端控件)，会话没有空闲、无法交给导入导出独占时提示并返回 None。"""
+        api = self.get_current_api()
+        if not api or api.state() != QProcess.Running:
+            self.warning("警告", "终端进程未运行。请稍后或尝试重新启动。")
+            return None
+        terminal_obj_name = api.terminal_object_name
+        text_edit = self._get_terminal_widget_by_object_name(terminal_obj_name)
+        if not text_edit:
+            self.warning("警告", f"未找到终端 '{terminal_obj_name}'。")
+            return None
+        if self._explorer_current_api_obj_name is not None or terminal_obj_name in self.script_runners:
+            self.warning("警告", "已有命令正在进行中，请稍后。")
+            return None
+        if self.get_terminal_mode(terminal_obj_name) != TerminalInputMode.NORMAL:
+            self.warning("警告", "终端未就绪（请先登录）。")
+            return None
+        return api, terminal_obj_name, text_edit
+
+    def _session_user(self, text_edit: PlainTextEdit) -> str:
+        """终端里最近一个 shell 提示符中的用户名，还没有提示符时返回空字符串。"""
+        prompt_matches = list(self.main_shell_prompt_regex.finditer(text_edit.toPlainText()))
+        if not prompt_matches:
+            return ""
+        return prompt_matches[-1].group(0).split("@", 1)[1].split(":", 1)[0]
+
+    def _start_transfer(self, runner, terminal_obj_name: str, text_edit: PlainTextEdit):
+        runner.finished.connect(lambda success, name=terminal_obj_name: self._on_transfer_finished(name))
+        self.script_runners[terminal_obj_name] = runner # 与脚本一样独占这个会话，输出经 feed 拆分
+        input_start_index = self.input_start_indices.get(terminal_obj_name, len(text_edit.toPlainText()))
+        cursor = text_edit.textCursor()
+        cursor.setPosition(input_start_index)
+        cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+        self._append_to_terminal(text_edit, runner.start())
+
+    def run_import(self, host_dir: str, destination: str) -> ImportRunner | None:
+        """把主机目录导入到当前终端会话的 destination（绝对路径），返回正在运行的 ImportRunner，无法开始时返回 None。"""
+        session = self._idle_session()
+        if session is None:
+            return None
+        api, terminal_obj_name, text_edit = session
+        import_runner = ImportRunner(api, host_dir, destination, self)
+        self._start_transfer(import_runner, terminal_obj_name, text_edit)
+        return import_runner
+
+    def run_export(self, source: str, destination: str) -> ExportRunner | None:
+        """把当前终端会话中的目录 source（绝对路径）导出到主机目录或 tar 归档，返回正在运行的 ExportRunner，无法开始时返回 None。"""
+        session = self._idle_session()
+        if session is None:
+            return None
+        api, terminal_obj_name, text_edit = session
+        export_runner = ExportRunner(api, source, destination, self._session_user(text_edit), self)
+        self._start_transfer(export_runner, terminal_obj_name, text_edit)
+        return export_runner
+
+    def _on_transfer_finished(self, terminal_obj_name: str):
+        runner = self.script_runners.pop(terminal_obj_name, None)
+        if runner is not None:
+            runner.deleteLater()
+        if isinstance(runner, ImportRunner):
+            self.requestExplorerRefresh.emit()
 
     def inform(self, title, content):
         InfoBar.info(
@@ -616,7 +836,7 @@ class Terminal(QWidget):
             self._send_special_command_error(terminal_obj_name, f"未找到终端UI组件 '{terminal_obj_name}'。", "cat_file_content", file_path)
             return False
 
-        if self._explorer_current_api_obj_name is not None:
+        if self._explorer_current_api_obj_name is not None or terminal_obj_name in self.script_runners:
             self._send_special_command_error(terminal_obj_name, "已有命令正在进行中，请稍后。", "cat_file_content", file_path)
             return False
 
@@ -653,7 +873,7 @@ class Terminal(QWidget):
             self._send_special_command_error(terminal_obj_name, f"未找到终端UI组件 '{terminal_obj_name}'。", "save_file_content", file_path)
             return False
 
-        if self._explorer_current_api_obj_name is not None:
+        if self._explorer_current_api_obj_name is not None or terminal_obj_name in self.script_runners:
             self._send_special_command_error(terminal_obj_name, "已有命令正在进行中，请稍后。", "save_file_content", file_path)
             return False
 
@@ -682,16 +902,12 @@ class Terminal(QWidget):
             "output_buffer": [],
             "command_type": "save_file_content",
             "file_path": file_path,
-            "command_queue": commands # Store all commands to be executed sequentially
+            "command_queue": [] # 所有行放在一个 batch 块里发送，不再逐条等待提示符
         }
-        if commands: # Send the first command immediately
-            first_command = commands.pop(0)
-            self._append_to_terminal(text_edit, first_command + '\n')
-            api.send_input_to_app(first_command)
-            return True
-        else: # Should not happen if lines processing is correct
-            self._send_special_command_error(terminal_obj_name, "没有生成保存命令。", "save_file_content", file_path)
-            return False
+        block = "\n".join(["batch -e", *commands, "end"]) # 后端执行完整个块只输出一个提示符，出错时跳过剩余的行
+        self._append_to_terminal(text_edit, block + '\n')
+        api.send_input_to_app(block)
+        return True
 
     def get_current_terminal_path(self, terminal_object_name: str) -> str:
         return self.current_paths_by_terminal.get(terminal_object_name, "~")
\ No newline at end of file
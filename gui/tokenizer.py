@@ -0,0 +1,178 @@
+import os
+import re
+
+from .highlighter import SHELL_COMMANDS
+
+STATE_NORMAL = 0 # 块结束时不处于任何跨行结构中
+
+class Tokenizer:
+    """ Line tokenizer, produces (start, length, kind) spans and the state at line end """
+    name = "plain"
+
+    def tokenize_line(self, text: str, state: int):
+        return [], STATE_NORMAL
+
+
+class RegexTokenizer(Tokenizer):
+    """ Tokenizer built from one combined named-group regex, no multi-line constructs """
+    name = "regex"
+    token_regex = None
+
+    def tokenize_line(self, text: str, state: int):
+        spans = []
+        for match in self.token_regex.finditer(text):
+            start, end = match.span()
+            spans.append((start, end - start, match.lastgroup))
+        return spans, STATE_NORMAL
+
+
+def _keyword_pattern(words):
+    return r"\b(?:" + "|".join(sorted(words, key=len, reverse=True)) + r")\b"
+
+
+class PythonTokenizer(Tokenizer):
+    name = "python"
+
+    STATE_SINGLE_TRIPLE = 1 # 位于 ''' 字符串中
+    STATE_DOUBLE_TRIPLE = 2 # 位于 """ 字符串中
+
+    KEYWORDS = [
+        'False', 'None', 'True', 'and', 'as', 'assert', 'async', 'await', 'break', 'class', 'continue',
+        'def', 'del', 'elif', 'else', 'except', 'finally', 'for', 'from', 'global', 'if', 'import', 'in',
+        'is', 'lambda', 'nonlocal', 'not', 'or', 'pass', 'raise', 'return', 'try', 'while', 'with', 'yield'
+    ]
+
+    token_regex = re.compile(
+        r"(?P<string>(?:(?<!\w)[rRbBuUfF]{1,2})?(?:'''|\"\"\"|'(?:\\.|[^'\\])*'|\"(?:\\.|[^\"\\])*\"))"
+        r"|(?P<comment>#.*$)"
+        r"|(?P<keyword>" + _keyword_pattern(KEYWORDS) + r")"
+        r"|(?P<decorator>@[\w\.]+)"
+        r"|(?P<number>\b\d+(?:\.\d+)?\b)"
+    )
+    triple_end = {STATE_SINGLE_TRIPLE: "'''", STATE_DOUBLE_TRIPLE: '"""'}
+
+    def tokenize_line(self, text: str, state: int):
+        spans = []
+        pos = 0
+        if state in self.triple_end: # 上一行留下的未闭合三引号字符串
+            end = text.find(self.triple_end[state])
+            if end == -1:
+                return [(0, len(text), "string")], state
+            pos = end + 3
+            spans.append((0, pos, "string"))
+        while True:
+            match = self.token_regex.search(text, pos)
+            if not match:
+                return spans, STATE_NORMAL
+            start, end = match.span()
+            kind = match.lastgroup
+            token = match.group(kind)
+            if kind == "string" and token.endswith(("'''", '"""')) and len(token.lstrip("rRbBuUfF")) == 3:
+                quote = token[-3:]
+                close = text.find(quote, end)
+                if close == -1: # 三引号字符串延续到下一行
+                    spans.append((start, len(text) - start, "string"))
+                    return spans, self.STATE_SINGLE_TRIPLE if quote == "'''" else self.STATE_DOUBLE_TRIPLE
+                end = close + 3
+            spans.append((start, end - start, kind))
+            pos = end
+
+
+class CTokenizer(Tokenizer):
+    name = "c"
+
+    STATE_BLOCK_COMMENT = 1 # 位于 /* */ 注释中
+
+    KEYWORDS = [
+        'auto', 'bool', 'break', 'case', 'char', 'class', 'const', 'constexpr', 'continue', 'default',
+        'delete', 'do', 'double', 'else', 'enum', 'explicit', 'extern', 'false', 'float', 'for', 'friend',
+        'goto', 'if', 'inline', 'int', 'long', 'namespace', 'new', 'nullptr', 'operator', 'private',
+        'protected', 'public', 'return', 'short', 'signed', 'sizeof', 'static', 'struct', 'switch',
+        'template', 'this', 'true', 'typedef', 'typename', 'union', 'unsigned', 'using', 'virtual',
+        'void', 'volatile', 'while', 'uint8_t', 'uint16_t', 'uint32_t', 'uint64_t', 'int8_t', 'int16_t',
+        'int32_t', 'int64_t', 'size_t'
+    ]
+
+    token_regex = re.compile(
+        r"(?P<comment>//.*$|/\*)"
+        r"|(?P<string>\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*')"
+        r"|(?P<preprocessor>^\s*#\s*\w+)"
+        r"|(?P<keyword>" + _keyword_pattern(KEYWORDS) + r")"
+        r"|(?P<number>\b(?:0[xX][0-9a-fA-F]+|\d+(?:\.\d+)?)[uUlLfF]*\b)"
+    )
+
+    def tokenize_line(self, text: str, state: int):
+        spans = []
+        pos = 0
+        if state == self.STATE_BLOCK_COMMENT:
+            end = text.find("*/")
+            if end == -1:
+                return [(0, len(text), "comment")], state
+            pos = end + 2
+            spans.append((0, pos, "comment"))
+        while True:
+            match = self.token_regex.search(text, pos)
+            if not match:
+                return spans, STATE_NORMAL
+            start, end = match.span()
+            kind = match.lastgroup
+            if kind == "comment" and match.group(kind) == "/*":
+                close = text.find("*/", end)
+                if close == -1: # 块注释延续到下一行
+                    spans.append((start, len(text) - start, "comment"))
+                    return spans, self.STATE_BLOCK_COMMENT
+                end = close + 2
+            spans.append((start, end - start, kind))
+            pos = end
+
+
+class JsonTokenizer(RegexTokenizer):
+    name = "json"
+    token_regex = re.compile(
+        r"(?P<keyword>\"(?:\\.|[^\"\\])*\"(?=\s*:))"
+        r"|(?P<string>\"(?:\\.|[^\"\\])*\")"
+        r"|(?P<number>-?\b\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\b)"
+        r"|(?P<constant>\b(?:true|false|null)\b)"
+    )
+
+
+class MarkdownTokenizer(RegexTokenizer):
+    name = "markdown"
+    token_regex = re.compile(
+        r"(?P<keyword>^#{1,6}\s.*$)"
+        r"|(?P<string>`[^`]*`)"
+        r"|(?P<constant>\*\*[^*]+\*\*|__[^_]+__)"
+        r"|(?P<decorator>\[[^\]]*\]\([^)]*\))"
+        r"|(?P<comment>^\s*>.*$)"
+    )
+
+
+class ShellTokenizer(RegexTokenizer):
+    name = "shell"
+    token_regex = re.compile(
+        r"(?P<string>'[^']*'|\"[^\"]*\")"
+        r"|(?P<comment>#.*$)"
+        r"|(?P<decorator>\$[a-zA-Z_]\w*|\$\{[^}]+\})"
+        r"|(?P<keyword>" + _keyword_pattern(SHELL_COMMANDS) + r")"
+        r"|(?P<constant>(?<!\w)-{1,2}[\w-]+)"
+        r"|(?P<number>\b\d+(?:\.\d+)?\b)"
+    )
+
+
+TOKENIZERS = { # 按扩展名选择分词器，新的文件类型在这里注册即可
+    ".py": PythonTokenizer,
+    ".c": CTokenizer,
+    ".h": CTokenizer,
+    ".cpp": CTokenizer,
+    ".hpp": CTokenizer,
+    ".cc": CTokenizer,
+    ".json": JsonTokenizer,
+    ".md": MarkdownTokenizer,
+    ".sh": ShellTokenizer,
+}
+
+def tokenizer_for_path(file_path: str):
+    """ Returns a tokenizer instance for the extension of file_path, None (plain text) if unknown """
+    extension = os.path.splitext(file_path or "")[1].lower()
+    tokenizer = TOKENIZERS.get(extension)
+    return tokenizer() if tokenizer else None # 纯文本不进入分词线程
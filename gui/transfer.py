@@ -0,0 +1,395 @@
+import tarfile
+import threading
+import time
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+from api.client import CAT_ERROR, DOWNLOAD_HOLD_BYTES, WRITE_ABORT, parse_ls_long, write_frames
+from api.client import SHELL_PROMPT as END_PROMPT
+from api.image import DiskImage, ImageError, find_image
+from api.transfer import (IMAGE_EXPORT_USER, TransferCancelled, TransferStats, contains_nul, export_image, open_sink,
+                          parse_time, plan_import, relative_path)
+
+from .script import SHELL_PROMPT, PROMPT_TAIL_LENGTH
+
+IMPORT_PIPELINE_DEPTH = 16 # 小文件和 mkdir 最多这么多条同时在后端排队
+INPUT_HIGH_WATER = 1024 * 1024 # 后端还没读走的输入超过这么多字节时暂停发送，大文件不会整个堆在写缓冲区里
+EXPORT_PROGRESS_INTERVAL = 0.05 # 导出线程最多每隔这么多秒报告一次进度
+
+class ImportOperation:
+    """ One mkdir or write of an import """
+    def __init__(self, kind: str, path: str, host_path: str = None, size: int = 0):
+        self.kind = kind # "mkdir" 或 "write"
+        self.path = path
+        self.host_path = host_path
+        self.size = size
+        self.output = ""
+        self.aborted = False # 取消时内容只发送了一部分
+
+    @property
+    def text(self) -> str:
+        return f'{self.kind} "{self.path}"'
+
+
+class ImportRunner(QObject):
+    """
+    Imports a host directory through one terminal's backend session, the same way ScriptRunner runs a script:
+    commands are pipelined and every shell prompt completes the oldest one in flight.
+    File contents are streamed with the `write` command, pausing while the backend has not read INPUT_HIGH_WATER bytes.
+    """
+    progress = Signal(object) # TransferStats
+    finished = Signal(bool) # 没有出错且没有取消时为 True
+
+    def __init__(self, api, host_dir: str, destination: str, parent=None):
+        super().__init__(parent)
+        self.api = api
+        self.destination = destination
+        self.stats = TransferStats()
+        self.operations = [] if not destination.strip("/") else [ImportOperation("mkdir", destination)]
+        for directories, files in plan_import(host_dir, destination, self.stats):
+            self.operations.extend(ImportOperation("mkdir", directory) for directory in directories)
+            self.operations.extend(ImportOperation("write", path, host_path, size) for host_path, path, size in files)
+        self.next_index = 0
+        self.in_flight = []
+        self.stopped = False
+        self.done = False
+        self._file = None # 正在发送内容的文件
+        self._frames = None # 它剩下的分段
+        self._frames_started = False # 命令行是否已经发出
+        self._buffer = ""
+        self.api.inputWritten.connect(self._pump)
+
+    def start(self) -> str:
+        """ Starts sending and returns the echo of the first command for the terminal """
+        self.stats.started = time.perf_counter()
+        self._pump()
+        if not self.in_flight:
+            QTimer.singleShot(0, self._finish) # 没有要导入的内容，等调用方连接好 finished 再结束
+        return self.in_flight[0].text + "\n" if self.in_flight else ""
+
+    def _pump(self, *_):
+        while not self.done:
+            if self._frames is not None:
+                if self.api.pending_input_bytes() > INPUT_HIGH_WATER:
+                    return # 等 inputWritten 再继续
+                frame = next(self._frames, None)
+                if frame is None:
+                    self._close_file()
+                    continue
+                self.api.send_bytes_to_app(frame[0])
+                self._frames_started = True
+                if frame[1]:
+                    self.stats.bytes_done += frame[1]
+                    self.progress.emit(self.stats)
+                continue
+            if self.stopped or self.next_index >= len(self.operations) or len(self.in_flight) >= IMPORT_PIPELINE_DEPTH:
+                return
+            operation = self.operations[self.next_index]
+            self.next_index += 1
+            if operation.kind == "mkdir":
+                self.in_flight.append(operation)
+                self.api.send_input_to_app(operation.text, trace=False)
+                continue
+            try:
+                if contains_nul(operation.host_path):
+                    self._skip(operation, "contains NUL bytes")
+                    continue
+                self._file = open(operation.host_path, 'rb')
+            except OSError as e:
+                self._skip(operation, e.strerror or str(e))
+                continue
+            self._frames = write_frames(operation.path, self._file)
+            self._frames_started = False
+            self.in_flight.append(operation)
+
+    def _skip(self, operation: ImportOperation, reason: str):
+        self.stats.skipped.append((operation.host_path, reason))
+        self.stats.files_total -= 1
+        self.stats.bytes_total -= operation.size
+
+    def _close_file(self):
+        self._frames = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def feed(self, output: str) -> str:
+        """ Takes backend stdout, returns the text to show: output with each command echoed after its prompt """
+        if self.done:
+            return output
+        self._buffer += output
+        display = []
+        position = 0
+        for match in SHELL_PROMPT.finditer(self._buffer):
+            if self.in_flight:
+                self.in_flight[0].output += self._buffer[position:match.start()]
+            display.append(self._buffer[position:match.end()])
+            position = match.end()
+            self._complete_current()
+            if self.in_flight:
+                display.append(self.in_flight[0].text + "\n")
+        self._buffer = self._buffer[position:]
+        flush_length = len(self._buffer) - PROMPT_TAIL_LENGTH
+        if flush_length > 0:
+            if self.in_flight:
+                self.in_flight[0].output += self._buffer[:flush_length]
+            display.append(self._buffer[:flush_length])
+            self._buffer = self._buffer[flush_length:]
+        if self.done:
+            display.append(self._buffer)
+            self._buffer = ""
+        return "".join(display)
+
+    def _complete_current(self):
+        if not self.in_flight:
+            return
+        operation = self.in_flight.pop(0)
+        message = operation.output.strip().splitlines()[-1] if operation.output.strip() else ""
+        if operation.kind == "mkdir":
+            if not message:
+                self.stats.directories += 1
+            elif not message.endswith("File exists"):
+                self.stats.errors.append((operation.path, message))
+        elif not operation.aborted:
+            self.stats.files_done += 1
+            if message:
+                self.stats.errors.append((operation.path, message))
+        self.progress.emit(self.stats)
+        self._pump()
+        if not self.in_flight and self._frames is None and (self.stopped or self.next_index >= len(self.operations)):
+            self._finish()
+
+    def cancel(self):
+        """ Sends nothing more: the file being sent is aborted and keeps its old content, commands in flight still complete """
+        self.stopped = True
+        self.stats.cancelled = True
+        if self._frames is not None:
+            if self._frames_started:
+                self.api.send_bytes_to_app(WRITE_ABORT)
+                self.in_flight[-1].aborted = True
+            else:
+                self.in_flight.pop()
+            self._close_file()
+        if not self.in_flight:
+            self._finish()
+
+    def abort(self):
+        """ The backend is gone, finish now """
+        self.stopped = True
+        self.in_flight.clear()
+        self._close_file()
+        self._finish()
+
+    def _finish(self):
+        if self.done:
+            return
+        self.done = True
+        self.stats.finished = time.perf_counter()
+        self.api.inputWritten.disconnect(self._pump)
+        self.finished.emit(not self.stats.errors and not self.stats.cancelled)
+
+
+class ExportRunner(QObject):
+    """
+    Exports a virtual directory to a host directory or tar archive (see api.transfer.open_sink) while holding one
+    terminal's session, so no command changes the disk while it is read.
+    When root is logged in to a local backend process, the image in the working directory is read directly on a worker
+    thread. Reading the image skips the permission checks, so other users go through the shell. A daemon's image may
+    live anywhere, so daemon sessions do too: the tree is walked with `ls -l` and every file streamed out of `cat`;
+    the backend sends UTF-8, which is written back as UTF-8. The terminal only sees decoded text, so bytes that are not
+    valid UTF-8 do not survive that path; `python -m api.transfer export --shell` downloads raw bytes instead.
+    """
+    progress = Signal(object) # TransferStats
+    finished = Signal(bool) # 没有出错且没有取消时为 True
+    _imageDone = Signal(str) # 工作线程结束，出错时带着错误信息
+
+    def __init__(self, api, source: str, destination: str, user: str, parent=None):
+        super().__init__(parent)
+        self.api = api
+        self.source = source.rstrip("/") or "/"
+        self.destination = destination
+        self.stats = TransferStats()
+        self.image_path = None
+        if api.socket is None and user == IMAGE_EXPORT_USER:
+            self.image_path = find_image() # 后端进程和界面在同一个工作目录
+        self.sink = None
+        self.done = False
+        self._cancel = threading.Event()
+        self._thread = None
+        self._last_report = 0.0
+        self._operations = [] # 经 shell 导出时还要执行的 ("ls", 路径, None) 或 ("cat", 路径, 修改时间)，当作栈使用
+        self._current = None # 正在执行的操作
+        self._target = None # cat 的输出写入的文件
+        self._buffer = ""
+        self._received = 0 # 当前 cat 已收到的字符数
+        self._imageDone.connect(self._on_image_done)
+
+    @property
+    def direct(self) -> bool:
+        return self.image_path is not None
+
+    def start(self) -> str:
+        """ Starts exporting and returns the echo of the first command for the terminal """
+        self.stats.started = time.perf_counter()
+        try:
+            self.sink = open_sink(self.source, self.destination)
+        except (OSError, tarfile.TarError) as e:
+            self.stats.errors.append((self.destination, str(e)))
+            QTimer.singleShot(0, self._finish)
+            return ""
+        if self.direct:
+            self._thread = threading.Thread(target=self._export_image, name="osfm-export", daemon=True)
+            self._thread.start()
+            return ""
+        self._operations.append(("ls", self.source, None))
+        return self._next()
+
+    def _export_image(self):
+        error = ""
+        try:
+            with DiskImage(self.image_path) as image:
+                export_image(image, self.source, self.sink, self.stats, self._cancel, self._report)
+        except TransferCancelled:
+            self.stats.cancelled = True
+        except (ImageError, OSError, tarfile.TarError) as e:
+            error = str(e)
+        self._imageDone.emit(error)
+
+    def _report(self, stats: TransferStats):
+        """ Called on the worker thread after every chunk, passed on at most every EXPORT_PROGRESS_INTERVAL seconds """
+        now = time.perf_counter()
+        if now - self._last_report >= EXPORT_PROGRESS_INTERVAL:
+            self._last_report = now
+            self.progress.emit(stats)
+
+    def _on_image_done(self, error: str):
+        if error:
+            self.stats.errors.append((self.source, error))
+        self._finish()
+
+    def _next(self) -> str:
+        """ Sends the next command and returns its echo, finishes when there is nothing left """
+        while self._operations and not self._cancel.is_set():
+            kind, path, mtime = self._operations.pop()
+            if kind == "cat":
+                try:
+                    self._target = self.sink.open_file(relative_path(self.source, path), mtime)
+                except OSError as e:
+                    self.stats.errors.append((path, str(e)))
+                    continue
+                self._received = 0
+            self._current = (kind, path, mtime)
+            command = f'ls -l "{path}"' if kind == "ls" else f'cat "{path}"'
+            self.api.send_input_to_app(command, trace=False)
+            return command + "\n"
+        self._current = None
+        self._finish()
+        return ""
+
+    def feed(self, output: str) -> str:
+        """ Takes backend stdout, returns what the terminal shows: the prompts and commands, not the file contents """
+        if self.done or self._current is None:
+            return output
+        self._buffer += output
+        match = END_PROMPT.search(self._buffer, max(0, len(self._buffer) - PROMPT_TAIL_LENGTH))
+        if match is None:
+            flush_length = len(self._buffer) - PROMPT_TAIL_LENGTH
+            if self._current[0] == "cat" and flush_length > 0 and (self._received or len(self._buffer) > DOWNLOAD_HOLD_BYTES):
+                self._write(self._buffer[:flush_length]) # 已经长到不会是错误信息，只留下可能是提示符的末尾
+                self._buffer = self._buffer[flush_length:]
+            return ""
+        body, prompt = self._buffer[:match.start()], self._buffer[match.start():]
+        self._buffer = ""
+        if self._current[0] == "ls":
+            self._complete_listing(body)
+        else:
+            self._complete_file(body)
+        return prompt + self._next()
+
+    def _write(self, text: str):
+        """ Writes cat output to the target; after a host error the rest of the file is dropped """
+        if self._target is None:
+            return
+        data = text.encode('utf-8')
+        try:
+            self._target.write(data)
+        except (OSError, tarfile.TarError) as e:
+            self.stats.errors.append((self._current[1], str(e)))
+            self._target.discard()
+            self._target = None
+            return
+        self._received += len(text)
+        self.stats.bytes_done += len(data)
+        self.progress.emit(self.stats)
+
+    def _complete_listing(self, body: str):
+        path = self._current[1]
+        lines = body.strip().splitlines()
+        if len(lines) == 1 and lines[0].startswith("ls: "):
+            self.stats.errors.append((path, lines[0]))
+            return
+        entries = parse_ls_long(body)
+        mtime = next((parse_time(entry.modified_time) for entry in entries if entry.name == "."), 0.0)
+        try:
+            self.sink.add_directory(relative_path(self.source, path), mtime)
+        except (OSError, tarfile.TarError) as e:
+            self.stats.errors.append((path, str(e)))
+            return
+        self.stats.directories += 1
+        children = [entry for entry in entries if entry.name not in (".", "..")]
+        for entry in reversed(children): # 栈顶先是这个目录的文件，然后才是子目录
+            if entry.is_dir:
+                self._operations.append(("ls", f"{path.rstrip('/')}/{entry.name}", None))
+        for entry in reversed(children):
+            if not entry.is_dir:
+                self._operations.append(("cat", f"{path.rstrip('/')}/{entry.name}", parse_time(entry.modified_time)))
+                self.stats.files_total += 1
+        self.progress.emit(self.stats)
+
+    def _complete_file(self, body: str):
+        path = self._current[1]
+        if body.endswith("\n"):
+            body = body[:-1] # cat 在内容后面多输出一个换行
+        if self._target is not None and not self._received and "\n" not in body and CAT_ERROR.match(body):
+            self._target.discard()
+            self._target = None
+            self.stats.errors.append((path, body))
+            return
+        self._write(body)
+        if self._target is not None:
+            try:
+                self._target.close()
+            except (OSError, tarfile.TarError) as e:
+                self.stats.errors.append((path, str(e)))
+            self._target = None
+        self.stats.files_done += 1
+        self.progress.emit(self.stats)
+
+    def cancel(self):
+        """ The worker thread stops after the current chunk; through the shell, the file being read still completes """
+        self._cancel.set()
+        self.stats.cancelled = True
+
+    def abort(self):
+        """ The backend is gone or the terminal is closing, finish now """
+        self._cancel.set()
+        if self._thread is not None:
+            self._thread.join() # 工作线程在下一段之前就会停下
+        if self._target is not None:
+            self._target.discard()
+            self._target = None
+        self._current = None
+        self._finish()
+
+    def _finish(self):
+        if self.done:
+            return
+        self.done = True
+        if self.sink is not None:
+            try:
+                self.sink.close()
+            except (OSError, tarfile.TarError) as e:
+                self.stats.errors.append((self.destination, str(e)))
+        self.stats.finished = time.perf_counter()
+        self.progress.emit(self.stats)
+        self.finished.emit(not self.stats.errors and not self.stats.cancelled)
@@ -0,0 +1,180 @@
+import atexit
+import cProfile
+import functools
+import os
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+
+from pathlib import Path
+
+from PySide6.QtCore import QObject, QTimer, QCoreApplication
+
+from api import tracer
+
+from .config import load_config
+
+def _setting(env_name: str, config_key: str, default):
+    """ Environment variable first, then config.json, then default; a malformed variable is ignored with a warning """
+    value = os.environ.get(env_name)
+    if value is not None:
+        if isinstance(default, bool):
+            return value.lower() not in ("", "0", "false", "no")
+        try:
+            return type(default)(value)
+        except ValueError:
+            print(f"[watchdog] ignoring {env_name}={value!r}, expected {type(default).__name__}", file=sys.stderr)
+    return load_config().get(config_key, default)
+
+def profile_dir() -> Path:
+    return Path(_setting("OSFM_PROFILE_DIR", "profileDir", "profiles"))
+
+def _write_profile_file(name: str, suffix: str, write):
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    file_path = directory / f"{name}{suffix}"
+    write(file_path)
+    return file_path
+
+
+class StallWatchdog(QObject):
+    """ Measures event loop latency and dumps the GUI thread stack when the loop stalls """
+    TICK_INTERVAL_MS = 50
+
+    def __init__(self, threshold_ms: int = 200, parent=None):
+        super().__init__(parent)
+        self.threshold = threshold_ms / 1000
+        self.gui_thread_id = threading.get_ident()
+        self.last_tick = time.perf_counter()
+        self.stall_count = 0
+        self._reported_tick = None # 同一次卡顿只记录一次
+        self._stopped = threading.Event()
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.TICK_INTERVAL_MS)
+        self.timer.timeout.connect(self._tick)
+        self.monitor = threading.Thread(target=self._monitor, name="osfm-watchdog", daemon=True)
+
+    def start(self):
+        self.last_tick = time.perf_counter()
+        self.timer.start()
+        self.monitor.start()
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.stop)
+
+    def stop(self):
+        self.timer.stop()
+        self._stopped.set()
+
+    def _tick(self):
+        now = time.perf_counter()
+        lag = now - self.last_tick - self.TICK_INTERVAL_MS / 1000 # 定时器本应触发的时刻与实际触发时刻之差
+        tracer.add_sample("event_loop.latency", max(0.0, lag))
+        self.last_tick = now
+
+    def _monitor(self):
+        while not self._stopped.wait(self.threshold / 4):
+            last_tick = self.last_tick
+            stalled_for = time.perf_counter() - last_tick
+            if stalled_for > self.threshold and self._reported_tick != last_tick:
+                self._reported_tick = last_tick
+                self._report_stall(stalled_for)
+
+    def _report_stall(self, stalled_for: float):
+        frame = sys._current_frames().get(self.gui_thread_id)
+        if frame is None:
+            return
+        self.stall_count += 1
+        stack = "".join(traceback.format_stack(frame))
+        report = f"[watchdog] GUI thread stalled for {stalled_for * 1000:.0f} ms (stall #{self.stall_count})\n{stack}"
+        print(report, file=sys.stderr)
+        try:
+            directory = profile_dir()
+            directory.mkdir(parents=True, exist_ok=True)
+            with open(directory / "stalls.log", 'a', encoding='utf-8') as f:
+                f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {report}\n")
+        except OSError:
+            pass # 写日志失败时只保留 stderr 的输出
+
+
+def start_watchdog(parent=None):
+    """ Starts the watchdog when OSFM_WATCHDOG or the "watchdog" setting is on, returns it or None """
+    if not _setting("OSFM_WATCHDOG", "watchdog", False):
+        return None
+    watchdog = StallWatchdog(_setting("OSFM_WATCHDOG_THRESHOLD_MS", "watchdogThresholdMs", 200), parent)
+    watchdog.start()
+    return watchdog
+
+
+def _profiled_names() -> set:
+    names = _setting("OSFM_PROFILE", "profile", "")
+    return {name.strip() for name in names.split(",") if name.strip()}
+
+class _HotPathProfiles:
+    """ One cProfile.Profile per hot path name, accumulated over every call and dumped at an interval and on exit """
+    def __init__(self):
+        self.profiles = {} # {名称: cProfile.Profile}
+        self.trace_memory = set() # 需要同时写出 tracemalloc 统计的名称
+        self.active = False # 同一时刻只能有一个 profiler 运行，嵌套的热点路径算进外层
+        self.last_dump = time.monotonic()
+        self.interval = None
+        self._exit_registered = False
+
+    def register(self, name: str, trace_memory: bool):
+        self.profiles.setdefault(name, cProfile.Profile())
+        if trace_memory:
+            self.trace_memory.add(name)
+        if not self._exit_registered:
+            self._exit_registered = True
+            self.interval = _setting("OSFM_PROFILE_INTERVAL_S", "profileIntervalS", 60)
+            atexit.register(self.dump)
+
+    def run(self, name: str, function, args, kwargs):
+        if self.active:
+            return function(*args, **kwargs)
+        if name in self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start() # 从第一次调用开始一直跟踪到退出
+        self.active = True
+        try:
+            return self.profiles[name].runcall(function, *args, **kwargs)
+        finally:
+            self.active = False
+            if self.interval and time.monotonic() - self.last_dump >= self.interval:
+                self.dump()
+
+    def dump(self):
+        """ Overwrites <name>.prof (and <name>.mem.txt) in the profile directory with everything collected so far """
+        self.last_dump = time.monotonic()
+        snapshot = tracemalloc.take_snapshot() if self.trace_memory and tracemalloc.is_tracing() else None
+        try:
+            for name, profiler in self.profiles.items():
+                _write_profile_file(name, ".prof", profiler.dump_stats)
+                if snapshot is not None and name in self.trace_memory:
+                    top_stats = snapshot.statistics('lineno')[:30]
+                    _write_profile_file(name, ".mem.txt", lambda path: path.write_text(
+                        "\n".join(str(stat) for stat in top_stats), encoding='utf-8'))
+        except OSError as e:
+            print(f"[watchdog] cannot write profiles: {e}", file=sys.stderr)
+
+_profiles = _HotPathProfiles()
+
+def hot_path(name: str):
+    """
+    Marks a function as a named hot path. When OSFM_PROFILE lists the name (or "all"), every call runs under one
+    cProfile.Profile kept for that name, and tracemalloc runs too when OSFM_TRACEMALLOC is set. The totals are written
+    to <name>.prof in the profile directory every OSFM_PROFILE_INTERVAL_S seconds (0: only on exit) and on exit.
+    Otherwise the function is returned unchanged.
+    """
+    def decorator(function):
+        names = _profiled_names()
+        if name not in names and "all" not in names:
+            return function
+        _profiles.register(name, _setting("OSFM_TRACEMALLOC", "tracemalloc", False))
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            return _profiles.run(name, function, args, kwargs)
+        return wrapper
+    return decorator
@@ -1,7 +1,12 @@
 #include "CommandLineInterface.h"
 
+#include <algorithm>
+
+CommandLineInterface::CommandLineInterface(FileSystemCore& fileSystem, bool shared) : fileSystem(fileSystem), shared(shared) {
+}
+
 void CommandLineInterface::initialize() {
-    if (!fileSystem.mount()) { //如果挂载失败,先格式化
+    if (!fileSystem.isMounted() && !fileSystem.mount()) { //如果挂载失败,先格式化
         std::cout << "mount failed!" << std::endl << "begin format!" << std::endl;
         //如果格式化失败,创建新磁盘
         if (!fileSystem.format(BLOCK_BYTE)) {
@@ -18,8 +23,9 @@ void CommandLineInterface::initialize() {
     uint32_t root_disk = fileSystem.getRootLocation(); //读入根节点所在磁盘块
     INode rootInode{}; //根节点
     fileSystem.read(root_disk, 0, reinterpret_cast<char*>(&rootInode), sizeof(rootInode)); //从根节点所在磁盘块读入根节点信息
-    fileSystem.read(rootInode.bno, 0, reinterpret_cast<char*> (&directory), sizeof(directory)); //将根目录信息写入当前目录
+    readDirectory(rootInode.bno, directory); //将根目录信息写入当前目录
     nowDiretoryDisk = rootInode.bno;
+    failed = false;
 }
 
 bool CommandLineInterface::logout() {
@@ -28,39 +34,95 @@ bool CommandLineInterface::logout() {
     //从根节点所在磁盘块读入根节点信息
     fileSystem.read(root_disk, 0, reinterpret_cast<char*>(&rootInode), sizeof(rootInode));
     //将根目录信息写入当前目录
-    fileSystem.read(rootInode.bno, 0, reinterpret_cast<char*> (&directory), sizeof(directory));
+    readDirectory(rootInode.bno, directory);
     nowDiretoryDisk = rootInode.bno;
 
-    fileSystem.update(); //更新信息
+    fileSystem.sync(); //更新信息并写回缓存
     return true;
 }
 
-std::pair<bool, int> CommandLineInterface::cd(uint8_t uid, std::string directoryName, const std::string& initCmd) {
-    int dirLocation = -1;
-    for (int i = 0; i < DIRECTORY_NUMS; i++) {
-        if (directory.item[i].inodeIndex == 0) {
-            break;
+void CommandLineInterface::sync() {
+    fileSystem.sync();
+}
+
+void CommandLineInterface::reload() {
+    fileSystem.reload();
+}
+
+bool CommandLineInterface::cachestat() {
+    CacheStat stat = fileSystem.getCacheStat();
+    uint64_t total = stat.hits + stat.misses;
+    std::cout << "hits:       " << stat.hits << std::endl;
+    std::cout << "misses:     " << stat.misses << std::endl;
+    std::cout << "hit rate:   " << (total ? stat.hits * 100.0 / total : 0.0) << "%" << std::endl;
+    std::cout << "writebacks: " << stat.writebacks << std::endl;
+    std::cout << "readaheads: " << stat.readaheads << std::endl;
+    std::cout << "cached:     " << stat.cached << "/" << stat.capacity << " blocks" << std::endl;
+    return true;
+}
+
+bool CommandLineInterface::fragstat(uint8_t uid, const std::string& fileName, const std::string& initCmd) {
+    uint32_t fileBlocks = 0, fileExtents = 0;
+    if (!fileName.empty()) {
+        int fileLocation = findItem(fileName);
+        if (fileLocation == -1 || judge(directory.item[fileLocation].inodeIndex)) {
+            error() << initCmd << ": No such file" << std::endl;
+            return false;
         }
-        if (!strcmp(directory.item[i].name, directoryName.c_str())) {
-            //确保是目录名
-            if (judge(directory.item[i].inodeIndex)) {
-                dirLocation = i;
-            } else {
-                dirLocation = -2;
+        INode iNode{};
+        fileSystem.read(directory.item[fileLocation].inodeIndex, 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
+        if (!checkReadAccess(uid, iNode)) {
+            error() << initCmd << ": Permission denied" << std::endl;
+            return false;
+        }
+        //按文件的读取顺序（索引表，数据块，下一个索引表……）统计块号不连续的次数
+        uint32_t last = 0;
+        auto visit = [&](uint32_t bno) {
+            fileBlocks++;
+            if (bno != last + 1) {
+                fileExtents++;
             }
-            break;
+            last = bno;
+        };
+        for (uint32_t next = iNode.bno; next; ) {
+            FileIndex fileIndex{};
+            fileSystem.read(next, 0, reinterpret_cast<char*>(&fileIndex), sizeof(fileIndex));
+            visit(next);
+            for (int i = 0; i < FILE_INDEX_SIZE && fileIndex.index[i]; i++) {
+                visit(fileIndex.index[i]);
+            }
+            next = fileIndex.next;
         }
     }
+    FragStat stat = fileSystem.getFragStat();
+    std::cout << "allocator:      " << (fileSystem.getAllocator() == ALLOCATOR_EXTENT ? "extent" : "stack") << std::endl;
+    std::cout << "free blocks:    " << stat.freeBlocks << std::endl;
+    std::cout << "free extents:   " << stat.freeExtents << std::endl;
+    std::cout << "largest extent: " << stat.largestExtent << " blocks" << std::endl;
+    //最长空闲段以外的空闲块所占比例，0% 表示空闲空间是完整的一段
+    std::cout << "fragmentation:  " << (stat.freeBlocks ? 100.0 - stat.largestExtent * 100.0 / stat.freeBlocks : 0.0) << "%" << std::endl;
+    if (!fileName.empty()) {
+        std::cout << "file blocks:    " << fileBlocks << std::endl;
+        std::cout << "file extents:   " << fileExtents << std::endl;
+    }
+    return true;
+}
+
+std::pair<bool, int> CommandLineInterface::cd(uint8_t uid, std::string directoryName, const std::string& initCmd) {
+    int dirLocation = findItem(directoryName);
+    if (dirLocation != -1 && !judge(directory.item[dirLocation].inodeIndex)) {
+        dirLocation = -2;
+    }
 
     if (dirLocation == -1) {
         if (!initCmd.empty()) {
-            std::cout << currentCmd << ": " << initCmd << ": No such directory" << std::endl;
+            error() << initCmd << ": No such directory" << std::endl;
         }
         return {false, 0};
     }
     if (dirLocation == -2) {
         if (!initCmd.empty()) {
-            std::cout << currentCmd << ": " << initCmd << ": Not a directory" << std::endl;
+            error() << initCmd << ": Not a directory" << std::endl;
         }
         return {false, 1};
     }
@@ -71,24 +133,24 @@ std::pair<bool, int> CommandLineInterface::cd(uint8_t uid, std::string directory
 
     if (!checkReadAccess(uid, iNode)) {
         if (!initCmd.empty()) {
-            std::cout << currentCmd << ": " << initCmd << ": Permission denied" << std::endl;
+            error() << initCmd << ": Permission denied" << std::endl;
         }
         return {false, 2};
     }
 
     nowDiretoryDisk = iNode.bno; //设置新的当前目录
-    fileSystem.read(iNode.bno, 0, reinterpret_cast<char*>(&directory), sizeof(directory));
+    readDirectory(iNode.bno, directory);
     return {true, 0};
 }
 
 bool CommandLineInterface::ls(uint8_t uid, bool all, const std::string& initCmd) {
     INode iNode{};
-    fileSystem.read(directory.item[0].inodeIndex, 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
+    fileSystem.read(readItem(nowDiretoryDisk, 0).inodeIndex, 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
     if (!checkReadAccess(uid, iNode)) {
         if (initCmd.empty()) {
-            std::cout << currentCmd << ": cannot open directory: Permission denied" << std::endl;
+            error() << "cannot open directory: Permission denied" << std::endl;
         } else {
-            std::cout << currentCmd << ": cannot open directory '" << initCmd << "': Permission denied" << std::endl;
+            error() << "cannot open directory '" << initCmd << "': Permission denied" << std::endl;
         }
         return false;
     }
@@ -96,16 +158,17 @@ bool CommandLineInterface::ls(uint8_t uid, bool all, const std::string& initCmd)
     if (all) {
         std::cout << "  fileName   | uid |              owner               |   access   |    creation time    |    modified time" << std::endl;
     }
-    for (int i = 0; i < DIRECTORY_NUMS && directory.item[i].inodeIndex != 0; i++) {
+    //逐块读出目录项并立即输出，不把整个目录读入内存
+    forEachItem(nowDiretoryDisk, [&](const DirectoryItem& item) {
         if (all) {
-            if (judge(directory.item[i].inodeIndex)) {
-                std::cout  << printFixedLength(directory.item[i].name, FILE_NAME_LENGTH) << " |  ";
+            if (judge(item.inodeIndex)) {
+                std::cout  << printFixedLength(item.name, FILE_NAME_LENGTH) << " |  ";
             }
             else {
-                std::cout << printFixedLength(directory.item[i].name, FILE_NAME_LENGTH) << " |  ";
+                std::cout << printFixedLength(item.name, FILE_NAME_LENGTH) << " |  ";
             }
             INode iNode{};
-            fileSystem.read(directory.item[i].inodeIndex, 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
+            fileSystem.read(item.inodeIndex, 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
             std::cout << (int)iNode.uid << "  | ";
             if (iNode.uid) {
                 User user{};
@@ -123,13 +186,14 @@ bool CommandLineInterface::ls(uint8_t uid, bool all, const std::string& initCmd)
             std::cout << iNode.creationTime << " | ";
             std::cout << iNode.modifiedTime << std::endl;
         } else {
-            if (judge(directory.item[i].inodeIndex)) {
-                std::cout  << directory.item[i].name << "\t";
+            if (judge(item.inodeIndex)) {
+                std::cout  << item.name << "\t";
             } else {
-                std::cout << directory.item[i].name << "\t";
+                std::cout << item.name << "\t";
             }
         }
-    }
+        return true;
+    });
     if (!all) {
         std::cout << std::endl;
     }
@@ -140,33 +204,28 @@ bool CommandLineInterface::ls(uint8_t uid, bool all, std::vector<std::string> sr
     auto findRes = findDisk(uid, src);
     if (findRes.first == -1) {
         if (findRes.second == 0 || findRes.second == 1) {
-            std::cout << currentCmd << ": cannot open directory '" << initCmd << "': No such directory" << std::endl;
+            error() << "cannot open directory '" << initCmd << "': No such directory" << std::endl;
         } else if (findRes.second == 2) {
-            std::cout << currentCmd << ": cannot open directory '" << initCmd << "': Permission denied" << std::endl;
+            error() << "cannot open directory '" << initCmd << "': Permission denied" << std::endl;
         }
         return false;
     }
 
     uint32_t tmpDirDisk = findRes.first;
-    Directory tmpDir{};
-    fileSystem.read(tmpDirDisk, 0, reinterpret_cast<char*>(&tmpDir), sizeof(tmpDir));
-    uint32_t inodeDisk = tmpDir.item[findRes.second].inodeIndex;
+    uint32_t inodeDisk = readItem(tmpDirDisk, findRes.second).inodeIndex;
     INode iNode{};
     fileSystem.read(inodeDisk, 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
     if (iNode.flag >> 6 != 1) {
-        std::cout << currentCmd << ": cannot open directory '" << initCmd << "': Not a directory" << std::endl;
+        error() << "cannot open directory '" << initCmd << "': Not a directory" << std::endl;
         return false;
     }
     if (!checkReadAccess(uid, iNode)) {
-        std::cout << currentCmd << ": cannot open directory '" << initCmd << "': Permission denied" << std::endl;
+        error() << "cannot open directory '" << initCmd << "': Permission denied" << std::endl;
         return false;
     }
     tmpDirDisk = iNode.bno;
-    fileSystem.read(tmpDirDisk, 0, reinterpret_cast<char*>(&tmpDir), sizeof(tmpDir));
-    std::swap(directory, tmpDir);
-    std::swap(nowDiretoryDisk, tmpDirDisk);
+    std::swap(nowDiretoryDisk, tmpDirDisk); //ls 直接从磁盘逐块读取，不需要读入目标目录
     ls(uid, all, initCmd);
-    std::swap(directory, tmpDir);
     std::swap(nowDiretoryDisk, tmpDirDisk);
     return true;
 }
@@ -175,24 +234,13 @@ bool CommandLineInterface::touch(uint8_t uid, std::string fileName, const std::s
     INode iNode{};
     fileSystem.read(directory.item[0].inodeIndex, 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
     if (!checkWriteAccess(uid, iNode)) {
-        std::cout << currentCmd << ": cannot touch '" << initCmd << "': Permission denied" << std::endl;
+        error() << "cannot touch '" << initCmd << "': Permission denied" << std::endl;
         return false;
     }
 
-    int directoryIndex = -1;
-    for (int i = 0; i < DIRECTORY_NUMS; i++) { //遍历所有目录项,找到空闲目录项
-        if (directory.item[i].inodeIndex == 0) {
-            directoryIndex = i;
-            break;
-        }
-    }
-    if (directoryIndex == -1) { //目录项满了
-        std::cout << currentCmd << ": cannot touch '" << initCmd << "': No space left on device" << std::endl;
-        return false;
-    }
     //重复文件检测
     if (duplicateDetection(fileName)) {
-        std::cout << currentCmd << ": cannot touch '" << initCmd << "': File exists" << std::endl;
+        error() << "cannot touch '" << initCmd << "': File exists" << std::endl;
         return false;
     }
     uint32_t fileInodeDisk = fileSystem.blockAllocate(); //给新文件的i结点分配空闲磁盘块
@@ -216,13 +264,8 @@ bool CommandLineInterface::touch(uint8_t uid, std::string fileName, const std::s
     strcpy(fileInode.modifiedTime, fileInode.creationTime);
     fileSystem.write(fileInodeDisk, 0, reinterpret_cast<char*>(&fileInode), sizeof(fileInode));
 
-    strcpy(directory.item[directoryIndex].name, fileName.c_str()); //更新目录项信息
-    directory.item[directoryIndex].inodeIndex = fileInodeDisk;
-    if (directoryIndex + 1 < DIRECTORY_NUMS) {
-        directory.item[directoryIndex + 1].inodeIndex = 0;
-    }
-    //将更新后的当前目录信息写入磁盘
-    fileSystem.write(nowDiretoryDisk, 0, reinterpret_cast<char*>(&directory), sizeof(directory));
+    //更新目录项信息，并将更新后的当前目录信息写入磁盘
+    addItem(fileName, fileInodeDisk);
 
     //char str[BLOCK_SIZE] = "testjljslkadjflkasjdf";
     //fileSystem.write(fileDisk, 0, reinterpret_cast<char*>(str), BLOCK_BYTE);
@@ -235,29 +278,27 @@ bool CommandLineInterface::touch(uint8_t uid, std::vector<std::string> src, std:
     auto findRes = findDisk(uid, src);
     if (findRes.first == -1) {
         if (findRes.second == 0 || findRes.second == 1) {
-            std::cout << currentCmd << ": cannot touch '" << initCmd << "': No such file or directory" << std::endl;
+            error() << "cannot touch '" << initCmd << "': No such file or directory" << std::endl;
         } else if (findRes.second == 2) {
-            std::cout << currentCmd << ": cannot touch '" << initCmd << "': Permission denied" << std::endl;
+            error() << "cannot touch '" << initCmd << "': Permission denied" << std::endl;
         }
         return false;
     }
 
     uint32_t tmpDirDisk = findRes.first;
-    Directory tmpDir{};
-    fileSystem.read(tmpDirDisk, 0, reinterpret_cast<char*>(&tmpDir), sizeof(tmpDir));
-    uint32_t inodeDisk = tmpDir.item[findRes.second].inodeIndex;
+    uint32_t inodeDisk = readItem(tmpDirDisk, findRes.second).inodeIndex;
     INode iNode{};
     fileSystem.read(inodeDisk, 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
     if (iNode.flag >> 6 != 1) {
-        std::cout << currentCmd << ": cannot touch '" << initCmd << "': No such file or directory" << std::endl;
+        error() << "cannot touch '" << initCmd << "': No such file or directory" << std::endl;
         return false;
     }
     if (!checkReadAccess(uid, iNode)) {
-        std::cout << currentCmd << ": cannot touch '" << initCmd << "': Permission denied" << std::endl;
+        error() << "cannot touch '" << initCmd << "': Permission denied" << std::endl;
         return false;
     }
     tmpDirDisk = iNode.bno;
-    fileSystem.read(tmpDirDisk, 0, reinterpret_cast<char*>(&tmpDir), sizeof(tmpDir));
+    DirectoryList& tmpDir = loadDirectory(tmpDirDisk);
     std::swap(directory, tmpDir);
     std::swap(nowDiretoryDisk, tmpDirDisk);
     touch(uid, fileName, initCmd);
@@ -266,117 +307,87 @@ bool CommandLineInterface::touch(uint8_t uid, std::vector<std::string> src, std:
     return true;
 }
 
-bool CommandLineInterface::cat(uint8_t uid, std::string fileName, const std::string& initCmd, std::tuple<bool, std::string, std::string>* returnContent) {
-    int fileLocation = -1;
-    for (int i = 0; i < DIRECTORY_NUMS; i++) {
-        if (directory.item[i].inodeIndex == 0) {
-            break;
-        }
-        if (!strcmp(directory.item[i].name, fileName.c_str())) {
-            if (!judge(directory.item[i].inodeIndex)) {
-                fileLocation = i;
-            } else {
-                fileLocation = -2;
-            }
-            break;
-        }
+bool CommandLineInterface::cat(uint8_t uid, std::string fileName, const std::string& initCmd, std::tuple<bool, std::string, std::string>* returnContent, uint64_t offset, uint64_t length) {
+    int fileLocation = findItem(fileName);
+    if (fileLocation != -1 && judge(directory.item[fileLocation].inodeIndex)) {
+        fileLocation = -2;
     }
     if (fileLocation == -1) {
-        std::cout << currentCmd << ": " << initCmd << ": No such file" << std::endl;
+        error() << initCmd << ": No such file" << std::endl;
         return false;
     }
     if (fileLocation == -2) {
-        std::cout << currentCmd << ": " << initCmd << ": Not a file" << std::endl;
+        error() << initCmd << ": Not a file" << std::endl;
         return false;
     }
 
     INode iNode{};
     fileSystem.read(directory.item[fileLocation].inodeIndex, 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
     if (!checkReadAccess(uid, iNode)) {
-        std::cout << currentCmd << ": " << initCmd << ": Permission denied" << std::endl;
+        error() << initCmd << ": Permission denied" << std::endl;
         return false;
     }
 
-    std::string content = readFile(iNode.bno);
     if (returnContent) {
         std::get<0>(*returnContent) = true;
-        std::get<1>(*returnContent) = content;
+        std::get<1>(*returnContent) = readFile(iNode.bno);
         std::get<2>(*returnContent) = iNode.creationTime;
     } else {
-        std::cout << content << std::endl;
+        streamFile(iNode.bno, offset, length, std::cout);
+        std::cout << std::endl;
     }
     return true;
 }
 
-bool CommandLineInterface::cat(uint8_t uid, std::vector<std::string> src, std::string fileName, const std::string& initCmd, std::tuple<bool, std::string, std::string>* returnContent) {
+bool CommandLineInterface::cat(uint8_t uid, std::vector<std::string> src, std::string fileName, const std::string& initCmd, std::tuple<bool, std::string, std::string>* returnContent, uint64_t offset, uint64_t length) {
     auto findRes = findDisk(uid, src);
     if (findRes.first == -1) {
         if (findRes.second == 0 || findRes.second == 1) {
-            std::cout << currentCmd << ": " << initCmd << ": No such file or directory" << std::endl;
+            error() << initCmd << ": No such file or directory" << std::endl;
         } else if (findRes.second == 2) {
-            std::cout << currentCmd << ": " << initCmd << ": Permission denied" << std::endl;
+            error() << initCmd << ": Permission denied" << std::endl;
         }
         return false;
     }
 
     uint32_t tmpDirDisk = findRes.first;
-    Directory tmpDir{};
-    fileSystem.read(tmpDirDisk, 0, reinterpret_cast<char*>(&tmpDir), sizeof(tmpDir));
-    uint32_t inodeDisk = tmpDir.item[findRes.second].inodeIndex;
+    uint32_t inodeDisk = readItem(tmpDirDisk, findRes.second).inodeIndex;
     INode iNode{};
     fileSystem.read(inodeDisk, 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
     if (iNode.flag >> 6 != 1) {
-        std::cout << currentCmd << ": " << initCmd << ": No such file or directory" << std::endl;
+        error() << initCmd << ": No such file or directory" << std::endl;
         return false;
     }
     if (!checkReadAccess(uid, iNode)) {
-        std::cout << currentCmd << ": " << initCmd << ": Permission denied" << std::endl;
+        error() << initCmd << ": Permission denied" << std::endl;
         return false;
     }
     tmpDirDisk = iNode.bno;
-    fileSystem.read(tmpDirDisk, 0, reinterpret_cast<char*>(&tmpDir), sizeof(tmpDir));
+    DirectoryList& tmpDir = loadDirectory(tmpDirDisk);
     std::swap(directory, tmpDir);
     std::swap(nowDiretoryDisk, tmpDirDisk);
-    cat(uid, fileName, initCmd, returnContent);
+    cat(uid, fileName, initCmd, returnContent, offset, length);
     std::swap(directory, tmpDir);
     std::swap(nowDiretoryDisk, tmpDirDisk);
     return true;
 }
 
 bool CommandLineInterface::vim(uint8_t uid, std::string fileName, const std::string& initCmd, std::tuple<bool, std::string, std::string>* inputContent) {
-    int fileLocation = -1;
-    for (int i = 0; i < DIRECTORY_NUMS; i++) {
-        if (directory.item[i].inodeIndex == 0) {
-            break;
-        }
-        if (!strcmp(directory.item[i].name, fileName.c_str())) {
-            if (!judge(directory.item[i].inodeIndex)) {
-                fileLocation = i;
-            } else {
-                fileLocation = -2;
-            }
-            break;
-        }
+    int fileLocation = findItem(fileName);
+    if (fileLocation != -1 && judge(directory.item[fileLocation].inodeIndex)) {
+        fileLocation = -2;
     }
     if (fileLocation == -2) {
-        std::cout << currentCmd << ": " << initCmd << ": Is a directory" << std::endl;
+        error() << initCmd << ": Is a directory" << std::endl;
         return false;
     }
     if (fileLocation == -1) {
         if (!touch(uid, fileName, initCmd)) {
             return false;
         }
-        for (int i = 0; i < DIRECTORY_NUMS; i++) {
-            if (directory.item[i].inodeIndex == 0) {
-                break;
-            }
-            if (!strcmp(directory.item[i].name, fileName.c_str())) {
-                fileLocation = i;
-                break;
-            }
-        }
+        fileLocation = findItem(fileName);
         if (fileLocation == -1) { // 理论上到这里 fileLocation 应该 >= 0 了，否则说明 touch 成功了但没找到，属于更底层bug
-            std::cout << currentCmd << ": internal error: could not locate newly created file '" << initCmd << "'" << std::endl;
+            error() << "internal error: could not locate newly created file '" << initCmd << "'" << std::endl;
             return false;
         }
     }
@@ -386,7 +397,7 @@ bool CommandLineInterface::vim(uint8_t uid, std::string fileName, const std::str
 
     if (!inputContent) {
         if (!checkReadAccess(uid, iNode)) {
-            std::cout << currentCmd << ": " << initCmd << ": Permission denied" << std::endl;
+            error() << initCmd << ": Permission denied" << std::endl;
             return false;
         }
         std::string content = readFile(iNode.bno);
@@ -404,9 +415,9 @@ bool CommandLineInterface::vim(uint8_t uid, std::string fileName, const std::str
     } else {
         if (!checkWriteAccess(uid, iNode)) { // 根据 currentCmd 调整错误信息更友好
             if (currentCmd == "echo") {
-                std::cout << currentCmd << ": cannot write to '" << initCmd << "': Permission denied" << std::endl;
+                error() << "cannot write to '" << initCmd << "': Permission denied" << std::endl;
             } else {
-                std::cout << currentCmd << ": cannot " << (currentCmd == "mv" ? "move" : "copy") << " to '" << initCmd << "': Permission denied" << std::endl;
+                error() << "cannot " << (currentCmd == "mv" ? "move" : "copy") << " to '" << initCmd << "': Permission denied" << std::endl;
             }
             return false;
             // std::cout << currentCmd << ": cannot " << (currentCmd == "mv" ? "move" : "copy") << " to '" << initCmd << "': Permission denied" << std::endl;
@@ -428,29 +439,27 @@ bool CommandLineInterface::vim(uint8_t uid, std::vector<std::string> src, std::s
     auto findRes = findDisk(uid, src);
     if (findRes.first == -1) {
         if (findRes.second == 0 || findRes.second == 1) {
-            std::cout << currentCmd << ": " << initCmd << ": No such file or directory" << std::endl;
+            error() << initCmd << ": No such file or directory" << std::endl;
         } else if (findRes.second == 2) {
-            std::cout << currentCmd << ": " << initCmd << ": Permission denied" << std::endl;
+            error() << initCmd << ": Permission denied" << std::endl;
         }
         return false;
     }
 
     uint32_t tmpDirDisk = findRes.first;
-    Directory tmpDir{};
-    fileSystem.read(tmpDirDisk, 0, reinterpret_cast<char*>(&tmpDir), sizeof(tmpDir));
-    uint32_t inodeDisk = tmpDir.item[findRes.second].inodeIndex;
+    uint32_t inodeDisk = readItem(tmpDirDisk, findRes.second).inodeIndex;
     INode iNode{};
     fileSystem.read(inodeDisk, 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
     if (iNode.flag >> 6 != 1) {
-        std::cout << currentCmd << ": " << initCmd << ": No such file or directory" << std::endl;
+        error() << initCmd << ": No such file or directory" << std::endl;
         return false;
     }
     if (!checkReadAccess(uid, iNode)) {
-        std::cout << currentCmd << ": " << initCmd << ": Permission denied" << std::endl;
+        error() << initCmd << ": Permission denied" << std::endl;
         return false;
     }
     tmpDirDisk = iNode.bno;
-    fileSystem.read(tmpDirDisk, 0, reinterpret_cast<char*>(&tmpDir), sizeof(tmpDir));
+    DirectoryList& tmpDir = loadDirectory(tmpDirDisk);
     std::swap(directory, tmpDir);
     std::swap(nowDiretoryDisk, tmpDirDisk);
     vim(uid, fileName, initCmd, inputContent);
@@ -459,6 +468,129 @@ bool CommandLineInterface::vim(uint8_t uid, std::vector<std::string> src, std::s
     return true;
 }
 
+bool CommandLineInterface::append(uint8_t uid, std::string fileName, const std::string& initCmd, const std::string& line) {
+    int fileLocation = findItem(fileName);
+    if (fileLocation != -1 && judge(directory.item[fileLocation].inodeIndex)) {
+        error() << initCmd << ": Is a directory" << std::endl;
+        return false;
+    }
+    if (fileLocation == -1) {
+        error() << initCmd << ": No such file or directory for append. Use '>' to create and write." << std::endl;
+        return false;
+    }
+
+    INode iNode{};
+    fileSystem.read(directory.item[fileLocation].inodeIndex, 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
+    if (!checkWriteAccess(uid, iNode)) {
+        error() << "cannot write to '" << initCmd << "': Permission denied" << std::endl;
+        return false;
+    }
+    appendFile(iNode.bno, line);
+    strcpy(iNode.modifiedTime, INode::getCurTime().c_str());
+    fileSystem.write(directory.item[fileLocation].inodeIndex, 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
+    fileSystem.update();
+    return true;
+}
+
+bool CommandLineInterface::append(uint8_t uid, std::vector<std::string> src, std::string fileName, const std::string& initCmd, const std::string& line) {
+    auto findRes = findDisk(uid, src);
+    if (findRes.first == -1) {
+        if (findRes.second == 0 || findRes.second == 1) {
+            error() << initCmd << ": No such file or directory" << std::endl;
+        } else if (findRes.second == 2) {
+            error() << initCmd << ": Permission denied" << std::endl;
+        }
+        return false;
+    }
+
+    uint32_t tmpDirDisk = findRes.first;
+    uint32_t inodeDisk = readItem(tmpDirDisk, findRes.second).inodeIndex;
+    INode iNode{};
+    fileSystem.read(inodeDisk, 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
+    if (iNode.flag >> 6 != 1) {
+        error() << initCmd << ": No such file or directory" << std::endl;
+        return false;
+    }
+    if (!checkReadAccess(uid, iNode)) {
+        error() << initCmd << ": Permission denied" << std::endl;
+        return false;
+    }
+    tmpDirDisk = iNode.bno;
+    DirectoryList& tmpDir = loadDirectory(tmpDirDisk);
+    std::swap(directory, tmpDir);
+    std::swap(nowDiretoryDisk, tmpDirDisk);
+    bool ret = append(uid, fileName, initCmd, line);
+    std::swap(directory, tmpDir);
+    std::swap(nowDiretoryDisk, tmpDirDisk);
+    return ret;
+}
+
+bool CommandLineInterface::write(uint8_t uid, std::string fileName, const std::string& initCmd, ChunkReader& chunks) {
+    int fileLocation = findItem(fileName);
+    if (fileLocation != -1 && judge(directory.item[fileLocation].inodeIndex)) {
+        error() << initCmd << ": Is a directory" << std::endl;
+        return false;
+    }
+    if (fileLocation == -1) {
+        if (!touch(uid, fileName, initCmd)) {
+            return false;
+        }
+        fileLocation = findItem(fileName);
+    }
+
+    INode iNode{};
+    fileSystem.read(directory.item[fileLocation].inodeIndex, 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
+    if (!checkWriteAccess(uid, iNode)) {
+        error() << "cannot write to '" << initCmd << "': Permission denied" << std::endl;
+        return false;
+    }
+    uint32_t newFileIndexDisk = writeStream(chunks);
+    if (chunks.failed()) { //输入不完整，保留原来的内容，错误信息由 Shell 输出
+        freeFile(newFileIndexDisk);
+        fileSystem.update();
+        return false;
+    }
+    freeFile(iNode.bno);
+    iNode.bno = newFileIndexDisk;
+    strcpy(iNode.modifiedTime, INode::getCurTime().c_str());
+    fileSystem.write(directory.item[fileLocation].inodeIndex, 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
+    fileSystem.update();
+    return true;
+}
+
+bool CommandLineInterface::write(uint8_t uid, std::vector<std::string> src, std::string fileName, const std::string& initCmd, ChunkReader& chunks) {
+    auto findRes = findDisk(uid, src);
+    if (findRes.first == -1) {
+        if (findRes.second == 0 || findRes.second == 1) {
+            error() << initCmd << ": No such file or directory" << std::endl;
+        } else if (findRes.second == 2) {
+            error() << initCmd << ": Permission denied" << std::endl;
+        }
+        return false;
+    }
+
+    uint32_t tmpDirDisk = findRes.first;
+    uint32_t inodeDisk = readItem(tmpDirDisk, findRes.second).inodeIndex;
+    INode iNode{};
+    fileSystem.read(inodeDisk, 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
+    if (iNode.flag >> 6 != 1) {
+        error() << initCmd << ": No such file or directory" << std::endl;
+        return false;
+    }
+    if (!checkReadAccess(uid, iNode)) {
+        error() << initCmd << ": Permission denied" << std::endl;
+        return false;
+    }
+    tmpDirDisk = iNode.bno;
+    DirectoryList& tmpDir = loadDirectory(tmpDirDisk);
+    std::swap(directory, tmpDir);
+    std::swap(nowDiretoryDisk, tmpDirDisk);
+    bool ret = write(uid, fileName, initCmd, chunks);
+    std::swap(directory, tmpDir);
+    std::swap(nowDiretoryDisk, tmpDirDisk);
+    return ret;
+}
+
 bool CommandLineInterface::mv(uint8_t uid, std::vector<std::string> src, std::vector<std::string> des, const std::string& initSrc, const std::string& initDes) {
     if (!cp(uid, src, des, initSrc, initDes)) {
         return false;
@@ -509,26 +641,16 @@ bool CommandLineInterface::cp(uint8_t uid, std::vector<std::string> src, std::ve
 }
 
 bool CommandLineInterface::rm(uint8_t uid, std::string fileName, const std::string& initCmd) {
-    int fileLocation = -1;
-    for (int i = 0; i < DIRECTORY_NUMS; i++) {
-        if (directory.item[i].inodeIndex == 0) {
-            break;
-        }
-        if (!strcmp(directory.item[i].name, fileName.c_str())) {
-            if (!judge(directory.item[i].inodeIndex)) {
-                fileLocation = i;
-            } else {
-                fileLocation = -2;
-            }
-            break;
-        }
+    int fileLocation = findItem(fileName);
+    if (fileLocation != -1 && judge(directory.item[fileLocation].inodeIndex)) {
+        fileLocation = -2;
     }
     if (fileLocation == -1) {
-        std::cout << currentCmd << ": cannot remove '" << initCmd << "': No such file" << std::endl;
+        error() << "cannot remove '" << initCmd << "': No such file" << std::endl;
         return false;
     }
     if (fileLocation == -2) {
-        std::cout << currentCmd << ": cannot remove '" << initCmd << "': Not a file" << std::endl;
+        error() << "cannot remove '" << initCmd << "': Not a file" << std::endl;
         return false;
     }
 
@@ -536,7 +658,7 @@ bool CommandLineInterface::rm(uint8_t uid, std::string fileName, const std::stri
     INode fileIndexInode{};
     fileSystem.read(directory.item[fileLocation].inodeIndex, 0, reinterpret_cast<char*>(&fileIndexInode), sizeof(fileIndexInode));
     if (!checkWriteAccess(uid, fileIndexInode)) {
-        std::cout << currentCmd << ": cannot remove '" << initCmd << "': Permission denied" << std::endl;
+        error() << "cannot remove '" << initCmd << "': Permission denied" << std::endl;
         return false;
     }
 
@@ -544,9 +666,8 @@ bool CommandLineInterface::rm(uint8_t uid, std::string fileName, const std::stri
     //回收i结点
     fileSystem.blockFree(directory.item[fileLocation].inodeIndex);
     //更新目录项
-    wholeDirItemsMove(fileLocation);
-    //将新的目录项写入磁盘
-    fileSystem.write(nowDiretoryDisk, 0, reinterpret_cast<char*>(&directory), sizeof(directory));
+    //删除目录项，并将新的目录项写入磁盘
+    removeItem(fileLocation);
     fileSystem.update();
     return true;
 }
@@ -555,29 +676,27 @@ bool CommandLineInterface::rm(uint8_t uid, std::vector<std::string> src, std::st
     auto findRes = findDisk(uid, src);
     if (findRes.first == -1) {
         if (findRes.second == 0 || findRes.second == 1) {
-            std::cout << currentCmd << ": cannot remove '" << initCmd << "': No such file or directory" << std::endl;
+            error() << "cannot remove '" << initCmd << "': No such file or directory" << std::endl;
         } else if (findRes.second == 2) {
-            std::cout << currentCmd << ": cannot remove '" << initCmd << "': Permission denied" << std::endl;
+            error() << "cannot remove '" << initCmd << "': Permission denied" << std::endl;
         }
         return false;
     }
 
     uint32_t tmpDirDisk = findRes.first;
-    Directory tmpDir{};
-    fileSystem.read(tmpDirDisk, 0, reinterpret_cast<char*>(&tmpDir), sizeof(tmpDir));
-    uint32_t inodeDisk = tmpDir.item[findRes.second].inodeIndex;
+    uint32_t inodeDisk = readItem(tmpDirDisk, findRes.second).inodeIndex;
     INode iNode{};
     fileSystem.read(inodeDisk, 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
     if (iNode.flag >> 6 != 1) {
-        std::cout << currentCmd << ": cannot remove '" << initCmd << "': No such file or directory" << std::endl;
+        error() << "cannot remove '" << initCmd << "': No such file or directory" << std::endl;
         return false;
     }
     if (!checkReadAccess(uid, iNode)) {
-        std::cout << currentCmd << ": cannot remove '" << initCmd << "': Permission denied" << std::endl;
+        error() << "cannot remove '" << initCmd << "': Permission denied" << std::endl;
         return false;
     }
     tmpDirDisk = iNode.bno;
-    fileSystem.read(tmpDirDisk, 0, reinterpret_cast<char*>(&tmpDir), sizeof(tmpDir));
+    DirectoryList& tmpDir = loadDirectory(tmpDirDisk);
     std::swap(directory, tmpDir);
     std::swap(nowDiretoryDisk, tmpDirDisk);
     rm(uid, fileName, initCmd);
@@ -590,24 +709,12 @@ bool CommandLineInterface::mkdir(uint8_t uid, std::string directoryName, const s
     INode iNode{};
     fileSystem.read(directory.item[0].inodeIndex, 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
     if (!checkWriteAccess(uid, iNode)) {
-        std::cout << currentCmd << ": cannot create directory '" << initCmd << "': Permission denied" << std::endl;
-        return false;
-    }
-
-    int directoryIndex = -1;
-    for (int i = 0; i < DIRECTORY_NUMS; i++) { //遍历所有目录项,找到空闲目录项
-        if (directory.item[i].inodeIndex == 0) {
-            directoryIndex = i;
-            break;
-        }
-    }
-    if (directoryIndex == -1) { //目录项满了
-        std::cout << currentCmd << ": cannot create directory '" << initCmd << "': No space left on device" << std::endl;
+        error() << "cannot create directory '" << initCmd << "': Permission denied" << std::endl;
         return false;
     }
 
     if (duplicateDetection(directoryName)) { //重复文件检测
-        std::cout << currentCmd << ": cannot create directory '" << initCmd << "': File exists" << std::endl;
+        error() << "cannot create directory '" << initCmd << "': File exists" << std::endl;
         return false;
     }
 
@@ -629,6 +736,7 @@ bool CommandLineInterface::mkdir(uint8_t uid, std::string directoryName, const s
     newDirectory.item[2].inodeIndex = 0;
     //将目录项信息写入磁盘
     fileSystem.write(directoryDisk, 0, reinterpret_cast<char*>(&newDirectory), sizeof(newDirectory));
+    directoryVersion(directoryDisk)++; //这个磁盘块以前可能是别的目录，使它的旧索引失效
 
     //新目录i节点
     INode directoryInode{};
@@ -641,13 +749,8 @@ bool CommandLineInterface::mkdir(uint8_t uid, std::string directoryName, const s
     fileSystem.write(directoryInodeDisk, 0, reinterpret_cast<char*>(&directoryInode), sizeof(directoryInode));
 
     //更新当前目录目录项
-    strcpy(directory.item[directoryIndex].name, directoryName.c_str());
-    directory.item[directoryIndex].inodeIndex = directoryInodeDisk;
-    if (directoryIndex + 1 < DIRECTORY_NUMS) {
-        directory.item[directoryIndex + 1].inodeIndex = 0;
-    }
-    //将更新后的当前目录信息写入磁盘
-    fileSystem.write(nowDiretoryDisk, 0, reinterpret_cast<char*>(&directory), sizeof(directory));
+    //更新目录项信息，并将更新后的当前目录信息写入磁盘
+    addItem(directoryName, directoryInodeDisk);
 
     fileSystem.update(); //更新已分配磁盘块
     return true;
@@ -657,29 +760,27 @@ bool CommandLineInterface::mkdir(uint8_t uid, std::vector<std::string> src, std:
     auto findRes = findDisk(uid, src);
     if (findRes.first == -1) {
         if (findRes.second == 0 || findRes.second == 1) {
-            std::cout << currentCmd << ": cannot create directory '" << initCmd << "': No such directory" << std::endl;
+            error() << "cannot create directory '" << initCmd << "': No such directory" << std::endl;
         } else if (findRes.second == 2) {
-            std::cout << currentCmd << ": cannot create directory '" << initCmd << "': Permission denied" << std::endl;
+            error() << "cannot create directory '" << initCmd << "': Permission denied" << std::endl;
         }
         return false;
     }
 
     uint32_t tmpDirDisk = findRes.first;
-    Directory tmpDir{};
-    fileSystem.read(tmpDirDisk, 0, reinterpret_cast<char*>(&tmpDir), sizeof(tmpDir));
-    uint32_t inodeDisk = tmpDir.item[findRes.second].inodeIndex;
+    uint32_t inodeDisk = readItem(tmpDirDisk, findRes.second).inodeIndex;
     INode iNode{};
     fileSystem.read(inodeDisk, 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
     if (iNode.flag >> 6 != 1) {
-        std::cout << currentCmd << ": cannot create directory '" << initCmd << "': Not a directory" << std::endl;
+        error() << "cannot create directory '" << initCmd << "': Not a directory" << std::endl;
         return false;
     }
     if (!checkReadAccess(uid, iNode)) {
-        std::cout << currentCmd << ": cannot create directory '" << initCmd << "': Permission denied" << std::endl;
+        error() << "cannot create directory '" << initCmd << "': Permission denied" << std::endl;
         return false;
     }
     tmpDirDisk = iNode.bno;
-    fileSystem.read(tmpDirDisk, 0, reinterpret_cast<char*>(&tmpDir), sizeof(tmpDir));
+    DirectoryList& tmpDir = loadDirectory(tmpDirDisk);
     std::swap(directory, tmpDir);
     std::swap(nowDiretoryDisk, tmpDirDisk);
     mkdir(uid, dirName, initCmd);
@@ -690,26 +791,16 @@ bool CommandLineInterface::mkdir(uint8_t uid, std::vector<std::string> src, std:
 
 bool CommandLineInterface::rmdir(uint8_t uid, std::string dirName, const std::string& initCmd) {
     //先查找对应目录
-    int dirLocation = -1;
-    for (int i = 0; i < DIRECTORY_NUMS; i++) {
-        if (directory.item[i].inodeIndex == 0) {
-            break;
-        }
-        if (!strcmp(directory.item[i].name, dirName.c_str())) {
-            if (judge(directory.item[i].inodeIndex)) {
-                dirLocation = i;
-            } else {
-                dirLocation = -2;
-            }
-            break;
-        }
+    int dirLocation = findItem(dirName);
+    if (dirLocation != -1 && !judge(directory.item[dirLocation].inodeIndex)) {
+        dirLocation = -2;
     }
     if (dirLocation == -1) {
-        std::cout << currentCmd << ": cannot remove directory '" << initCmd << "': No such directory" << std::endl;
+        error() << "cannot remove directory '" << initCmd << "': No such directory" << std::endl;
         return false;
     }
     if (dirLocation == -2) {
-        std::cout << currentCmd << ": cannot remove directory '" << initCmd << "': Not a directory" << std::endl;
+        error() << "cannot remove directory '" << initCmd << "': Not a directory" << std::endl;
         return false;
     }
 
@@ -719,19 +810,20 @@ bool CommandLineInterface::rmdir(uint8_t uid, std::string dirName, const std::st
     INode dirInode1{};
     fileSystem.read(directory.item[dirLocation].inodeIndex, 0, reinterpret_cast<char*>(&dirInode1), sizeof(dirInode1));
     if (!checkWriteAccess(uid, dirInode1)) {
-        std::cout << currentCmd << ": cannot remove directory '" << initCmd << "': Permission denied" << std::endl;
+        error() << "cannot remove directory '" << initCmd << "': Permission denied" << std::endl;
         return false;
     }
 
-    fileSystem.read(dirInode1.bno, 0, reinterpret_cast<char*>(&directory), sizeof(directory));
+    DirectoryList parent; //子目录的删除不会修改当前目录，先换出，结束后换回，不必重新读入
+    std::swap(parent, directory);
+    readDirectory(dirInode1.bno, directory);
     nowDiretoryDisk = dirInode1.bno;
 
-    for (int i = 0; i < DIRECTORY_NUMS; i++) {
-        if (!directory.item[i].inodeIndex) break;
+    for (int i = 0; i < (int)directory.item.size(); i++) {
         if (!judge(directory.item[i].inodeIndex)) {
             //文件
             if (!rm(uid, directory.item[i].name, initCmd)) {
-                fileSystem.read(nowDisk, 0, reinterpret_cast<char*>(&directory), sizeof(directory));
+                std::swap(directory, parent);
                 nowDiretoryDisk = nowDisk;
                 return false;
             }
@@ -739,23 +831,25 @@ bool CommandLineInterface::rmdir(uint8_t uid, std::string dirName, const std::st
         } else if (strcmp(directory.item[i].name, ".") != 0 && strcmp(directory.item[i].name, "..") != 0) {
             //目录
             if (!rmdir(uid, directory.item[i].name, initCmd)) {
-                fileSystem.read(nowDisk, 0, reinterpret_cast<char*>(&directory), sizeof(directory));
+                std::swap(directory, parent);
                 nowDiretoryDisk = nowDisk;
                 return false;
             }
             i--;
         }
     }
+    //回收指定目录的所有目录块
+    for (uint32_t block : directory.blocks) {
+        fileSystem.blockFree(block);
+    }
+    directoryIndexes.erase(dirInode1.bno);
     //重置当前目录
-    fileSystem.read(nowDisk, 0, reinterpret_cast<char*>(&directory), sizeof(directory));
+    std::swap(directory, parent);
     nowDiretoryDisk = nowDisk;
     //回收指定目录的i结点所在磁盘块
-    //std::cout << dirInode1.bno << ' ' << directory.item[dirLocation].inodeIndex << std::endl;
-    fileSystem.blockFree(dirInode1.bno);
     fileSystem.blockFree(directory.item[dirLocation].inodeIndex);
-    wholeDirItemsMove(dirLocation);
-    //将新的目录项写入磁盘
-    fileSystem.write(nowDiretoryDisk, 0, reinterpret_cast<char*>(&directory), sizeof(directory));
+    //删除目录项，并将新的目录项写入磁盘
+    removeItem(dirLocation);
     fileSystem.update();
     return true;
 }
@@ -764,29 +858,27 @@ bool CommandLineInterface::rmdir(uint8_t uid, std::vector<std::string> src, std:
     auto findRes = findDisk(uid, src);
     if (findRes.first == -1) {
         if (findRes.second == 0 || findRes.second == 1) {
-            std::cout << currentCmd << ": cannot remove directory '" << initCmd << "': No such directory" << std::endl;
+            error() << "cannot remove directory '" << initCmd << "': No such directory" << std::endl;
         } else if (findRes.second == 2) {
-            std::cout << currentCmd << ": cannot remove directory '" << initCmd << "': Permission denied" << std::endl;
+            error() << "cannot remove directory '" << initCmd << "': Permission denied" << std::endl;
         }
         return false;
     }
 
     uint32_t tmpDirDisk = findRes.first;
-    Directory tmpDir{};
-    fileSystem.read(tmpDirDisk, 0, reinterpret_cast<char*>(&tmpDir), sizeof(tmpDir));
-    uint32_t inodeDisk = tmpDir.item[findRes.second].inodeIndex;
+    uint32_t inodeDisk = readItem(tmpDirDisk, findRes.second).inodeIndex;
     INode iNode{};
     fileSystem.read(inodeDisk, 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
     if (iNode.flag >> 6 != 1) {
-        std::cout << currentCmd << ": cannot remove directory '" << initCmd << "': Not a directory" << std::endl;
+        error() << "cannot remove directory '" << initCmd << "': Not a directory" << std::endl;
         return false;
     }
     if (!checkReadAccess(uid, iNode)) {
-        std::cout << currentCmd << ": cannot remove directory '" << initCmd << "': Permission denied" << std::endl;
+        error() << "cannot remove directory '" << initCmd << "': Permission denied" << std::endl;
         return false;
     }
     tmpDirDisk = iNode.bno;
-    fileSystem.read(tmpDirDisk, 0, reinterpret_cast<char*>(&tmpDir), sizeof(tmpDir));
+    DirectoryList& tmpDir = loadDirectory(tmpDirDisk);
     std::swap(directory, tmpDir);
     std::swap(nowDiretoryDisk, tmpDirDisk);
     rmdir(uid, dirName, initCmd);
@@ -795,36 +887,29 @@ bool CommandLineInterface::rmdir(uint8_t uid, std::vector<std::string> src, std:
     return true;
 }
 
-bool CommandLineInterface::format() {
-    fileSystem.format(BLOCK_BYTE);
+bool CommandLineInterface::format(uint32_t allocator) {
+    fileSystem.format(BLOCK_BYTE, allocator);
+    directoryIndexes.clear(); //格式化后所有目录块都重新写过
+    pathDirectory = DirectoryList();
     fileSystem.update();
     INode iNode{};
     fileSystem.read(fileSystem.getRootLocation(), 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
     nowDiretoryDisk = iNode.bno;
-    fileSystem.read(nowDiretoryDisk, 0, reinterpret_cast<char*>(&directory), sizeof(directory));
+    readDirectory(nowDiretoryDisk, directory);
     return true;
 }
 
 bool CommandLineInterface::chmod(uint8_t uid, std::string name, std::string who, std::string access, const std::string& initCmd) {
-    int location = -1;
-    for (int i = 0; i < DIRECTORY_NUMS; i++) {
-        if (directory.item[i].inodeIndex == 0) {
-            break;
-        }
-        if (!strcmp(directory.item[i].name, name.c_str())) {
-            location = i;
-            break;
-        }
-    }
+    int location = findItem(name);
     if (location == -1) {
-        std::cout << currentCmd << ": cannot access '" << initCmd << "': No such file or directory" << std::endl;
+        error() << "cannot access '" << initCmd << "': No such file or directory" << std::endl;
         return false;
     }
 
     INode iNode{};
     fileSystem.read(directory.item[location].inodeIndex, 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
     if (!checkOwnerAccess(uid, iNode)) {
-        std::cout << currentCmd << ": cannot access '" << initCmd << "': Permission denied" << std::endl;
+        error() << "cannot access '" << initCmd << "': Permission denied" << std::endl;
         return false;
     }
 
@@ -861,29 +946,27 @@ bool CommandLineInterface::chmod(uint8_t uid, std::vector<std::string> src, std:
     auto findRes = findDisk(uid, src);
     if (findRes.first == -1) {
         if (findRes.second == 0 || findRes.second == 1) {
-            std::cout << currentCmd << ": cannot access '" << initCmd << "': No such file or directory" << std::endl;
+            error() << "cannot access '" << initCmd << "': No such file or directory" << std::endl;
         } else if (findRes.second == 2) {
-            std::cout << currentCmd << ": cannot access '" << initCmd << "': Permission denied" << std::endl;
+            error() << "cannot access '" << initCmd << "': Permission denied" << std::endl;
         }
         return false;
     }
 
     uint32_t tmpDirDisk = findRes.first;
-    Directory tmpDir{};
-    fileSystem.read(tmpDirDisk, 0, reinterpret_cast<char*>(&tmpDir), sizeof(tmpDir));
-    uint32_t inodeDisk = tmpDir.item[findRes.second].inodeIndex;
+    uint32_t inodeDisk = readItem(tmpDirDisk, findRes.second).inodeIndex;
     INode iNode{};
     fileSystem.read(inodeDisk, 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
     if (iNode.flag >> 6 != 1) {
-        std::cout << currentCmd << ": cannot access '" << initCmd << "': No such file or directory" << std::endl;
+        error() << "cannot access '" << initCmd << "': No such file or directory" << std::endl;
         return false;
     }
     if (!checkReadAccess(uid, iNode)) {
-        std::cout << currentCmd << ": cannot access '" << initCmd << "': Permission denied" << std::endl;
+        error() << "cannot access '" << initCmd << "': Permission denied" << std::endl;
         return false;
     }
     tmpDirDisk = iNode.bno;
-    fileSystem.read(tmpDirDisk, 0, reinterpret_cast<char*>(&tmpDir), sizeof(tmpDir));
+    DirectoryList& tmpDir = loadDirectory(tmpDirDisk);
     std::swap(directory, tmpDir);
     std::swap(nowDiretoryDisk, tmpDirDisk);
     chmod(uid, name, who, access, initCmd);
@@ -894,16 +977,16 @@ bool CommandLineInterface::chmod(uint8_t uid, std::vector<std::string> src, std:
 
 bool CommandLineInterface::mkuser(uint8_t uid, std::string name) {
     if (!sudoMode || uid != 1) {
-        std::cout << currentCmd << ": Permission denied" << std::endl;
+        error() << "Permission denied" << std::endl;
         return false;
     }
     if (fileSystem.duplicateDetection(name)) {
-        std::cout << currentCmd << ": user '" << name << "' already exists" << std::endl;
+        error() << "user '" << name << "' already exists" << std::endl;
         return false;
     }
     uint8_t newUid = fileSystem.emptyDetection();
     if (newUid == MAX_USER_NUMS) {
-        std::cout << currentCmd << ": user list is full" << std::endl;
+        error() << "user list is full" << std::endl;
         return false;
     }
 
@@ -915,11 +998,11 @@ bool CommandLineInterface::mkuser(uint8_t uid, std::string name) {
     std::cin.ignore();
     if (passwd != confirm) {
         std::cout << "Sorry, passwords do not match." << std::endl;
-        std::cout << currentCmd << ": failed preliminary check by password service" << std::endl;
+        error() << "failed preliminary check by password service" << std::endl;
         return false;
     }
     if (passwd.length() >= USERNAME_PASWORD_LENGTH) {
-        std::cout << currentCmd << ": too long password" << std::endl;
+        error() << "too long password" << std::endl;
         return false;
     }
 
@@ -930,16 +1013,16 @@ bool CommandLineInterface::mkuser(uint8_t uid, std::string name) {
 
 bool CommandLineInterface::rmuser(uint8_t uid, std::string name) {
     if (!sudoMode || uid != 1) {
-        std::cout << currentCmd << ": Permission denied" << std::endl;
+        error() << "Permission denied" << std::endl;
         return false;
     }
     uint8_t delUid = fileSystem.duplicateDetection(name);
     if (!delUid) {
-        std::cout << currentCmd << ": user '" << name << "' does not exist" << std::endl;
+        error() << "user '" << name << "' does not exist" << std::endl;
         return false;
     }
     if (delUid == 1) {
-        std::cout << currentCmd << ": cannot delete user 'root'" << std::endl;
+        error() << "cannot delete user 'root'" << std::endl;
         return false;
     }
 
@@ -994,12 +1077,12 @@ bool CommandLineInterface::passwd(uint8_t uid, std::string name) {
 
     int checkUid = fileSystem.userVerify(name, old);
     if (!checkUid) {
-        std::cout << currentCmd << ": Authentication token manipulation error" << std::endl;
-        std::cout << currentCmd << ": password unchanged" << std::endl;
+        error() << "Authentication token manipulation error" << std::endl;
+        error() << "password unchanged" << std::endl;
         return false;
     }
     else if (checkUid != uid) {
-        std::cout << currentCmd << ": System error" << std::endl;
+        error() << "System error" << std::endl;
         return false;
     }
 
@@ -1011,11 +1094,11 @@ bool CommandLineInterface::passwd(uint8_t uid, std::string name) {
     std::cin.ignore();
     if (passwd != confirm) {
         std::cout << "Sorry, passwords do not match." << std::endl;
-        std::cout << currentCmd << ": failed preliminary check by password service" << std::endl;
+        error() << "failed preliminary check by password service" << std::endl;
         return false;
     }
     if (passwd.length() >= USERNAME_PASWORD_LENGTH) {
-        std::cout << currentCmd << ": too long password" << std::endl;
+        error() << "too long password" << std::endl;
         return false;
     }
 
@@ -1026,15 +1109,15 @@ bool CommandLineInterface::passwd(uint8_t uid, std::string name) {
 
 bool CommandLineInterface::trust(uint8_t uid, std::string currentUser, std::string targetUser) {
     if (!sudoMode) {
-        std::cout << currentCmd << ": Permission denied" << std::endl;
+        error() << "Permission denied" << std::endl;
         return false;
     }
     if (fileSystem.duplicateDetection(targetUser) == uid) {
-        std::cout << currentCmd << ": already trust yourself" << std::endl;
+        error() << "already trust yourself" << std::endl;
         return false;
     }
     if (!fileSystem.grantTrustUser(currentUser, targetUser)) {
-        std::cout << currentCmd << ": user '" << targetUser << "' does not exist" << std::endl;
+        error() << "user '" << targetUser << "' does not exist" << std::endl;
         return false;
     }
     fileSystem.update();
@@ -1043,15 +1126,15 @@ bool CommandLineInterface::trust(uint8_t uid, std::string currentUser, std::stri
 
 bool CommandLineInterface::distrust(uint8_t uid, std::string currentUser, std::string targetUser) {
     if (!sudoMode) {
-        std::cout << currentCmd << ": Permission denied" << std::endl;
+        error() << "Permission denied" << std::endl;
         return false;
     }
     if (fileSystem.duplicateDetection(targetUser) == uid) {
-        std::cout << currentCmd << ": cannot distrust yourself" << std::endl;
+        error() << "cannot distrust yourself" << std::endl;
         return false;
     }
     if (!fileSystem.revokeTrustUser(currentUser, targetUser)) {
-        std::cout << currentCmd << ": user '" << targetUser << "' does not exist" << std::endl;
+        error() << "user '" << targetUser << "' does not exist" << std::endl;
         return false;
     }
     fileSystem.update();
@@ -1059,14 +1142,27 @@ bool CommandLineInterface::distrust(uint8_t uid, std::string currentUser, std::s
 }
 
 void CommandLineInterface::updateDirNow() {
-    fileSystem.read(nowDiretoryDisk, 0, reinterpret_cast<char*>(&directory), sizeof(directory));
+    //守护进程中所有会话共用修改计数，计数能反映所有写入；单独的进程看不到其他进程的写入，每条命令开始时都要重新读入
+    if (!shared) {
+        directoryVersion(nowDiretoryDisk)++; //当前目录和它的哈希索引一起失效
+        pathDirectory.blocks.clear();
+    }
+    loadDirNow();
+}
+
+void CommandLineInterface::loadDirNow() {
+    //目录块只经由 writeDirectoryBlock 和 mkdir 写入，它们都会增加修改计数，计数没变说明内存中的目录仍然有效
+    if (!directory.blocks.empty() && directory.blocks[0] == nowDiretoryDisk && directory.version == directoryVersion(nowDiretoryDisk)) {
+        return;
+    }
+    readDirectory(nowDiretoryDisk, directory);
 }
 
 void CommandLineInterface::goToRoot() {
     INode iNode{};
     fileSystem.read(fileSystem.getRootLocation(), 0, reinterpret_cast<char*>(&iNode), sizeof(iNode));
     nowDiretoryDisk = iNode.bno;
-    fileSystem.read(nowDiretoryDisk, 0, reinterpret_cast<char*>(&directory), sizeof(directory));
+    readDirectory(nowDiretoryDisk, directory);
 }
 
 void CommandLineInterface::getUser(uint8_t uid, User* user) {
@@ -1085,10 +1181,24 @@ void CommandLineInterface::setCurrentCmd(const std::string& cmd) {
     currentCmd = cmd;
 }
 
+void CommandLineInterface::resetStatus() {
+    failed = false;
+}
+
+bool CommandLineInterface::commandFailed() {
+    return failed;
+}
+
+std::ostream& CommandLineInterface::error() {
+    failed = true;
+    return std::cout << currentCmd << ": ";
+}
+
 std::pair<uint32_t, int> CommandLineInterface::findDisk(uint8_t uid, std::vector<std::string> src) {
     std::string srcName = src.back(); //获取名
     src.pop_back();
     uint32_t tmpDirectoryDisk = nowDiretoryDisk;
+    DirectoryList tmpDirectory = directory; //保存当前目录，结束时换回，不必重新读入
     int error = 0; //能否找到目录
     std::string dirName; //输出错误信息用
     for (std::string& item : src) { //在此次直接调用cd函数来寻找
@@ -1110,23 +1220,17 @@ std::pair<uint32_t, int> CommandLineInterface::findDisk(uint8_t uid, std::vector
         //std::cout << "failed: '" << dirName << "' No such directory" << std::endl;
         //还原现场
         nowDiretoryDisk = tmpDirectoryDisk;
-        fileSystem.read(nowDiretoryDisk, 0, reinterpret_cast<char*>(&directory), sizeof(directory));
+        std::swap(directory, tmpDirectory);
         return std::make_pair(-1, error);
     }
     int location = -1;
     if (srcName != "") { //找到对应i结点
-        for (int i = 0; i < DIRECTORY_NUMS; i++) {
-            if (!directory.item[i].inodeIndex) break;
-            if (!strcmp(directory.item[i].name, srcName.c_str())) {
-                location = i;
-                break;
-            }
-        }
+        location = findItem(srcName);
         if (location == -1) {
             //std::cout << "failed '" << srcName << "' No such directory or file" << std::endl;
             //还原现场
             nowDiretoryDisk = tmpDirectoryDisk;
-            fileSystem.read(nowDiretoryDisk, 0, reinterpret_cast<char*>(&directory), sizeof(directory));
+            std::swap(directory, tmpDirectory);
             return std::make_pair(-1, 0);
         }
     } else {
@@ -1135,21 +1239,35 @@ std::pair<uint32_t, int> CommandLineInterface::findDisk(uint8_t uid, std::vector
     }
     std::pair<uint32_t, int> ret = std::make_pair(nowDiretoryDisk, location); //记录下需要返回的数据
     nowDiretoryDisk = tmpDirectoryDisk; //还原现场
-    fileSystem.read(nowDiretoryDisk, 0, reinterpret_cast<char*>(&directory), sizeof(directory));
+    std::swap(directory, tmpDirectory);
     return ret;
 }
 
 uint32_t CommandLineInterface::readFileBlock(uint32_t disk, std::string& content) {
     FileIndex fileIndex{};
     fileSystem.read(disk, 0, reinterpret_cast<char*>(&fileIndex), sizeof(fileIndex));
-    char buf[BLOCK_BYTE] = {};
-    for (int i = 0; i < FILE_INDEX_SIZE && fileIndex.index[i]; i++) {
-        fileSystem.read(fileIndex.index[i], 0, reinterpret_cast<char*>(buf), BLOCK_BYTE);
-        for (int j = 0; j < BLOCK_BYTE; j++) {
-            if (buf[j]) {
-                content += buf[j];
+    std::vector<char> buf;
+    for (int i = 0; i < FILE_INDEX_SIZE && fileIndex.index[i]; ) {
+        int run = 1; //从第i项开始块号连续的项数，连续的块一次读入
+        while (i + run < FILE_INDEX_SIZE && fileIndex.index[i + run] == fileIndex.index[i] + run) {
+            run++;
+        }
+        buf.resize(run * BLOCK_BYTE);
+        fileSystem.readBlocks(fileIndex.index[i], run, buf.data());
+        const char* pos = buf.data();
+        const char* end = pos + buf.size();
+        while (pos < end) { //跳过块中的 0，其余内容整段追加
+            const char* zero = static_cast<const char*>(memchr(pos, 0, end - pos));
+            if (!zero) {
+                zero = end;
+            }
+            content.append(pos, zero);
+            pos = zero;
+            while (pos < end && !*pos) {
+                pos++;
             }
         }
+        i += run;
     }
     return fileIndex.next;
 }
@@ -1163,7 +1281,47 @@ std::string CommandLineInterface::readFile(uint32_t startDisk) {
     return content;
 }
 
-uint32_t CommandLineInterface::writeFileBlock(uint32_t nxtDisk, const std::string& content) {
+void CommandLineInterface::streamFile(uint32_t startDisk, uint64_t offset, uint64_t length, std::ostream& out) {
+    const uint64_t indexBytes = static_cast<uint64_t>(FILE_INDEX_SIZE) * BLOCK_BYTE; //一个索引表对应的字节数
+    FileIndex fileIndex{};
+    std::vector<char> buf; //最多 READAHEAD_BLOCK_NUMS 块
+    for (uint32_t disk = startDisk; disk && length; disk = fileIndex.next) {
+        fileSystem.read(disk, 0, reinterpret_cast<char*>(&fileIndex), sizeof(fileIndex));
+        if (offset >= indexBytes) { //整个索引表都在offset之前，不读它的数据块
+            offset -= indexBytes;
+            continue;
+        }
+        int i = offset / BLOCK_BYTE;
+        offset %= BLOCK_BYTE;
+        while (i < FILE_INDEX_SIZE && fileIndex.index[i] && length) {
+            int run = 1;
+            while (run < READAHEAD_BLOCK_NUMS && i + run < FILE_INDEX_SIZE && fileIndex.index[i + run] == fileIndex.index[i] + run) {
+                run++;
+            }
+            buf.resize(run * BLOCK_BYTE);
+            fileSystem.readBlocks(fileIndex.index[i], run, buf.data());
+            const char* pos = buf.data() + offset;
+            const char* end = buf.data() + buf.size();
+            offset = 0;
+            while (pos < end && length) { //与 readFileBlock 一样跳过块中的 0
+                const char* zero = static_cast<const char*>(memchr(pos, 0, end - pos));
+                if (!zero) {
+                    zero = end;
+                }
+                uint64_t len = std::min<uint64_t>(zero - pos, length);
+                out.write(pos, len);
+                length -= len;
+                pos = zero;
+                while (pos < end && !*pos) {
+                    pos++;
+                }
+            }
+            i += run;
+        }
+    }
+}
+
+uint32_t CommandLineInterface::writeFileBlock(uint32_t nxtDisk, const std::string& content, const uint32_t* blocks) {
     FileIndex fileIndex{};
     fileIndex.next = nxtDisk;
     char buf[BLOCK_BYTE] = {};
@@ -1175,28 +1333,135 @@ uint32_t CommandLineInterface::writeFileBlock(uint32_t nxtDisk, const std::strin
             if (startPosi + j < endPosi) buf[j] = content[startPosi + j];
             else buf[j] = 0;
         }
-        fileIndex.index[i] = fileSystem.blockAllocate();
-        //std::cout << "writeFileBlock: " << startPosi << ' ' << endPosi << ' ' << fileIndex.index[i] << std::endl;
+        fileIndex.index[i] = blocks[i + 1];
         fileSystem.write(fileIndex.index[i], 0, reinterpret_cast<char*>(buf), BLOCK_BYTE);
     }
-    fileIndex.index[i] = 0;
-    uint32_t fileIndexDisk = fileSystem.blockAllocate();
+    if (i < FILE_INDEX_SIZE) { //索引表写满时 index[i] 就是 next，不能清零
+        fileIndex.index[i] = 0;
+    }
+    uint32_t fileIndexDisk = blocks[0];
     fileSystem.write(fileIndexDisk, 0, reinterpret_cast<char*>(&fileIndex), sizeof(fileIndex));
     return fileIndexDisk;
 }
 
 uint32_t CommandLineInterface::writeFile(std::string content) {
-    uint32_t totBlock = (content.length() + BLOCK_BYTE * FILE_INDEX_SIZE - 1) / (BLOCK_BYTE * FILE_INDEX_SIZE);
+    uint32_t dataBlock = (content.length() + BLOCK_BYTE - 1) / BLOCK_BYTE;
+    uint32_t totBlock = std::max<uint32_t>(1, (dataBlock + FILE_INDEX_SIZE - 1) / FILE_INDEX_SIZE); //索引表个数，空文件也要有一个索引表
+    //按内容大小一次申请所有块，每个索引表后面紧跟它的数据块，位图模式下整个文件通常落在一段连续的块上
+    std::vector<uint32_t> blocks = fileSystem.blocksAllocate(totBlock + dataBlock);
     uint32_t next = 0;
     for (int i = totBlock - 1; i >= 0; i--) {
         uint32_t startPosi = i * BLOCK_BYTE * FILE_INDEX_SIZE;
         uint32_t endPosi = std::min<uint32_t>(content.length(), (i + 1) * BLOCK_BYTE * FILE_INDEX_SIZE);
-        //std::cout << "writeFile: " << startPosi << ' ' << endPosi << std::endl;
-        next = writeFileBlock(next, content.substr(startPosi, endPosi - startPosi));
+        next = writeFileBlock(next, content.substr(startPosi, endPosi - startPosi), blocks.data() + i * (FILE_INDEX_SIZE + 1));
     }
     return next;
 }
 
+void CommandLineInterface::appendFile(uint32_t startDisk, const std::string& line) {
+    //沿索引表链找到最后一个索引表，每个索引表对应 FILE_INDEX_SIZE 个数据块，不读任何数据块
+    uint32_t indexDisk = startDisk;
+    FileIndex fileIndex{};
+    fileSystem.read(indexDisk, 0, reinterpret_cast<char*>(&fileIndex), sizeof(fileIndex));
+    while (fileIndex.next) {
+        indexDisk = fileIndex.next;
+        fileSystem.read(indexDisk, 0, reinterpret_cast<char*>(&fileIndex), sizeof(fileIndex));
+    }
+    int used = 0; //最后一个索引表已用的项数
+    while (used < FILE_INDEX_SIZE && fileIndex.index[used]) {
+        used++;
+    }
+
+    //只有最后一个数据块没写满，先填满它的末尾
+    char buf[BLOCK_BYTE] = {};
+    std::string content = line + "\n";
+    size_t written = 0;
+    if (used) {
+        uint32_t lastBlock = fileIndex.index[used - 1];
+        fileSystem.read(lastBlock, 0, buf, BLOCK_BYTE);
+        int tail = BLOCK_BYTE;
+        while (tail && !buf[tail - 1]) {
+            tail--;
+        }
+        if (tail && buf[tail - 1] != '\n') { //与原来一样，已有内容不以换行结尾时先补一个换行
+            content.insert(content.begin(), '\n');
+        }
+        written = std::min<size_t>(BLOCK_BYTE - tail, content.length());
+        if (written) {
+            memcpy(buf + tail, content.data(), written);
+            fileSystem.write(lastBlock, tail, buf + tail, written);
+        }
+    }
+    if (written == content.length()) {
+        return;
+    }
+
+    //剩下的内容放进新申请的块，索引表写满时在链尾接一个新的索引表
+    uint32_t dataBlock = (content.length() - written + BLOCK_BYTE - 1) / BLOCK_BYTE;
+    uint32_t freeItems = FILE_INDEX_SIZE - used;
+    uint32_t indexBlock = dataBlock > freeItems ? (dataBlock - freeItems + FILE_INDEX_SIZE - 1) / FILE_INDEX_SIZE : 0;
+    std::vector<uint32_t> blocks = fileSystem.blocksAllocate(indexBlock + dataBlock);
+    size_t next = 0;
+    for (; written < content.length(); written += BLOCK_BYTE) {
+        if (used == FILE_INDEX_SIZE) {
+            fileIndex.next = blocks[next++];
+            fileSystem.write(indexDisk, 0, reinterpret_cast<char*>(&fileIndex), sizeof(fileIndex));
+            indexDisk = fileIndex.next;
+            fileIndex = FileIndex{};
+            used = 0;
+        }
+        size_t len = std::min<size_t>(BLOCK_BYTE, content.length() - written);
+        memcpy(buf, content.data() + written, len);
+        memset(buf + len, 0, BLOCK_BYTE - len);
+        fileIndex.index[used] = blocks[next++];
+        fileSystem.write(fileIndex.index[used++], 0, buf, BLOCK_BYTE);
+    }
+    fileSystem.write(indexDisk, 0, reinterpret_cast<char*>(&fileIndex), sizeof(fileIndex));
+}
+
+uint32_t CommandLineInterface::writeStream(ChunkReader& chunks) {
+    uint32_t startDisk = fileSystem.blockAllocate();
+    uint32_t indexDisk = startDisk;
+    FileIndex fileIndex{};
+    int used = 0; //当前索引表已用的项数
+    char buf[BLOCK_BYTE];
+    std::string pending; //还没有写出的内容，不满一块的部分留到下一段
+    std::string chunk;
+    bool more = true;
+    while (more) {
+        more = chunks.next(chunk);
+        if (!more && chunks.failed()) {
+            break;
+        }
+        pending += chunk;
+        chunk.clear();
+        size_t full = more ? pending.size() / BLOCK_BYTE : (pending.size() + BLOCK_BYTE - 1) / BLOCK_BYTE; //结束时最后不满的一块补 0 写出
+        size_t done = 0;
+        while (done < full) {
+            if (used == FILE_INDEX_SIZE) { //索引表写满，链接一个新的索引表，新的数据块紧跟在它后面
+                fileIndex.next = fileSystem.blockAllocate();
+                fileSystem.write(indexDisk, 0, reinterpret_cast<char*>(&fileIndex), sizeof(fileIndex));
+                indexDisk = fileIndex.next;
+                fileIndex = FileIndex{};
+                used = 0;
+            }
+            std::vector<uint32_t> blocks = fileSystem.blocksAllocate(std::min<size_t>(full - done, FILE_INDEX_SIZE - used));
+            for (uint32_t bno : blocks) {
+                size_t pos = done * BLOCK_BYTE;
+                size_t len = std::min<size_t>(BLOCK_BYTE, pending.size() - pos);
+                memcpy(buf, pending.data() + pos, len);
+                memset(buf + len, 0, BLOCK_BYTE - len);
+                fileSystem.write(bno, 0, buf, BLOCK_BYTE);
+                fileIndex.index[used++] = bno;
+                done++;
+            }
+        }
+        pending.erase(0, std::min(pending.size(), done * BLOCK_BYTE));
+    }
+    fileSystem.write(indexDisk, 0, reinterpret_cast<char*>(&fileIndex), sizeof(fileIndex));
+    return startDisk;
+}
+
 uint32_t CommandLineInterface::freeFileBlock(uint32_t disk) {
     FileIndex fileIndex{};
     fileSystem.read(disk, 0, reinterpret_cast<char*>(&fileIndex), sizeof(fileIndex));
@@ -1218,25 +1483,153 @@ void CommandLineInterface::freeFile(uint32_t startDisk) {
     }
 }
 
-void CommandLineInterface::wholeDirItemsMove(int itemLocation) {
-    //目录项整体前移
-    directory.item[itemLocation].inodeIndex = 0;
-    for (int i = itemLocation; i + 1 < DIRECTORY_NUMS; i++) {
-        if (!directory.item[i + 1].inodeIndex) break;
-        std::swap(directory.item[i], directory.item[i + 1]);
+void CommandLineInterface::readDirectory(uint32_t disk, DirectoryList& dir) {
+    dir.item.clear();
+    dir.blocks.clear();
+    dir.version = directoryVersion(disk);
+    Directory block{};
+    uint32_t next = disk;
+    while (next) {
+        dir.blocks.push_back(next);
+        fileSystem.read(next, 0, reinterpret_cast<char*>(&block), sizeof(block));
+        next = 0;
+        for (int i = 0; i < DIRECTORY_NUMS && block.item[i].inodeIndex; i++) {
+            if (i == DIRECTORY_BLOCK_ITEMS && !strcmp(block.item[i].name, DIRECTORY_LINK_NAME)) {
+                next = block.item[i].inodeIndex;
+                break;
+            }
+            dir.item.push_back(block.item[i]); //旧的单块目录可能用满 DIRECTORY_NUMS 项，照常读入，下次写回时拆成两块
+        }
     }
 }
 
-bool CommandLineInterface::duplicateDetection(std::string name) {
-    for (int i = 0; i < DIRECTORY_NUMS; ++i) {
-        if (!directory.item[i].inodeIndex) {
-            break;
+DirectoryList& CommandLineInterface::loadDirectory(uint32_t disk) {
+    if (pathDirectory.blocks.empty() || pathDirectory.blocks[0] != disk || pathDirectory.version != directoryVersion(disk)) {
+        readDirectory(disk, pathDirectory);
+    }
+    return pathDirectory;
+}
+
+DirectoryItem CommandLineInterface::readItem(uint32_t disk, int location) {
+    Directory block{};
+    fileSystem.read(disk, 0, reinterpret_cast<char*>(&block), sizeof(block));
+    while (location >= DIRECTORY_BLOCK_ITEMS && !strcmp(block.item[DIRECTORY_BLOCK_ITEMS].name, DIRECTORY_LINK_NAME)) {
+        fileSystem.read(block.item[DIRECTORY_BLOCK_ITEMS].inodeIndex, 0, reinterpret_cast<char*>(&block), sizeof(block));
+        location -= DIRECTORY_BLOCK_ITEMS;
+    }
+    return block.item[location];
+}
+
+template <typename Visitor>
+bool CommandLineInterface::forEachItem(uint32_t disk, Visitor visit) {
+    Directory block{};
+    uint32_t next = disk;
+    while (next) {
+        fileSystem.read(next, 0, reinterpret_cast<char*>(&block), sizeof(block));
+        next = 0;
+        for (int i = 0; i < DIRECTORY_NUMS && block.item[i].inodeIndex; i++) {
+            if (i == DIRECTORY_BLOCK_ITEMS && !strcmp(block.item[i].name, DIRECTORY_LINK_NAME)) {
+                next = block.item[i].inodeIndex;
+                break;
+            }
+            if (!visit(block.item[i])) {
+                return false;
+            }
         }
-        if (!strcmp(directory.item[i].name, name.c_str())) {
-            return true;
+    }
+    return true;
+}
+
+void CommandLineInterface::writeDirectoryBlock(DirectoryList& dir, size_t blockIndex) {
+    Directory block{};
+    size_t first = blockIndex * DIRECTORY_BLOCK_ITEMS;
+    size_t count = std::min<size_t>(DIRECTORY_BLOCK_ITEMS, dir.item.size() - std::min(first, dir.item.size()));
+    std::copy(dir.item.begin() + first, dir.item.begin() + first + count, block.item);
+    if (blockIndex + 1 < dir.blocks.size()) { //不是最后一块，最后一项链接到下一块
+        block.item[DIRECTORY_BLOCK_ITEMS].inodeIndex = dir.blocks[blockIndex + 1];
+        strcpy(block.item[DIRECTORY_BLOCK_ITEMS].name, DIRECTORY_LINK_NAME);
+    }
+    fileSystem.write(dir.blocks[blockIndex], 0, reinterpret_cast<char*>(&block), sizeof(block));
+    dir.version = ++directoryVersion(dir.blocks[0]);
+}
+
+uint64_t& CommandLineInterface::directoryVersion(uint32_t disk) {
+    return fileSystem.directoryVersion(disk);
+}
+
+DirectoryIndex& CommandLineInterface::currentIndex() {
+    loadDirNow();
+    auto it = directoryIndexes.find(nowDiretoryDisk);
+    if (it == directoryIndexes.end()) {
+        if (directoryIndexes.size() >= DIRECTORY_INDEX_NUMS) { //缓存的索引太多时全部丢弃
+            directoryIndexes.clear();
         }
+        it = directoryIndexes.emplace(nowDiretoryDisk, DirectoryIndex()).first;
+    }
+    if (!it->second.valid(directory.version)) {
+        it->second.build(directory);
     }
-    return false;
+    return it->second;
+}
+
+int CommandLineInterface::findItem(const std::string& name) {
+    return currentIndex().find(name);
+}
+
+void CommandLineInterface::addItem(const std::string& name, uint32_t inodeDisk) {
+    DirectoryIndex& index = currentIndex();
+    DirectoryItem item{};
+    item.inodeIndex = inodeDisk;
+    strcpy(item.name, name.c_str());
+    directory.item.push_back(item);
+    size_t location = directory.item.size() - 1;
+    size_t blockIndex = location / DIRECTORY_BLOCK_ITEMS;
+    bool linked = false;
+    while (directory.blocks.size() <= blockIndex) { //最后一块已满，分配新块并链接到目录末尾
+        directory.blocks.push_back(fileSystem.blockAllocate());
+        linked = true;
+    }
+    writeDirectoryBlock(directory, blockIndex);
+    if (linked) { //上一块需要写入链接项，旧的满块目录还要把最后一项移到新块
+        writeDirectoryBlock(directory, blockIndex - 1);
+    }
+    index.insert(name, location);
+    index.stamp(directory.version);
+}
+
+void CommandLineInterface::removeItem(int itemLocation) {
+    DirectoryIndex& index = currentIndex();
+    size_t last = directory.item.size() - 1;
+    index.erase(std::string(directory.item[itemLocation].name, strnlen(directory.item[itemLocation].name, FILE_NAME_LENGTH)));
+    //不整体前移，用最后一项填补空位，目录项仍然从头连续存放
+    if (itemLocation != last) {
+        directory.item[itemLocation] = directory.item[last];
+        index.move(std::string(directory.item[itemLocation].name, strnlen(directory.item[itemLocation].name, FILE_NAME_LENGTH)), itemLocation);
+    }
+    directory.item.pop_back();
+    size_t holeBlock = itemLocation / DIRECTORY_BLOCK_ITEMS; //被删除项所在的块
+    size_t lastBlock = last / DIRECTORY_BLOCK_ITEMS; //原来最后一项所在的块
+    size_t usedBlocks = std::max<size_t>(1, (directory.item.size() + DIRECTORY_BLOCK_ITEMS - 1) / DIRECTORY_BLOCK_ITEMS);
+    bool unlinked = false;
+    while (directory.blocks.size() > usedBlocks) { //最后一块空了，回收并去掉上一块的链接项
+        fileSystem.blockFree(directory.blocks.back());
+        directory.blocks.pop_back();
+        unlinked = true;
+    }
+    if (holeBlock < directory.blocks.size()) {
+        writeDirectoryBlock(directory, holeBlock);
+    }
+    if (lastBlock != holeBlock && lastBlock < directory.blocks.size()) {
+        writeDirectoryBlock(directory, lastBlock);
+    }
+    if (unlinked && directory.blocks.size() - 1 != holeBlock) {
+        writeDirectoryBlock(directory, directory.blocks.size() - 1);
+    }
+    index.stamp(directory.version);
+}
+
+bool CommandLineInterface::duplicateDetection(std::string name) {
+    return findItem(name) != -1;
 }
 
 int CommandLineInterface::judge(uint32_t disk) {
@@ -5,18 +5,26 @@
 #include <iostream>
 #include <cstring>
 #include <vector>
+#include <unordered_map>
 
 #include "FileSystemCore.h"
 #include "./include/Constraints.h"
 #include "./include/Data.h"
 #include "./model/Vim.h"
+#include "./model/DirectoryIndex.h"
+#include "./model/ChunkReader.h"
 
 // 为用户提供的接口，支持用户常用的功能
 class CommandLineInterface {
 public:
-    void initialize(); //初始化
+    explicit CommandLineInterface(FileSystemCore& fileSystem, bool shared = false); //守护进程中每个会话有自己的 CommandLineInterface，共用一个 FileSystemCore，此时 shared 为 true
+    void initialize(); //初始化，磁盘还没有挂载时挂载
 
     bool logout(); //一个用户退出后的处理
+    void sync(); //把缓存的修改写回磁盘，一条命令结束、登出和退出时调用
+    void reload(); //重新读入其他进程可能修改过的磁盘内容，单独的进程在每行命令开始时调用
+    bool cachestat(); //cachestat命令接口，显示磁盘块缓存的统计
+    bool fragstat(uint8_t uid, const std::string& fileName, const std::string& initCmd); //fragstat命令接口，显示空闲空间的碎片统计，fileName非空时再显示该文件占用的块数和段数
 
     std::pair<bool, int> cd(uint8_t uid, std::string directoryName, const std::string& initCmd = std::string()); //cd命令接口,进入当前目录的文件夹，返回切换是否成功和错误类型
     bool ls(uint8_t uid, bool all, const std::string& initCmd); //ls命令接口,显示当前目录所有文件信息
@@ -24,8 +32,8 @@ public:
 
     bool touch(uint8_t uid, std::string fileName, const std::string& initCmd); //touch命令接口,创建文件
     bool touch(uint8_t uid, std::vector<std::string> src, std::string fileName, const std::string& initCmd); //touch命令接口,根据src路径创建文件
-    bool cat(uint8_t uid, std::string fileName, const std::string& initCmd, std::tuple<bool, std::string, std::string>* returnContent = nullptr); //cat命令接口,打印文件
-    bool cat(uint8_t uid, std::vector<std::string> src, std::string fileName, const std::string& initCmd, std::tuple<bool, std::string, std::string>* returnContent = nullptr); //cat命令接口,根据src路径打印文件
+    bool cat(uint8_t uid, std::string fileName, const std::string& initCmd, std::tuple<bool, std::string, std::string>* returnContent = nullptr, uint64_t offset = 0, uint64_t length = UINT64_MAX); //cat命令接口,打印文件从offset开始的length字节
+    bool cat(uint8_t uid, std::vector<std::string> src, std::string fileName, const std::string& initCmd, std::tuple<bool, std::string, std::string>* returnContent = nullptr, uint64_t offset = 0, uint64_t length = UINT64_MAX); //cat命令接口,根据src路径打印文件
 
     bool mv(uint8_t uid, std::vector<std::string> src, std::vector<std::string> des, const std::string& initSrc, const std::string& initDes); //mv命令接口,移动文件
     bool cp(uint8_t uid, std::vector<std::string> src, std::vector<std::string> des, const std::string& initSrc, const std::string& initDes); //cp命令接口,复制文件
@@ -37,7 +45,7 @@ public:
     bool rmdir(uint8_t uid, std::string dirName, const std::string& initCmd); //rmdir命令接口,删除文件夹
     bool rmdir(uint8_t uid, std::vector<std::string> src, std::string dirName, const std::string& initCmd); //rmdir命令接口,根据src路径删除文件夹
 
-    bool format(); //format命令接口,格式化整个文件系统
+    bool format(uint32_t allocator = ALLOCATOR_EXTENT); //format命令接口,按指定的空闲块管理方式格式化整个文件系统
     bool chmod(uint8_t uid, std::string name, std::string who, std::string access, const std::string& initCmd); //chmod命令接口,修改文件或目录权限
     bool chmod(uint8_t uid, std::vector<std::string> src, std::string name, std::string who, std::string access, const std::string& initCmd); //chmod命令接口,根据src路径修改文件或目录权限
 
@@ -50,33 +58,58 @@ public:
 
     bool vim(uint8_t uid, std::string fileName, const std::string& initCmd, std::tuple<bool, std::string, std::string>* inputContent = nullptr); //vim命令接口,编辑文件
     bool vim(uint8_t uid, std::vector<std::string> src, std::string fileName, const std::string& initCmd, std::tuple<bool, std::string, std::string>* inputContent = nullptr); //vim命令接口,根据src路径编辑文件
+    bool append(uint8_t uid, std::string fileName, const std::string& initCmd, const std::string& line); //echo >> 接口,在文件末尾追加一行
+    bool append(uint8_t uid, std::vector<std::string> src, std::string fileName, const std::string& initCmd, const std::string& line); //echo >> 接口,根据src路径追加
+    bool write(uint8_t uid, std::string fileName, const std::string& initCmd, ChunkReader& chunks); //write命令接口,用chunks读入的内容创建或覆盖文件
+    bool write(uint8_t uid, std::vector<std::string> src, std::string fileName, const std::string& initCmd, ChunkReader& chunks); //write命令接口,根据src路径写入
 
-    void updateDirNow(); //更新当前目录信息
+    void updateDirNow(); //每条命令开始时更新当前目录信息，守护进程中内存中的目录没有过期时跳过，单独的进程总是重新读入
 
     void goToRoot(); //进入根目录
     void getUser(uint8_t uid, User* user); //根据uid提取用户信息
     uint8_t userVerify(std::string username, std::string password); //用户鉴别，鉴别成功返回uid，否则返回0
     void setSudoMode(const bool& sudo); //设置是否是sudo模式
     void setCurrentCmd(const std::string& cmd); //设置当前的命令（用于反馈错误信息）
+    void resetStatus(); //开始执行一条新命令前清除失败标记
+    bool commandFailed(); //当前命令是否输出过错误信息
 
 private:
-    Directory directory;//当前目录
+    DirectoryList directory;//当前目录
+    DirectoryList pathDirectory; //带路径的命令最近操作的目录，例如 touch big/f1 之后的 touch big/f2 不必重新读入 big
     uint32_t nowDiretoryDisk;//当前目录所在磁盘块号
     bool sudoMode;
     std::string currentCmd;
-    FileSystemCore fileSystem;
+    bool failed; //当前命令是否失败
+    FileSystemCore& fileSystem;
+    bool shared; //FileSystemCore 由守护进程的所有会话共用，修改计数能反映这个磁盘的所有写入
+    std::unordered_map<uint32_t, DirectoryIndex> directoryIndexes; //{目录首块: 哈希索引}，最近访问过的目录
+
+    std::ostream& error(); //输出 "<命令>: " 并标记当前命令失败，后接具体错误信息
 
     //非接口函数设为私有，不让上层调用
     std::pair<uint32_t, int> findDisk(uint8_t uid, std::vector<std::string> src); //从当前目录开始,根据src数组提供的路径,找到对应文件或者目录所在的目录所在的磁盘块号和该文件或者目录的i结点所在的目录项序号
 
     uint32_t readFileBlock(uint32_t disk, std::string& content); //读取一整个FileIndex的内容
     std::string readFile(uint32_t startDisk); //读取首个FileIndex的链表的所有内容
-    uint32_t writeFileBlock(uint32_t disk, const std::string& content); //写一整个FileIndex的内容
+    void streamFile(uint32_t startDisk, uint64_t offset, uint64_t length, std::ostream& out); //把文件从offset开始的length字节逐段写到out，不在内存中拼出整个文件
+    uint32_t writeFileBlock(uint32_t disk, const std::string& content, const uint32_t* blocks); //写一整个FileIndex的内容，blocks[0]放索引表，之后依次放数据
     uint32_t writeFile(std::string content); //写一整个文件
+    void appendFile(uint32_t startDisk, const std::string& line); //只改写最后一个数据块和最后一个索引表，把line作为新的一行接在文件末尾
+    uint32_t writeStream(ChunkReader& chunks); //边读边写一个新文件，内存中只保留最近一段输入，返回首个索引表所在块
     uint32_t freeFileBlock(uint32_t disk); //回收一整个FileIndex的块
     void freeFile(uint32_t startDisk); //回收一整个文件
 
-    void wholeDirItemsMove(int itemLocation); //将从指定位置开始的目录项整体前移
+    void readDirectory(uint32_t disk, DirectoryList& dir); //沿链接读入首块为disk的整个目录
+    DirectoryList& loadDirectory(uint32_t disk); //带路径的命令要操作的目录，pathDirectory 没有过期时直接沿用
+    DirectoryItem readItem(uint32_t disk, int location); //只读入首块为disk的目录中第location项所在的块，返回该项
+    template <typename Visitor> bool forEachItem(uint32_t disk, Visitor visit); //逐块遍历目录项，visit 返回 false 时停止
+    void writeDirectoryBlock(DirectoryList& dir, size_t blockIndex); //把目录的第blockIndex块写回磁盘
+    uint64_t& directoryVersion(uint32_t disk); //首块为disk的目录的修改计数，目录块只经由 writeDirectoryBlock 和 mkdir 写入
+    void loadDirNow(); //内存中的当前目录过期（修改计数变了）时重新读入
+    DirectoryIndex& currentIndex(); //当前目录的哈希索引，没有或已过期时根据 directory 重建
+    int findItem(const std::string& name); //在当前目录中查找名字，返回目录项序号，没有则返回-1
+    void addItem(const std::string& name, uint32_t inodeDisk); //在当前目录末尾添加目录项并写回磁盘，最后一块满了就链接一个新块
+    void removeItem(int itemLocation); //用最后一个目录项填补被删除的位置并写回磁盘，最后一块空了就回收
     bool duplicateDetection(std::string name); //重复名检测
     int judge(uint32_t disk); //判断i结点指向的是目录还是文件,目录1,文件0
 
@@ -0,0 +1,239 @@
+#include "Daemon.h"
+
+#include <cstring>
+#include <iostream>
+#include <streambuf>
+#include <vector>
+
+#include "Shell.h"
+
+Daemon::Daemon(std::string socketPath) : socketPath(std::move(socketPath)) {
+    consoleIn = std::cin.rdbuf();
+    consoleOut = std::cout.rdbuf();
+}
+
+#ifndef _WIN32
+
+#include <cerrno>
+#include <csignal>
+#include <cstdlib>
+#include <thread>
+#include <arpa/inet.h>
+#include <sys/socket.h>
+#include <sys/time.h>
+#include <sys/un.h>
+#include <unistd.h>
+
+namespace {
+    volatile sig_atomic_t stopRequested = 0;
+
+    void requestStop(int) {
+        stopRequested = 1;
+    }
+
+    bool sendAll(int fd, const char* buf, size_t sz) {
+        while (sz) {
+            ssize_t n = send(fd, buf, sz, 0);
+            if (n < 0 && errno == EINTR) {
+                continue;
+            }
+            if (n <= 0) {
+                return false;
+            }
+            buf += n;
+            sz -= n;
+        }
+        return true;
+    }
+
+    bool recvAll(int fd, char* buf, size_t sz) {
+        while (sz) {
+            ssize_t n = recv(fd, buf, sz, 0);
+            if (n < 0 && errno == EINTR) {
+                continue;
+            }
+            if (n <= 0) {
+                return false;
+            }
+            buf += n;
+            sz -= n;
+        }
+        return true;
+    }
+}
+
+//一个连接的输入输出缓冲区，会话执行期间 std::cin 和 std::cout 都指向它
+class Daemon::Session : public std::streambuf {
+public:
+    Session(Daemon& daemon, int fd, std::unique_lock<std::mutex>& lock) : daemon(daemon), fd(fd), lock(lock), output(FRAME_CHUNK_BYTES), closed(false), idle(false) {
+        setp(output.data(), output.data() + output.size());
+    }
+
+    void attach() { //rdbuf 同时清除其他会话留下的流状态
+        std::cin.rdbuf(this);
+        std::cout.rdbuf(this);
+    }
+
+    void setIdle(bool value) { //Shell::onIdle
+        idle = value;
+    }
+
+    void detach() {
+        sync();
+        std::cin.rdbuf(daemon.consoleIn);
+        std::cout.rdbuf(daemon.consoleOut);
+    }
+
+protected:
+    int overflow(int ch) override {
+        sync();
+        if (ch != traits_type::eof()) {
+            *pptr() = traits_type::to_char_type(ch);
+            pbump(1);
+        }
+        return traits_type::not_eof(ch); //连接断开后输出直接丢弃，命令照常执行完
+    }
+
+    int sync() override {
+        if (pptr() > pbase()) {
+            sendFrame(FRAME_OUTPUT, pbase(), pptr() - pbase());
+            setp(output.data(), output.data() + output.size());
+        }
+        return 0;
+    }
+
+    int underflow() override { //输入读完了：发出 FRAME_READY 等待下一个输入帧，在提示符处等待时释放 mutex
+        if (gptr() < egptr()) {
+            return traits_type::to_int_type(*gptr());
+        }
+        sync();
+        while (!closed) {
+            sendFrame(FRAME_READY, nullptr, 0);
+            bool waitIdle = idle;
+            timeval timeout{waitIdle ? 0 : INPUT_TIMEOUT_SECONDS, 0}; //空闲的会话可以一直等待用户输入
+            setsockopt(fd, SOL_SOCKET, SO_RCVTIMEO, &timeout, sizeof(timeout));
+            if (waitIdle) {
+                lock.unlock();
+            }
+            char header[5];
+            uint32_t sz = 0;
+            bool ok = recvAll(fd, header, sizeof(header));
+            if (ok) {
+                memcpy(&sz, header, sizeof(sz));
+                sz = ntohl(sz);
+                input.resize(sz);
+                ok = recvAll(fd, input.data(), sz);
+            }
+            bool timedOut = !ok && (errno == EAGAIN || errno == EWOULDBLOCK);
+            if (waitIdle) {
+                lock.lock();
+                attach(); //等待期间其他会话可能用过 std::cin 和 std::cout
+            }
+            if (!ok) {
+                if (timedOut) {
+                    std::cerr << "daemon: no input for " << INPUT_TIMEOUT_SECONDS << " s in the middle of a command, closing the session" << std::endl;
+                }
+                closed = true;
+                break;
+            }
+            if (header[4] == FRAME_INPUT && sz) {
+                setg(input.data(), input.data(), input.data() + sz);
+                return traits_type::to_int_type(*gptr());
+            }
+        }
+        return traits_type::eof();
+    }
+
+private:
+    Daemon& daemon;
+    int fd;
+    std::unique_lock<std::mutex>& lock; //会话线程持有的 daemon.mutex
+    std::vector<char> input; //最近收到的输入帧
+    std::vector<char> output; //尚未发出的输出
+    bool closed; //连接已断开
+    bool idle; //Shell 在提示符处等待下一条命令或登录信息，只有这时等待输入才释放 mutex
+
+    void sendFrame(char type, const char* data, uint32_t sz) {
+        if (closed) {
+            return;
+        }
+        char header[5];
+        uint32_t length = htonl(sz);
+        memcpy(header, &length, sizeof(length));
+        header[4] = type;
+        if (!sendAll(fd, header, sizeof(header)) || !sendAll(fd, data, sz)) {
+            closed = true;
+        }
+    }
+};
+
+int Daemon::run() {
+    signal(SIGPIPE, SIG_IGN); //客户端断开后的写入由 send 返回错误处理
+    struct sigaction action{};
+    action.sa_handler = requestStop; //不设置 SA_RESTART，accept 会被信号打断
+    sigemptyset(&action.sa_mask);
+    sigaction(SIGINT, &action, nullptr);
+    sigaction(SIGTERM, &action, nullptr);
+
+    sockaddr_un address{};
+    address.sun_family = AF_UNIX;
+    if (socketPath.empty() || socketPath.size() >= sizeof(address.sun_path)) {
+        std::cerr << "daemon: invalid socket path '" << socketPath << "'" << std::endl;
+        return 1;
+    }
+    strcpy(address.sun_path, socketPath.c_str());
+    unlink(socketPath.c_str()); //上次没有正常退出时留下的套接字文件
+    int server = socket(AF_UNIX, SOCK_STREAM, 0);
+    if (server < 0 || bind(server, reinterpret_cast<sockaddr*>(&address), sizeof(address)) < 0 || listen(server, SOMAXCONN) < 0) {
+        std::cerr << "daemon: cannot listen on '" << socketPath << "': " << strerror(errno) << std::endl;
+        return 1;
+    }
+    std::cerr << "daemon: listening on " << socketPath << std::endl;
+
+    while (!stopRequested) {
+        int fd = accept(server, nullptr, nullptr);
+        if (fd < 0) {
+            continue;
+        }
+        std::thread(&Daemon::serve, this, fd).detach();
+    }
+    close(server);
+    unlink(socketPath.c_str());
+
+    mutex.lock(); //等正在执行的命令结束，之后会话线程都停在 mutex 上，随进程一起结束
+    std::cin.rdbuf(consoleIn);
+    std::cout.rdbuf(consoleOut);
+    fileSystem.sync();
+    std::cerr << "daemon: stopped" << std::endl;
+    std::exit(0);
+}
+
+void Daemon::serve(int fd) {
+    std::unique_lock<std::mutex> lock(mutex);
+    {
+        Session session(*this, fd, lock);
+        session.attach();
+        {
+            Shell shell(fileSystem, true);
+            shell.onIdle = [&session](bool idle) { session.setIdle(idle); };
+            shell.cmd_login();
+            while (!shell.isExit) {
+                shell.exec();
+            }
+        }
+        session.detach();
+    }
+    close(fd);
+}
+
+#else
+
+int Daemon::run() {
+    std::cerr << "daemon: Unix domain sockets are not supported on this platform" << std::endl;
+    return 1;
+}
+
+void Daemon::serve(int fd) {
+}
+
+#endif
@@ -0,0 +1,38 @@
+#ifndef FILESYSTEM_DAEMON_H
+#define FILESYSTEM_DAEMON_H
+
+#include <cstdint>
+#include <mutex>
+#include <string>
+
+#include "FileSystemCore.h"
+
+#define FRAME_INPUT 'I' //客户端 -> 守护进程：若干行输入
+#define FRAME_OUTPUT 'O' //守护进程 -> 客户端：一段输出
+#define FRAME_READY 'R' //守护进程 -> 客户端：之前的输入都已处理完，会话在等待下一个输入帧
+#define FRAME_CHUNK_BYTES 65536 //输出攒到这么多字节就发出一帧
+#define INPUT_TIMEOUT_SECONDS 30 //命令执行中等待后续输入的最长时间，超时按断开处理，停住的客户端不能一直占着 mutex
+
+//守护进程模式：一个进程挂载磁盘，通过 Unix 域套接字同时为多个客户端服务
+//每个连接是一个会话，有自己的 Shell（登录用户、当前目录、sudo 状态），所有会话共用一个 FileSystemCore 和它的块缓存
+//帧格式为 4 字节大端长度 + 1 字节类型 + 内容；每个输入帧恰好对应一个 FRAME_READY，会话结束时守护进程关闭连接
+//会话各自运行在一个线程中，但只有持有 mutex 的会话在执行；会话在提示符处等待下一条命令（或登录）时才释放 mutex，
+//命令自己读取的输入（write 的分段、密码、batch 块）持有 mutex 等待，所以命令是逐条串行执行的，不会交错
+class Daemon {
+public:
+    explicit Daemon(std::string socketPath);
+    int run(); //监听直到收到 SIGINT 或 SIGTERM，返回进程退出码
+
+private:
+    class Session;
+
+    std::string socketPath; //套接字文件路径
+    FileSystemCore fileSystem; //所有会话共用的文件系统
+    std::mutex mutex; //持有者才能执行命令、使用 std::cin 和 std::cout
+    std::streambuf* consoleIn; //启动时 std::cin 的缓冲区，会话结束后还原
+    std::streambuf* consoleOut; //启动时 std::cout 的缓冲区
+
+    void serve(int fd); //在会话线程中运行一个 Shell 直到退出或断开
+};
+
+#endif //FILESYSTEM_DAEMON_H
@@ -1,13 +1,24 @@
 #include "DiskManager.h"
 
+#include <algorithm>
+#include <cstring>
+#include <filesystem>
+
 std::string DiskManager::diskName = "./OSFileSystem.dsk";
 
 DiskManager::DiskManager() {
     isOpen = false;
+    cursor = 0;
+    diskBytes = 0;
+    hits = 0;
+    misses = 0;
+    writebacks = 0;
+    readaheads = 0;
 }
 
 DiskManager::~DiskManager() {
     if (isOpen) {
+        dropCache();
         disk.close();
     }
 }
@@ -20,6 +31,8 @@ bool DiskManager::open() {
     if (t.is_open()) {
         t.close();
         disk.open(diskName, std::ios::in | std::ios::out | std::ios::binary); //以读、写、二进制形式打开文件流对象
+        disk.seekg(0, std::ios::end);
+        diskBytes = disk.tellg();
         isOpen = true;
         return true;
     }
@@ -30,6 +43,7 @@ bool DiskManager::close() {
     if (!isOpen) {
         return true;
     }
+    dropCache();
     disk.close();
     isOpen = false;
     return true;
@@ -39,38 +53,163 @@ bool DiskManager::init(uint32_t sz) {
     if (isOpen) {
         return false;
     }
-    std::ofstream c(diskName, std::ios::binary | std::ios::out); //以二进制和写入（输出）的形式创建输出文件流对象
-    //填充虚拟磁盘
-    c.seekp(0, std::ios::beg); //将写入位置设置为文件开头
-    for (uint32_t i = 0; i < sz; ++i) {
-        c.write("\0", 1); //写入一个字节的空数据，重复 sz 次
-    }
-    c.seekp(0, std::ios::beg); //将写入位置重新设置为文件开头
+    std::ofstream c(diskName, std::ios::binary | std::ios::out | std::ios::trunc); //以二进制和写入（输出）的形式创建输出文件流对象
     c.write(reinterpret_cast<char*>(&sz), sizeof(sz)); //写入文件大小信息
     int8_t ok = -1; //未格式化标记
     c.write(reinterpret_cast<char*>(&ok), sizeof(ok)); //写入未格式化标记信息
     c.close();
+    //不再逐字节填充，直接把文件扩展到 sz 字节：支持稀疏文件的文件系统上不占实际空间，未写入的部分读出来都是 0
+    std::error_code ec;
+    std::filesystem::resize_file(diskName, sz, ec);
+    if (ec) {
+        return false;
+    }
     return true;
 }
 
 void DiskManager::seekStart(uint32_t sz) {
-    disk.seekp(sz, std::ios::beg);
-    //std::cout<<cursor<<std::endl;
+    cursor = sz;
 }
 
 void DiskManager::seekCurrent(uint32_t sz) {
-    disk.seekp(sz, std::ios::cur);
-    //std::cout<<cursor<<std::endl;
+    cursor += sz;
 }
 
 void DiskManager::read(char* buf, uint32_t sz) {
-    disk.read(buf, sz);
-    disk.flush(); //刷新输出流，实时显示
-    disk.clear(); //清除文件流的错误状态和文件尾标记
+    while (sz > 0) {
+        uint32_t bno = cursor / BLOCK_BYTE;
+        uint32_t offset = cursor % BLOCK_BYTE;
+        uint32_t len = std::min<uint32_t>(sz, BLOCK_BYTE - offset);
+        uint32_t span = (offset + sz + BLOCK_BYTE - 1) / BLOCK_BYTE; //本次读取还要经过的块数
+        CacheBlock& block = getBlock(bno, false, std::min<uint32_t>(span, READAHEAD_BLOCK_NUMS));
+        memcpy(buf, block.data.data() + offset, len);
+        buf += len;
+        cursor += len;
+        sz -= len;
+    }
 }
 
 void DiskManager::write(const char* buf, uint32_t sz) {
-    disk.write(buf, sz);
+    while (sz > 0) {
+        uint32_t bno = cursor / BLOCK_BYTE;
+        uint32_t offset = cursor % BLOCK_BYTE;
+        uint32_t len = std::min<uint32_t>(sz, BLOCK_BYTE - offset);
+        CacheBlock& block = getBlock(bno, len == BLOCK_BYTE);
+        memcpy(block.data.data() + offset, buf, len);
+        block.dirty = true;
+        buf += len;
+        cursor += len;
+        sz -= len;
+    }
+}
+
+void DiskManager::sync() {
+    if (!isOpen) {
+        return;
+    }
+    std::vector<uint32_t> dirty;
+    for (auto& [bno, block] : cache) {
+        if (block.dirty) {
+            dirty.push_back(bno);
+        }
+    }
+    std::sort(dirty.begin(), dirty.end()); //按块号顺序写回，减少磁头跳动
+    for (uint32_t bno : dirty) {
+        writeBack(bno, cache[bno]);
+    }
     disk.flush();
+}
+
+void DiskManager::invalidate() {
+    if (!isOpen) {
+        return;
+    }
+    for (auto it = cache.begin(); it != cache.end(); ) {
+        if (it->second.dirty) {
+            ++it;
+            continue;
+        }
+        lru.erase(it->second.position);
+        it = cache.erase(it);
+    }
+    disk.clear();
+    disk.seekg(0, std::ios::end); //文件可能被别的进程写长了（截短过的磁盘）
+    diskBytes = disk.tellg();
+}
+
+void DiskManager::invalidate(uint32_t start, uint32_t sz) {
+    for (uint32_t bno = start / BLOCK_BYTE; bno <= (start + sz - 1) / BLOCK_BYTE; ++bno) {
+        auto it = cache.find(bno);
+        if (it != cache.end() && !it->second.dirty) {
+            lru.erase(it->second.position);
+            cache.erase(it);
+        }
+    }
+}
+
+CacheStat DiskManager::getCacheStat() {
+    return {hits, misses, writebacks, readaheads, static_cast<uint32_t>(cache.size()), CACHE_BLOCK_NUMS};
+}
+
+DiskManager::CacheBlock& DiskManager::getBlock(uint32_t bno, bool overwrite, uint32_t ahead) {
+    auto it = cache.find(bno);
+    if (it != cache.end()) {
+        hits++;
+        lru.splice(lru.begin(), lru, it->second.position); //移到链表头部，表示最近使用
+        return it->second;
+    }
+    misses++;
+    if (overwrite) {
+        return insertBlock(bno);
+    }
+    //连续读取多块时，后面尚未缓存的块一次从磁盘文件读入，连续存放的文件因此只需一次读取
+    uint32_t count = 1;
+    while (count < ahead && !cache.count(bno + count) && static_cast<uint64_t>(bno + count) * BLOCK_BYTE < diskBytes) {
+        count++;
+    }
+    std::vector<char> buf(static_cast<size_t>(count) * BLOCK_BYTE, 0);
+    disk.seekg(static_cast<std::streamoff>(bno) * BLOCK_BYTE, std::ios::beg);
+    disk.read(buf.data(), buf.size());
+    disk.clear(); //最后一块可能不满，读到文件尾时清除错误状态
+    readaheads += count - 1;
+    for (uint32_t i = count; i-- > 1; ) { //倒序插入，请求的块最后插入，位于链表头部
+        memcpy(insertBlock(bno + i).data.data(), buf.data() + static_cast<size_t>(i) * BLOCK_BYTE, BLOCK_BYTE);
+    }
+    CacheBlock& block = insertBlock(bno);
+    memcpy(block.data.data(), buf.data(), BLOCK_BYTE);
+    return block;
+}
+
+DiskManager::CacheBlock& DiskManager::insertBlock(uint32_t bno) {
+    if (cache.size() >= CACHE_BLOCK_NUMS) { //淘汰最久未使用的块
+        uint32_t victim = lru.back();
+        auto victimIt = cache.find(victim);
+        if (victimIt->second.dirty) {
+            writeBack(victim, victimIt->second);
+        }
+        cache.erase(victimIt);
+        lru.pop_back();
+    }
+    lru.push_front(bno);
+    CacheBlock& block = cache[bno];
+    block.data.assign(BLOCK_BYTE, 0);
+    block.dirty = false;
+    block.position = lru.begin();
+    return block;
+}
+
+void DiskManager::writeBack(uint32_t bno, CacheBlock& block) {
+    uint64_t start = static_cast<uint64_t>(bno) * BLOCK_BYTE;
+    uint64_t len = start < diskBytes ? std::min<uint64_t>(BLOCK_BYTE, diskBytes - start) : BLOCK_BYTE;
+    disk.seekp(start, std::ios::beg);
+    disk.write(block.data.data(), len);
     disk.clear();
+    block.dirty = false;
+    writebacks++;
+}
+
+void DiskManager::dropCache() {
+    sync();
+    cache.clear();
+    lru.clear();
 }
@@ -5,25 +5,65 @@
 #include <fstream>
 #include <string>
 #include <cstdint>
+#include <list>
+#include <unordered_map>
+#include <vector>
+
+#include "include/Constraints.h"
+
+struct CacheStat {
+    uint64_t hits; //命中缓存的块访问次数
+    uint64_t misses; //需要从磁盘文件读入的块访问次数
+    uint64_t writebacks; //写回磁盘文件的块数
+    uint64_t readaheads; //未命中时随请求的块一起成批读入的后续块数
+    uint32_t cached; //当前缓存中的块数
+    uint32_t capacity; //缓存容量
+};
 
 //模拟磁盘，支持挂载磁盘模拟文件、读写头前后移动（以字节为单位）、初始化磁盘功能
+//读写经过一个按 BLOCK_BYTE 分块的 LRU 写回缓存，脏块在淘汰或 sync 时才写入磁盘文件
 class DiskManager {
 public:
     DiskManager(); //构造函数，将打开标记初始化为未打开
-    ~DiskManager(); //析构函数，退出的时候将打开标记设置为未打开
+    ~DiskManager(); //析构函数，写回脏块，退出的时候将打开标记设置为未打开
 
     bool open(); //打开虚拟磁盘文件，返回是否打开成功
-    bool close(); //关闭虚拟磁盘文件，返回是否关闭
+    bool close(); //写回脏块并关闭虚拟磁盘文件，返回是否关闭
     bool init(uint32_t sz); //创建未格式化的指定容量的虚拟磁盘文件，单位为Byte
     void seekStart(uint32_t sz); //将读写头移动到距起始sz字节处
     void seekCurrent(uint32_t sz); //将读写头移动到距当前位置sz字节处
     void read(char* buf, uint32_t sz); //从当前位置读出sz字节到buf缓冲区
     void write(const char* buf, uint32_t sz); //从当前位置将sz字节写入文件
+    void sync(); //把所有脏块写回磁盘文件并刷新
+    void invalidate(); //丢弃干净的缓存块并重新取得文件长度，其他进程可能修改过磁盘文件；脏块保留
+    void invalidate(uint32_t start, uint32_t sz); //只丢弃覆盖[start, start+sz)字节的干净缓存块，下次读取时从磁盘文件重新读入
+
+    CacheStat getCacheStat(); //缓存命中、未命中和写回次数
 
 private:
+    struct CacheBlock {
+        std::vector<char> data;
+        bool dirty;
+        std::list<uint32_t>::iterator position; //在 lru 链表中的位置
+    };
+
     static std::string diskName; //虚拟磁盘文件名
-    std::fstream disk; //C++文件对象模拟磁盘，同时起到读写头的作用
+    std::fstream disk; //C++文件对象模拟磁盘
     bool isOpen; //磁盘是否打开标记
+    uint32_t cursor; //读写头位置
+    uint64_t diskBytes; //磁盘文件长度，最后一块写回时不超出文件
+
+    std::unordered_map<uint32_t, CacheBlock> cache; //{块号: 缓存块}
+    std::list<uint32_t> lru; //最近使用的块号在前
+    uint64_t hits;
+    uint64_t misses;
+    uint64_t writebacks;
+    uint64_t readaheads;
+
+    CacheBlock& getBlock(uint32_t bno, bool overwrite, uint32_t ahead = 1); //取得缓存块，overwrite 为 true 表示整块都会被覆盖，不必先从磁盘读入；未命中时连同后面至多 ahead-1 个未缓存的块一次读入
+    CacheBlock& insertBlock(uint32_t bno); //为块分配缓存位置，缓存满时淘汰最久未使用的块
+    void writeBack(uint32_t bno, CacheBlock& block); //把一个脏块写回磁盘文件
+    void dropCache(); //写回并清空缓存
 };
 
 #endif //FILESYSTEM_DISKDRIVER_H
@@ -1,8 +1,13 @@
 #include "FileSystemCore.h"
 
+#include <vector>
+
 FileSystemCore::FileSystemCore() {
     stack = new FreeBlockStack();
+    bitmap = new FreeBlockBitmap();
     isOpen = false;
+    writeGeneration = 0;
+    syncedWriteGeneration = 0;
 }
 
 FileSystemCore::~FileSystemCore() {
@@ -12,11 +17,14 @@ FileSystemCore::~FileSystemCore() {
         disk.seekStart(sizeof(capacity) + sizeof(isUnformatted) + sizeof(blockSize));
         //将超级块的修改标志位置为 0，表示系统信息已经被更新
         systemInfo.flag = 0;
+        systemInfo.avaliableCapacity = systemInfo.freeBlockNumber * blockSize; //可用容量随空闲块数一起写回
+        systemInfo.generation++;
         //将更新后的systemInfo写入磁盘
         disk.write(reinterpret_cast<char*>(&systemInfo), sizeof(systemInfo));
     }
     //删除动态分配的内存
     delete stack;
+    delete bitmap;
 }
 
 bool FileSystemCore::createDisk(uint32_t sz) {
@@ -24,10 +32,11 @@ bool FileSystemCore::createDisk(uint32_t sz) {
     return ok;
 }
 
-bool FileSystemCore::format(uint16_t bsize) {
+bool FileSystemCore::format(uint16_t bsize, uint32_t allocator) {
     if (!isOpen) {
         return false;
     }
+    writeGeneration++;
 
     //写入格式化标记、块大小
     disk.seekStart(sizeof(capacity)); //移动读写头
@@ -36,6 +45,8 @@ bool FileSystemCore::format(uint16_t bsize) {
     blockSize = bsize; //设置块大小
     disk.write(reinterpret_cast<char*>(&blockSize), sizeof(blockSize)); //将块大小写入磁盘
     systemInfo.flag = 0; //将修改标记设置为已被修改
+    systemInfo.allocator = allocator;
+    systemInfo.generation = 0;
 
     systemInfo.freeBlockStackTop = 1; //空闲块栈顶初始位于磁盘块1
     uint32_t totalBlock = capacity / blockSize; //磁盘被划分的块数
@@ -63,31 +74,32 @@ bool FileSystemCore::format(uint16_t bsize) {
     }
     systemInfo.trustMatrix[0][0] = 1;
 
-    //初始化磁盘中的空闲块栈
-    uint32_t ptr = (blockStackSize + 1) * blockSize; //计算初始位置指针
-    for (uint32_t b = totalBlock - 1; b >= blockStackSize + 3; --b) {
-        ptr -= sizeof(uint32_t); //更新指针位置
-        disk.seekStart(ptr); //移动读写头位置
-        disk.write(reinterpret_cast<char*>(&b), sizeof(b)); //将当前块号写入磁盘
-    }
-
-    //确定空闲块栈顶的偏移量
-    disk.seekStart(blockSize);
-    bool findStackTop = false;
-    auto& i = systemInfo.freeBlockStackTop; //空闲块栈的栈顶
-    auto& j = systemInfo.freeBlockStackOffset; //空闲块栈栈顶指针所在的块内偏移
-    for (i = 1; i <= blockStackSize; ++i) {
-        for (j = 0; j < stack->getMaxSize(); ++j) {
-            uint32_t t;
-            disk.read(reinterpret_cast<char*>(&t), sizeof(t));
-            if (t) {//遍历直到找到不为0的位置，此时表示找到空闲块的栈顶
-                findStackTop = true;
-                break;
-            }
+    if (allocator == ALLOCATOR_EXTENT) {
+        //位图模式：空闲块 blockStackSize+3 ~ totalBlock-1 置 1，位图写在原空闲块栈区域的开头
+        bitmap->init(totalBlock);
+        for (uint32_t bno = blockStackSize + 3; bno < totalBlock; ++bno) {
+            bitmap->setFree(bno, true);
         }
-        if (findStackTop) {
-            break;
+        writeBitmap();
+        systemInfo.freeBlockStackTop = 0;
+        systemInfo.freeBlockStackOffset = 0;
+    } else {
+        //初始化磁盘中的空闲块栈：空闲块号 blockStackSize+3 ~ totalBlock-1 依次存放在栈区的末尾，栈区前部补 0
+        //按整块在内存中构造后写入，不再逐项定位写入再逐项读回查找栈顶
+        uint32_t maxSize = stack->getMaxSize();
+        uint32_t freeBlocks = totalBlock - blockStackSize - 3;
+        uint32_t firstSlot = blockStackSize * maxSize - freeBlocks; //栈顶所在的项
+        std::vector<uint32_t> stackBlock(maxSize);
+        for (uint32_t k = 0; k < blockStackSize; ++k) {
+            for (uint32_t j = 0; j < maxSize; ++j) {
+                uint32_t slot = k * maxSize + j;
+                stackBlock[j] = slot < firstSlot ? 0 : slot - firstSlot + blockStackSize + 3;
+            }
+            disk.seekStart((k + 1) * blockSize);
+            disk.write(reinterpret_cast<char*>(stackBlock.data()), sizeof(uint32_t) * maxSize);
         }
+        systemInfo.freeBlockStackTop = 1 + firstSlot / maxSize; //空闲块栈的栈顶
+        systemInfo.freeBlockStackOffset = firstSlot % maxSize; //空闲块栈栈顶指针所在的块内偏移
     }
 
     //创建根目录，配置根目录i节点和目录列表的信息
@@ -115,10 +127,12 @@ bool FileSystemCore::format(uint16_t bsize) {
     disk.write(reinterpret_cast<char*>(&systemInfo), sizeof(systemInfo));
 
     //写入空闲块栈
-    auto blocks = stack->getBlocks();
-    disk.seekStart(systemInfo.freeBlockStackTop * blockSize);
-    disk.read(reinterpret_cast<char*>(blocks), sizeof(blocks[0]) * stack->getMaxSize()); //将磁盘上的空闲块栈数据加载到内存中
-    stack->setStackTop(systemInfo.freeBlockStackOffset); //更新栈顶指针
+    if (allocator != ALLOCATOR_EXTENT) {
+        auto blocks = stack->getBlocks();
+        disk.seekStart(systemInfo.freeBlockStackTop * blockSize);
+        disk.read(reinterpret_cast<char*>(blocks), sizeof(blocks[0]) * stack->getMaxSize()); //将磁盘上的空闲块栈数据加载到内存中
+        stack->setStackTop(systemInfo.freeBlockStackOffset); //更新栈顶指针
+    }
 
     return true;
 }
@@ -126,6 +140,10 @@ bool FileSystemCore::format(uint16_t bsize) {
 //挂载的目的是确保该磁盘已经被格式化，以便操作系统可以访问其中的文件和目录
 //挂载文件系统，读取超级块信息和空闲块栈信息
 //确保磁盘被正确打开并且已经格式化，然后读取必要的信息（如块大小、超级块信息和空闲块栈）以初始化文件系统的内部状态
+bool FileSystemCore::isMounted() {
+    return isOpen && !isUnformatted;
+}
+
 bool FileSystemCore::mount() {
     if (!disk.open()) { //打开磁盘
         return false; //如果磁盘打开失败，返回失败
@@ -135,21 +153,70 @@ bool FileSystemCore::mount() {
     disk.read(reinterpret_cast<char*>(&isUnformatted), sizeof(isUnformatted)); //读取是否格式化标记
     isOpen = true; //设置文件系统为打开状态
     if (!isUnformatted) { //如果文件系统已格式化
-        disk.read(reinterpret_cast<char*>(&blockSize), sizeof(blockSize)); //读取块大小
-        disk.read(reinterpret_cast<char*>(&systemInfo), sizeof(systemInfo)); //读取超级块信息
+        loadSystemInfo();
+        return true; //返回成功
+    } else {
+        return false; //如果文件系统未格式化，返回失败
+    }
+}
+
+void FileSystemCore::loadSystemInfo() {
+    disk.read(reinterpret_cast<char*>(&blockSize), sizeof(blockSize)); //读取块大小
+    disk.read(reinterpret_cast<char*>(&systemInfo), sizeof(systemInfo)); //读取超级块信息
+    if (systemInfo.allocator == ALLOCATOR_EXTENT) { //读入空闲块位图
+        uint32_t totalBlocks = capacity / blockSize;
+        if (bitmap->pageCount() != (totalBlocks + BLOCK_SIZE - 1) / BLOCK_SIZE) { //重新读入时大小没变就保留上次分配的位置
+            bitmap->init(totalBlocks);
+        }
+        disk.seekStart(blockSize);
+        disk.read(bitmap->data(), bitmap->pageCount() * BLOCK_BYTE);
+        bitmap->clearDirty();
+    } else {
         auto blocks = stack->getBlocks(); //获取空闲块栈
         disk.seekStart(systemInfo.freeBlockStackTop * blockSize);
         disk.read(reinterpret_cast<char*>(blocks), sizeof(blocks[0]) * stack->getMaxSize());
         stack->setStackTop(systemInfo.freeBlockStackOffset); //设置空闲块栈顶
-        disk.seekStart(0);
-        return true; //返回成功
-    } else {
-        return false; //如果文件系统未格式化，返回失败
+    }
+    disk.seekStart(0);
+}
+
+void FileSystemCore::reload() {
+    if (!isMounted()) {
+        return;
+    }
+    //只从磁盘文件重新读入超级块，写回次数和本进程上次读入或写回的相同，缓存的块就都没有过期
+    uint32_t head = sizeof(capacity) + sizeof(isUnformatted) + sizeof(blockSize);
+    FileSystemCoreInfo onDisk;
+    disk.invalidate(0, head + sizeof(onDisk));
+    disk.seekStart(head);
+    disk.read(reinterpret_cast<char*>(&onDisk), sizeof(onDisk));
+    disk.seekStart(0);
+    if (onDisk.generation == systemInfo.generation) {
+        return;
+    }
+    //上一条命令结束时修改都已写回，这里丢弃的只是其他进程已经改写过的干净块
+    disk.invalidate();
+    disk.read(reinterpret_cast<char*>(&capacity), sizeof(capacity));
+    disk.read(reinterpret_cast<char*>(&isUnformatted), sizeof(isUnformatted));
+    if (isUnformatted) {
+        return;
+    }
+    loadSystemInfo();
+    for (auto& [bno, version] : directoryVersions) { //内存中的目录和哈希索引都可能已经过期
+        version++;
     }
 }
 
 //分配块，从空闲块栈中获取一个空闲块
 uint32_t FileSystemCore::blockAllocate() {
+    if (systemInfo.allocator == ALLOCATOR_EXTENT) {
+        uint32_t ret = 0;
+        if (bitmap->allocate(1, ret)) {
+            systemInfo.freeBlockNumber--;
+            systemInfo.flag = 1;
+        }
+        return ret;
+    }
     bool isStackEmpty = stack->empty(); //检查空闲块栈是否为空（为空的含义是当前块栈没有空闲块可以使用）
     if (isStackEmpty) { //如果空闲块栈为空
         auto blocks = stack->getBlocks();
@@ -168,6 +235,12 @@ uint32_t FileSystemCore::blockAllocate() {
 
 //释放块，将块归还到空闲块栈
 void FileSystemCore::blockFree(uint32_t bno) {
+    if (systemInfo.allocator == ALLOCATOR_EXTENT) {
+        bitmap->setFree(bno, true);
+        systemInfo.freeBlockNumber++;
+        systemInfo.flag = 1;
+        return;
+    }
     bool isStackFull = stack->full(); //检查空闲块栈是否已满
     if (isStackFull) { //如果空闲块栈已满
         auto blocks = stack->getBlocks();
@@ -183,6 +256,30 @@ void FileSystemCore::blockFree(uint32_t bno) {
     systemInfo.flag = 1; //设置超级块修改标记
 }
 
+//分配多个块，位图模式下每次取一段连续空闲块，空闲空间零碎时由多段拼成
+std::vector<uint32_t> FileSystemCore::blocksAllocate(uint32_t count) {
+    std::vector<uint32_t> ret;
+    ret.reserve(count);
+    while (ret.size() < count) {
+        if (systemInfo.allocator != ALLOCATOR_EXTENT) {
+            ret.push_back(blockAllocate());
+            continue;
+        }
+        uint32_t start = 0;
+        uint32_t length = bitmap->allocate(count - ret.size(), start);
+        if (!length) { //没有空闲块了，与 blockAllocate 一样返回 0
+            ret.resize(count, 0);
+            break;
+        }
+        for (uint32_t bno = start; bno < start + length; ++bno) {
+            ret.push_back(bno);
+        }
+        systemInfo.freeBlockNumber -= length;
+        systemInfo.flag = 1;
+    }
+    return ret;
+}
+
 //读取块数据
 void FileSystemCore::read(uint32_t bno, uint16_t offset, char* buf, uint16_t sz) {
     uint32_t base = bno * blockSize; //计算块的起始地址
@@ -195,6 +292,12 @@ void FileSystemCore::write(uint32_t bno, uint16_t offset, const char* buf, uint1
     uint32_t base = bno * blockSize; //计算块的起始地址
     disk.seekStart(base + offset); //定位到块的具体偏移
     disk.write(buf, sz); //写入数据
+    writeGeneration++;
+}
+
+void FileSystemCore::readBlocks(uint32_t bno, uint32_t count, char* buf) {
+    disk.seekStart(bno * blockSize);
+    disk.read(buf, count * blockSize); //连续的块一次读入，缓存未命中时磁盘管理器成批读取
 }
 
 void FileSystemCore::readNext(char* buf, uint16_t sz) {
@@ -203,6 +306,7 @@ void FileSystemCore::readNext(char* buf, uint16_t sz) {
 
 void FileSystemCore::writeNext(char* buf, uint16_t sz) {
     disk.write(buf, sz); //将缓冲区中的数据写入磁盘
+    writeGeneration++;
 }
 
 void FileSystemCore::locale(uint32_t bno, uint16_t offset) {
@@ -352,19 +456,82 @@ uint32_t FileSystemCore::getRootLocation() {
     return systemInfo.rootLocation; //返回根目录的位置
 }
 
+uint64_t& FileSystemCore::directoryVersion(uint32_t bno) {
+    return directoryVersions[bno];
+}
+
+uint64_t FileSystemCore::getWriteGeneration() {
+    return writeGeneration;
+}
+
 //上级模块可以设置在进行 10 次或者其他次数以后执行一次 update函数，将数据持久化，以避免频繁的磁盘写入操作。
 void FileSystemCore::update() {
     if (systemInfo.flag) {
         systemInfo.flag = 0;
+        systemInfo.avaliableCapacity = systemInfo.freeBlockNumber * blockSize; //可用容量随空闲块数一起写回
+        systemInfo.generation++; //其他进程据此知道磁盘被修改过
         //写入基础信息
         disk.seekStart(sizeof(capacity));
         disk.write(reinterpret_cast<char*>(&isUnformatted), sizeof(isUnformatted));
         disk.write(reinterpret_cast<char*>(&blockSize), sizeof(blockSize));
         disk.write(reinterpret_cast<char*>(&systemInfo), sizeof(systemInfo));
-        //写入空闲块栈信息
+        //写入空闲块栈或位图信息
+        if (systemInfo.allocator == ALLOCATOR_EXTENT) {
+            writeBitmap();
+            return;
+        }
         auto blocks = stack->getBlocks();
         disk.seekStart(systemInfo.freeBlockStackTop * blockSize);
         disk.write(reinterpret_cast<char*>(blocks), sizeof(blocks[0]) * stack->getMaxSize());
     }
 }
 
+void FileSystemCore::writeBitmap() {
+    for (uint32_t page = 0; page < bitmap->pageCount(); ++page) {
+        if (bitmap->pageDirty(page)) {
+            disk.seekStart((page + 1) * blockSize);
+            disk.write(bitmap->data() + page * BLOCK_BYTE, BLOCK_BYTE);
+        }
+    }
+    bitmap->clearDirty();
+}
+
+void FileSystemCore::sync() {
+    if (writeGeneration != syncedWriteGeneration) { //写过数据块时超级块也要写回，增加写回次数
+        syncedWriteGeneration = writeGeneration;
+        systemInfo.flag = 1;
+    }
+    update();
+    disk.sync();
+}
+
+CacheStat FileSystemCore::getCacheStat() {
+    return disk.getCacheStat();
+}
+
+uint32_t FileSystemCore::getAllocator() {
+    return systemInfo.allocator;
+}
+
+FragStat FileSystemCore::getFragStat() {
+    if (systemInfo.allocator == ALLOCATOR_EXTENT) {
+        return bitmap->getFragStat();
+    }
+    //空闲块栈模式：把栈中的空闲块标到临时位图上再统计，栈顶块以内存中的为准
+    FreeBlockBitmap freeBlocks;
+    freeBlocks.init(capacity / blockSize);
+    uint32_t maxSize = stack->getMaxSize();
+    auto blocks = stack->getBlocks();
+    for (uint32_t j = systemInfo.freeBlockStackOffset; j < maxSize; ++j) {
+        freeBlocks.setFree(blocks[j], true);
+    }
+    std::vector<uint32_t> stackBlock(maxSize);
+    for (uint32_t k = systemInfo.freeBlockStackTop + 1; k < systemInfo.rootLocation; ++k) { //栈区为磁盘块 1 ~ rootLocation-1
+        read(k, 0, reinterpret_cast<char*>(stackBlock.data()), sizeof(uint32_t) * maxSize);
+        for (uint32_t bno : stackBlock) {
+            freeBlocks.setFree(bno, true);
+        }
+    }
+    return freeBlocks.getFragStat();
+}
+
@@ -6,7 +6,10 @@
 #include <cstring>
 #include "DiskManager.h"
 #include "include/Data.h"
+#include <vector>
+#include <unordered_map>
 #include "model/FreeBlockStack.h" //空闲块
+#include "model/FreeBlockBitmap.h" //空闲块位图
 
 //基本文件系统，实现对于文件的管理
 class FileSystemCore {
@@ -15,14 +18,18 @@ public:
     ~FileSystemCore(); //析构函数，将更新后的systemInfo写入磁盘
 
     bool createDisk(uint32_t sz); //创建一个指定大小的磁盘，单位为Byte
-    bool format(uint16_t bsize); //指定块大小，进行格式化，单位Byte
+    bool format(uint16_t bsize, uint32_t allocator = ALLOCATOR_EXTENT); //指定块大小和空闲块管理方式，进行格式化，单位Byte
     bool mount(); //尝试挂载硬盘，若挂载失败则需要格式化
+    bool isMounted(); //是否已经挂载了格式化过的磁盘，守护进程中后来的会话不再重复挂载
+    void reload(); //超级块写回次数和上次读入或写回时不同，就丢弃缓存的磁盘块，重新读入超级块和空闲块栈（位图），所有目录的修改计数加一；单独的进程在每条命令前调用
 
     uint32_t blockAllocate(); //分配空闲磁盘块
     void blockFree(uint32_t bno); //回收磁盘块
+    std::vector<uint32_t> blocksAllocate(uint32_t count); //分配count个磁盘块，位图模式下尽量是连续的块
 
     void read(uint32_t bno, uint16_t offset, char* buf, uint16_t sz); //从磁盘块bno偏移offset开始读sz字节到缓冲区buf
     void write(uint32_t bno, uint16_t offset, const char* buf, uint16_t sz); //从磁盘块bno偏移offset开始覆盖写入缓冲区buf开始sz字节
+    void readBlocks(uint32_t bno, uint32_t count, char* buf); //从磁盘块bno开始连续读count个整块
     void readNext(char* buf, uint16_t sz); //从当前位置继续读取数据
     void writeNext(char* buf, uint16_t sz); //从当前位置继续写入数据
     void locale(uint32_t bno, uint16_t offset); //将读写头移动到bno磁盘块的offset偏移
@@ -41,7 +48,13 @@ public:
     void getUser(uint8_t uid, User* user); //根据uid读取用户信息
 
     uint32_t getRootLocation(); //读取根目录所在磁盘块
+    uint64_t getWriteGeneration(); //写入计数，每次写磁盘加一，上层据此判断缓存的磁盘内容是否过期
+    uint64_t& directoryVersion(uint32_t bno); //首块为bno的目录的修改计数，由所有使用这个磁盘的会话共享
     void update(); //更新信息
+    void sync(); //更新信息并把磁盘缓存中的脏块写回磁盘
+    CacheStat getCacheStat(); //磁盘缓存统计
+    uint32_t getAllocator(); //空闲块管理方式
+    FragStat getFragStat(); //空闲空间的碎片统计
 
 private:
     DiskManager disk; //虚拟磁盘对象
@@ -51,6 +64,13 @@ private:
     bool isOpen; //磁盘是否打开标记
     FileSystemCoreInfo systemInfo; //文件系统超级块
     FreeBlockStack* stack; //空闲块栈，使用指针是为了防止写入硬盘时占用空间
+    FreeBlockBitmap* bitmap; //空闲块位图，ALLOCATOR_EXTENT 模式下代替空闲块栈，存放在原来空闲块栈的区域
+    uint64_t writeGeneration; //写入计数
+    uint64_t syncedWriteGeneration; //上一次 sync 时的写入计数
+    std::unordered_map<uint32_t, uint64_t> directoryVersions; //{目录首块: 修改计数}
+
+    void writeBitmap(); //把修改过的位图块写入磁盘
+    void loadSystemInfo(); //从磁盘读入块大小、超级块和空闲块栈（位图），读写头需位于块大小处
 
 };
 
@@ -1,11 +1,13 @@
 #include "Shell.h"
 
-Shell::Shell() {
+Shell::Shell(FileSystemCore& fileSystem, bool shared) : shared(shared), userInterface(fileSystem, shared) {
     user.uid = 0;
     isExit = false;
+    cmdFailed = false;
+    inBatch = false;
 
     help["touch"]    = "touch <FILE>                     touch file timestamps";
-    help["cat"]      = "cat <FILE>                       concatenate and display files";
+    help["cat"]      = "cat <FILE> [<OFFSET> [<LENGTH>]] concatenate and display files, or LENGTH bytes from OFFSET";
     help["echo"]     = "echo <STRING> [>|>> <FILE>]      display a line of text or redirect output";
     help["rm"]       = "rm <FILE>                        remove files";
     help["rmdir"]    = "rmdir <DIR>                      remove directories";
@@ -13,7 +15,7 @@ Shell::Shell() {
     help["cd"]       = "cd <DIR>                         change the working directory";
     help["ls"]       = "ls [-l] [<DIR>]                  list directory contents";
     help["logout"]   = "logout                           exit a login shell";
-    help["format"]   = "format                           format disks or tapes";
+    help["format"]   = "format [stack|extent]            format disks or tapes, extent (default) allocates contiguous blocks";
 
     help["help"]     = "help                             display information about builtin commands";
     help["clear"]    = "clear                            clear the terminal screen";
@@ -29,6 +31,10 @@ Shell::Shell() {
     help["trust"]    = "trust <USERNAME>                 add a user to the trusted list";
     help["distrust"] = "distrust <USERNAME>              remove a user from the trusted list";
     help["vim"]      = "vim <FILE>                       a programmer's file editor";
+    help["cachestat"] = "cachestat                        display disk block cache statistics";
+    help["fragstat"] = "fragstat [<FILE>]                display free space fragmentation, and the extents of a file";
+    help["batch"]    = "batch [-e] ... end               run the lines up to 'end' with a single prompt, -e stops at the first error";
+    help["write"]    = "write <FILE>                     create or overwrite a file from the length-prefixed chunks that follow";
 
     userInterface.initialize();
 }
@@ -98,36 +104,136 @@ std::pair<bool, std::vector<std::string>> Shell::split_cmd(std::string& cmd) {
     return std::make_pair(true, cmds);
 }
 
+std::vector<std::pair<std::string, bool>> Shell::split_list(const std::string& line) {
+    std::vector<std::pair<std::string, bool>> cmds;
+    bool isQuote = false;
+    bool afterAnd = false; //当前这一段前面是否是 &&
+    std::string item = "";
+    for (size_t i = 0; i < line.size(); i++) {
+        char ch = line[i];
+        if (ch == '\"') {
+            isQuote = !isQuote;
+        } else if (!isQuote && (ch == ';' || (ch == '&' && i + 1 < line.size() && line[i + 1] == '&'))) {
+            cmds.emplace_back(item, afterAnd);
+            item = "";
+            afterAnd = (ch == '&');
+            if (afterAnd) {
+                i++; //跳过第二个 &
+            }
+            continue;
+        }
+        item += ch;
+    }
+    cmds.emplace_back(item, afterAnd); //引号不匹配时交给 split_cmd 报错
+    return cmds;
+}
+
 void Shell::exec() {
     std::string input;
+    outputPrefix();
+    setIdle(true);
+    if (!std::getline(std::cin, input)) { //输入流已关闭（例如前端退出），按 exit 处理，避免不停输出提示符
+        userInterface.logout();
+        isExit = true;
+        return;
+    }
+    setIdle(false); //之后命令自己读取的输入（write 的分段、密码、batch 块）都属于这条命令
+    if (!shared) { //每个标签页单独的进程：其他进程可能在这之前写过磁盘，守护进程中所有会话共用一份缓存，不需要
+        userInterface.reload();
+    }
+
+    bool valid;
+    std::tie(valid, cmd) = split_cmd(input);
+    if (valid && !cmd.empty() && cmd[0] == "batch") {
+        cmd_batch();
+    } else {
+        runList(input);
+    }
+    userInterface.sync(); //命令（或整个 batch 块）结束，把缓存的修改写回磁盘
+}
+
+bool Shell::runList(const std::string& line) {
+    bool ok = true;
+    bool last = true; //上一条执行（或跳过）的命令是否成功，&& 后的命令只在它成功时执行
+    for (auto& [item, afterAnd] : split_list(line)) {
+        if (afterAnd && !last) {
+            continue;
+        }
+        last = runCommand(item);
+        ok = ok && last;
+        if (isExit) {
+            break;
+        }
+    }
+    return ok;
+}
+
+void Shell::cmd_batch() {
+    bool stopOnError = false;
+    if (cmd.size() == 2 && cmd[1] == "-e") {
+        stopOnError = true;
+    } else if (cmd.size() > 1) {
+        error() << "batch: usage: batch [-e]" << std::endl;
+        return;
+    }
+
+    std::vector<std::string> lines;
+    std::string line;
+    while (std::getline(std::cin, line)) { //先读完整个块，块内不输出提示符
+        size_t first = line.find_first_not_of(" \t\r");
+        size_t last = line.find_last_not_of(" \t\r");
+        if (first != std::string::npos && line.substr(first, last - first + 1) == "end") {
+            break;
+        }
+        lines.push_back(line);
+    }
+
+    inBatch = true;
+    for (const auto& item : lines) {
+        if (!runList(item) && stopOnError) {
+            break;
+        }
+        if (isExit) {
+            break;
+        }
+    }
+    inBatch = false;
+}
+
+bool Shell::runCommand(std::string input) {
     bool valid;
+    cmdFailed = false;
+    userInterface.resetStatus();
     userInterface.updateDirNow();
-    outputPrefix();
-    std::getline(std::cin, input);
     std::tie(valid, cmd) = split_cmd(input);
 
     if (!valid) {
-        std::cout << "syntax error: missing terminating \" character" << std::endl;
-        return;
+        error() << "syntax error: missing terminating \" character" << std::endl;
+        return false;
     }
     if (cmd.empty()) {
-        return;
+        return true;
     }
 
     std::string cmdType = cmd[0];
+    //块内的命令在执行前已经全部读入，需要再读输入的命令会读到块后面的内容
+    if (inBatch && (cmdType == "sudo" || cmdType == "passwd" || cmdType == "mkuser" || cmdType == "vim" || cmdType == "batch" || cmdType == "write")) {
+        error() << "batch: " << cmdType << ": not allowed in a batch" << std::endl;
+        return false;
+    }
 
     if (cmdType == "sudo") {
         isSudo = true;
         cmd.erase(cmd.begin());
         if (cmd.empty()) {
             cmdType = "";
-            std::cout << "sudo: missing command operand" << std::endl;
-            return;
+            error() << "sudo: missing command operand" << std::endl;
+            return false;
         } else {
             cmdType = cmd[0];
         }
         if (!cmd_sudo()) {
-            return;
+            return false;
         }
     } else {
         isSudo = false;
@@ -135,7 +241,9 @@ void Shell::exec() {
     userInterface.setSudoMode(isSudo);
     userInterface.setCurrentCmd(cmdType);
 
-    if (cmdType == "cat") {
+    if (cmdType == "cachestat") {
+        cmd_cachestat();
+    } else if (cmdType == "cat") {
         cmd_cat();
     } else if (cmdType == "cd") {
         cmd_cd();
@@ -153,6 +261,8 @@ void Shell::exec() {
         cmd_exit();
     } else if (cmdType == "format") {
         cmd_format();
+    } else if (cmdType == "fragstat") {
+        cmd_fragstat();
     } else if (cmdType == "help") {
         cmd_help();
     } else if (cmdType == "ls") {
@@ -181,18 +291,25 @@ void Shell::exec() {
         cmd_trust();
     } else if (cmdType == "vim") {
         cmd_vim();
+    } else if (cmdType == "write") {
+        cmd_write();
     } else {
-        std::cout << cmdType << ": command not found" << std::endl;
+        error() << cmdType << ": command not found" << std::endl;
     }
+    return !cmdFailed && !userInterface.commandFailed();
 }
 
 void Shell::cmd_login() {
     std::string userName;
     std::string password;
     cmd_clear();
+    setIdle(true);
     while (1) {
         std::cout << "host@login:Username$ " << std::flush;
-        std::cin >> userName;
+        if (!(std::cin >> userName)) { //输入流已关闭，不再循环等待登录
+            isExit = true;
+            return;
+        }
         if (debug) {
             userName = "root";
         }
@@ -201,6 +318,9 @@ void Shell::cmd_login() {
         if (debug) {
             password = "123456";
         }
+        if (!shared) { //预先启动的进程挂载得早，期间其他进程可能改过用户表和空闲块
+            userInterface.reload();
+        }
 
         uint8_t uid = userInterface.userVerify(userName, password);
         if (uid == 0) {
@@ -213,13 +333,14 @@ void Shell::cmd_login() {
         }
     }
     cmd_clear();
-    std::getchar();
+    std::cin.ignore(); //读走密码后的换行；不用 getchar，守护进程中 std::cin 读的是会话的套接字而不是 stdin
+    setIdle(false);
     curPath.clear();
 }
 
 void Shell::cmd_logout() {
     if (cmd.size() > 1) {
-        std::cout << "logout: too much arguments" << std::endl;
+        error() << "logout: too much arguments" << std::endl;
         return;
     }
     userInterface.logout();
@@ -228,7 +349,7 @@ void Shell::cmd_logout() {
 
 void Shell::cmd_exit() {
     if (cmd.size() > 1) {
-        std::cout << "exit: too much arguments" << std::endl;
+        error() << "exit: too much arguments" << std::endl;
         return;
     }
     userInterface.logout();
@@ -238,7 +359,7 @@ void Shell::cmd_exit() {
 
 void Shell::cmd_cd() {
     if (cmd.size() > 2) {
-        std::cout << "cd: too much arguments" << std::endl;
+        error() << "cd: too much arguments" << std::endl;
         return;
     }
     if (cmd.size() == 1) {
@@ -274,7 +395,7 @@ void Shell::cmd_cd() {
 
 void Shell::cmd_ls() {
     if (cmd.size() > 3) {
-        std::cout << "ls: too much arguments" << std::endl;
+        error() << "ls: too much arguments" << std::endl;
         return;
     }
 
@@ -287,7 +408,7 @@ void Shell::cmd_ls() {
         } else {
             std::vector<std::string> src = split_path(cmd[1]);
             if (src.empty()) {
-                std::cout << "ls: missing operand" << std::endl;
+                error() << "ls: missing operand" << std::endl;
                 return;
             }
             userInterface.ls(user.uid, false, src, cmd[1]);
@@ -296,41 +417,41 @@ void Shell::cmd_ls() {
         if (cmd[1] == "-l") {
             std::vector<std::string> src = split_path(cmd[2]);
             if (src.empty()) {
-                std::cout << "ls: missing operand" << std::endl;
+                error() << "ls: missing operand" << std::endl;
                 return;
             }
             userInterface.ls(user.uid, true, src, cmd[2]);
         } else if (cmd[2] == "-l") {
             std::vector<std::string> src = split_path(cmd[1]);
             if (src.empty()) {
-                std::cout << "ls: missing operand" << std::endl;
+                error() << "ls: missing operand" << std::endl;
                 return;
             }
             userInterface.ls(user.uid, true, src, cmd[1]);
         } else {
-            std::cout << "ls: too much arguments" << std::endl;
+            error() << "ls: too much arguments" << std::endl;
         }
     }
 }
 
 void Shell::cmd_touch() {
     if (cmd.size() < 2) {
-        std::cout << "touch: missing file operand" << std::endl;
+        error() << "touch: missing file operand" << std::endl;
         return;
     }
     if (cmd.size() > 2) {
-        std::cout << "touch: too much arguments" << std::endl;
+        error() << "touch: too much arguments" << std::endl;
         return;
     }
 
     std::vector<std::string> src = split_path(cmd[1]);
     if (src.empty()) {
-        std::cout << "touch: missing file operand" << std::endl;
+        error() << "touch: missing file operand" << std::endl;
         return;
     }
     std::string fileName = src.back();
     if (fileName.length() >= FILE_NAME_LENGTH) {
-        std::cout << "touch: too long file name" << std::endl;
+        error() << "touch: too long file name" << std::endl;
         return;
     }
     src.pop_back();
@@ -341,48 +462,72 @@ void Shell::cmd_touch() {
     }
 }
 
+void Shell::cmd_cachestat() {
+    if (cmd.size() > 1) {
+        error() << "cachestat: too much arguments" << std::endl;
+        return;
+    }
+    userInterface.cachestat();
+}
+
+void Shell::cmd_fragstat() {
+    if (cmd.size() > 2) {
+        error() << "fragstat: too much arguments" << std::endl;
+        return;
+    }
+    userInterface.fragstat(user.uid, cmd.size() == 2 ? cmd[1] : std::string(), cmd.size() == 2 ? cmd[1] : std::string());
+}
+
 void Shell::cmd_cat() {
     if (cmd.size() < 2) {
-        std::cout << "cat: missing file operand" << std::endl;
+        error() << "cat: missing file operand" << std::endl;
         return;
     }
-    if (cmd.size() > 2) {
-        std::cout << "cat: too much arguments" << std::endl;
+    if (cmd.size() > 4) {
+        error() << "cat: too much arguments" << std::endl;
         return;
     }
+    uint64_t range[2] = {0, UINT64_MAX}; //cat <FILE> [<OFFSET> [<LENGTH>]]
+    for (size_t i = 2; i < cmd.size(); i++) {
+        if (cmd[i].empty() || cmd[i].size() > 18 || cmd[i].find_first_not_of("0123456789") != std::string::npos) {
+            error() << "cat: invalid " << (i == 2 ? "offset" : "length") << " '" << cmd[i] << "'" << std::endl;
+            return;
+        }
+        range[i - 2] = std::stoull(cmd[i]);
+    }
 
     if (!cmd[1].empty() && cmd[1][0] == '~') {
         cmd[1] = cmd[1].substr(1);
     }
     std::vector<std::string> src = split_path(cmd[1]);
     if (src.empty()) {
-        std::cout << "cat: missing file operand" << std::endl;
+        error() << "cat: missing file operand" << std::endl;
         return;
     }
     std::string fileName = src.back();
     src.pop_back();
-    if (!src.empty()) userInterface.cat(user.uid, src, fileName, cmd[1]);
-    else userInterface.cat(user.uid, fileName, cmd[1]);
+    if (!src.empty()) userInterface.cat(user.uid, src, fileName, cmd[1], nullptr, range[0], range[1]);
+    else userInterface.cat(user.uid, fileName, cmd[1], nullptr, range[0], range[1]);
 }
 
 void Shell::cmd_mv() {
     if (cmd.size() < 3) {
-        std::cout << "mv: missing file operand" << std::endl;
+        error() << "mv: missing file operand" << std::endl;
         return;
     }
     if (cmd.size() > 3) {
-        std::cout << "mv: too much arguments" << std::endl;
+        error() << "mv: too much arguments" << std::endl;
         return;
     }
 
     std::vector<std::string> src = split_path(cmd[1]);
     if (src.empty()) {
-        std::cout << "mv: missing file operand" << std::endl;
+        error() << "mv: missing file operand" << std::endl;
         return;
     }
     std::vector<std::string> des = split_path(cmd[2]);
     if (des.empty()) {
-        std::cout << "mv: missing file operand" << std::endl;
+        error() << "mv: missing file operand" << std::endl;
         return;
     }
     userInterface.mv(user.uid, src, des, cmd[1], cmd[2]);
@@ -390,22 +535,22 @@ void Shell::cmd_mv() {
 
 void Shell::cmd_cp() {
     if (cmd.size() < 3) {
-        std::cout << "cp: missing file operand" << std::endl;
+        error() << "cp: missing file operand" << std::endl;
         return;
     }
     if (cmd.size() > 3) {
-        std::cout << "cp: too much arguments" << std::endl;
+        error() << "cp: too much arguments" << std::endl;
         return;
     }
 
     std::vector<std::string> src = split_path(cmd[1]);
     if (src.empty()) {
-        std::cout << "cp: missing file operand" << std::endl;
+        error() << "cp: missing file operand" << std::endl;
         return;
     }
     std::vector<std::string> des = split_path(cmd[2]);
     if (des.empty()) {
-        std::cout << "cp: missing file operand" << std::endl;
+        error() << "cp: missing file operand" << std::endl;
         return;
     }
     userInterface.cp(user.uid, src, des, cmd[1], cmd[2]);
@@ -413,17 +558,17 @@ void Shell::cmd_cp() {
 
 void Shell::cmd_rm() {
     if (cmd.size() < 2) {
-        std::cout << "rm: missing file operand" << std::endl;
+        error() << "rm: missing file operand" << std::endl;
         return;
     }
     if (cmd.size() > 2) {
-        std::cout << "rm: too much arguments" << std::endl;
+        error() << "rm: too much arguments" << std::endl;
         return;
     }
 
     std::vector<std::string> src = split_path(cmd[1]);
     if (src.empty()) {
-        std::cout << "rm: missing file operand" << std::endl;
+        error() << "rm: missing file operand" << std::endl;
         return;
     }
     std::string fileName = src.back();
@@ -437,22 +582,22 @@ void Shell::cmd_rm() {
 
 void Shell::cmd_mkdir() {
     if (cmd.size() < 2) {
-        std::cout << "mkdir: missing operand" << std::endl;
+        error() << "mkdir: missing operand" << std::endl;
         return;
     }
     if (cmd.size() > 2) {
-        std::cout << "mkdir: too much arguments" << std::endl;
+        error() << "mkdir: too much arguments" << std::endl;
         return;
     }
 
     std::vector<std::string> src = split_path(cmd[1]);
     if (src.empty()) {
-        std::cout << "mkdir: missing operand" << std::endl;
+        error() << "mkdir: missing operand" << std::endl;
         return;
     }
     std::string dirName = src.back();
     if (dirName.length() >= FILE_NAME_LENGTH) {
-        std::cout << "mkdir: too long directory name" << std::endl;
+        error() << "mkdir: too long directory name" << std::endl;
         return;
     }
     src.pop_back();
@@ -465,17 +610,17 @@ void Shell::cmd_mkdir() {
 
 void Shell::cmd_rmdir() {
     if (cmd.size() < 2) {
-        std::cout << "rmdir: missing operand" << std::endl;
+        error() << "rmdir: missing operand" << std::endl;
         return;
     }
     if (cmd.size() > 2) {
-        std::cout << "rmdir: too much arguments" << std::endl;
+        error() << "rmdir: too much arguments" << std::endl;
         return;
     }
 
     std::vector<std::string> src = split_path(cmd[1]);
     if (src.empty()) {
-        std::cout << "rmdir: missing operand" << std::endl;
+        error() << "rmdir: missing operand" << std::endl;
         return;
     }
     std::string dirName = src.back();
@@ -495,11 +640,11 @@ bool Shell::cmd_sudo() {
 
     uint8_t checkUid = userInterface.userVerify(user.name, password);
     if (!checkUid) {
-        std::cout << "Password verification failed" << std::endl;
+        error() << "Password verification failed" << std::endl;
         return false;
     }
     else if (checkUid != user.uid) {
-        std::cout << "sudo: System error" << std::endl;
+        error() << "sudo: System error" << std::endl;
         return false;
     }
     else {
@@ -509,12 +654,25 @@ bool Shell::cmd_sudo() {
 }
 
 void Shell::cmd_format() {
-    if (cmd.size() > 1) {
-        std::cout << "format: too much arguments" << std::endl;
+    if (cmd.size() > 2) {
+        error() << "format: too much arguments" << std::endl;
+        return;
+    }
+    if (shared) {
+        error() << "format: not allowed while the disk is shared by the daemon" << std::endl;
         return;
     }
+    uint32_t allocator = ALLOCATOR_EXTENT;
+    if (cmd.size() == 2) {
+        if (cmd[1] == "stack") {
+            allocator = ALLOCATOR_STACK;
+        } else if (cmd[1] != "extent") {
+            error() << "format: invalid allocator '" << cmd[1] << "', expected stack or extent" << std::endl;
+            return;
+        }
+    }
     userInterface.logout();
-    userInterface.format();
+    userInterface.format(allocator);
     curPath.clear();
     user.uid = 0;
 }
@@ -522,21 +680,21 @@ void Shell::cmd_format() {
 void Shell::cmd_chmod() {
     //chmod <file> -ato rwx
     if (cmd.size() < 3) {
-        std::cout << "chmod: missing operand" << std::endl;
+        error() << "chmod: missing operand" << std::endl;
         return;
     }
     if (cmd.size() > 4) {
-        std::cout << "chmod: too much arguments" << std::endl;
+        error() << "chmod: too much arguments" << std::endl;
         return;
     }
 
     std::vector<std::string> src = split_path(cmd[1]);
     if (src.empty()) {
-        std::cout << "chmod: missing operand" << std::endl;
+        error() << "chmod: missing operand" << std::endl;
         return;
     }
     if (cmd[2] != "-a" && cmd[2] != "-t" && cmd[2] != "-o") {
-        std::cout << "chmod: invalid mode: '" << cmd[2] << "'" << std::endl;
+        error() << "chmod: invalid mode: '" << cmd[2] << "'" << std::endl;
         return;
     }
     std::string access(3, '-');
@@ -555,7 +713,7 @@ void Shell::cmd_chmod() {
             tmp.erase(tmp.find('x'), 1);
         }
         if (!tmp.empty()) {
-            std::cout << "chmod: invalid access: '" << cmd[3] << "'" << std::endl;
+            error() << "chmod: invalid access: '" << cmd[3] << "'" << std::endl;
             return;
         }
     }
@@ -571,17 +729,17 @@ void Shell::cmd_chmod() {
 
 void Shell::cmd_mkuser() {
     if (cmd.size() < 2) {
-        std::cout << "mkuser: missing operand" << std::endl;
+        error() << "mkuser: missing operand" << std::endl;
         return;
     }
     if (cmd.size() > 2) {
-        std::cout << "mkuser: too much arguments" << std::endl;
+        error() << "mkuser: too much arguments" << std::endl;
         return;
     }
 
     std::string name = cmd[1];
     if (name.length() >= USERNAME_PASWORD_LENGTH) {
-        std::cout << "mkuser: too long user name" << std::endl;
+        error() << "mkuser: too long user name" << std::endl;
         return;
     }
     userInterface.mkuser(user.uid, name);
@@ -589,11 +747,11 @@ void Shell::cmd_mkuser() {
 
 void Shell::cmd_rmuser() {
     if (cmd.size() < 2) {
-        std::cout << "rmuser: missing operand" << std::endl;
+        error() << "rmuser: missing operand" << std::endl;
         return;
     }
     if (cmd.size() > 2) {
-        std::cout << "rmuser: too much arguments" << std::endl;
+        error() << "rmuser: too much arguments" << std::endl;
         return;
     }
 
@@ -603,7 +761,7 @@ void Shell::cmd_rmuser() {
 
 void Shell::cmd_lsuser() {
     if (cmd.size() > 1) {
-        std::cout << "lsuser: too much arguments" << std::endl;
+        error() << "lsuser: too much arguments" << std::endl;
         return;
     }
     userInterface.lsuser();
@@ -611,7 +769,7 @@ void Shell::cmd_lsuser() {
 
 void Shell::cmd_passwd() {
     if (cmd.size() > 1) {
-        std::cout << "passwd: too much arguments" << std::endl;
+        error() << "passwd: too much arguments" << std::endl;
         return;
     }
     userInterface.passwd(user.uid, user.name);
@@ -619,11 +777,11 @@ void Shell::cmd_passwd() {
 
 void Shell::cmd_trust() {
     if (cmd.size() < 2) {
-        std::cout << "trust: missing operand" << std::endl;
+        error() << "trust: missing operand" << std::endl;
         return;
     }
     if (cmd.size() > 2) {
-        std::cout << "trust: too much arguments" << std::endl;
+        error() << "trust: too much arguments" << std::endl;
         return;
     }
 
@@ -633,11 +791,11 @@ void Shell::cmd_trust() {
 
 void Shell::cmd_distrust() {
     if (cmd.size() < 2) {
-        std::cout << "distrust: missing operand" << std::endl;
+        error() << "distrust: missing operand" << std::endl;
         return;
     }
     if (cmd.size() > 2) {
-        std::cout << "distrust: too much arguments" << std::endl;
+        error() << "distrust: too much arguments" << std::endl;
         return;
     }
 
@@ -647,7 +805,7 @@ void Shell::cmd_distrust() {
 
 void Shell::cmd_help() {
     if (cmd.size() > 2) {
-        std::cout << "cd: too much arguments" << std::endl;
+        error() << "cd: too much arguments" << std::endl;
         return;
     }
 
@@ -662,12 +820,14 @@ void Shell::cmd_help() {
         std::cout << "__________________________________________" << std::endl;
         std::cout << help[cmd[1]] << std::endl;
     } else {
-        std::cout << "help: " << cmd[1] << ": command not found" << std::endl;
+        error() << "help: " << cmd[1] << ": command not found" << std::endl;
     }
 }
 
 void Shell::cmd_clear() {
-    system("cls");
+    if (!shared) { //守护进程的会话由客户端自己清屏
+        system("cls");
+    }
 }
 
 void Shell::cmd_echo() {
@@ -675,7 +835,7 @@ void Shell::cmd_echo() {
         std::cout << cmd[1] << std::endl; // 打印到终端，std::endl会添加换行
     } else if (cmd.size() == 4) { // 形式: echo "content" > file 或 echo "content" >> file
         if (cmd[2] != ">" && cmd[2] != ">>") { // 检查重定向运算符是否有效
-            std::cout << "echo: syntax error: unrecognized redirect operator '" << cmd[2] << "'" << std::endl;
+            error() << "echo: syntax error: unrecognized redirect operator '" << cmd[2] << "'" << std::endl;
             return;
         }
         std::string content_to_process = cmd[1]; // 用户输入的待写入内容
@@ -688,7 +848,7 @@ void Shell::cmd_echo() {
         std::vector<std::string> path_parts = split_path(target_file_path);
         // 修正路径解析，确保即使是根目录或当前目录的空路径也有效
         if (path_parts.empty() || (path_parts.size() == 1 && path_parts[0].empty() && target_file_path != "~")) {
-            std::cout << "echo: invalid file path '" << target_file_path << "'" << std::endl;
+            error() << "echo: invalid file path '" << target_file_path << "'" << std::endl;
             return;
         }
         std::string fileName = path_parts.back(); // 提取文件名
@@ -698,39 +858,20 @@ void Shell::cmd_echo() {
             path_parts.clear(); // Ensure it's truly empty if it represents current dir for clarity
         }
         if (fileName.length() >= FILE_NAME_LENGTH) { // 检查文件名长度
-            std::cout << "echo: too long file name '" << fileName << "'" << std::endl;
+            error() << "echo: too long file name '" << fileName << "'" << std::endl;
             return;
         }
-        std::string final_content_for_vim;
-        std::string original_creation_time;
-        if (append) { // 如果是追加模式 (>>)
-            std::tuple<bool, std::string, std::string> existing_content_tuple; // tuple: {success, content, creationTime}
-            std::get<0>(existing_content_tuple) = false; // Flag to indicate we want content back
-            bool cat_success;
+        if (append) { // 如果是追加模式 (>>)，只改写文件末尾，不读出整个文件再重写
             if (path_parts.empty()) { // 文件在当前目录或根目录
-                cat_success = userInterface.cat(user.uid, fileName, target_file_path, &existing_content_tuple);
+                userInterface.append(user.uid, fileName, target_file_path, content_to_process);
             } else { // 文件在指定路径
-                cat_success = userInterface.cat(user.uid, path_parts, fileName, target_file_path, &existing_content_tuple);
-            }
-            if (!cat_success) {
-                // 如果cat失败（例如文件不存在、权限不足、是目录等），cat会打印错误信息。
-                // 特别是 "No such file or directory" 错误，在追加模式下，我们不允许创建新文件。
-                std::cout << "echo: " << target_file_path << ": No such file or directory for append. Use '>' to create and write." << std::endl;
-                return;
-            }
-            std::string existing_content = std::get<1>(existing_content_tuple);
-            original_creation_time = std::get<2>(existing_content_tuple); // 保留原有文件的创建时间
-            // 确保现有内容以换行符结尾，除非它是空文件。
-            if (!existing_content.empty() && existing_content.back() != '\n') {
-                existing_content += '\n';
+                userInterface.append(user.uid, path_parts, fileName, target_file_path, content_to_process);
             }
-            // 将新内容追加到原有内容之后，并确保新内容也以换行符结尾。
-            final_content_for_vim = existing_content + content_to_process + "\n";
-        } else { // 如果是覆盖模式 (>)
-            // 写入的内容就是用户输入的，并确保以换行符结尾。
-            final_content_for_vim = content_to_process + "\n";
-            original_creation_time = INode::getCurTime(); // 新文件或覆盖文件，创建时间设置为当前
+            return;
         }
+        // 覆盖模式 (>)：写入的内容就是用户输入的，并确保以换行符结尾。
+        std::string final_content_for_vim = content_to_process + "\n";
+        std::string original_creation_time = INode::getCurTime(); // 新文件或覆盖文件，创建时间设置为当前
         // ---------- 写入文件 ----------
         std::tuple<bool, std::string, std::string> write_content_tuple;
         std::get<0>(write_content_tuple) = false; // 标记：这是传入的内容
@@ -746,7 +887,7 @@ void Shell::cmd_echo() {
             return;
         }
     } else { // 参数数量不正确
-        std::cout << "echo: invalid number of arguments." << std::endl;
+        error() << "echo: invalid number of arguments." << std::endl;
         std::cout << "Usage: echo <TEXT>           (print to terminal)" << std::endl;
         std::cout << "       echo <TEXT> > <FILE>  (overwrite file)" << std::endl;
         std::cout << "       echo <TEXT> >> <FILE> (append to file)" << std::endl;
@@ -754,23 +895,27 @@ void Shell::cmd_echo() {
 }
 
 void Shell::cmd_vim() {
+    if (shared) {
+        error() << "vim: needs a console, not available in a daemon session" << std::endl;
+        return;
+    }
     if (cmd.size() < 2) {
-        std::cout << "vim: missing file operand" << std::endl;
+        error() << "vim: missing file operand" << std::endl;
         return;
     }
     if (cmd.size() > 2) {
-        std::cout << "vim: too much arguments" << std::endl;
+        error() << "vim: too much arguments" << std::endl;
         return;
     }
 
     std::vector<std::string> src = split_path(cmd[1]);
     if (src.empty()) {
-        std::cout << "vim: missing file operand" << std::endl;
+        error() << "vim: missing file operand" << std::endl;
         return;
     }
     std::string fileName = src.back();
     if (fileName.length() >= FILE_NAME_LENGTH) {
-        std::cout << "vim: too long file name" << std::endl;
+        error() << "vim: too long file name" << std::endl;
         return;
     }
     src.pop_back();
@@ -778,6 +923,42 @@ void Shell::cmd_vim() {
     else userInterface.vim(user.uid, fileName, cmd[1]);
 }
 
+void Shell::cmd_write() {
+    ChunkReader chunks(std::cin);
+    if (cmd.size() < 2) {
+        error() << "write: missing file operand" << std::endl;
+    } else if (cmd.size() > 2) {
+        error() << "write: too much arguments" << std::endl;
+    } else {
+        std::vector<std::string> src = split_path(cmd[1]);
+        std::string fileName = src.empty() ? "" : src.back();
+        if (fileName.empty()) {
+            error() << "write: missing file operand" << std::endl;
+        } else if (fileName.length() >= FILE_NAME_LENGTH) {
+            error() << "write: too long file name '" << fileName << "'" << std::endl;
+        } else {
+            src.pop_back();
+            if (!src.empty()) userInterface.write(user.uid, src, fileName, cmd[1], chunks);
+            else userInterface.write(user.uid, fileName, cmd[1], chunks);
+        }
+    }
+    chunks.skip(); //出错时也要读完内容
+    if (chunks.failed()) {
+        error() << "write: invalid chunk length" << std::endl;
+    }
+}
+
+std::ostream& Shell::error() {
+    cmdFailed = true;
+    return std::cout;
+}
+
+void Shell::setIdle(bool idle) {
+    if (onIdle) {
+        onIdle(idle);
+    }
+}
+
 void Shell::outputPrefix() {
     std::cout << "OSFileSystem@" << user.name << ":~";
     for (const auto& s : curPath) {
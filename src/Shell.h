@@ -1,6 +1,7 @@
 #ifndef FILESYSTEM_SHELL_H
 #define FILESYSTEM_SHELL_H
 
+#include <functional>
 #include <string>
 #include <map>
 #include <iostream>
@@ -15,15 +16,21 @@ class Shell {
 public:
     // bool debug = true;
     bool debug = false;
-    Shell();
+    explicit Shell(FileSystemCore& fileSystem, bool shared = false); //shared 为 true 表示守护进程中的会话，其他会话同时使用这个磁盘
 
     //根据part分割str
     std::vector<std::string> split_path(std::string path); //路径划分 data/ztr/sghn->data   ztr    sghn
     std::pair<bool, std::vector<std::string>> split_cmd(std::string& path); //cmd划分  cp /data1/1.txt /data2/1.txt->cp  /data1/1.txt     /data2/1.txt
+    std::vector<std::pair<std::string, bool>> split_list(const std::string& line); //命令列表划分 mkdir a && cd a ; ls->(mkdir a, false) (cd a, true) (ls, false)，true 表示前一条成功才执行
     bool isExit; //是否退出标记
+    std::function<void(bool)> onIdle; //等待下一条命令或登录信息前以 true 调用，读到后以 false 调用；守护进程只在空闲时让其他会话执行
 
     //界面主程序
-    void exec(); //退出终端的具体实现
+    void exec(); //读入一行（或一个 batch 块）并执行，执行完只输出一次提示符
+    bool runList(const std::string& line); //执行 ; 和 && 连接的命令列表，有命令失败时返回false
+    bool runCommand(std::string input); //执行单条命令，返回是否成功
+    void cmd_batch(); //batch [-e] 读入直到 end 的所有行，依次执行
+    void cmd_cachestat();
     void cmd_cat();
     void cmd_cd();
     void cmd_clear();
@@ -33,6 +40,7 @@ public:
     void cmd_echo();
     void cmd_exit();
     void cmd_format();
+    void cmd_fragstat();
     void cmd_help();
     void cmd_login();
     void cmd_logout();
@@ -48,6 +56,7 @@ public:
     bool cmd_sudo();
     void cmd_touch();
     void cmd_trust();
+    void cmd_write(); //write <FILE>，命令行之后读入按长度分段的文件内容
 
     void cmd_vim(); //vim命令处理程序
 
@@ -55,11 +64,17 @@ public:
 
 private:
     std::vector<std::string> cmd;                  //用户输入的整行命令
+    bool cmdFailed;                                //当前命令是否失败
+    bool inBatch;                                  //是否正在执行 batch 块
     User user;                                     //当前登录用户
     bool isSudo;                                   //是否是超管状态
+    bool shared;                                   //磁盘是否与其他会话共享，此时不能格式化，也没有可供 vim 使用的控制台
     CommandLineInterface userInterface;            //用户接口
     std::vector<std::string> curPath;              //当前从根目录开始的路径
     std::map<std::string, std::string> help;       //帮助文档
+
+    std::ostream& error(); //输出错误信息前调用，标记当前命令失败
+    void setIdle(bool idle); //通知 onIdle，没有设置时什么也不做
 };
 
 #endif //FILESYSTEM_SHELL_H
@@ -6,8 +6,16 @@
 #define BLOCK_BYTE (BLOCK_SIZE / 8) //块大小，4096 Byte, 4KB
 #define FILE_NAME_LENGTH ((DIRECTORY_ITEM_SIZE - 32) / (8 * sizeof(char))) //文件名最大长度
 #define DIRECTORY_NUMS (BLOCK_SIZE / DIRECTORY_ITEM_SIZE) //目录项总项数
+#define DIRECTORY_BLOCK_ITEMS (DIRECTORY_NUMS - 1) //多块目录中每块存放的目录项数，最后一项留作指向下一块的链接
+#define DIRECTORY_LINK_NAME "/" //链接项的名字，文件名中不可能出现 /
 #define FILE_INDEX_SIZE (BLOCK_SIZE / 32 - 1) //文件索引表总项数
 #define USERNAME_PASWORD_LENGTH 32 //用户名和密码的最大长度
 #define MAX_USER_NUMS 8 //最多的用户数
+#define DIRECTORY_INDEX_NUMS 64 //最多保留哈希索引的目录数
+#define CACHE_BLOCK_NUMS 1024 //磁盘块缓存的容量，1024 块 = 4MB
+#define READAHEAD_BLOCK_NUMS 256 //一次读入的连续块数上限，256 块 = 1MB
+#define WRITE_CHUNK_MAX_BYTES (READAHEAD_BLOCK_NUMS * BLOCK_BYTE) //write 命令每段输入的长度上限
+#define ALLOCATOR_STACK 0 //空闲块栈，逐块后进先出分配
+#define ALLOCATOR_EXTENT 1 //空闲块位图，按连续段分配
 
 #endif //FILESYSTEM_CONSTRAINTS_H
@@ -5,6 +5,7 @@
 #include <string>
 #include <ctime>
 #include <iomanip>
+#include <vector>
 #include "../include/Constraints.h"
 
 
@@ -18,6 +19,14 @@ class Directory { //目录类，一个目录恰好是一个块大小
 public:
     DirectoryItem item[DIRECTORY_NUMS]; //32768/128=256
     //从头开始遍历第一个index==0的项为空闲目录项
+    //目录项超过一块时，最后一项为名字是 DIRECTORY_LINK_NAME 的链接项，inodeIndex 指向下一个目录块
+};
+
+class DirectoryList { //读入内存的整个目录，可能由多个链接起来的目录块组成
+public:
+    std::vector<DirectoryItem> item; //所有目录项，第 i 项位于第 i / DIRECTORY_BLOCK_ITEMS 块
+    std::vector<uint32_t> blocks; //目录块的磁盘块号，第一块就是目录i结点中的bno
+    uint64_t version = 0; //读入时目录的修改计数，与最新计数不同说明内存中的目录已过期
 };
 
 
@@ -69,6 +78,8 @@ public:
     uint8_t trustMatrix[MAX_USER_NUMS][MAX_USER_NUMS]; //信赖者矩阵，trustMatrix[i][j]=1代表i信赖j
 
     uint8_t flag; //超级块修改标记，-1未被修改，0已经被修改
+    uint32_t allocator; //空闲块管理方式，ALLOCATOR_STACK 或 ALLOCATOR_EXTENT；旧磁盘这里读出来是 0，即空闲块栈
+    uint32_t generation; //超级块写回次数，单独的进程在每条命令前比较它，变了说明其他进程写过磁盘，需要丢弃缓存
 };
 
 
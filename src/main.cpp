@@ -1,7 +1,24 @@
+#include <cstring>
+#ifdef _WIN32
+#include <fcntl.h>
+#include <io.h>
+#endif
+
+#include "Daemon.h"
 #include "Shell.h"
 
-int main() {
-    Shell s;
+int main(int argc, char* argv[]) {
+    if (argc == 3 && !strcmp(argv[1], "--daemon")) { //app --daemon <套接字路径>：挂载磁盘，为多个客户端服务
+        Daemon daemon(argv[2]);
+        return daemon.run();
+    }
+#ifdef _WIN32
+    if (!_isatty(_fileno(stdin))) { //前端通过管道输入时按二进制读，write 的内容不能做换行转换
+        _setmode(_fileno(stdin), _O_BINARY);
+    }
+#endif
+    FileSystemCore fileSystem;
+    Shell s(fileSystem);
     s.cmd_login();
     while (!s.isExit) {
         s.exec();
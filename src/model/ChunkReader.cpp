@@ -0,0 +1,53 @@
+#include "ChunkReader.h"
+
+#include <cctype>
+
+ChunkReader::ChunkReader(std::istream& in) : in(in), finished(false), broken(false) {
+}
+
+bool ChunkReader::next(std::string& chunk) {
+    if (finished) {
+        return false;
+    }
+    std::string line;
+    if (!std::getline(in, line)) {
+        finished = broken = true;
+        return false;
+    }
+    if (!line.empty() && line.back() == '\r') {
+        line.pop_back();
+    }
+    uint64_t length = 0;
+    for (char ch : line) {
+        if (!isdigit(static_cast<unsigned char>(ch)) || length > WRITE_CHUNK_MAX_BYTES) {
+            length = UINT64_MAX;
+            break;
+        }
+        length = length * 10 + (ch - '0');
+    }
+    if (line.empty() || length > WRITE_CHUNK_MAX_BYTES) {
+        finished = broken = true;
+        return false;
+    }
+    if (!length) {
+        finished = true;
+        return false;
+    }
+    chunk.resize(length);
+    in.read(&chunk[0], length);
+    if (static_cast<uint64_t>(in.gcount()) != length) {
+        finished = broken = true;
+        return false;
+    }
+    return true;
+}
+
+void ChunkReader::skip() {
+    std::string chunk;
+    while (next(chunk)) {
+    }
+}
+
+bool ChunkReader::failed() {
+    return broken;
+}
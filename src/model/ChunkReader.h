@@ -0,0 +1,24 @@
+#ifndef FILESYSTEM_CHUNKREADER_H
+#define FILESYSTEM_CHUNKREADER_H
+
+#include <cstdint>
+#include <istream>
+#include <string>
+#include "../include/Constraints.h"
+
+//write 命令的输入：命令行之后是若干段 "<十进制长度>\n" 加上这么多字节的原始内容，以长度为 0 的一段结束
+//内容按字节原样读入，可以包含换行和引号；长度行格式错误时无法再找到下一段，之后的输入都按命令处理
+class ChunkReader {
+public:
+    explicit ChunkReader(std::istream& in);
+    bool next(std::string& chunk); //读入下一段，读到结束段、格式错误或输入流关闭时返回false
+    void skip(); //丢弃剩下的段，命令出错时也要读完输入，否则内容会被当成命令执行
+    bool failed(); //是否因为格式错误或输入流关闭而结束
+
+private:
+    std::istream& in;
+    bool finished; //已经读到结束段或出错
+    bool broken; //长度行格式错误或输入不完整
+};
+
+#endif //FILESYSTEM_CHUNKREADER_H
@@ -0,0 +1,50 @@
+#include "DirectoryIndex.h"
+
+#include <cstring>
+
+DirectoryIndex::DirectoryIndex() : count(0), version(0), built(false) {
+}
+
+void DirectoryIndex::build(const DirectoryList& dir) {
+    items.clear();
+    items.reserve(dir.item.size());
+    count = 0;
+    for (const DirectoryItem& item : dir.item) {
+        items.emplace(std::string(item.name, strnlen(item.name, FILE_NAME_LENGTH)), count);
+        count++;
+    }
+    version = dir.version;
+    built = true;
+}
+
+bool DirectoryIndex::valid(uint64_t version) {
+    return built && this->version == version;
+}
+
+void DirectoryIndex::stamp(uint64_t version) {
+    this->version = version;
+}
+
+int DirectoryIndex::find(const std::string& name) {
+    auto it = items.find(name);
+    return it == items.end() ? -1 : it->second;
+}
+
+void DirectoryIndex::insert(const std::string& name, int location) {
+    items[name] = location;
+    count++;
+}
+
+void DirectoryIndex::erase(const std::string& name) {
+    if (items.erase(name)) {
+        count--;
+    }
+}
+
+void DirectoryIndex::move(const std::string& name, int location) {
+    items[name] = location;
+}
+
+int DirectoryIndex::size() {
+    return count;
+}
@@ -0,0 +1,31 @@
+#ifndef FILESYSTEM_DIRECTORYINDEX_H
+#define FILESYSTEM_DIRECTORYINDEX_H
+
+#include <cstdint>
+#include <string>
+#include <unordered_map>
+#include "../include/Constraints.h"
+#include "../include/Data.h"
+
+//一个目录的哈希索引，目录项名字到目录项序号
+//以建立时目录的修改计数判断是否过期，经过 insert/erase 维护的修改在写回后用 stamp 更新计数
+class DirectoryIndex {
+public:
+    DirectoryIndex();
+    void build(const DirectoryList& dir); //根据目录内容重建索引
+    bool valid(uint64_t version); //索引是否仍然对应磁盘上的目录
+    void stamp(uint64_t version); //目录修改并写回磁盘后，更新索引对应的修改计数
+    int find(const std::string& name); //返回目录项序号，没有则返回-1
+    void insert(const std::string& name, int location); //添加目录项
+    void erase(const std::string& name); //删除目录项
+    void move(const std::string& name, int location); //目录项被移动到新位置
+    int size(); //目录项个数，即第一个空闲目录项的序号
+
+private:
+    std::unordered_map<std::string, int> items; //{名字: 目录项序号}
+    int count; //目录项个数
+    uint64_t version; //索引对应的目录修改计数
+    bool built; //是否已经建立
+};
+
+#endif //FILESYSTEM_DIRECTORYINDEX_H
@@ -0,0 +1,105 @@
+#include "FreeBlockBitmap.h"
+
+#include <algorithm>
+
+FreeBlockBitmap::FreeBlockBitmap() : totalBlocks(0), cursor(0) {
+}
+
+void FreeBlockBitmap::init(uint32_t totalBlocks) {
+    this->totalBlocks = totalBlocks;
+    cursor = 0;
+    uint32_t pages = (totalBlocks + BLOCK_SIZE - 1) / BLOCK_SIZE; //每个位图块记录 BLOCK_SIZE 个块
+    words.assign(pages * (BLOCK_BYTE / sizeof(uint64_t)), 0); //按整块分配，读写位图时不越界
+    dirtyPages.assign(pages, true);
+}
+
+bool FreeBlockBitmap::isFree(uint32_t bno) {
+    return bno < totalBlocks && (words[bno / 64] >> (bno % 64) & 1);
+}
+
+void FreeBlockBitmap::setFree(uint32_t bno, bool free) {
+    if (free) {
+        words[bno / 64] |= uint64_t(1) << (bno % 64);
+    } else {
+        words[bno / 64] &= ~(uint64_t(1) << (bno % 64));
+    }
+    dirtyPages[bno / BLOCK_SIZE] = true;
+}
+
+uint32_t FreeBlockBitmap::findNext(uint32_t from, bool free, uint32_t limit) {
+    limit = std::min(limit, totalBlocks);
+    if (from >= limit) {
+        return limit;
+    }
+    uint32_t w = from / 64;
+    uint64_t word = free ? words[w] : ~words[w];
+    word &= ~uint64_t(0) << (from % 64); //忽略from之前的位
+    while (!word) { //整个字都不符合时一次跳过64块
+        if (++w * 64 >= limit) {
+            return limit;
+        }
+        word = free ? words[w] : ~words[w];
+    }
+    uint32_t bno = w * 64 + __builtin_ctzll(word);
+    return std::min(bno, limit);
+}
+
+uint32_t FreeBlockBitmap::allocate(uint32_t want, uint32_t& start) {
+    uint32_t bestStart = 0, bestLength = 0;
+    bool found = false;
+    //先从cursor往后找，再从头找到cursor，连续写入的文件因此大多落在相邻的块上
+    for (int pass = 0; pass < 2 && !found; pass++) {
+        uint32_t begin = pass == 0 ? cursor : 0;
+        uint32_t end = pass == 0 ? totalBlocks : cursor;
+        for (uint32_t s = findNext(begin, true); s < end; ) {
+            uint32_t e = findNext(s, false, s + want); //只需要知道这一段够不够 want 块
+            if (e - s > bestLength) {
+                bestStart = s;
+                bestLength = e - s;
+            }
+            if (e - s >= want) {
+                found = true;
+                break;
+            }
+            s = findNext(e, true);
+        }
+    }
+    uint32_t length = std::min(bestLength, want);
+    if (!length) {
+        return 0;
+    }
+    start = bestStart;
+    for (uint32_t b = start; b < start + length; b++) {
+        setFree(b, false);
+    }
+    cursor = start + length;
+    return length;
+}
+
+FragStat FreeBlockBitmap::getFragStat() {
+    FragStat stat{0, 0, 0};
+    for (uint32_t s = findNext(0, true); s < totalBlocks; ) {
+        uint32_t e = findNext(s, false);
+        stat.freeBlocks += e - s;
+        stat.freeExtents++;
+        stat.largestExtent = std::max(stat.largestExtent, e - s);
+        s = findNext(e, true);
+    }
+    return stat;
+}
+
+char* FreeBlockBitmap::data() {
+    return reinterpret_cast<char*>(words.data());
+}
+
+uint32_t FreeBlockBitmap::pageCount() {
+    return dirtyPages.size();
+}
+
+bool FreeBlockBitmap::pageDirty(uint32_t page) {
+    return dirtyPages[page];
+}
+
+void FreeBlockBitmap::clearDirty() {
+    dirtyPages.assign(dirtyPages.size(), false);
+}
@@ -0,0 +1,39 @@
+#ifndef FILESYSTEM_FREEBLOCKBITMAP_H
+#define FILESYSTEM_FREEBLOCKBITMAP_H
+
+#include <cstdint>
+#include <vector>
+#include "../include/Constraints.h"
+
+struct FragStat {
+    uint32_t freeBlocks; //空闲块数
+    uint32_t freeExtents; //空闲块组成的连续段数
+    uint32_t largestExtent; //最长的连续空闲段
+};
+
+//空闲块位图，每块一位，1表示空闲
+//按连续段分配：优先从上次分配结束的位置往后找足够长的空闲段，找不到时给出最长的一段
+class FreeBlockBitmap {
+public:
+    FreeBlockBitmap();
+    void init(uint32_t totalBlocks); //所有块都标记为已使用
+    bool isFree(uint32_t bno); //块是否空闲
+    void setFree(uint32_t bno, bool free); //标记块空闲或已使用
+    uint32_t allocate(uint32_t want, uint32_t& start); //分配至多want个连续块，返回实际块数，start为第一块，没有空闲块返回0
+    FragStat getFragStat(); //空闲空间的碎片统计
+
+    char* data(); //位图本体，按字节存取，第b块对应第b/8字节的第b%8位
+    uint32_t pageCount(); //位图占用的磁盘块数
+    bool pageDirty(uint32_t page); //位图第page块在上次写回后是否修改过
+    void clearDirty(); //位图写回磁盘后清除修改标记
+
+private:
+    std::vector<uint64_t> words; //位图本体
+    std::vector<bool> dirtyPages; //位图每块的修改标记
+    uint32_t totalBlocks; //磁盘总块数
+    uint32_t cursor; //上次分配结束的位置
+
+    uint32_t findNext(uint32_t from, bool free, uint32_t limit = UINT32_MAX); //从from开始第一个空闲（或已使用）的块，到limit（不超过totalBlocks）为止都没有则返回limit
+};
+
+#endif //FILESYSTEM_FREEBLOCKBITMAP_H
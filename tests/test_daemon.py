@@ -0,0 +1,72 @@
+import asyncio
+import subprocess
+import sys
+import time
+
+import pytest
+
+from api.client import SHELL_PROMPT, AsyncClient
+from api.executable import find_executable
+from api.fsck import Checker
+from api.image import DISK_NAME, DiskImage
+
+EXECUTABLE = find_executable("app")
+
+pytestmark = pytest.mark.skipif(EXECUTABLE is None or sys.platform == "win32", reason="needs the built backend and Unix sockets")
+
+@pytest.fixture
+def daemon(tmp_path):
+    """ (套接字路径, 映像路径) of a daemon serving a freshly formatted image """
+    async def create():
+        async with AsyncClient(executable=EXECUTABLE, cwd=str(tmp_path), disk_size_mb=16):
+            pass
+    asyncio.run(create())
+    socket_path = str(tmp_path / "osfm.sock")
+    process = subprocess.Popen([EXECUTABLE, "--daemon", socket_path], cwd=tmp_path, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 5
+    while not (tmp_path / "osfm.sock").exists() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    yield socket_path, str(tmp_path / DISK_NAME)
+    process.terminate()
+    process.wait(5)
+
+def test_command_input_does_not_interleave_with_other_sessions(daemon):
+    socket_path, image_path = daemon
+    chunk = b"x" * 5000
+    order = []
+
+    async def remove(client: AsyncClient):
+        await client.rm("/f")
+        order.append("rm")
+
+    async def scenario():
+        async with AsyncClient(socket_path=socket_path) as a, AsyncClient(socket_path=socket_path) as b:
+            await a.write("/f", "old")
+            a.process.stdin.write(b"write /f\n%d\n" % len(chunk) + chunk) # write 的第一段，命令还没有结束
+            await a.process.stdin.drain()
+            await asyncio.sleep(0.3)
+            removing = asyncio.create_task(remove(b))
+            await asyncio.sleep(0.3) # rm 只能在 write 结束后执行
+            order.append("write")
+            a.process.stdin.write(b"%d\n" % len(chunk) + chunk + b"0\n")
+            await a.process.stdin.drain()
+            await a._read_until(SHELL_PROMPT)
+            await removing
+            assert "f" not in await a.listdir("/")
+
+    asyncio.run(scenario())
+    assert order == ["write", "rm"]
+    with DiskImage(image_path) as image:
+        assert Checker(image).run().problems == []
+
+def test_concurrent_mkuser_get_different_slots(daemon):
+    socket_path, image_path = daemon
+
+    async def scenario():
+        async with AsyncClient(socket_path=socket_path) as a, AsyncClient(socket_path=socket_path) as b:
+            await asyncio.gather(a.mkuser("alice", "pw1"), b.mkuser("bob", "pw2"))
+            return {user.name for user in await a.lsuser()}
+
+    assert {"alice", "bob"} <= asyncio.run(scenario())
+    with DiskImage(image_path) as image:
+        assert Checker(image).run().problems == []
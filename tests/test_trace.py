@@ -0,0 +1,65 @@
+from api.trace import Tracer
+
+SHELL = "OSFileSystem@root:~$ "
+SECRETS = ("123456", "s3cret", "n3w-s3cret")
+
+def _session(tracer: Tracer, exchanges):
+    """ Feeds [(输入, 后端的输出)] through tracer the way API does: begin on write, record_output on read """
+    tracer.record_output("T", SHELL)
+    for command, output in exchanges:
+        tracer.begin("T", command)
+        tracer.record_output("T", output)
+
+def _recorded_names(tracer: Tracer) -> set:
+    names = set(tracer.histograms) | set(tracer.first_byte_histograms) | set(tracer.bytes_received)
+    return names | {trace.command_type for trace in tracer.traces}
+
+def test_mkuser_passwords_are_not_recorded():
+    tracer = Tracer()
+    _session(tracer, [
+        ("sudo mkuser bob", "[sudo] password for root: "),
+        ("123456", "password: "),
+        ("s3cret", "retype password: "),
+        ("s3cret", SHELL),
+    ])
+    names = _recorded_names(tracer)
+    assert not names & set(SECRETS)
+    assert tracer.histograms["password"].count == 3
+
+def test_passwd_passwords_are_not_recorded():
+    tracer = Tracer()
+    _session(tracer, [
+        ("passwd", "Changing password for root\ncurrent password: "),
+        ("123456", "password: "),
+        ("n3w-s3cret", "retype password: "),
+        ("n3w-s3cret", SHELL),
+        ("ls", ".\t..\t\n" + SHELL),
+    ])
+    names = _recorded_names(tracer)
+    assert not names & set(SECRETS)
+    assert tracer.histograms["password"].count == 3
+    assert tracer.histograms["passwd"].count == 1
+    assert tracer.histograms["ls"].count == 1
+
+def test_prompt_split_across_reads():
+    tracer = Tracer()
+    tracer.record_output("T", SHELL)
+    tracer.begin("T", "passwd")
+    tracer.record_output("T", "Changing password for root\ncurrent pass")
+    tracer.record_output("T", "word: ")
+    tracer.begin("T", "123456")
+    assert tracer.last_trace.command_type == "password"
+
+def test_stage_after_prompt_stays_with_its_terminal():
+    tracer = Tracer()
+    tracer.record_output("A", SHELL)
+    tracer.record_output("B", SHELL)
+    tracer.begin("A", "ls")
+    tracer.record_output("A", "a\tb\n" + SHELL)
+    tracer.begin("B", "cat f") # 另一个标签页的命令成为 last_trace
+    tracer.add_stage("explorer.parse", 0.01, "A")
+    ls, cat = tracer.traces[0], tracer.last_trace
+    assert ls.command_type == "ls" and "explorer.parse" in ls.stages
+    assert not cat.stages
+    tracer.add_stage("explorer.parse", 0.01, "C") # 没有命令的终端：只进直方图
+    assert tracer.histograms["stage:explorer.parse"].count == 2
@@ -0,0 +1,37 @@
+import struct
+import tarfile
+
+from api.image import BLOCK_BYTE, FILE_INDEX_SIZE, HEADER, SUPERBLOCK, SUPERBLOCK_OFFSET, DiskImage, INode
+from api.transfer import TarSink, TransferStats, export_image
+
+TIME = "2024-01-01 00:00:00"
+DATA_BLOCKS = [10, 11, 20, 21, 22, 30] # 三段不连续的数据块
+
+def _make_image(path, content: bytes):
+    """ 64 块的映像：根目录 INode 在块 2，目录项在块 3，文件 f 的 INode 在块 4、索引表在块 5 """
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(64 * BLOCK_BYTE, 0, BLOCK_BYTE))
+        f.write(SUPERBLOCK.pack(2, 0, 1, 0, 0))
+        f.truncate(64 * BLOCK_BYTE)
+    with DiskImage(str(path), writable=True) as image:
+        image.write_inode(2, INode(1, 0x7f, 3, TIME, TIME))
+        image.write_directory([3], [(".", 2), ("..", 2), ("f", 4)])
+        image.write_inode(4, INode(1, 0x3f, 5, TIME, TIME))
+        index = list(DATA_BLOCKS) + [0] * (FILE_INDEX_SIZE + 1 - len(DATA_BLOCKS))
+        image.write(5, struct.pack(f"<{FILE_INDEX_SIZE + 1}I", *index))
+        for i, bno in enumerate(DATA_BLOCKS):
+            image.write(bno, content[i * BLOCK_BYTE:(i + 1) * BLOCK_BYTE])
+
+def test_tar_export_of_a_file_in_several_runs(tmp_path):
+    content = bytes(ord("a") + i % 26 for i in range(5 * BLOCK_BYTE + 100))
+    image_path = tmp_path / "OSFileSystem.dsk"
+    _make_image(image_path, content)
+    archive = tmp_path / "out.tar.gz"
+    stats = TransferStats()
+    sink = TarSink(str(archive), "root", "gz")
+    with DiskImage(str(image_path)) as image:
+        export_image(image, "/", sink, stats)
+    sink.close()
+    assert not stats.errors and stats.files_done == 1
+    with tarfile.open(archive) as tar:
+        assert tar.extractfile("root/f").read() == content